@@ -0,0 +1,638 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@organization: Profitbricks GmbH
+@copyright: © 2010 - 2015 by Profitbricks GmbH
+@license: GPL3
+@summary: asyncio variants of the execution of all external storage tools
+
+This module requires Python >= 3.5, it must not be imported under Python 2.
+
+All coroutines take the appropriate handler object as first argument and
+reuse its methods for building the command line and for evaluating the
+results, only the execution of the command itself is done asynchronously
+by asyncio.create_subprocess_exec(). The number of concurrent processes
+per tool is bounded by an AsyncToolRunner.
+"""
+
+# Standard modules
+import os
+import time
+import signal
+import errno
+import weakref
+import logging
+import asyncio
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.base import PathOpenedOnDeletionError
+
+from pb_blockdev.process import ExecTimeoutError
+from pb_blockdev.process import get_sudo_cmd, log_output
+from pb_blockdev.process import KILL_GRACE_PERIOD
+
+from pb_blockdev.megaraid.handler import MEGACLI_MAX_CONCURRENCY
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.2'
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+
+DEFAULT_TOOL_CONCURRENCY = {
+    'lvm': 4,
+    'mdadm': 2,
+    'multipathd': 4,
+    'megacli': MEGACLI_MAX_CONCURRENCY,
+    'losetup': 2,
+    'dmsetup': 8,
+    'fuser': 8,
+    'blockdev': 8,
+}
+
+
+# =============================================================================
+def _current_loop():
+    """
+    Gives back the running event loop, asyncio.get_running_loop()
+    exists only since Python 3.7.
+    """
+
+    if hasattr(asyncio, 'get_running_loop'):
+        return asyncio.get_running_loop()
+    return asyncio.get_event_loop()
+
+
+# =============================================================================
+class AsyncToolRunner(object):
+    """
+    Executes commands asynchronously with a bounded number of concurrent
+    processes per tool.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, limits=None, default_limit=DEFAULT_CONCURRENCY):
+        """
+        Constructor.
+
+        @param limits: the maximum number of concurrent processes per tool,
+                       overriding DEFAULT_TOOL_CONCURRENCY
+        @type limits: dict
+        @param default_limit: the maximum number of concurrent processes
+                              of tools not mentioned in limits
+        @type default_limit: int
+
+        """
+
+        self.limits = dict(DEFAULT_TOOL_CONCURRENCY)
+        if limits:
+            self.limits.update(limits)
+        self.default_limit = int(default_limit)
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    # -------------------------------------------------------------------------
+    def semaphore(self, tool):
+        """
+        Gives back the semaphore bounding the concurrency of the given tool
+        in the running event loop. A semaphore is bound to the loop it was
+        first used in, so every event loop gets its own semaphores.
+        """
+
+        loop = _current_loop()
+        semaphores = self._semaphores.get(loop)
+        if semaphores is None:
+            semaphores = {}
+            self._semaphores[loop] = semaphores
+
+        if tool not in semaphores:
+            limit = self.limits.get(tool, self.default_limit)
+            semaphores[tool] = asyncio.Semaphore(limit)
+        return semaphores[tool]
+
+    # -------------------------------------------------------------------------
+    async def run(self, tool, cmd, timeout=None, sudo_cmd=None):
+        """
+        Executes the given command in its own process group. On timeout
+        the whole process group is killed.
+
+        @raise ExecTimeoutError: on a timeout of the command
+
+        @param tool: the name of the tool for bounding the concurrency
+        @type tool: str
+        @param cmd: the command to execute with all its arguments
+        @type cmd: list of str
+        @param timeout: the timeout in seconds, None means no timeout
+        @type timeout: float or None
+        @param sudo_cmd: path to the 'sudo' command, if given, the command
+                         is executed non-interactive by sudo
+        @type sudo_cmd: str or None
+
+        @return: a tuple of::
+            - return value of the command,
+            - output on STDOUT,
+            - output on STDERR
+        @rtype: tuple
+
+        """
+
+        cmd = [str(x) for x in cmd]
+        if sudo_cmd:
+            cmd = [sudo_cmd, '-n'] + cmd
+
+        async with self.semaphore(tool):
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                start_new_session=True)
+            try:
+                (std_out, std_err) = await asyncio.wait_for(
+                    proc.communicate(), timeout)
+            except asyncio.TimeoutError:
+                e = ExecTimeoutError(timeout, cmd)
+                LOG.warn(str(e))
+                await self._kill_process_group(proc)
+                raise e
+
+        return (
+            proc.returncode, std_out.decode('utf-8', 'replace'),
+            std_err.decode('utf-8', 'replace'))
+
+    # -------------------------------------------------------------------------
+    async def _kill_process_group(self, proc):
+        """
+        Terminates the process group of the given process, first
+        with SIGTERM, after a grace period with SIGKILL.
+        """
+
+        for signum in (signal.SIGTERM, signal.SIGKILL):
+            if proc.returncode is not None:
+                break
+            try:
+                os.killpg(proc.pid, signum)
+            except OSError as e:
+                if e.errno == errno.ESRCH:
+                    break
+                try:
+                    os.kill(proc.pid, signum)
+                except OSError:
+                    break
+            try:
+                await asyncio.wait_for(proc.wait(), KILL_GRACE_PERIOD)
+                break
+            except asyncio.TimeoutError:
+                pass
+
+        await proc.wait()
+
+
+_default_runner = None
+
+
+# =============================================================================
+def get_default_runner():
+    """
+    Gives back the process wide default AsyncToolRunner.
+    """
+
+    global _default_runner
+    if _default_runner is None:
+        _default_runner = AsyncToolRunner()
+    return _default_runner
+
+
+# =============================================================================
+async def handler_call(
+        handler, tool, cmd, timeout=None, quiet=True, sudo=False,
+        simulate=None, runner=None):
+    """
+    Asynchronous variant of pb_blockdev.process.handler_call_with_timeout().
+    Simulated commands are given to handler.call(), because they
+    are not really executed.
+    """
+
+    do_simulate = handler.simulate
+    if simulate is not None:
+        do_simulate = bool(simulate)
+    if do_simulate:
+        return handler.call(cmd, quiet=quiet, sudo=sudo, simulate=True)
+
+    if runner is None:
+        runner = get_default_runner()
+
+    sudo_cmd = None
+    if sudo:
+        sudo_cmd = get_sudo_cmd(handler)
+
+    (ret_code, std_out, std_err) = await runner.run(
+        tool, cmd, timeout=timeout, sudo_cmd=sudo_cmd)
+
+    log_output(handler, std_out, std_err, quiet=quiet)
+
+    return (ret_code, std_out, std_err)
+
+
+# =============================================================================
+def _do_sudo(sudo=None):
+    """
+    Execution by sudo, if not running as root or if explicitely given.
+    """
+
+    if sudo is not None:
+        return bool(sudo)
+    if os.geteuid():
+        return True
+    return False
+
+
+# =============================================================================
+async def exec_lvm(
+        handler, cmd_params=None, locked=False, release_lock=True,
+        quiet=True, simulate=None, sudo=None, force=False, runner=None):
+    """
+    Asynchronous variant of GenericLvmHandler.exec_lvm(), the persistent
+    lvm shell is not used.
+
+    @raise LvmTimeoutError: On timeout execution of 'lvm'
+    @raise LvmExecError: On some errors on execution
+
+    """
+
+    from pb_blockdev.lvm import LvmTimeoutError
+
+    (cmd, cmd_str) = handler._build_lvm_cmd(cmd_params, quiet=quiet)
+
+    do_sudo = _do_sudo(sudo)
+    if do_sudo:
+        LOG.debug(_("Executing as root:") + " %s", cmd_str)
+    else:
+        LOG.debug(_("Executing:") + " %s", cmd_str)
+
+    call_lock = None
+    if locked:
+        loop = asyncio.get_event_loop()
+        call_lock = await loop.run_in_executor(
+            None, handler._acquire_lvm_lock, cmd_params, release_lock)
+
+    try:
+        try:
+            (ret_code, std_out, std_err) = await handler_call(
+                handler, 'lvm', cmd, timeout=handler.lvm_timeout, quiet=quiet,
+                sudo=do_sudo, simulate=simulate, runner=runner)
+        except ExecTimeoutError:
+            raise LvmTimeoutError(handler.lvm_timeout, cmd_str)
+
+        handler._check_lvm_result(cmd_str, ret_code, std_err, force=force)
+
+    finally:
+        if locked:
+            handler._release_lvm_lock(call_lock, release_lock)
+
+    return (ret_code, std_out, std_err)
+
+
+# =============================================================================
+async def exec_mdadm(
+        handler, mode='manage', cmd_params=None, locked=False,
+        release_lock=True, quiet=True, simulate=None, sudo=None, force=False,
+        runner=None):
+    """
+    Asynchronous variant of GenericMdHandler.exec_mdadm().
+
+    @raise MdadmTimeoutError: On timeout execution of mdadm
+    @raise MdadmError: On some errors on execution
+
+    """
+
+    from pb_blockdev.md import MdadmTimeoutError
+
+    (cmd, cmd_str) = handler._build_mdadm_cmd(mode, cmd_params, quiet=quiet)
+
+    do_sudo = _do_sudo(sudo)
+    if do_sudo:
+        LOG.debug(_("Executing as root:") + " %s", cmd_str)
+    else:
+        LOG.debug(_("Executing:") + " %s", cmd_str)
+
+    if locked and not handler.global_lock:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, handler.lock_global)
+
+    try:
+        try:
+            (ret_code, std_out, std_err) = await handler_call(
+                handler, 'mdadm', cmd, timeout=handler.mdadm_timeout,
+                quiet=quiet, sudo=do_sudo, simulate=simulate, runner=runner)
+        except ExecTimeoutError:
+            raise MdadmTimeoutError(handler.mdadm_timeout, cmd_str)
+
+        handler._check_mdadm_result(cmd_str, ret_code, std_err, force=force)
+
+    finally:
+        if locked and release_lock:
+            handler.global_lock = None
+
+    return (ret_code, std_out, std_err)
+
+
+# =============================================================================
+async def exec_multipathd(
+        handler, cmd_params, quiet=True, simulate=None, runner=None):
+    """
+    Asynchronous variant of GenericMultipathHandler.exec_multipathd().
+
+    @raise MultipathdNotRunningError: if the multipathd is not running
+    @raise ExecMultipathdError: on other errors
+
+    """
+
+    (cmd, cmd_str) = handler._build_multipathd_cmd(cmd_params)
+
+    do_sudo = _do_sudo()
+    if do_sudo:
+        LOG.debug(_("Executing as root:") + " %s", cmd_str)
+    else:
+        LOG.debug(_("Executing:") + " %s", cmd_str)
+
+    (ret_code, std_out, std_err) = await handler_call(
+        handler, 'multipathd', cmd, quiet=True, sudo=do_sudo,
+        simulate=simulate, runner=runner)
+
+    handler._check_multipathd_result(cmd_str, ret_code, std_err)
+    return (ret_code, std_out, std_err)
+
+
+# =============================================================================
+async def exec_megacli(handler, args, nolog=True, runner=None):
+    """
+    Asynchronous variant of MegaraidHandler.exec_megacli().
+
+    @raise CommandNotFoundError: if the MegaCli command could not be found.
+
+    @return: a dictionary with the keys 'out', 'err', 'retval'
+             and 'exitcode'
+    @rtype: dict
+
+    """
+
+    cmd = handler._build_megacli_cmd(args, nolog=nolog)
+
+    (ret, std_out, std_err) = await handler_call(
+        handler, 'megacli', cmd, quiet=True, sudo=False, runner=runner)
+
+    return handler._megacli_result(ret, std_out, std_err)
+
+
+# =============================================================================
+async def refresh_lvm_system(lvm_system, runner=None):
+    """
+    Asynchronous variant of LvmSystem.refresh(), the reports of 'vgs' and
+    'pvs' are retrieved concurrently.
+    """
+
+    from pb_blockdev.lvm.vg import VG_REPORT_FIELDS
+    from pb_blockdev.lvm.system import PVSEG_REPORT_FIELDS
+
+    async def report(command, fields, extra_params=None):
+        cmd_params = lvm_system._report_params(command, fields, extra_params)
+        (ret_code, std_out, std_err) = await exec_lvm(
+            lvm_system, cmd_params, quiet=True, simulate=False, force=True,
+            runner=runner)
+        return lvm_system._parse_report(
+            command, fields, ret_code, std_out, std_err)
+
+    (vg_rows, pv_rows) = await asyncio.gather(
+        report('vgs', VG_REPORT_FIELDS),
+        report('pvs', PVSEG_REPORT_FIELDS, ['--segments']))
+
+    lvm_system._init_from_reports(vg_rows, pv_rows)
+
+
+# =============================================================================
+async def dm_get_table(dm_dev, force=False, runner=None):
+    """
+    Asynchronous variant of DeviceMapperDevice._get_table().
+
+    @raise DmTableGetError: on some errors.
+
+    @return: the current device mapper table.
+    @rtype: str
+
+    """
+
+    if dm_dev._table and not force:
+        return dm_dev._table
+
+    if not dm_dev.dm_name:
+        LOG.debug(_("Cannot retrieve DM table, because I have no name."))
+        return None
+
+    cmd = [dm_dev.dmsetup_cmd, 'table', dm_dev.dm_name]
+    (ret_code, std_out, std_err) = await handler_call(
+        dm_dev, 'dmsetup', cmd, quiet=True, sudo=True, simulate=False,
+        runner=runner)
+
+    return dm_dev._eval_table(ret_code, std_out, std_err)
+
+
+# =============================================================================
+async def _dm_suspend_resume(dm_dev, action, runner=None):
+    """
+    Suspends or resumes the given device mapper device and waits,
+    until the new state is reached.
+    """
+
+    from pb_blockdev.dm import DmSuspendError, DmResumeError
+
+    suspend = (action == 'suspend')
+    error_class = DmResumeError
+    if suspend:
+        error_class = DmSuspendError
+
+    cmd = [dm_dev.dmsetup_cmd, action, dm_dev.dm_name]
+    start_time = time.time()
+    (ret_code, std_out, std_err) = await handler_call(
+        dm_dev, 'dmsetup', cmd, quiet=True, sudo=True, runner=runner)
+    if ret_code:
+        raise error_class(dm_dev.dm_name, ret_code, std_err)
+
+    if dm_dev.simulate:
+        return
+
+    i = 0
+    dm_dev.retr_suspended()
+    while dm_dev.suspended != suspend and i < 10:
+        await asyncio.sleep(0.2)
+        dm_dev.retr_suspended()
+        i += 1
+
+    if dm_dev.suspended != suspend:
+        msg = _("state %(st)r not reached after %(sec)0.3f seconds") % {
+            'st': action, 'sec': time.time() - start_time}
+        raise error_class(dm_dev.dm_name, 99, msg)
+
+
+# =============================================================================
+async def dm_suspend(dm_dev, runner=None):
+    """
+    Asynchronous variant of DeviceMapperDevice.suspend().
+
+    @raise DmSuspendError: on some errors.
+    """
+
+    LOG.info(_("Suspending DM device %r ..."), dm_dev.dm_name)
+    await _dm_suspend_resume(dm_dev, 'suspend', runner=runner)
+
+
+# =============================================================================
+async def dm_resume(dm_dev, runner=None):
+    """
+    Asynchronous variant of DeviceMapperDevice.resume().
+
+    @raise DmResumeError: on some errors.
+    """
+
+    LOG.info(_("Resuming DM device %r ..."), dm_dev.dm_name)
+    await _dm_suspend_resume(dm_dev, 'resume', runner=runner)
+
+
+# =============================================================================
+async def opened_by_processes(dev, path=None, runner=None):
+    """
+    Asynchronous variant of BlockDevice.opened_by_processes().
+
+    @raise ValueError: on a wrong given path
+    @raise FuserError: on some errors executing 'fuser'.
+
+    @return: a list with all process IDs of the opening processes.
+    @rtype: list of int
+
+    """
+
+    path2check = dev._fuser_path(path)
+    cmd = [dev.fuser_command, path2check]
+    cmd_str = "%s %r" % (dev.fuser_command, path2check)
+
+    (ret_code, std_out, std_err) = await handler_call(
+        dev, 'fuser', cmd, quiet=True, sudo=_do_sudo(), simulate=False,
+        runner=runner)
+
+    return dev._eval_fuser_result(
+        path2check, cmd_str, ret_code, std_out, std_err)
+
+
+# =============================================================================
+async def check_for_deletion(dev, runner=None):
+    """
+    Asynchronous variant of BlockDevice.check_for_deletion().
+
+    @raise CheckForDeletionError: if the block device cannot be removed.
+    """
+
+    pids = await opened_by_processes(dev, runner=runner)
+    if pids:
+        raise PathOpenedOnDeletionError(dev.device, pids)
+
+    dev._check_holders_for_deletion()
+
+
+# =============================================================================
+async def flush(dev, simulate=None, runner=None):
+    """
+    Asynchronous variant of BlockDevice.flush().
+
+    @raise BlockDeviceError: on a uncoverable error.
+    """
+
+    cmd = dev._build_flush_cmd()
+    if not cmd:
+        return
+
+    do_simulate = bool(simulate)
+    if simulate is None:
+        do_simulate = dev.simulate
+
+    LOG.info(_("Flushing buffers of device %r ..."), dev.device)
+    (ret_code, std_out, std_err) = await handler_call(
+        dev, 'blockdev', cmd, quiet=True, sudo=_do_sudo(),
+        simulate=do_simulate, runner=runner)
+
+    dev._check_flush_result(ret_code, std_err)
+    if not do_simulate:
+        await asyncio.sleep(1)
+
+
+# =============================================================================
+async def loop_attach(
+        loop_dev, filename, sudo=None, offset=None, sizelimit=None,
+        runner=None):
+    """
+    Asynchronous variant of LoopDevice.attach().
+
+    @raise LoopDeviceError: if the requirements are not fulfilled or the
+                            call of 'losetup' was not successful.
+    """
+
+    cmd = loop_dev._build_attach_cmd(filename, offset=offset, sizelimit=sizelimit)
+
+    do_sudo = loop_dev.sudo
+    if sudo is not None:
+        do_sudo = bool(sudo)
+
+    (ret_code, std_out, std_err) = await handler_call(
+        loop_dev, 'losetup', cmd, quiet=loop_dev.quiet, sudo=do_sudo,
+        runner=runner)
+
+    loop_dev._eval_attach_result(str(filename), ret_code, std_out, std_err)
+
+
+# =============================================================================
+async def loop_detach(loop_dev, sudo=None, runner=None):
+    """
+    Asynchronous variant of LoopDevice.detach().
+
+    @raise CheckForDeletionError: if the device could not detached, because
+                                  it is used
+    @raise LoopDeviceError: if the call of 'losetup' was not successful.
+    """
+
+    if not loop_dev.attached:
+        LOG.warn(
+            _("Device %r is even detached from some backing file."),
+            loop_dev.device)
+        loop_dev._eval_detach_result(0, None)
+        return
+
+    await check_for_deletion(loop_dev, runner=runner)
+
+    LOG.info(_("Detaching loop device %s ..."), loop_dev.device)
+    cmd = [loop_dev.losetup_cmd, '--detach', loop_dev.device]
+
+    do_sudo = loop_dev.sudo
+    if sudo is not None:
+        do_sudo = bool(sudo)
+
+    (ret_code, std_out, std_err) = await handler_call(
+        loop_dev, 'losetup', cmd, quiet=loop_dev.quiet, sudo=do_sudo,
+        runner=runner)
+
+    loop_dev._eval_detach_result(ret_code, std_err)
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, ProfitBricks GmbH, Berlin
+@summary: Module for a per object cache of lazy loaded attributes with TTLs
+
+Every cached attribute of a class is declared with its kind in the class
+attribute cached_attrs:
+
+ - ATTR_STATIC:   never changes during the lifetime of the device,
+                  e.g. vendor, model or the major:minor number
+ - ATTR_SLOW:     changes seldom, e.g. size or the readonly flag
+ - ATTR_VOLATILE: may change at any time, e.g. states
+
+The value of an attribute <name> is stored as usual in the instance
+variable _<name>, None means 'not loaded'. The time to live of every kind
+is taken from the class attribute cache_ttls, None means forever,
+0 means no caching at all.
+"""
+
+# Standard modules
+import time
+import logging
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+ATTR_STATIC = 'static'
+ATTR_SLOW = 'slow'
+ATTR_VOLATILE = 'volatile'
+
+DEFAULT_CACHE_TTLS = {
+    ATTR_STATIC: None,
+    ATTR_SLOW: 5.0,
+    ATTR_VOLATILE: 0.0,
+}
+
+
+# =============================================================================
+class AttrCacheMixin(object):
+    """
+    Mixin class for objects with cached lazy loaded attributes.
+    """
+
+    cache_ttls = DEFAULT_CACHE_TTLS
+    """
+    @cvar: the time to live in seconds of every kind of attributes,
+           None means forever, 0 means no caching
+    @type: dict
+    """
+
+    cached_attrs = {}
+    """
+    @cvar: the kind of every cached attribute by its name
+    @type: dict
+    """
+
+    # -------------------------------------------------------------------------
+    def _cache_stamps(self):
+
+        stamps = self.__dict__.get('_attr_cache_stamps')
+        if stamps is None:
+            stamps = {}
+            self.__dict__['_attr_cache_stamps'] = stamps
+        return stamps
+
+    # -------------------------------------------------------------------------
+    def cache_ttl(self, attr):
+        """
+        Gives back the time to live in seconds of the given attribute,
+        None means forever.
+        """
+
+        kind = self.cached_attrs.get(attr, ATTR_VOLATILE)
+        return self.cache_ttls.get(kind)
+
+    # -------------------------------------------------------------------------
+    def cache_valid(self, attr):
+        """
+        Checks, whether the cached value of the given attribute is loaded
+        and not expired. An expired value is dropped.
+
+        Values set directly without cache_loaded() are regarded as loaded
+        at their first check.
+
+        @rtype: bool
+        """
+
+        if getattr(self, '_' + attr, None) is None:
+            return False
+
+        ttl = self.cache_ttl(attr)
+        if ttl is None:
+            return True
+        if ttl <= 0:
+            self.invalidate(attr)
+            return False
+
+        stamps = self._cache_stamps()
+        now = time.time()
+        stamp = stamps.get(attr)
+        if stamp is None:
+            stamps[attr] = now
+            return True
+        if now - stamp < ttl:
+            return True
+
+        self.invalidate(attr)
+        return False
+
+    # -------------------------------------------------------------------------
+    def cache_loaded(self, attr):
+        """
+        Marks the given attribute as just loaded.
+        """
+
+        self._cache_stamps()[attr] = time.time()
+
+    # -------------------------------------------------------------------------
+    def _changeable_attrs(self):
+
+        return sorted([
+            x for x in self.cached_attrs
+            if self.cached_attrs[x] != ATTR_STATIC])
+
+    # -------------------------------------------------------------------------
+    def invalidate(self, *attrs):
+        """
+        Drops the cached values of the given attributes. If no one was
+        given, the values of all not static attributes are dropped.
+        """
+
+        if not attrs:
+            attrs = self._changeable_attrs()
+
+        stamps = self._cache_stamps()
+        for attr in attrs:
+            if attr not in self.cached_attrs:
+                msg = _("%(attr)r is not a cached attribute of %(cls)s.") % {
+                    'attr': attr, 'cls': self.__class__.__name__}
+                raise AttributeError(msg)
+            setattr(self, '_' + attr, None)
+            if attr in stamps:
+                del stamps[attr]
+
+    # -------------------------------------------------------------------------
+    def refresh(self, *attrs):
+        """
+        Drops and reloads the cached values of the given attributes.
+        If no one was given, all not static attributes are reloaded.
+
+        @return: the new values by attribute name
+        @rtype: dict
+        """
+
+        if not attrs:
+            attrs = self._changeable_attrs()
+
+        self.invalidate(*attrs)
+        result = {}
+        for attr in attrs:
+            result[attr] = getattr(self, attr)
+        return result
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -35,12 +35,19 @@ from pb_base.handler import PbBaseHandlerError
 from pb_base.handler import CommandNotFoundError
 from pb_base.handler import PbBaseHandler
 
+from pb_blockdev.sysfs import read_attrs
+
+from pb_blockdev.tools import find_tool
+
+from pb_blockdev.attr_cache import AttrCacheMixin
+from pb_blockdev.attr_cache import ATTR_STATIC, ATTR_SLOW, ATTR_VOLATILE
+
 from pb_blockdev.translate import pb_gettext, pb_ngettext
 
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.10.2'
+__version__ = '0.13.0'
 
 LOG = logging.getLogger(__name__)
 
@@ -430,11 +437,22 @@ class BlockDeviceStatistic(PbBaseObject):
 
 
 # =============================================================================
-class BlockDevice(PbBaseHandler):
+class BlockDevice(PbBaseHandler, AttrCacheMixin):
     """
     Base block device object.
     """
 
+    cached_attrs = {
+        'major_number': ATTR_STATIC,
+        'minor_number': ATTR_STATIC,
+        'removable': ATTR_STATIC,
+        'sectors': ATTR_SLOW,
+        'readonly': ATTR_SLOW,
+        'holders': ATTR_SLOW,
+        'slaves': ATTR_SLOW,
+        'exists': ATTR_VOLATILE,
+    }
+
     # -------------------------------------------------------------------------
     def __init__(
         self, name, appname=None, verbose=0, version=__version__,
@@ -536,6 +554,12 @@ class BlockDevice(PbBaseHandler):
         @type: long
         """
 
+        self._exists = None
+        """
+        @ivar: flag, whether the blockdevice exists
+        @type: bool
+        """
+
         self._holders = None
         """
         @ivar: list of all holders of the current blockdevice (other
@@ -581,14 +605,12 @@ class BlockDevice(PbBaseHandler):
         failed_commands = []
 
         # Check of the fuser command
-        if not os.path.exists(self._fuser_command):
-            self._fuser_command = self.get_command('fuser')
-            if not self.fuser_command:
-                failed_commands.append('fuser')
+        self._fuser_command = find_tool('fuser', FUSER_PATH)
+        if not self.fuser_command:
+            failed_commands.append('fuser')
 
         # Check for the 'blockdev' command
-        if not os.path.exists(self._blockdev_cmd):
-            self._blockdev_cmd = self.get_command('blockdev')
+        self._blockdev_cmd = find_tool('blockdev', BLOCKDEV_PATH)
 
         # Some commands are missing
         if failed_commands:
@@ -694,7 +716,7 @@ class BlockDevice(PbBaseHandler):
     @property
     def holders(self):
         """A list of all holders of the current blockdevice."""
-        if self._holders is not None:
+        if self.cache_valid('holders'):
             return self._holders
         if not self.sysfs_holders_dir:
             return None
@@ -707,13 +729,14 @@ class BlockDevice(PbBaseHandler):
             for holder_file in sorted(holder_files):
                 holders.append(os.path.basename(holder_file))
         self._holders = tuple(holders[:])
+        self.cache_loaded('holders')
         return self._holders
 
     # -----------------------------------------------------------
     @property
     def slaves(self):
         """A list of all slaves of the current blockdevice."""
-        if self._slaves is not None:
+        if self.cache_valid('slaves'):
             return self._slaves
         if not self.sysfs_slaves_dir:
             return None
@@ -726,6 +749,7 @@ class BlockDevice(PbBaseHandler):
             for slave_file in sorted(slave_files):
                 slaves.append(os.path.basename(slave_file))
         self._slaves = tuple(slaves[:])
+        self.cache_loaded('slaves')
         return self._slaves
 
     # -----------------------------------------------------------
@@ -740,22 +764,25 @@ class BlockDevice(PbBaseHandler):
     @property
     def exists(self):
         """Does the blockdevice of the current object exists?"""
+        if self.cache_valid('exists'):
+            return self._exists
         sfs_dir = self.sysfs_bd_dir
         if not sfs_dir:
             return False
-        if os.path.exists(sfs_dir):
-            return True
-        return False
+        self._exists = os.path.exists(sfs_dir)
+        self.cache_loaded('exists')
+        return self._exists
 
     # -----------------------------------------------------------
     @property
     def sectors(self):
         """The size of the blockdevice in 512-byte sectors."""
-        if self._sectors is not None:
+        if self.cache_valid('sectors'):
             return self._sectors
         if not self.exists:
             return None
         self.retr_sectors()
+        self.cache_loaded('sectors')
         return self._sectors
 
     # -----------------------------------------------------------
@@ -780,22 +807,24 @@ class BlockDevice(PbBaseHandler):
     @property
     def major_number(self):
         """The major device number."""
-        if self._major_number is not None:
+        if self.cache_valid('major_number'):
             return self._major_number
         if not self.exists:
             return None
         self.retr_major_minor()
+        self.cache_loaded('major_number')
         return self._major_number
 
     # -----------------------------------------------------------
     @property
     def minor_number(self):
         """The minor device number."""
-        if self._minor_number is not None:
+        if self.cache_valid('minor_number'):
             return self._minor_number
         if not self.exists:
             return None
         self.retr_major_minor()
+        self.cache_loaded('minor_number')
         return self._minor_number
 
     # -----------------------------------------------------------
@@ -810,22 +839,24 @@ class BlockDevice(PbBaseHandler):
     @property
     def removable(self):
         """A flag, whether the device is removeable, e.g. CD-ROM."""
-        if self._removable is not None:
+        if self.cache_valid('removable'):
             return self._removable
         if not self.exists:
             return None
         self.retr_removable()
+        self.cache_loaded('removable')
         return self._removable
 
     # -----------------------------------------------------------
     @property
     def readonly(self):
         """A flag, whether the device is readonly, e.g. CD-ROM."""
-        if self._readonly is not None:
+        if self.cache_valid('readonly'):
             return self._readonly
         if not self.exists:
             return None
         self.retr_readonly()
+        self.cache_loaded('readonly')
         return self._readonly
 
     # -----------------------------------------------------------
@@ -1065,49 +1096,146 @@ class BlockDevice(PbBaseHandler):
         return stats
 
     # -------------------------------------------------------------------------
-    def retr_removable(self):
+    def read_attrs(self, names):
         """
-        A method to retrieve whether the device is a removable device.
+        Reads the given attribute files below the sysfs directory of the
+        device in one go, see pb_blockdev.sysfs.read_attrs().
 
-        @raise BlockDeviceError: if the removable file in sysfs doesn't exists
-                                 or could not read
+        @raise OSError: on other errors than a missing file
+
+        @param names: the names of the attribute files relative to the sysfs
+                      directory, e.g. ['size', 'ro', 'device/vendor']
+        @type names: list of str
+
+        @return: the stripped contents by the names, None for missing files
+        @rtype: dict
+        """
 
+        return read_attrs(self, names)
+
+    # -------------------------------------------------------------------------
+    def _read_sysfs_attrs(self, names, what, error_class=None):
         """
+        Like read_attrs(), but raising error_class on errors.
+        """
+
+        if error_class is None:
+            error_class = BlockDeviceError
 
         if not self.name:
             msg = _(
-                "Cannot retrieve removable state, "
-                "because it's an unnamed block device object.")
-            raise BlockDeviceError(msg)
+                "Cannot retrieve %s, "
+                "because it's an unnamed block device object.") % (what)
+            raise error_class(msg)
 
-        if not self.exists:
-            msg = _(
-                "Cannot retrieve removable state of %r, "
-                "because the block device doesn't exists.") % (self.name)
-            raise BlockDeviceError(msg)
+        try:
+            return self.read_attrs(names)
+        except (IOError, OSError) as e:
+            msg = _("Cannot retrieve %(what)s of %(bd)r: %(err)s") % {
+                'what': what, 'bd': self.name, 'err': str(e)}
+            raise error_class(msg)
 
-        r_file = self.sysfs_removable_file
-        if not os.path.exists(r_file):
-            msg = _(
-                "Cannot retrieve removable state of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                'bd': self.name, 'file': r_file}
-            raise BlockDeviceError(msg)
+    # -------------------------------------------------------------------------
+    def _sysfs_attr(
+            self, name, what, attrs=None, error_class=None,
+            required=True, empty_ok=False):
+        """
+        Gives back the content of the given attribute file below the sysfs
+        directory of the device. It's taken from attrs, if it was read
+        there before by read_attrs(), else it's read.
+
+        @raise BlockDeviceError: (or error_class) if the device doesn't exists,
+                                 if the file doesn't exists or could not read
+                                 or has no content
+
+        @param name: the name of the attribute file, e.g. 'size'
+        @type name: str
+        @param what: the description of the attribute for error messages
+        @type what: str
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
+        @param error_class: the exception class to raise
+        @type error_class: class
+        @param required: raise an exception, if the file doesn't exists,
+                         else give back None
+        @type required: bool
+        @param empty_ok: accept an empty file
+        @type empty_ok: bool
+
+        @return: the stripped content of the file
+        @rtype: str or None
+        """
 
-        if not os.access(r_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve removable state of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                'bd': self.name, 'file': r_file}
-            raise BlockDeviceError(msg)
+        if error_class is None:
+            error_class = BlockDeviceError
 
-        f_content = self.read_file(r_file, quiet=True).strip()
-        if not f_content:
+        if attrs is not None and name in attrs:
+            content = attrs[name]
+        else:
+            content = self._read_sysfs_attrs([name], what, error_class)[name]
+
+        r_file = os.path.join(self.sysfs_bd_dir, name)
+        if content is None:
+            if not self.exists:
+                msg = _(
+                    "Cannot retrieve %(what)s of %(bd)r, "
+                    "because the block device doesn't exists.") % {
+                    'what': what, 'bd': self.name}
+                raise error_class(msg)
             msg = _(
-                "Cannot retrieve removable state of %(bd)r, "
+                "Cannot retrieve %(what)s of %(bd)r, "
+                "because the file %(file)r doesn't exists.") % {
+                'what': what, 'bd': self.name, 'file': r_file}
+            if not required:
+                if self.verbose > 1:
+                    LOG.debug(msg)
+                return None
+            raise error_class(msg)
+
+        if not content and not empty_ok:
+            msg = _(
+                "Cannot retrieve %(what)s of %(bd)r, "
                 "because file %(file)r has no content.") % {
-                'bd': self.name, 'file': r_file}
-            raise BlockDeviceError(msg)
+                'what': what, 'bd': self.name, 'file': r_file}
+            raise error_class(msg)
+
+        return content
+
+    # -------------------------------------------------------------------------
+    def retr_basic_attrs(self):
+        """
+        Retrieves the major/minor number, the removable and readonly state
+        and the size of the device, reading all appropriate files in sysfs
+        together.
+
+        @raise BlockDeviceError: if one of the files in sysfs doesn't exists
+                                 or could not read
+
+        """
+
+        attrs = self._read_sysfs_attrs(
+            ('dev', 'removable', 'ro', 'size'), _('block device attributes'))
+        self.retr_major_minor(attrs)
+        self.retr_removable(attrs)
+        self.retr_readonly(attrs)
+        self.retr_sectors(attrs)
+        for attr in ('major_number', 'minor_number', 'removable', 'readonly', 'sectors'):
+            self.cache_loaded(attr)
+
+    # -------------------------------------------------------------------------
+    def retr_removable(self, attrs=None):
+        """
+        A method to retrieve whether the device is a removable device.
+
+        @raise BlockDeviceError: if the removable file in sysfs doesn't exists
+                                 or could not read
+
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
+
+        """
+
+        f_content = self._sysfs_attr('removable', _('removable state'), attrs)
 
         if f_content == '1':
             self._removable = True
@@ -1115,49 +1243,19 @@ class BlockDevice(PbBaseHandler):
             self._removable = False
 
     # -------------------------------------------------------------------------
-    def retr_readonly(self):
+    def retr_readonly(self, attrs=None):
         """
         A method to retrieve whether the device is a readonly device.
 
         @raise BlockDeviceError: if the readonly file in sysfs doesn't exists
                                  or could not read
 
-        """
-
-        if not self.name:
-            msg = _(
-                "Cannot retrieve readonly state, "
-                "because it's an unnamed block device object.")
-            raise BlockDeviceError(msg)
-
-        if not self.exists:
-            msg = _(
-                "Cannot retrieve readonly state of %r, "
-                "because the block device doesn't exists.") % (self.name)
-            raise BlockDeviceError(msg)
-
-        r_file = self.sysfs_ro_file
-        if not os.path.exists(r_file):
-            msg = _(
-                "Cannot retrieve readonly state of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                'bd': self.name, 'file': r_file}
-            raise BlockDeviceError(msg)
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
 
-        if not os.access(r_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve readonly state of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                'bd': self.name, 'file': r_file}
-            raise BlockDeviceError(msg)
+        """
 
-        f_content = self.read_file(r_file, quiet=True).strip()
-        if not f_content:
-            msg = _(
-                "Cannot retrieve readonly state of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                'bd': self.name, 'file': r_file}
-            raise BlockDeviceError(msg)
+        f_content = self._sysfs_attr('ro', _('readonly state'), attrs)
 
         if f_content == '1':
             self._readonly = True
@@ -1165,49 +1263,19 @@ class BlockDevice(PbBaseHandler):
             self._readonly = False
 
     # -------------------------------------------------------------------------
-    def retr_sectors(self):
+    def retr_sectors(self, attrs=None):
         """
         A method to retrieve the size of the blockdevice in 512-byte sectors.
 
         @raise BlockDeviceError: if the size file in sysfs doesn't exits
                                  or could not read
 
-        """
-
-        if not self.name:
-            msg = _(
-                "Cannot retrieve size, "
-                "because it's an unnamed block device object.")
-            raise BlockDeviceError(msg)
-
-        if not self.exists:
-            msg = _(
-                "Cannot retrieve size of %r, "
-                "because the block device doesn't exists.") % (self.name)
-            raise BlockDeviceError(msg)
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
 
-        r_file = self.sysfs_size_file
-        if not os.path.exists(r_file):
-            msg = _(
-                "Cannot retrieve size of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                'bd': self.name, 'file': r_file}
-            raise BlockDeviceError(msg)
-
-        if not os.access(r_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve size of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                'bd': self.name, 'file': r_file}
-            raise BlockDeviceError(msg)
+        """
 
-        f_content = self.read_file(r_file, quiet=True).strip()
-        if not f_content:
-            msg = _(
-                "Cannot retrieve size of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                'bd': self.name, 'file': r_file}
-            raise BlockDeviceError(msg)
+        f_content = self._sysfs_attr('size', _('size'), attrs)
 
         try:
             if sys.version_info[0] <= 2:
@@ -1218,11 +1286,11 @@ class BlockDevice(PbBaseHandler):
             msg = _(
                 "Cannot retrieve size of %(bd)r, "
                 "because file %(file)r has illegal content: %(err)s") % {
-                'bd': self.name, 'file': r_file, 'err': str(e)}
+                'bd': self.name, 'file': self.sysfs_size_file, 'err': str(e)}
             raise BlockDeviceError(msg)
 
     # -------------------------------------------------------------------------
-    def retr_major_minor(self):
+    def retr_major_minor(self, attrs=None):
         """
         A method to retrieve the major/minor number of the device form the
         appropriate dev file in sysfs. These numbers are saved in
@@ -1231,50 +1299,19 @@ class BlockDevice(PbBaseHandler):
         @raise BlockDeviceError: if the dev file in sysfs doesn't exits
                                  or could not read
 
-        """
-
-        if not self.name:
-            msg = _(
-                "Cannot retrieve major/minor number, "
-                "because it's an unnamed block device object.")
-            raise BlockDeviceError(msg)
-
-        if not self.exists:
-            msg = _(
-                "Cannot retrieve major/minor number of %r, "
-                "because the block device doesn't exists.") % (
-                self.name)
-            raise BlockDeviceError(msg)
-
-        dev_file = self.sysfs_dev_file
-        if not os.path.exists(dev_file):
-            msg = _(
-                "Cannot retrieve major/minor number of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                'bd': self.name, 'file': dev_file}
-            raise BlockDeviceError(msg)
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
 
-        if not os.access(dev_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve major/minor number of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                'bd': self.name, 'file': dev_file}
-            raise BlockDeviceError(msg)
+        """
 
-        f_content = self.read_file(dev_file, quiet=True).strip()
-        if not f_content:
-            msg = _(
-                "Cannot retrieve major/minor number of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                'bd': self.name, 'file': dev_file}
-            raise BlockDeviceError(msg)
+        f_content = self._sysfs_attr('dev', _('major/minor number'), attrs)
 
         match = RE_MAJOR_MINOR.search(f_content)
         if not match:
             msg = _(
                 "Cannot retrieve major/minor number of %(bd)r, "
                 "because cannot evaluate content of %(file)r: %(cont)r"
-                ) % {'bd': self.name, 'file': dev_file, 'cont': f_content}
+                ) % {'bd': self.name, 'file': self.sysfs_dev_file, 'cont': f_content}
             raise BlockDeviceError(msg)
 
         self._major_number = int(match.group(1))
@@ -1478,27 +1515,14 @@ class BlockDevice(PbBaseHandler):
 
         """
 
-        if not self.exists:
-            LOG.error(_(
-                "Trying to flush buffers of a non-existing device %r."), self.device)
-            return
-
-        if self.readonly:
-            LOG.warn(_(
-                "Cannot flush buffers of device %r, device is readonly."), self.device)
-            return
-
-        if not self.blockdev_command:
-            LOG.error(_(
-                "Cannot flush buffers of device %(d)r, command %(c)r not found.") % {
-                'd': self.device, 'c': 'blockdev'})
+        cmd = self._build_flush_cmd()
+        if not cmd:
             return
 
         do_simulate = bool(simulate)
         if simulate is None:
             do_simulate = self.simulate
 
-        cmd = [self.blockdev_command, '--flushbufs', self.device]
         cmd_str = "%s --flushbufs %r" % (self.blockdev_command, self.device)
 
         do_sudo = False
@@ -1513,12 +1537,7 @@ class BlockDevice(PbBaseHandler):
         (ret_code, std_out, std_err) = self.call(
             cmd, quiet=True, sudo=do_sudo, simulate=do_simulate)
 
-        if ret_code:
-            msg = _("Error %(n)d executing \"%(c)s\": %(e)s") % {
-                'n': ret_code, 'c': self.blockdev_command, 'e': std_err}
-            raise BlockDeviceError(msg)
-
-        LOG.debug(_("Flushing buffers of device %r successful."), self.device)
+        self._check_flush_result(ret_code, std_err)
         if not do_simulate:
             if self.verbose > 1:
                 LOG.debug("Sleeping a second for secure ...")
@@ -1526,6 +1545,49 @@ class BlockDevice(PbBaseHandler):
 
         return
 
+    # -------------------------------------------------------------------------
+    def _build_flush_cmd(self):
+        """
+        Checks the requirements for flushing the buffers of the current
+        block device and builds the command line for 'blockdev --flushbufs'.
+
+        @return: the command line or None, if flushing is not possible
+        @rtype: list of str or None
+        """
+
+        if not self.exists:
+            LOG.error(_(
+                "Trying to flush buffers of a non-existing device %r."), self.device)
+            return None
+
+        if self.readonly:
+            LOG.warn(_(
+                "Cannot flush buffers of device %r, device is readonly."), self.device)
+            return None
+
+        if not self.blockdev_command:
+            LOG.error(_(
+                "Cannot flush buffers of device %(d)r, command %(c)r not found.") % {
+                'd': self.device, 'c': 'blockdev'})
+            return None
+
+        return [self.blockdev_command, '--flushbufs', self.device]
+
+    # -------------------------------------------------------------------------
+    def _check_flush_result(self, ret_code, std_err):
+        """
+        Checks the result of 'blockdev --flushbufs'.
+
+        @raise BlockDeviceError: if the return value is not zero.
+        """
+
+        if ret_code:
+            msg = _("Error %(n)d executing \"%(c)s\": %(e)s") % {
+                'n': ret_code, 'c': self.blockdev_command, 'e': std_err}
+            raise BlockDeviceError(msg)
+
+        LOG.debug(_("Flushing buffers of device %r successful."), self.device)
+
     # -------------------------------------------------------------------------
     def opened_by_processes(self, path=None):
         """
@@ -1544,6 +1606,36 @@ class BlockDevice(PbBaseHandler):
 
         """
 
+        path2check = self._fuser_path(path)
+        cmd = [self.fuser_command, path2check]
+        cmd_str = "%s %r" % (self.fuser_command, path2check)
+
+        do_sudo = False
+        if os.geteuid():
+            do_sudo = True
+        if do_sudo:
+            LOG.debug(_("Executing as root:") + " %s", cmd_str)
+        else:
+            LOG.debug(_("Executing:") + " %s", cmd_str)
+
+        (ret_code, std_out, std_err) = self.call(
+            cmd, quiet=True, sudo=do_sudo, simulate=False)
+
+        return self._eval_fuser_result(
+            path2check, cmd_str, ret_code, std_out, std_err)
+
+    # -------------------------------------------------------------------------
+    def _fuser_path(self, path=None):
+        """
+        Gives back the path to check with 'fuser', see opened_by_processes().
+
+        @raise ValueError: on a wrong given path
+        @raise PathNotExistsError: if the path doesn't exists
+
+        @return: the path to check
+        @rtype: str
+        """
+
         path2check = self.device
         if path is not None:
             path2check = str(path)
@@ -1557,19 +1649,18 @@ class BlockDevice(PbBaseHandler):
         if not os.path.exists(path2check):
             raise PathNotExistsError(path2check)
 
-        cmd = [self.fuser_command, path2check]
-        cmd_str = "%s %r" % (self.fuser_command, path2check)
+        return path2check
 
-        do_sudo = False
-        if os.geteuid():
-            do_sudo = True
-        if do_sudo:
-            LOG.debug(_("Executing as root:") + " %s", cmd_str)
-        else:
-            LOG.debug(_("Executing:") + " %s", cmd_str)
+    # -------------------------------------------------------------------------
+    def _eval_fuser_result(self, path2check, cmd_str, ret_code, std_out, std_err):
+        """
+        Evaluates the result of 'fuser', see opened_by_processes().
 
-        (ret_code, std_out, std_err) = self.call(
-            cmd, quiet=True, sudo=do_sudo, simulate=False)
+        @raise FuserError: on some errors executing 'fuser'.
+
+        @return: a list with all process IDs of the opening processes.
+        @rtype: list of int
+        """
 
         pids = []
         std_out = to_str_or_bust(std_out)
@@ -1612,10 +1703,22 @@ class BlockDevice(PbBaseHandler):
         if pids:
             raise PathOpenedOnDeletionError(self.device, pids)
 
+        self._check_holders_for_deletion()
+
+    # -------------------------------------------------------------------------
+    def _check_holders_for_deletion(self):
+        """
+        Checks, whether the block device has holder devices, which
+        prevent it from deletion.
+
+        @raise CheckForDeletionError: if there are holder devices
+                                      of this device.
+        """
+
         if self.verbose > 1:
             LOG.debug(_(
                 "Checking, whether %r has holder devices ..."), self.name)
-        self._holders = None
+        self.invalidate('holders')
         if self.holders:
             raise HasHoldersOnDeletionError(self.name, self.holders)
 
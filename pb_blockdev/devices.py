@@ -10,52 +10,106 @@
 """
 
 # Standard modules
+import sys
 import os
 import logging
+import importlib
 
 # Third party modules
 
 # Own modules
 from pb_blockdev.base import BlockDeviceError
 from pb_blockdev.base import BlockDevice
-
-from pb_blockdev.loop import LoopDevice
-
-from pb_blockdev.dm import DeviceMapperDevice
-
-from pb_blockdev.scsi import ScsiDevice
-
-from pb_blockdev.multipath.device import MultipathDevice
-
-from pb_blockdev.md.device import MdDevice
+from pb_blockdev.base import BASE_SYSFS_BLOCKDEV_DIR
 
 from pb_blockdev.translate import pb_gettext, pb_ngettext
 
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.3.6'
+__version__ = '0.4.0'
 
 LOG = logging.getLogger(__name__)
 
 # --------------------------------------------
 # Some module variables
 
-BLOCKDEV_CLASS_LIST = [
-    MdDevice,
-    MultipathDevice,
-    DeviceMapperDevice,
-    LoopDevice,
-    ScsiDevice,
-    BlockDevice
+# The blockdevice classes in the order of checking: the module, the class
+# name and a path below the sysfs directory of the device, which must exist
+# for a device of this class (None, if there is no such path).
+# The modules are imported only, if this path exists, or if it's None.
+# The base BlockDevice is the last one in any case.
+BLOCKDEV_CLASS_SPECS = [
+    ('pb_blockdev.md.device', 'MdDevice', 'md'),
+    ('pb_blockdev.multipath.device', 'MultipathDevice', 'dm'),
+    ('pb_blockdev.dm', 'DeviceMapperDevice', 'dm'),
+    ('pb_blockdev.scsi', 'ScsiDevice', os.path.join('device', 'scsi_device')),
+    ('pb_blockdev.loop', 'LoopDevice', None),
 ]
 
+# The classes, which can be imported lazy from this module
+LAZY_CLASSES = {
+    'MdDevice': 'pb_blockdev.md.device',
+    'MultipathDevice': 'pb_blockdev.multipath.device',
+    'DeviceMapperDevice': 'pb_blockdev.dm',
+    'ScsiDevice': 'pb_blockdev.scsi',
+    'LoopDevice': 'pb_blockdev.loop',
+}
+
+
+# =============================================================================
+def _load_class(module_name, class_name):
+
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)
+
+
+# =============================================================================
+def get_blockdev_class_list():
+    """
+    Gives back all blockdevice classes in the order of checking.
+    All appropriate modules are imported herewith.
+
+    @rtype: list of class
+    """
+
+    classes = []
+    for (module_name, class_name, check_path) in BLOCKDEV_CLASS_SPECS:
+        classes.append(_load_class(module_name, class_name))
+    classes.append(BlockDevice)
+    return classes
+
+
+# =============================================================================
+def __getattr__(name):
+    """
+    Lazy import of the blockdevice classes and of BLOCKDEV_CLASS_LIST
+    (PEP 562, Python >= 3.7).
+    """
+
+    if name == 'BLOCKDEV_CLASS_LIST':
+        return get_blockdev_class_list()
+    if name in LAZY_CLASSES:
+        return _load_class(LAZY_CLASSES[name], name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+# Python < 3.7 doesn't support module level __getattr__
+if sys.version_info < (3, 7):
+    BLOCKDEV_CLASS_LIST = get_blockdev_class_list()
+    for _cls in BLOCKDEV_CLASS_LIST[:-1]:
+        globals()[_cls.__name__] = _cls
+    del _cls
+
 
 # =============================================================================
 def get_blockdev_class(device_name):
     """
     Gives back the appropriate class for the given device name.
 
+    The module of a class is imported only, if the device could be
+    of this class.
+
     @raise BlockDeviceError: if the given device name is invalid,
                              e.g. has path parts
 
@@ -74,10 +128,17 @@ def get_blockdev_class(device_name):
         msg = _("Invalid device name %r given.") % (device_name)
         raise BlockDeviceError(msg)
 
-    for cls in BLOCKDEV_CLASS_LIST:
+    bd_dir = os.path.join(BASE_SYSFS_BLOCKDEV_DIR, device_name)
+    for (module_name, class_name, check_path) in BLOCKDEV_CLASS_SPECS:
+        if check_path and not os.path.exists(os.path.join(bd_dir, check_path)):
+            continue
+        cls = _load_class(module_name, class_name)
         if cls.isa(device_name):
             return cls
 
+    if BlockDevice.isa(device_name):
+        return BlockDevice
+
     return None
 
 # =============================================================================
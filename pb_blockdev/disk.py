@@ -14,9 +14,7 @@ import sys
 import logging
 
 # Third party modules
-
-import parted
-from parted import IOException
+# parted is imported in Disk.discover(), because it's expensive to import
 
 # Own modules
 from pb_blockdev.base import BlockDeviceError
@@ -27,7 +25,7 @@ from pb_blockdev.translate import pb_gettext, pb_ngettext
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.2.9'
+__version__ = '0.3.0'
 
 log = logging.getLogger(__name__)
 
@@ -437,10 +435,12 @@ class Disk(BlockDevice):
                 self.name, (
                     _("Directory %r doesn't exists.") % (self.sysfs_bd_dir)))
 
+        import parted
+
         log.debug(_("Discovery of disk %r ..."), self.name)
         try:
             self.parted_device = parted.Device(self.device)
-        except IOException as e:
+        except parted.IOException as e:
             self.parted_device = None
             self._discoverable = False
             raise DiskNotDiscoveredError(self.name, str(e))
@@ -15,6 +15,7 @@ import logging
 import re
 import glob
 import time
+import tempfile
 
 # Third party modules
 
@@ -25,12 +26,18 @@ from pb_blockdev.base import BlockDeviceError
 from pb_blockdev.base import BlockDevice
 from pb_blockdev.base import BASE_SYSFS_BLOCKDEV_DIR
 
+from pb_blockdev.attr_cache import ATTR_STATIC, ATTR_VOLATILE
+
+from pb_blockdev.tools import find_tool
+
+from pb_blockdev.dm_table import DmTable
+
 from pb_blockdev.translate import pb_gettext, pb_ngettext
 
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.4.5'
+__version__ = '0.10.1'
 
 LOG = logging.getLogger(__name__)
 
@@ -278,15 +285,318 @@ class DmCreationError(DmDeviceError):
             'dev': self.dm_name, 'msg': self.err_msg}
 
 
+# =============================================================================
+class DmInfo(object):
+    """
+    The informations about a single devicemapper device
+    as a part of a DmSnapshot.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, name, blockdev=None, uuid=None, attr=None,
+            open_count=None, segments=None):
+        """
+        Constructor.
+
+        @param name: the devicemapper name
+        @type name: str
+        @param blockdev: the blockdevice name, e.g. 'dm-1'
+        @type blockdev: str or None
+        @param uuid: the devicemapper UUID
+        @type uuid: str or None
+        @param attr: the attribute string of 'dmsetup info', e.g. 'L--w'
+        @type attr: str or None
+        @param open_count: the open count of the device
+        @type open_count: int or None
+        @param segments: the number of table segments
+        @type segments: int or None
+
+        """
+
+        self.name = name
+        self.blockdev = blockdev
+        self.uuid = uuid
+        self.attr = attr
+        self.open_count = open_count
+        self.segments = segments
+
+        self.table_lines = None
+        """
+        @ivar: the lines of the device mapper table, None if not retrieved
+        @type: list of str or None
+        """
+
+    # -----------------------------------------------------------
+    @property
+    def suspended(self):
+        """A flag, whether the device is suspended."""
+        if not self.attr or len(self.attr) < 3:
+            return None
+        return self.attr[2] == 's'
+
+    # -----------------------------------------------------------
+    @property
+    def read_only(self):
+        """A flag, whether the device is read only."""
+        if not self.attr or len(self.attr) < 4:
+            return None
+        return self.attr[3] == 'r'
+
+    # -----------------------------------------------------------
+    @property
+    def table(self):
+        """The device mapper table as in the output of 'dmsetup table'."""
+        if self.table_lines is None:
+            return None
+        return "\n".join(self.table_lines)
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'name': self.name,
+            'blockdev': self.blockdev,
+            'uuid': self.uuid,
+            'attr': self.attr,
+            'open_count': self.open_count,
+            'segments': self.segments,
+            'suspended': self.suspended,
+            'read_only': self.read_only,
+            'table': self.table,
+        }
+        return res
+
+
+# =============================================================================
+class DmSnapshot(object):
+    """
+    A snapshot of all devicemapper devices of the system, retrieved
+    by one call of 'dmsetup info' and one call of 'dmsetup table'
+    for all devices together, with indexes by devicemapper name,
+    blockdevice name and UUID.
+    """
+
+    info_fields = ('name', 'blkdevname', 'uuid', 'attr', 'open', 'segments')
+
+    # -------------------------------------------------------------------------
+    def __init__(self):
+        """Constructor."""
+
+        self.timestamp = None
+        """
+        @ivar: the timestamp of retrieving the snapshot
+        @type: float or None
+        """
+
+        self.by_name = {}
+        """
+        @ivar: all devices by their devicemapper name
+        @type: dict of DmInfo
+        """
+
+        self.by_blockdev = {}
+        """
+        @ivar: all devices by their blockdevice name, e.g. 'dm-1'
+        @type: dict of DmInfo
+        """
+
+        self.by_uuid = {}
+        """
+        @ivar: all devices with an UUID by their UUID
+        @type: dict of DmInfo
+        """
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def collect(cls, handler, dmsetup_cmd=None):
+        """
+        Retrieves a new snapshot of all devicemapper devices.
+
+        @raise DmDeviceError: if one of the dmsetup calls failed
+
+        @param handler: the handler object used to execute dmsetup
+        @type handler: PbBaseHandler
+        @param dmsetup_cmd: the path to the dmsetup command
+        @type dmsetup_cmd: str
+
+        @rtype: DmSnapshot
+        """
+
+        if not dmsetup_cmd:
+            dmsetup_cmd = find_tool('dmsetup', DMSETUP_CMD) or DMSETUP_CMD
+
+        info_cmd = [
+            dmsetup_cmd, 'info', '-c', '--noheadings', '--separator', ':',
+            '-o', ','.join(cls.info_fields)]
+        table_cmd = [dmsetup_cmd, 'table']
+
+        timestamp = time.time()
+        outputs = []
+        for cmd in (info_cmd, table_cmd):
+            (ret_code, std_out, std_err) = handler.call(
+                cmd, quiet=True, sudo=True, simulate=False)
+            if ret_code:
+                msg = _("Error %(rc)d on executing %(cmd)r: %(err)s") % {
+                    'rc': ret_code, 'cmd': ' '.join(cmd), 'err': std_err}
+                raise DmDeviceError(msg)
+            outputs.append(std_out)
+
+        snapshot = cls.from_output(outputs[0], outputs[1])
+        snapshot.timestamp = timestamp
+        return snapshot
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_output(cls, info_output, table_output=None):
+        """
+        Creates a snapshot from the given output of 'dmsetup info'
+        and 'dmsetup table'.
+
+        @rtype: DmSnapshot
+        """
+
+        snapshot = cls()
+        snapshot.parse_info(info_output)
+        if table_output is not None:
+            snapshot.parse_table(table_output)
+        return snapshot
+
+    # -------------------------------------------------------------------------
+    def parse_info(self, output):
+        """
+        Evaluates the output of::
+
+            dmsetup info -c --noheadings --separator : \\
+                -o name,blkdevname,uuid,attr,open,segments
+
+        The devicemapper name may contain colons, so the line is
+        splitted from the right side.
+        """
+
+        for line in output.splitlines():
+            line = line.strip()
+            if not line or line == 'No devices found':
+                continue
+            fields = line.rsplit(':', len(self.info_fields) - 1)
+            if len(fields) != len(self.info_fields):
+                LOG.warn(_("Could not evaluate dmsetup info line %r."), line)
+                continue
+
+            (name, blockdev, uuid, attr, open_count, segments) = fields
+            info = DmInfo(
+                name, blockdev=(blockdev or None), uuid=(uuid or None),
+                attr=(attr or None), open_count=int(open_count or 0),
+                segments=int(segments or 0))
+
+            self.by_name[name] = info
+            if info.blockdev:
+                self.by_blockdev[info.blockdev] = info
+            if info.uuid:
+                self.by_uuid[info.uuid] = info
+
+    # -------------------------------------------------------------------------
+    def parse_table(self, output):
+        """
+        Evaluates the output of 'dmsetup table' for all devices, where
+        every line is prefixed by the devicemapper name and a colon.
+        The tables of all known devices are set to empty before.
+        """
+
+        for info in self.by_name.values():
+            info.table_lines = []
+
+        for line in output.splitlines():
+            line = line.rstrip()
+            if not line or line == 'No devices found':
+                continue
+
+            info = None
+            idx = line.find(': ')
+            if idx > 0:
+                info = self.by_name.get(line[:idx])
+            if info is None:
+                # A name containing ': '
+                for name in self.by_name:
+                    if line.startswith(name + ': '):
+                        info = self.by_name[name]
+                        idx = len(name)
+                        break
+            if info is None:
+                LOG.warn(_("Could not evaluate dmsetup table line %r."), line)
+                continue
+
+            table_line = line[idx + 2:].strip()
+            if table_line:
+                info.table_lines.append(table_line)
+
+    # -------------------------------------------------------------------------
+    def get(self, name):
+        """
+        Gives back the informations about the device with the given
+        devicemapper name, blockdevice name or UUID, or None,
+        if not found.
+
+        @rtype: DmInfo or None
+        """
+
+        for index in (self.by_name, self.by_blockdev, self.by_uuid):
+            if name in index:
+                return index[name]
+        return None
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        return len(self.by_name)
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'timestamp': self.timestamp,
+            'devices': [],
+        }
+        for name in sorted(self.by_name.keys()):
+            res['devices'].append(self.by_name[name].as_dict(short=short))
+        return res
+
+
 # =============================================================================
 class DeviceMapperDevice(BlockDevice):
 
+    cached_attrs = dict(
+        BlockDevice.cached_attrs,
+        dm_name=ATTR_STATIC,
+        uuid=ATTR_STATIC,
+        suspended=ATTR_VOLATILE,
+    )
+
     # -------------------------------------------------------------------------
     def __init__(
         self, name=None, dm_name=None, appname=None, verbose=0,
             version=__version__, base_dir=None, use_stderr=False,
-            simulate=False, sudo=False, quiet=False,
-            *targs, **kwargs):
+            simulate=False, sudo=False, quiet=False, dm_snapshot=None,
+            dm_backend=None, *targs, **kwargs):
         """
         Initialisation of the devicemapper device object.
 
@@ -318,6 +628,12 @@ class DeviceMapperDevice(BlockDevice):
         @type sudo: bool
         @param quiet: don't display ouput of action after calling
         @type quiet: bool
+        @param dm_snapshot: a snapshot of all devicemapper devices to use
+                            instead of looking up sysfs and calling dmsetup
+        @type dm_snapshot: DmSnapshot or None
+        @param dm_backend: a backend issuing the device mapper ioctls
+                           directly instead of executing dmsetup
+        @type dm_backend: DmIoctlBackend or None
 
         @return: None
 
@@ -351,6 +667,18 @@ class DeviceMapperDevice(BlockDevice):
         )
         self.initialized = False
 
+        self.dm_snapshot = dm_snapshot
+        """
+        @ivar: a snapshot of all devicemapper devices, if given
+        @type: DmSnapshot or None
+        """
+
+        self.dm_backend = dm_backend
+        """
+        @ivar: a backend for issuing the device mapper ioctls directly
+        @type: DmIoctlBackend or None
+        """
+
         if not name:
             name = self.retr_blockdev_name(dm_name)
             self._name = name
@@ -363,14 +691,11 @@ class DeviceMapperDevice(BlockDevice):
 
         failed_commands = []
 
-        self._dmsetup_cmd = DMSETUP_CMD
+        self._dmsetup_cmd = find_tool('dmsetup', DMSETUP_CMD)
         """
         @ivar: the dmsetup command for manipulating the devicemapper device
         @type: str
         """
-        if not os.path.exists(self.dmsetup_cmd) or not os.access(
-                self.dmsetup_cmd, os.X_OK):
-            self._dmsetup_cmd = self.get_command('dmsetup')
         if not self.dmsetup_cmd:
             failed_commands.append('dmsetup')
 
@@ -392,6 +717,12 @@ class DeviceMapperDevice(BlockDevice):
         @type: str
         """
 
+        self._dm_table = None
+        """
+        @ivar: the last parsed device mapper table together with its text
+        @type: tuple of str and DmTable or None
+        """
+
         # Some commands are missing
         if failed_commands:
             raise CommandNotFoundError(failed_commands)
@@ -445,7 +776,11 @@ class DeviceMapperDevice(BlockDevice):
     @property
     def dm_name(self):
         """The devicemapper name of the device."""
-        if self._dm_name is not None:
+        if self.cache_valid('dm_name'):
+            return self._dm_name
+        info = self._snapshot_info()
+        if info:
+            self._dm_name = info.name
             return self._dm_name
         if not self.exists:
             return None
@@ -458,18 +793,23 @@ class DeviceMapperDevice(BlockDevice):
     @property
     def suspended(self):
         """A flag, whether the device is suspended."""
-        if self._suspended is not None:
+        if self.cache_valid('suspended'):
             return self._suspended
         if not self.exists:
             return None
         self.retr_suspended()
+        self.cache_loaded('suspended')
         return self._suspended
 
     # -----------------------------------------------------------
     @property
     def uuid(self):
         """The UUID of the devicemapper device.."""
-        if self._uuid is not None:
+        if self.cache_valid('uuid'):
+            return self._uuid
+        info = self._snapshot_info()
+        if info:
+            self._uuid = info.uuid or ''
             return self._uuid
         if not self.exists:
             return None
@@ -484,6 +824,17 @@ class DeviceMapperDevice(BlockDevice):
             return None
         return self._get_table()
 
+    # -----------------------------------------------------------
+    @property
+    def dm_table(self):
+        """The device mapper table as a DmTable object with typed segments."""
+        table = self.table
+        if table is None:
+            return None
+        if self._dm_table is None or self._dm_table[0] != table:
+            self._dm_table = (table, DmTable.parse(table))
+        return self._dm_table[1]
+
     # -------------------------------------------------------------------------
     @staticmethod
     def isa(device_name):
@@ -543,6 +894,38 @@ class DeviceMapperDevice(BlockDevice):
 
         return res
 
+    # -------------------------------------------------------------------------
+    def _snapshot_info(self):
+        """
+        Gives back the informations about the current device from
+        the devicemapper snapshot, if there is any.
+
+        @rtype: DmInfo or None
+        """
+
+        if not self.dm_snapshot:
+            return None
+        if self.name:
+            info = self.dm_snapshot.by_blockdev.get(self.name)
+            if info:
+                return info
+        if self._dm_name:
+            return self.dm_snapshot.by_name.get(self._dm_name)
+        return None
+
+    # -------------------------------------------------------------------------
+    def _forget_table(self):
+        """
+        Forgets the known table of the device after loading, clearing or
+        activating a table, also the table in the devicemapper snapshot,
+        so the next access retrieves the current table.
+        """
+
+        self._table = None
+        info = self._snapshot_info()
+        if info:
+            info.table_lines = None
+
     # -------------------------------------------------------------------------
     def retr_blockdev_name(self, dm_name):
         """
@@ -556,6 +939,15 @@ class DeviceMapperDevice(BlockDevice):
 
         """
 
+        if self.dm_snapshot:
+            info = self.dm_snapshot.by_name.get(dm_name)
+            if info:
+                return info.blockdev
+            if self.verbose > 2:
+                LOG.debug(
+                    _("DM name %r not found in devicemapper snapshot."), dm_name)
+            return None
+
         if not os.path.isdir(BASE_DEV_MAPPER_DIR):
             if self.verbose > 3:
                 LOG.debug(
@@ -563,6 +955,14 @@ class DeviceMapperDevice(BlockDevice):
                     BASE_DEV_MAPPER_DIR)
             return None
 
+        # /dev/mapper/<name> is usually a symlink to ../dm-N
+        dev_file = os.path.join(BASE_DEV_MAPPER_DIR, dm_name)
+        if os.path.islink(dev_file):
+            bd_name = os.path.basename(os.path.realpath(dev_file))
+            if bd_name.startswith('dm-') and os.path.isdir(
+                    os.path.join(BASE_SYSFS_BLOCKDEV_DIR, bd_name)):
+                return bd_name
+
         pattern = os.path.join(BASE_SYSFS_BLOCKDEV_DIR, 'dm-*', 'dm', 'name')
         name_files = glob.glob(pattern)
 
@@ -750,7 +1150,8 @@ class DeviceMapperDevice(BlockDevice):
     def _get_table(self, force=False):
         """
         Tries to get the current device mapper table. If not found in
-        self._table it calls "dmsetup table <dmname>" to retrieve the current
+        self._table or in the devicemapper snapshot, it calls
+        "dmsetup table <dmname>" to retrieve the current
         dm table (and save it in self._table).
 
         @raise DmTableGetError: on some errors.
@@ -768,6 +1169,12 @@ class DeviceMapperDevice(BlockDevice):
         if self._table and not force:
             return self._table
 
+        if not force:
+            info = self._snapshot_info()
+            if info and info.table_lines is not None:
+                self._table = info.table
+                return self._table
+
         if not self.dm_name:
             LOG.debug(_("Cannot retrieve DM table, because I have no name."))
             return None
@@ -777,10 +1184,73 @@ class DeviceMapperDevice(BlockDevice):
                 _("Trying to get current device mapper table of %r ..."),
                 self.dm_name)
 
+        if self.dm_backend:
+            try:
+                table = self.dm_backend.get_table(self.dm_name)
+            except DmDeviceError as e:
+                raise DmTableGetError(self.dm_name, e.errno, e.strerror)
+            return self._eval_table(0, table, '')
+
         cmd = [self.dmsetup_cmd, 'table', self.dm_name]
         (ret_code, std_out, std_err) = self.call(
             cmd, quiet=True, sudo=True, simulate=False
         )
+        return self._eval_table(ret_code, std_out, std_err)
+
+    # -------------------------------------------------------------------------
+    def reload(self, table):
+        """
+        Loads the given table as the inactive table of the appropriate
+        DM device. It becomes the live table on the next resume.
+
+        @raise DmTableSetError: on some errors.
+
+        @param table: the new device mapper table
+        @type table: str or DmTable
+
+        @return: None
+
+        """
+
+        LOG.info(_("Loading a new table into DM device %r ..."), self.dm_name)
+        if self.verbose > 2:
+            LOG.debug(_("New table of %(dev)r:\n%(tbl)s") % {
+                'dev': self.dm_name, 'tbl': table})
+
+        if self.dm_backend:
+            if self.simulate:
+                return
+            try:
+                self.dm_backend.load_table(self.dm_name, table)
+            except DmDeviceError as e:
+                raise DmTableSetError(self.dm_name, e.errno, table, e.strerror)
+            self._forget_table()
+            return
+
+        (fd, table_file) = tempfile.mkstemp(prefix='dm-table-')
+        try:
+            os.write(fd, (str(table).strip() + "\n").encode('utf-8'))
+            os.close(fd)
+            cmd = [self.dmsetup_cmd, 'reload', self.dm_name, table_file]
+            (ret_code, std_out, std_err) = self.call(cmd, quiet=True, sudo=True)
+        finally:
+            os.remove(table_file)
+        if ret_code:
+            raise DmTableSetError(self.dm_name, ret_code, table, std_err)
+        self._forget_table()
+
+    # -------------------------------------------------------------------------
+    def _eval_table(self, ret_code, std_out, std_err):
+        """
+        Evaluates the result of "dmsetup table <dmname>" and saves
+        the table in self._table.
+
+        @raise DmTableGetError: on some errors.
+
+        @return: the current device mapper table.
+        @rtype: str
+        """
+
         if ret_code:
             raise DmTableGetError(self.dm_name, ret_code, std_err)
 
@@ -791,6 +1261,36 @@ class DeviceMapperDevice(BlockDevice):
         self._table = table
         return table
 
+    # -------------------------------------------------------------------------
+    def clear(self):
+        """
+        Drops the inactive table of the appropriate DM device, which
+        was loaded before by reload().
+
+        @raise DmTableSetError: on some errors.
+
+        @return: None
+
+        """
+
+        LOG.info(_("Clearing the inactive table of DM device %r ..."), self.dm_name)
+
+        if self.dm_backend:
+            if self.simulate:
+                return
+            try:
+                self.dm_backend.clear_table(self.dm_name)
+            except DmDeviceError as e:
+                raise DmTableSetError(self.dm_name, e.errno, '', e.strerror)
+            self._forget_table()
+            return
+
+        cmd = [self.dmsetup_cmd, 'clear', self.dm_name]
+        (ret_code, std_out, std_err) = self.call(cmd, quiet=True, sudo=True)
+        if ret_code:
+            raise DmTableSetError(self.dm_name, ret_code, '', std_err)
+        self._forget_table()
+
     # -------------------------------------------------------------------------
     def suspend(self):
         """
@@ -803,8 +1303,22 @@ class DeviceMapperDevice(BlockDevice):
         """
 
         LOG.info(_("Suspending DM device %r ..."), self.dm_name)
-        cmd = [self.dmsetup_cmd, 'suspend', self.dm_name]
         start_time = time.time()
+
+        if self.dm_backend:
+            if self.simulate:
+                return
+            try:
+                self.dm_backend.suspend(self.dm_name)
+            except DmDeviceError as e:
+                raise DmSuspendError(self.dm_name, e.errno, e.strerror)
+            self._suspended = True
+            LOG.debug(
+                _("DM device %(dev)r suspended in %(sec)0.6f seconds.") % {
+                    'dev': self.dm_name, 'sec': (time.time() - start_time)})
+            return
+
+        cmd = [self.dmsetup_cmd, 'suspend', self.dm_name]
         (ret_code, std_out, std_err) = self.call(cmd, quiet=True, sudo=True)
         if ret_code:
             raise DmSuspendError(self.dm_name, ret_code, std_err)
@@ -848,8 +1362,23 @@ class DeviceMapperDevice(BlockDevice):
         """
 
         LOG.info(_("Resuming DM device %r ..."), self.dm_name)
-        cmd = [self.dmsetup_cmd, 'resume', self.dm_name]
         start_time = time.time()
+
+        if self.dm_backend:
+            if self.simulate:
+                return
+            try:
+                self.dm_backend.resume(self.dm_name)
+            except DmDeviceError as e:
+                raise DmResumeError(self.dm_name, e.errno, e.strerror)
+            self._suspended = False
+            self._forget_table()
+            LOG.debug(
+                _("DM device %(dev)r resumed in %(sec)0.6f seconds.") % {
+                    'dev': self.dm_name, 'sec': (time.time() - start_time)})
+            return
+
+        cmd = [self.dmsetup_cmd, 'resume', self.dm_name]
         (ret_code, std_out, std_err) = self.call(cmd, quiet=True, sudo=True)
         if ret_code:
             raise DmResumeError(self.dm_name, ret_code, std_err)
@@ -857,6 +1386,7 @@ class DeviceMapperDevice(BlockDevice):
         if self.simulate:
             return
 
+        self._forget_table()
         self.retr_suspended()
         if self.suspended:
             i = 0
@@ -926,12 +1456,23 @@ class DeviceMapperDevice(BlockDevice):
             LOG.info(_("Removing devicemapper device %r ..."), self.dm_name)
 
         start_time = time.time()
-        (ret_code, std_out, std_err) = self.caller(
-            cmd, quiet=True, force=True, sudo=True
-        )
-        if ret_code:
-            msg = (_("error %d: ") % (ret_code)) + std_err
-            raise DmRemoveError(self.dm_name, msg)
+        if self.dm_backend and not force:
+            # The forced removing with replacing the table by an error
+            # target is left to dmsetup.
+            if self.simulate:
+                return
+            try:
+                self.dm_backend.remove(self.dm_name)
+            except DmDeviceError as e:
+                msg = (_("error %d: ") % (e.errno)) + e.strerror
+                raise DmRemoveError(self.dm_name, msg)
+        else:
+            (ret_code, std_out, std_err) = self.caller(
+                cmd, quiet=True, force=True, sudo=True
+            )
+            if ret_code:
+                msg = (_("error %d: ") % (ret_code)) + std_err
+                raise DmRemoveError(self.dm_name, msg)
 
         if self.simulate:
             return
@@ -0,0 +1,540 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@organization: Profitbricks GmbH
+@copyright: © 2010 - 2015 by Profitbricks GmbH
+@license: GPL3
+@summary: Module for a backend issuing device mapper ioctls directly
+          on /dev/mapper/control instead of executing dmsetup
+
+The structures are the ones of <linux/dm-ioctl.h> (interface version 4).
+The backend must run as root, there is no sudo. There is also no udev
+synchronisation like in dmsetup (udev cookies), so callers waiting for
+device nodes created by udev after a resume have to wait by themselves.
+"""
+
+# Standard modules
+import os
+import errno
+import fcntl
+import struct
+import logging
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.dm import DmDeviceError
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.1'
+
+LOG = logging.getLogger(__name__)
+
+# --------------------------------------------
+# Some module variables
+
+DM_CONTROL_FILE = os.sep + os.path.join('dev', 'mapper', 'control')
+
+DM_VERSION = (4, 0, 0)
+
+DM_NAME_LEN = 128
+DM_UUID_LEN = 129
+DM_MAX_TYPE_NAME = 16
+
+# struct dm_ioctl
+DM_IOCTL_FORMAT = '=3I3IiIIIQ%ds%ds7s' % (DM_NAME_LEN, DM_UUID_LEN)
+DM_IOCTL_SIZE = struct.calcsize(DM_IOCTL_FORMAT)
+
+# struct dm_target_spec
+DM_TARGET_SPEC_FORMAT = '=QQiI%ds' % (DM_MAX_TYPE_NAME)
+DM_TARGET_SPEC_SIZE = struct.calcsize(DM_TARGET_SPEC_FORMAT)
+
+DM_IOCTL_TYPE = 0xfd
+
+DM_VERSION_CMD = 0
+DM_DEV_REMOVE_CMD = 4
+DM_DEV_SUSPEND_CMD = 6
+DM_DEV_STATUS_CMD = 7
+DM_TABLE_LOAD_CMD = 9
+DM_TABLE_CLEAR_CMD = 10
+DM_TABLE_STATUS_CMD = 12
+
+DM_READONLY_FLAG = 1 << 0
+DM_SUSPEND_FLAG = 1 << 1
+DM_STATUS_TABLE_FLAG = 1 << 4
+DM_ACTIVE_PRESENT_FLAG = 1 << 5
+DM_INACTIVE_PRESENT_FLAG = 1 << 6
+DM_BUFFER_FULL_FLAG = 1 << 8
+DM_SKIP_LOCKFS_FLAG = 1 << 10
+DM_NOFLUSH_FLAG = 1 << 11
+DM_QUERY_INACTIVE_TABLE_FLAG = 1 << 12
+DM_DEFERRED_REMOVE = 1 << 17
+
+DEFAULT_BUFFER_SIZE = 16 * 1024
+MAX_BUFFER_SIZE = 64 * 1024 * 1024
+
+
+# =============================================================================
+def dm_ioctl_request(cmd):
+    """
+    Gives back the ioctl request number of the given device mapper command,
+    what is _IOWR(DM_IOCTL, cmd, struct dm_ioctl).
+    """
+
+    ioc_read_write = 3
+    return (
+        (ioc_read_write << 30) | (DM_IOCTL_SIZE << 16) |
+        (DM_IOCTL_TYPE << 8) | cmd)
+
+
+# =============================================================================
+def _to_bytes(value):
+
+    if not isinstance(value, bytes):
+        value = value.encode('utf-8')
+    return value
+
+
+# =============================================================================
+def _from_bytes(value):
+
+    value = value.split(b'\0', 1)[0]
+    if not isinstance(value, str):
+        value = value.decode('utf-8')
+    return value
+
+
+# =============================================================================
+def _align(size):
+
+    return (size + 7) & ~7
+
+
+# =============================================================================
+def parse_table_line(line):
+    """
+    Splits a line of a device mapper table into its fields.
+
+    @raise ValueError: if the line could not be evaluated
+
+    @return: start sector, length in sectors, target type and parameters
+    @rtype: tuple
+    """
+
+    fields = line.strip().split(None, 3)
+    if len(fields) < 3:
+        msg = _("Could not evaluate device mapper table line %r.") % (line)
+        raise ValueError(msg)
+    params = ''
+    if len(fields) > 3:
+        params = fields[3]
+    return (int(fields[0]), int(fields[1]), fields[2], params)
+
+
+# =============================================================================
+def pack_targets(targets):
+    """
+    Packs the given targets into the data area of a DM_TABLE_LOAD ioctl,
+    where the 'next' field of every target spec is the offset from
+    the current spec to the next one.
+
+    @param targets: the targets as tuples of start sector, length,
+                    target type and parameter string
+    @type targets: list of tuple
+
+    @rtype: bytes
+    """
+
+    chunks = []
+    for (start, length, target_type, params) in targets:
+        params = _to_bytes(params) + b'\0'
+        size = _align(DM_TARGET_SPEC_SIZE + len(params))
+        spec = struct.pack(
+            DM_TARGET_SPEC_FORMAT, int(start), int(length), 0, size,
+            _to_bytes(target_type))
+        chunks.append(spec + params + b'\0' * (size - DM_TARGET_SPEC_SIZE - len(params)))
+    return b''.join(chunks)
+
+
+# =============================================================================
+def unpack_targets(data, count):
+    """
+    Unpacks the target specs returned by a DM_TABLE_STATUS ioctl, where
+    the 'next' field of every target spec is the offset from the first
+    spec to the next one.
+
+    @param data: the data area beginning with the first target spec
+    @type data: bytes or bytearray
+    @param count: the number of targets
+    @type count: int
+
+    @return: the targets as tuples of start sector, length,
+             target type and parameter or status string
+    @rtype: list of tuple
+    """
+
+    data = bytes(data)
+    targets = []
+    offset = 0
+    for i in range(count):
+        (start, length, status, next_offset, target_type) = struct.unpack_from(
+            DM_TARGET_SPEC_FORMAT, data, offset)
+        params_start = offset + DM_TARGET_SPEC_SIZE
+        params_end = data.find(b'\0', params_start)
+        if params_end < 0:
+            params_end = len(data)
+        params = _from_bytes(data[params_start:params_end])
+        targets.append((start, length, _from_bytes(target_type), params))
+        offset = next_offset
+    return targets
+
+
+# =============================================================================
+class DmIoctlError(DmDeviceError):
+    """
+    Error class for a failed device mapper ioctl.
+    """
+
+    # -----------------------------------------------------------------------
+    def __init__(self, command, dm_name, err_no, strerror=None):
+        """
+        Constructor.
+
+        @param command: the name of the device mapper command
+        @type command: str
+        @param dm_name: the device mapper name
+        @type dm_name: str
+        @param err_no: the error number of the failed ioctl
+        @type err_no: int
+        @param strerror: the error message
+        @type strerror: str
+
+        """
+
+        self.command = command
+        self.dm_name = dm_name
+        self.errno = err_no
+        self.strerror = strerror
+        if not self.strerror:
+            self.strerror = os.strerror(err_no)
+
+    # -----------------------------------------------------------------------
+    def __str__(self):
+        """
+        Typecasting of object into a string
+        """
+
+        msg = _("Error %(errno)d on %(cmd)s of device mapper device %(dev)r: %(msg)s")
+        return msg % {
+            'errno': self.errno, 'cmd': self.command, 'dev': self.dm_name,
+            'msg': self.strerror}
+
+
+# =============================================================================
+class DmIoctlBackend(object):
+    """
+    Backend for DeviceMapperDevice issuing the device mapper ioctls directly
+    on /dev/mapper/control, without forking dmsetup.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, control_file=DM_CONTROL_FILE, buffer_size=DEFAULT_BUFFER_SIZE):
+        """
+        Constructor.
+
+        @param control_file: the device mapper control device
+        @type control_file: str
+        @param buffer_size: the initial size of the ioctl buffer, it will
+                            be increased, if the kernel needs more
+        @type buffer_size: int
+
+        """
+
+        self.control_file = control_file
+        self.buffer_size = max(int(buffer_size), DM_IOCTL_SIZE)
+        self._fd = None
+
+    # -------------------------------------------------------------------------
+    def open(self):
+        """Opens the device mapper control device, if not done before."""
+
+        if self._fd is None:
+            self._fd = os.open(self.control_file, os.O_RDWR)
+        return self._fd
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        """Closes the device mapper control device."""
+
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+
+        self.open()
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+    # -------------------------------------------------------------------------
+    def __del__(self):
+
+        self.close()
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def build_buffer(size, name=None, flags=0, data=b'', target_count=0):
+        """
+        Builds a buffer with a struct dm_ioctl and the given data behind it.
+
+        @rtype: bytearray
+        """
+
+        size = max(size, DM_IOCTL_SIZE + len(data))
+        name = _to_bytes(name or '')
+        if len(name) >= DM_NAME_LEN:
+            msg = _("Device mapper name %r is too long.") % (name)
+            raise DmDeviceError(msg)
+
+        header = struct.pack(
+            DM_IOCTL_FORMAT,
+            DM_VERSION[0], DM_VERSION[1], DM_VERSION[2],
+            size, DM_IOCTL_SIZE, target_count, 0, flags, 0, 0, 0,
+            name, b'', b'')
+
+        buf = bytearray(size)
+        buf[0:DM_IOCTL_SIZE] = header
+        buf[DM_IOCTL_SIZE:DM_IOCTL_SIZE + len(data)] = data
+        return buf
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def parse_header(buf):
+        """
+        Evaluates the struct dm_ioctl at the begin of the given buffer.
+
+        @rtype: dict
+        """
+
+        fields = struct.unpack_from(DM_IOCTL_FORMAT, bytes(buf[0:DM_IOCTL_SIZE]))
+        return {
+            'version': tuple(fields[0:3]),
+            'data_size': fields[3],
+            'data_start': fields[4],
+            'target_count': fields[5],
+            'open_count': fields[6],
+            'flags': fields[7],
+            'event_nr': fields[8],
+            'dev': fields[10],
+            'name': _from_bytes(fields[11]),
+            'uuid': _from_bytes(fields[12]),
+        }
+
+    # -------------------------------------------------------------------------
+    def ioctl(self, cmd, command, name=None, flags=0, data=b'', target_count=0):
+        """
+        Issues the given device mapper ioctl. If the kernel signals a full
+        buffer, it is repeated with a doubled buffer.
+
+        @raise DmIoctlError: if the ioctl failed
+
+        @return: the evaluated header and the whole buffer
+        @rtype: tuple of dict and bytearray
+        """
+
+        fd = self.open()
+        size = self.buffer_size
+        while True:
+            buf = self.build_buffer(
+                size, name=name, flags=flags, data=data, target_count=target_count)
+            try:
+                fcntl.ioctl(fd, dm_ioctl_request(cmd), buf, True)
+            except (IOError, OSError) as e:
+                raise DmIoctlError(command, name, e.errno, e.strerror)
+            header = self.parse_header(buf)
+            if not header['flags'] & DM_BUFFER_FULL_FLAG:
+                return (header, buf)
+            if size >= MAX_BUFFER_SIZE:
+                raise DmIoctlError(command, name, errno.ENOMEM)
+            size *= 2
+            self.buffer_size = size
+
+    # -------------------------------------------------------------------------
+    def version(self):
+        """
+        Gives back the version of the device mapper ioctl interface
+        of the kernel.
+
+        @rtype: tuple of int
+        """
+
+        (header, buf) = self.ioctl(DM_VERSION_CMD, 'version')
+        return header['version']
+
+    # -------------------------------------------------------------------------
+    def dev_status(self, name):
+        """
+        Gives back the status of the given device.
+
+        @rtype: dict
+        """
+
+        (header, buf) = self.ioctl(DM_DEV_STATUS_CMD, 'status', name=name)
+        header['major'] = os.major(header['dev'])
+        header['minor'] = os.minor(header['dev'])
+        header['suspended'] = bool(header['flags'] & DM_SUSPEND_FLAG)
+        header['read_only'] = bool(header['flags'] & DM_READONLY_FLAG)
+        return header
+
+    # -------------------------------------------------------------------------
+    def suspend(self, name, flush=True, lockfs=True):
+        """
+        Suspends the given device.
+
+        @param flush: flush the outstanding I/O before suspending
+        @type flush: bool
+        @param lockfs: freeze a filesystem on the device before suspending
+        @type lockfs: bool
+        """
+
+        flags = DM_SUSPEND_FLAG
+        if not flush:
+            flags |= DM_NOFLUSH_FLAG
+        if not lockfs:
+            flags |= DM_SKIP_LOCKFS_FLAG
+        self.ioctl(DM_DEV_SUSPEND_CMD, 'suspend', name=name, flags=flags)
+
+    # -------------------------------------------------------------------------
+    def resume(self, name):
+        """
+        Resumes the given device. If an inactive table was loaded before,
+        it becomes the live table.
+        """
+
+        self.ioctl(DM_DEV_SUSPEND_CMD, 'resume', name=name)
+
+    # -------------------------------------------------------------------------
+    def load_table(self, name, table):
+        """
+        Loads the given table as the inactive table of the given device.
+        It becomes the live table on the next resume.
+
+        @param table: the table in the format of 'dmsetup table', as a list
+                      of tuples of start sector, length, target type and
+                      parameter string or as a DmTable object
+        @type table: str or list of tuple or DmTable
+        """
+
+        if hasattr(table, 'targets'):
+            targets = table.targets()
+        elif isinstance(table, (list, tuple)):
+            targets = list(table)
+        else:
+            targets = []
+            for line in table.splitlines():
+                if line.strip():
+                    targets.append(parse_table_line(line))
+
+        self.ioctl(
+            DM_TABLE_LOAD_CMD, 'load', name=name, data=pack_targets(targets),
+            target_count=len(targets))
+
+    # -------------------------------------------------------------------------
+    def clear_table(self, name):
+        """Drops the inactive table of the given device."""
+
+        self.ioctl(DM_TABLE_CLEAR_CMD, 'clear', name=name)
+
+    # -------------------------------------------------------------------------
+    def get_targets(self, name, status=False, inactive=False):
+        """
+        Gives back the targets of the table of the given device.
+
+        @param status: give back the status of the targets
+                       instead of their parameters
+        @type status: bool
+        @param inactive: use the inactive instead of the live table
+        @type inactive: bool
+
+        @rtype: list of tuple
+        """
+
+        flags = 0
+        if not status:
+            flags |= DM_STATUS_TABLE_FLAG
+        if inactive:
+            flags |= DM_QUERY_INACTIVE_TABLE_FLAG
+        (header, buf) = self.ioctl(DM_TABLE_STATUS_CMD, 'table', name=name, flags=flags)
+        return unpack_targets(
+            buf[header['data_start']:header['data_size']], header['target_count'])
+
+    # -------------------------------------------------------------------------
+    def get_table(self, name, status=False, inactive=False):
+        """
+        Gives back the table of the given device in the format
+        of 'dmsetup table <name>'.
+
+        @rtype: str
+        """
+
+        lines = []
+        for (start, length, target_type, params) in self.get_targets(
+                name, status=status, inactive=inactive):
+            line = "%d %d %s" % (start, length, target_type)
+            if params:
+                line += ' ' + params
+            lines.append(line)
+        return "\n".join(lines)
+
+    # -------------------------------------------------------------------------
+    def remove(self, name, deferred=False):
+        """
+        Removes the given device.
+
+        @param deferred: remove the device, when it is closed the last time
+        @type deferred: bool
+        """
+
+        flags = 0
+        if deferred:
+            flags |= DM_DEFERRED_REMOVE
+        self.ioctl(DM_DEV_REMOVE_CMD, 'remove', name=name, flags=flags)
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        return {
+            '__class_name__': self.__class__.__name__,
+            'control_file': self.control_file,
+            'buffer_size': self.buffer_size,
+        }
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
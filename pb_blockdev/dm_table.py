@@ -0,0 +1,766 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@organization: Profitbricks GmbH
+@copyright: © 2010 - 2015 by Profitbricks GmbH
+@license: GPL3
+@summary: Module for a parsed device mapper table with typed segments
+
+The segment classes are using __slots__, because tables of thin pools
+and striped devices may have tens of thousands of segments.
+"""
+
+# Standard modules
+import logging
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+
+# =============================================================================
+def _invalid_args(target_type, args):
+
+    msg = _("Invalid arguments %(args)r of a %(tt)r target.") % {
+        'args': args, 'tt': target_type}
+    return ValueError(msg)
+
+
+# =============================================================================
+class DmSegment(object):
+    """
+    Base class for a segment of a device mapper table.
+    """
+
+    __slots__ = ('start', 'length')
+
+    target_type = None
+
+    # -------------------------------------------------------------------------
+    def __init__(self, start, length):
+        """
+        Constructor.
+
+        @param start: the start sector of the segment
+        @type start: int
+        @param length: the length of the segment in sectors
+        @type length: int
+
+        """
+
+        self.start = int(start)
+        self.length = int(length)
+
+    # -----------------------------------------------------------
+    @property
+    def end(self):
+        """The first sector behind the segment."""
+        return self.start + self.length
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_args(cls, start, length, args):
+        """
+        Creates a segment from the argument string of the table line.
+
+        @raise ValueError: if the arguments could not be evaluated
+
+        @rtype: DmSegment
+        """
+
+        if args.strip():
+            raise _invalid_args(cls.target_type, args)
+        return cls(start, length)
+
+    # -------------------------------------------------------------------------
+    def format_args(self):
+        """Gives back the argument string of the table line."""
+        return ''
+
+    # -------------------------------------------------------------------------
+    def devices(self):
+        """Gives back the devices ('major:minor' or paths) used by the segment."""
+        return []
+
+    # -------------------------------------------------------------------------
+    def format(self):
+        """Gives back the table line of the segment."""
+
+        line = "%d %d %s" % (self.start, self.length, self.target_type)
+        args = self.format_args()
+        if args:
+            line += ' ' + args
+        return line
+
+    # -------------------------------------------------------------------------
+    def as_tuple(self):
+        """
+        Gives back the segment as a tuple of start sector, length,
+        target type and argument string, like used by DmIoctlBackend.
+        """
+        return (self.start, self.length, self.target_type, self.format_args())
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'target_type': self.target_type,
+        }
+        for cls in self.__class__.__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                res[name] = getattr(self, name)
+        return res
+
+    # -------------------------------------------------------------------------
+    def __eq__(self, other):
+
+        if not isinstance(other, DmSegment):
+            return False
+        return self.as_tuple() == other.as_tuple()
+
+    # -------------------------------------------------------------------------
+    def __ne__(self, other):
+
+        return not self.__eq__(other)
+
+    # -------------------------------------------------------------------------
+    def __str__(self):
+        """Typecasting into a string."""
+        return self.format()
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+        """Typecasting into a string for reproduction."""
+        return "<%s(%r)>" % (self.__class__.__name__, self.format())
+
+
+# =============================================================================
+class DmGenericSegment(DmSegment):
+    """
+    A segment of a target type without an own class,
+    the arguments are kept as a string.
+    """
+
+    __slots__ = ('target_type', 'args')
+
+    # -------------------------------------------------------------------------
+    def __init__(self, start, length, target_type, args=''):
+
+        super(DmGenericSegment, self).__init__(start, length)
+        self.target_type = target_type
+        self.args = args
+
+    # -------------------------------------------------------------------------
+    def format_args(self):
+        return self.args
+
+
+# =============================================================================
+class DmErrorSegment(DmSegment):
+    """A segment of the 'error' target."""
+
+    __slots__ = ()
+
+    target_type = 'error'
+
+
+# =============================================================================
+class DmZeroSegment(DmSegment):
+    """A segment of the 'zero' target."""
+
+    __slots__ = ()
+
+    target_type = 'zero'
+
+
+# =============================================================================
+class DmLinearSegment(DmSegment):
+    """
+    A segment of the 'linear' target::
+
+        <device> <offset>
+    """
+
+    __slots__ = ('device', 'offset')
+
+    target_type = 'linear'
+
+    # -------------------------------------------------------------------------
+    def __init__(self, start, length, device, offset=0):
+
+        super(DmLinearSegment, self).__init__(start, length)
+        self.device = device
+        self.offset = int(offset)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_args(cls, start, length, args):
+
+        fields = args.split()
+        if len(fields) != 2:
+            raise _invalid_args(cls.target_type, args)
+        return cls(start, length, fields[0], int(fields[1]))
+
+    # -------------------------------------------------------------------------
+    def format_args(self):
+        return "%s %d" % (self.device, self.offset)
+
+    # -------------------------------------------------------------------------
+    def devices(self):
+        return [self.device]
+
+
+# =============================================================================
+class DmStripedSegment(DmSegment):
+    """
+    A segment of the 'striped' target::
+
+        <num stripes> <chunk size> [<device> <offset>]+
+    """
+
+    __slots__ = ('chunk_size', 'stripes')
+
+    target_type = 'striped'
+
+    # -------------------------------------------------------------------------
+    def __init__(self, start, length, chunk_size, stripes):
+        """
+        @param chunk_size: the chunk size in sectors
+        @type chunk_size: int
+        @param stripes: the stripes as tuples of device and offset
+        @type stripes: list of tuple
+        """
+
+        super(DmStripedSegment, self).__init__(start, length)
+        self.chunk_size = int(chunk_size)
+        self.stripes = stripes
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_args(cls, start, length, args):
+
+        fields = args.split()
+        try:
+            count = int(fields[0])
+            chunk_size = int(fields[1])
+        except (IndexError, ValueError):
+            raise _invalid_args(cls.target_type, args)
+        if len(fields) != 2 + 2 * count:
+            raise _invalid_args(cls.target_type, args)
+
+        stripes = []
+        for i in range(2, len(fields), 2):
+            stripes.append((fields[i], int(fields[i + 1])))
+        return cls(start, length, chunk_size, stripes)
+
+    # -------------------------------------------------------------------------
+    def format_args(self):
+
+        parts = ["%d %d" % (len(self.stripes), self.chunk_size)]
+        for (device, offset) in self.stripes:
+            parts.append("%s %d" % (device, offset))
+        return ' '.join(parts)
+
+    # -------------------------------------------------------------------------
+    def devices(self):
+        return [x[0] for x in self.stripes]
+
+
+# =============================================================================
+class DmSnapshotOriginSegment(DmSegment):
+    """
+    A segment of the 'snapshot-origin' target::
+
+        <origin>
+    """
+
+    __slots__ = ('origin', )
+
+    target_type = 'snapshot-origin'
+
+    # -------------------------------------------------------------------------
+    def __init__(self, start, length, origin):
+
+        super(DmSnapshotOriginSegment, self).__init__(start, length)
+        self.origin = origin
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_args(cls, start, length, args):
+
+        fields = args.split()
+        if len(fields) != 1:
+            raise _invalid_args(cls.target_type, args)
+        return cls(start, length, fields[0])
+
+    # -------------------------------------------------------------------------
+    def format_args(self):
+        return self.origin
+
+    # -------------------------------------------------------------------------
+    def devices(self):
+        return [self.origin]
+
+
+# =============================================================================
+class DmSnapshotSegment(DmSegment):
+    """
+    A segment of the 'snapshot' target::
+
+        <origin> <COW device> <persistent: P|N|PO> <chunk size>
+    """
+
+    __slots__ = ('origin', 'cow', 'persistent', 'chunk_size')
+
+    target_type = 'snapshot'
+
+    # -------------------------------------------------------------------------
+    def __init__(self, start, length, origin, cow, persistent='P', chunk_size=8):
+
+        super(DmSnapshotSegment, self).__init__(start, length)
+        self.origin = origin
+        self.cow = cow
+        self.persistent = persistent
+        self.chunk_size = int(chunk_size)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_args(cls, start, length, args):
+
+        fields = args.split()
+        if len(fields) != 4:
+            raise _invalid_args(cls.target_type, args)
+        return cls(start, length, fields[0], fields[1], fields[2], int(fields[3]))
+
+    # -------------------------------------------------------------------------
+    def format_args(self):
+        return "%s %s %s %d" % (
+            self.origin, self.cow, self.persistent, self.chunk_size)
+
+    # -------------------------------------------------------------------------
+    def devices(self):
+        return [self.origin, self.cow]
+
+
+# =============================================================================
+class DmThinPoolSegment(DmSegment):
+    """
+    A segment of the 'thin-pool' target::
+
+        <metadata dev> <data dev> <data block size> <low water mark>
+        <num features> [<feature>]*
+    """
+
+    __slots__ = (
+        'metadata_dev', 'data_dev', 'data_block_size', 'low_water_mark',
+        'features')
+
+    target_type = 'thin-pool'
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, start, length, metadata_dev, data_dev, data_block_size,
+            low_water_mark, features=None):
+
+        super(DmThinPoolSegment, self).__init__(start, length)
+        self.metadata_dev = metadata_dev
+        self.data_dev = data_dev
+        self.data_block_size = int(data_block_size)
+        self.low_water_mark = int(low_water_mark)
+        self.features = []
+        if features:
+            self.features = list(features)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_args(cls, start, length, args):
+
+        fields = args.split()
+        try:
+            count = int(fields[4])
+        except (IndexError, ValueError):
+            count = None
+            if len(fields) != 4:
+                raise _invalid_args(cls.target_type, args)
+        if count is not None and len(fields) != 5 + count:
+            raise _invalid_args(cls.target_type, args)
+        return cls(
+            start, length, fields[0], fields[1], int(fields[2]), int(fields[3]),
+            fields[5:])
+
+    # -------------------------------------------------------------------------
+    def format_args(self):
+
+        args = "%s %s %d %d %d" % (
+            self.metadata_dev, self.data_dev, self.data_block_size,
+            self.low_water_mark, len(self.features))
+        if self.features:
+            args += ' ' + ' '.join(self.features)
+        return args
+
+    # -------------------------------------------------------------------------
+    def devices(self):
+        return [self.metadata_dev, self.data_dev]
+
+
+# =============================================================================
+class DmThinSegment(DmSegment):
+    """
+    A segment of the 'thin' target::
+
+        <pool dev> <dev id> [<external origin dev>]
+    """
+
+    __slots__ = ('pool_dev', 'dev_id', 'external_origin')
+
+    target_type = 'thin'
+
+    # -------------------------------------------------------------------------
+    def __init__(self, start, length, pool_dev, dev_id, external_origin=None):
+
+        super(DmThinSegment, self).__init__(start, length)
+        self.pool_dev = pool_dev
+        self.dev_id = int(dev_id)
+        self.external_origin = external_origin
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_args(cls, start, length, args):
+
+        fields = args.split()
+        if len(fields) not in (2, 3):
+            raise _invalid_args(cls.target_type, args)
+        external_origin = None
+        if len(fields) > 2:
+            external_origin = fields[2]
+        return cls(start, length, fields[0], int(fields[1]), external_origin)
+
+    # -------------------------------------------------------------------------
+    def format_args(self):
+
+        args = "%s %d" % (self.pool_dev, self.dev_id)
+        if self.external_origin:
+            args += ' ' + self.external_origin
+        return args
+
+    # -------------------------------------------------------------------------
+    def devices(self):
+
+        if self.external_origin:
+            return [self.pool_dev, self.external_origin]
+        return [self.pool_dev]
+
+
+# =============================================================================
+class DmMultipathSegment(DmSegment):
+    """
+    A segment of the 'multipath' target::
+
+        <num features> [<feature>]* <num hw handler args> [<hw handler arg>]*
+        <num groups> <initial group>
+        [<path selector> <num selector args> [<selector arg>]*
+         <num paths> <num path args> [<device> [<path arg>]*]+]+
+
+    Every path group is a tuple of the path selector, the list of
+    selector arguments and the list of paths, where every path is a tuple
+    of the device and the list of path arguments.
+    """
+
+    __slots__ = ('features', 'hw_handler', 'initial_group', 'groups')
+
+    target_type = 'multipath'
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, start, length, features=None, hw_handler=None,
+            initial_group=1, groups=None):
+
+        super(DmMultipathSegment, self).__init__(start, length)
+        self.features = []
+        if features:
+            self.features = list(features)
+        self.hw_handler = []
+        if hw_handler:
+            self.hw_handler = list(hw_handler)
+        self.initial_group = int(initial_group)
+        self.groups = []
+        if groups:
+            self.groups = list(groups)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_args(cls, start, length, args):
+
+        fields = args.split()
+        pos = [0]
+
+        def take(count=None):
+            if count is None:
+                value = fields[pos[0]]
+                pos[0] += 1
+                return value
+            values = fields[pos[0]:pos[0] + count]
+            if len(values) != count:
+                raise IndexError()
+            pos[0] += count
+            return values
+
+        try:
+            features = take(int(take()))
+            hw_handler = take(int(take()))
+            group_count = int(take())
+            initial_group = int(take())
+            groups = []
+            for i in range(group_count):
+                selector = take()
+                selector_args = take(int(take()))
+                path_count = int(take())
+                path_arg_count = int(take())
+                paths = []
+                for j in range(path_count):
+                    device = take()
+                    paths.append((device, take(path_arg_count)))
+                groups.append((selector, selector_args, paths))
+        except (IndexError, ValueError):
+            raise _invalid_args(cls.target_type, args)
+        if pos[0] != len(fields):
+            raise _invalid_args(cls.target_type, args)
+
+        return cls(start, length, features, hw_handler, initial_group, groups)
+
+    # -------------------------------------------------------------------------
+    def format_args(self):
+
+        parts = [str(len(self.features))] + self.features
+        parts += [str(len(self.hw_handler))] + self.hw_handler
+        parts += [str(len(self.groups)), str(self.initial_group)]
+        for (selector, selector_args, paths) in self.groups:
+            parts += [selector, str(len(selector_args))] + list(selector_args)
+            path_arg_count = 0
+            if paths:
+                path_arg_count = len(paths[0][1])
+            parts += [str(len(paths)), str(path_arg_count)]
+            for (device, path_args) in paths:
+                parts += [device] + list(path_args)
+        return ' '.join(parts)
+
+    # -------------------------------------------------------------------------
+    def devices(self):
+
+        result = []
+        for (selector, selector_args, paths) in self.groups:
+            for (device, path_args) in paths:
+                result.append(device)
+        return result
+
+
+SEGMENT_CLASSES = {}
+"""
+@var: all segment classes by their target type
+@type: dict
+"""
+for _cls in (
+        DmErrorSegment, DmZeroSegment, DmLinearSegment, DmStripedSegment,
+        DmSnapshotOriginSegment, DmSnapshotSegment, DmThinPoolSegment,
+        DmThinSegment, DmMultipathSegment):
+    SEGMENT_CLASSES[_cls.target_type] = _cls
+del _cls
+
+
+# =============================================================================
+def parse_segment(line):
+    """
+    Creates a typed segment object from a line of a device mapper table.
+
+    @raise ValueError: if the line could not be evaluated
+
+    @rtype: DmSegment
+    """
+
+    fields = line.split(None, 3)
+    if len(fields) < 3:
+        msg = _("Could not evaluate device mapper table line %r.") % (line)
+        raise ValueError(msg)
+    args = ''
+    if len(fields) > 3:
+        args = fields[3].strip()
+
+    start = int(fields[0])
+    length = int(fields[1])
+    target_type = fields[2]
+    cls = SEGMENT_CLASSES.get(target_type)
+    if cls is None:
+        return DmGenericSegment(start, length, target_type, args)
+    return cls.from_args(start, length, args)
+
+
+# =============================================================================
+class DmTable(object):
+    """
+    A device mapper table as a list of typed segments.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, segments=None):
+        """
+        Constructor.
+
+        @param segments: the segments of the table
+        @type segments: list of DmSegment
+
+        """
+
+        self.segments = []
+        if segments:
+            self.segments = list(segments)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def parse(cls, text):
+        """
+        Creates a table from the output of 'dmsetup table <name>'.
+
+        @raise ValueError: if a line could not be evaluated
+
+        @rtype: DmTable
+        """
+
+        segments = []
+        if text:
+            for line in text.splitlines():
+                if line.strip():
+                    segments.append(parse_segment(line))
+        return cls(segments)
+
+    # -----------------------------------------------------------
+    @property
+    def size(self):
+        """The size of the table in sectors."""
+        if not self.segments:
+            return 0
+        return self.segments[-1].end
+
+    # -----------------------------------------------------------
+    @property
+    def target_types(self):
+        """All different target types used in the table."""
+        result = []
+        for segment in self.segments:
+            if segment.target_type not in result:
+                result.append(segment.target_type)
+        return result
+
+    # -------------------------------------------------------------------------
+    def devices(self):
+        """
+        Gives back all different devices used by the segments
+        of the table in the order of their first use.
+
+        @rtype: list of str
+        """
+
+        result = []
+        seen = set()
+        for segment in self.segments:
+            for device in segment.devices():
+                if device not in seen:
+                    seen.add(device)
+                    result.append(device)
+        return result
+
+    # -------------------------------------------------------------------------
+    def append(self, segment):
+        """Appends the given segment to the table."""
+        self.segments.append(segment)
+
+    # -------------------------------------------------------------------------
+    def targets(self):
+        """
+        Gives back all segments as tuples of start sector, length,
+        target type and argument string, like used by DmIoctlBackend.
+
+        @rtype: list of tuple
+        """
+        return [x.as_tuple() for x in self.segments]
+
+    # -------------------------------------------------------------------------
+    def format(self):
+        """Gives back the table in the format of 'dmsetup table <name>'."""
+        return "\n".join([x.format() for x in self.segments])
+
+    # -------------------------------------------------------------------------
+    def __str__(self):
+        """Typecasting into a string."""
+        return self.format()
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        return len(self.segments)
+
+    # -------------------------------------------------------------------------
+    def __iter__(self):
+        return iter(self.segments)
+
+    # -------------------------------------------------------------------------
+    def __getitem__(self, index):
+        return self.segments[index]
+
+    # -------------------------------------------------------------------------
+    def __eq__(self, other):
+
+        if not isinstance(other, DmTable):
+            return False
+        return self.segments == other.segments
+
+    # -------------------------------------------------------------------------
+    def __ne__(self, other):
+
+        return not self.__eq__(other)
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        return {
+            '__class_name__': self.__class__.__name__,
+            'size': self.size,
+            'segments': [x.as_dict(short=short) for x in self.segments],
+        }
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@organization: Profitbricks GmbH
+@copyright: © 2010 - 2015 by Profitbricks GmbH
+@license: GPL3
+@summary: Module for atomic suspend/reload/resume transactions
+          over a stack of devicemapper devices
+
+The new tables are loaded as inactive tables before suspending any
+device, so the I/O freeze covers only the suspends and resumes. The
+devices are suspended top-down (holders before the devices they are
+holding) and resumed bottom-up, following the holders in sysfs, also
+through devices not taking part in the transaction.
+"""
+
+# Standard modules
+import os
+import logging
+import time
+
+from collections import OrderedDict
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.base import BASE_SYSFS_BLOCKDEV_DIR
+
+from pb_blockdev.dm import DmDeviceError
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+
+# =============================================================================
+class DmTransactionError(DmDeviceError):
+    """
+    Error class for a failed devicemapper transaction.
+    """
+
+    # -----------------------------------------------------------------------
+    def __init__(self, step, dm_name, cause, rollback_errors=None):
+        """
+        Constructor.
+
+        @param step: the failed step, 'load', 'suspend' or 'resume'
+        @type step: str
+        @param dm_name: the device mapper name of the failed device
+        @type dm_name: str
+        @param cause: the exception causing the failure
+        @type cause: Exception
+        @param rollback_errors: the exceptions happened during the rollback
+        @type rollback_errors: list of Exception
+
+        """
+
+        self.step = step
+        self.dm_name = dm_name
+        self.cause = cause
+        self.rollback_errors = []
+        if rollback_errors:
+            self.rollback_errors = list(rollback_errors)
+
+    # -----------------------------------------------------------------------
+    def __str__(self):
+        """
+        Typecasting of object into a string
+        """
+
+        msg = _("Devicemapper transaction failed on %(step)s of %(dev)r: %(cause)s") % {
+            'step': self.step, 'dev': self.dm_name, 'cause': self.cause}
+        if self.rollback_errors:
+            msg += ' ' + (__(
+                "(%d error on rollback)", "(%d errors on rollback)",
+                len(self.rollback_errors)) % (len(self.rollback_errors)))
+        return msg
+
+
+# =============================================================================
+class DmTransaction(object):
+    """
+    A transaction loading new tables into a set of devicemapper devices
+    and switching them atomically by suspending and resuming in the order
+    of the holders graph, with a rollback on failure.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, sysfs_block_dir=BASE_SYSFS_BLOCKDEV_DIR):
+        """
+        Constructor.
+
+        @param sysfs_block_dir: the sysfs directory of all blockdevices,
+                                used for the holders of devices not taking
+                                part in the transaction
+        @type sysfs_block_dir: str
+
+        """
+
+        self.sysfs_block_dir = sysfs_block_dir
+
+        self.devices = OrderedDict()
+        """
+        @ivar: all devices of the transaction by their blockdevice name
+        @type: OrderedDict of DeviceMapperDevice
+        """
+
+        self.tables = {}
+        """
+        @ivar: the new tables by blockdevice name, None for devices,
+               which are only suspended and resumed
+        @type: dict
+        """
+
+        self.old_tables = {}
+        """
+        @ivar: the tables before the transaction by blockdevice name
+        @type: dict
+        """
+
+        self.freeze_times = OrderedDict()
+        """
+        @ivar: the time in seconds from the begin of the suspend until
+               the end of the resume of every device by devicemapper name
+        @type: OrderedDict
+        """
+
+    # -------------------------------------------------------------------------
+    def add(self, dm_dev, table=None):
+        """
+        Adds a device to the transaction.
+
+        @param dm_dev: the devicemapper device
+        @type dm_dev: DeviceMapperDevice
+        @param table: the new table of the device, None, if the device
+                      should only be suspended and resumed
+        @type table: str or DmTable or None
+
+        """
+
+        if not dm_dev.name:
+            msg = _("Devicemapper device %r has no blockdevice name.") % (
+                dm_dev.dm_name)
+            raise DmDeviceError(msg)
+        self.devices[dm_dev.name] = dm_dev
+        self.tables[dm_dev.name] = table
+
+    # -------------------------------------------------------------------------
+    def _holders(self, name):
+
+        dm_dev = self.devices.get(name)
+        if dm_dev is not None:
+            return list(dm_dev.holders or [])
+
+        holders_dir = os.path.join(self.sysfs_block_dir, name, 'holders')
+        try:
+            return sorted(os.listdir(holders_dir))
+        except (IOError, OSError):
+            return []
+
+    # -------------------------------------------------------------------------
+    def suspend_order(self):
+        """
+        Gives back the blockdevice names of all devices in the order of
+        suspending, the holders before the devices they are holding.
+
+        @raise DmDeviceError: if there is a cycle in the holders graph
+
+        @rtype: list of str
+        """
+
+        # The next devices of the transaction above every device
+        above = {}
+        for name in self.devices:
+            found = set()
+            seen = set([name])
+            todo = self._holders(name)
+            while todo:
+                holder = todo.pop()
+                if holder in seen:
+                    continue
+                seen.add(holder)
+                if holder in self.devices:
+                    found.add(holder)
+                else:
+                    todo.extend(self._holders(holder))
+            above[name] = found
+
+        below_count = {}
+        for name in self.devices:
+            below_count[name] = 0
+        for name in self.devices:
+            for holder in above[name]:
+                below_count[name] += 1
+
+        order = []
+        ready = [x for x in self.devices if not below_count[x]]
+        while ready:
+            name = ready.pop(0)
+            order.append(name)
+            for lower in self.devices:
+                if name in above[lower]:
+                    below_count[lower] -= 1
+                    if not below_count[lower]:
+                        ready.append(lower)
+
+        if len(order) != len(self.devices):
+            msg = _("Cycle in the holders graph of the devicemapper devices %r.") % (
+                [x for x in self.devices if x not in order])
+            raise DmDeviceError(msg)
+
+        return order
+
+    # -------------------------------------------------------------------------
+    def commit(self):
+        """
+        Executes the transaction:
+         - saving the current tables of all devices with a new table
+         - loading the new tables as inactive tables
+         - suspending all devices top-down
+         - resuming all devices bottom-up, which activates the new tables
+
+        On a failure all changes are rolled back.
+
+        @raise DmTransactionError: on a failure
+
+        @return: the freeze time of every device by devicemapper name
+        @rtype: OrderedDict
+        """
+
+        order = self.suspend_order()
+        self.freeze_times = OrderedDict()
+
+        self.old_tables = {}
+        for name in order:
+            if self.tables[name] is not None:
+                self.old_tables[name] = self.devices[name]._get_table(force=True)
+
+        loaded = []
+        suspended = []
+        resumed = []
+        suspend_start = {}
+        step = 'load'
+        name = None
+
+        try:
+            for name in order:
+                if self.tables[name] is not None:
+                    self.devices[name].reload(self.tables[name])
+                    loaded.append(name)
+
+            step = 'suspend'
+            for name in order:
+                suspend_start[name] = time.time()
+                self.devices[name].suspend()
+                suspended.append(name)
+
+            step = 'resume'
+            for name in reversed(order):
+                self.devices[name].resume()
+                resumed.append(name)
+                self._record_freeze(name, suspend_start[name])
+
+        except Exception as e:
+            LOG.error(_("Devicemapper transaction failed on %(step)s of %(dev)r: %(e)s") % {
+                'step': step, 'dev': name, 'e': e})
+            errors = self._rollback(order, loaded, suspended, resumed, suspend_start)
+            dm_name = name
+            if name in self.devices:
+                dm_name = self.devices[name].dm_name
+            raise DmTransactionError(step, dm_name, e, errors)
+
+        return self.freeze_times
+
+    # -------------------------------------------------------------------------
+    def _record_freeze(self, name, start):
+
+        dm_name = self.devices[name].dm_name
+        self.freeze_times[dm_name] = time.time() - start
+        LOG.debug(_("DM device %(dev)r was frozen %(sec)0.6f seconds.") % {
+            'dev': dm_name, 'sec': self.freeze_times[dm_name]})
+
+    # -------------------------------------------------------------------------
+    def _rollback(self, order, loaded, suspended, resumed, suspend_start):
+        """
+        Rolls back a failed transaction. Gives back a list of all
+        exceptions happened during the rollback.
+        """
+
+        errors = []
+
+        def attempt(func, *args):
+            try:
+                func(*args)
+                return True
+            except Exception as e:
+                LOG.error(_("Error on rollback: %s"), e)
+                errors.append(e)
+                return False
+
+        # Drop the inactive tables of all devices not resumed yet
+        for name in loaded:
+            if name not in resumed:
+                attempt(self.devices[name].clear)
+
+        # Restore the old tables of the already resumed devices,
+        # their holders are still suspended
+        for name in reversed(order):
+            if name not in resumed or name not in loaded:
+                continue
+            dm_dev = self.devices[name]
+            if attempt(dm_dev.reload, self.old_tables[name]):
+                if attempt(dm_dev.suspend):
+                    attempt(dm_dev.resume)
+
+        # Resume all still suspended devices bottom-up
+        for name in reversed(order):
+            if name in suspended and name not in resumed:
+                if attempt(self.devices[name].resume):
+                    self._record_freeze(name, suspend_start[name])
+
+        return errors
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        tables = {}
+        for name in self.tables:
+            table = self.tables[name]
+            if table is not None:
+                table = str(table)
+            tables[name] = table
+
+        return {
+            '__class_name__': self.__class__.__name__,
+            'sysfs_block_dir': self.sysfs_block_dir,
+            'devices': [self.devices[x].dm_name for x in self.devices],
+            'tables': tables,
+            'freeze_times': dict(self.freeze_times),
+        }
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
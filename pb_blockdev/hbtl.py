@@ -11,6 +11,8 @@
 import logging
 import re
 
+from functools import total_ordering
+
 # Third party modules
 
 # Own modules
@@ -21,12 +23,15 @@ from pb_blockdev.translate import pb_gettext, pb_ngettext
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.2.4'
+__version__ = '0.3.0'
 
 log = logging.getLogger(__name__)
 
 re_hbtl = re.compile(r'^(\d+):(\d+):(\d+):(\d+)$')
 
+# The maximum value of every part of a packed HBTL key
+HBTL_PART_MAX = 0xffff
+
 
 # =============================================================================
 class HBTLError(PbError):
@@ -37,14 +42,19 @@ class HBTLError(PbError):
 
 
 # =============================================================================
+@total_ordering
 class HBTL(object):
     """
     Encapsulation class for SCSI address of the form::
 
         Host:Bus:Target:Lun
 
+    HBTL objects are immutable, hashable and totally ordered by
+    host, bus, target and lun.
     """
 
+    __slots__ = ('_host', '_bus', '_target', '_lun')
+
     # -------------------------------------------------------------------------
     def __init__(self, host, bus, target, lun):
         """
@@ -87,6 +97,21 @@ class HBTL(object):
                 'val': lun, 'what': 'lun'}
             raise ValueError(msg)
 
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _new(cls, host, bus, target, lun):
+        """
+        Creates a HBTL object from already checked non-negative integers
+        without any further checks.
+        """
+
+        obj = object.__new__(cls)
+        obj._host = host
+        obj._bus = bus
+        obj._target = target
+        obj._lun = lun
+        return obj
+
     # -----------------------------------------------------------
     @property
     def host(self):
@@ -111,6 +136,49 @@ class HBTL(object):
         """The lun part of the HBTL address."""
         return self._lun
 
+    # -----------------------------------------------------------
+    @property
+    def key(self):
+        """
+        The address packed into a 64 bit integer with 16 bits for every
+        part, usable for fast sorting and as a dict key. The order of the
+        keys is the same as the order of the HBTL objects.
+
+        @raise ValueError: if a part of the address doesn't fit into 16 bits
+        """
+
+        if (self._host > HBTL_PART_MAX or self._bus > HBTL_PART_MAX or
+                self._target > HBTL_PART_MAX or self._lun > HBTL_PART_MAX):
+            msg = _("SCSI address %s could not be packed into a 64 bit integer.") % (
+                self)
+            raise ValueError(msg)
+        return (
+            (self._host << 48) | (self._bus << 32) | (self._target << 16) |
+            self._lun)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_key(cls, key):
+        """
+        Creating a HBTL object from a packed 64 bit integer (see key).
+        """
+
+        key = int(key)
+        if key < 0 or key >> 64:
+            msg = _("Invalid packed SCSI address %r.") % (key)
+            raise ValueError(msg)
+        return cls._new(
+            (key >> 48) & HBTL_PART_MAX, (key >> 32) & HBTL_PART_MAX,
+            (key >> 16) & HBTL_PART_MAX, key & HBTL_PART_MAX)
+
+    # -------------------------------------------------------------------------
+    def as_tuple(self):
+        """
+        Gives back the address as a tuple (host, bus, target, lun).
+        """
+
+        return (self._host, self._bus, self._target, self._lun)
+
     # -------------------------------------------------------------------------
     def as_dict(self, short=False):
         """
@@ -123,13 +191,10 @@ class HBTL(object):
         @rtype:  dict
         """
 
-        res = self.__dict__
         res = {}
-        for key in self.__dict__:
-            if short and key.startswith('_') and not key.startswith('__'):
-                continue
-            val = self.__dict__[key]
-            res[key] = val
+        if not short:
+            for key in self.__slots__:
+                res[key] = getattr(self, key)
         res['__class_name__'] = self.__class__.__name__
         res['__str__'] = str(self)
         res['host'] = self.host
@@ -154,7 +219,7 @@ class HBTL(object):
             msg = _("Could not interprete %r as a SCSI HBTL address.") % (string)
             raise ValueError(msg)
 
-        address = cls(
+        address = cls._new(
             int(match.group(1)),
             int(match.group(2)),
             int(match.group(3)),
@@ -163,6 +228,42 @@ class HBTL(object):
 
         return address
 
+    # -------------------------------------------------------------------------
+    @classmethod
+    def parse_many(cls, strings, skip_invalid=False):
+        """
+        Creating HBTL objects from all given strings, much faster
+        than from_string() for every string.
+
+        @raise ValueError: if a string could not evaluated and
+                           skip_invalid is not set.
+
+        @param strings: the strings to parse, e.g. directory names
+                        in /sys/bus/scsi/devices
+        @type strings: list of str
+        @param skip_invalid: silently skip all strings, which are not
+                             a SCSI address, e.g. 'host0' or 'target0:0:0'
+        @type skip_invalid: bool
+
+        @return: the HBTL objects in the order of the strings
+        @rtype: list of HBTL
+        """
+
+        result = []
+        new = cls._new
+        for string in strings:
+            parts = string.split(':')
+            if len(parts) == 4 and ''.join(parts).isdigit() and all(parts):
+                result.append(new(
+                    int(parts[0]), int(parts[1]), int(parts[2]), int(parts[3])))
+                continue
+            if skip_invalid:
+                continue
+            msg = _("Could not interprete %r as a SCSI HBTL address.") % (string)
+            raise ValueError(msg)
+
+        return result
+
     # -------------------------------------------------------------------------
     def __str__(self):
         """Typecasting into a string."""
@@ -182,29 +283,42 @@ class HBTL(object):
         return out
 
     # -------------------------------------------------------------------------
-    def __cmp__(self, other):
+    def __reduce__(self):
+        """Support for pickling and copying."""
+        return (self.__class__, self.as_tuple())
+
+    # -------------------------------------------------------------------------
+    def __hash__(self):
+        return hash(self.as_tuple())
+
+    # -------------------------------------------------------------------------
+    def __eq__(self, other):
+        if not isinstance(other, HBTL):
+            return NotImplemented
+        return (
+            (self._host, self._bus, self._target, self._lun) ==
+            (other._host, other._bus, other._target, other._lun))
+
+    # -------------------------------------------------------------------------
+    def __ne__(self, other):
+        if not isinstance(other, HBTL):
+            return NotImplemented
+        return (
+            (self._host, self._bus, self._target, self._lun) !=
+            (other._host, other._bus, other._target, other._lun))
+
+    # -------------------------------------------------------------------------
+    def __lt__(self, other):
         """
         Operator overloading for the comparision function, which is implicitely
         used with the sorted function.
         """
 
         if not isinstance(other, HBTL):
-            msg = _("Comparision partner %r is not a HBTL object.") % (other)
-            raise ValueError(msg)
-
-        res = cmp(self.host, other.host)
-        if res != 0:
-            return res
-
-        res = cmp(self.bus, other.bus)
-        if res != 0:
-            return res
-
-        res = cmp(self.target, other.target)
-        if res != 0:
-            return res
-
-        return cmp(self.lun, other.lun)
+            return NotImplemented
+        return (
+            (self._host, self._bus, self._target, self._lun) <
+            (other._host, other._bus, other._target, other._lun))
 
 
 # =============================================================================
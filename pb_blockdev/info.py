@@ -0,0 +1,585 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, ProfitBricks GmbH, Berlin
+@summary: Module for lightweight read-only records of block devices
+
+The records have the same property names as the appropriate handler
+classes (BlockDevice, DeviceMapperDevice, ScsiDevice, LoopDevice and
+MdDevice), but they are using __slots__ and they don't have any handler
+machinery (logging, simulate and sudo flags, commands aso.). All sysfs
+attributes of a device are read at once on creation.
+
+If a device should be changed, the appropriate handler object can be
+created by promote().
+"""
+
+# Standard modules
+import os
+import re
+import logging
+import importlib
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.sysfs import SysfsAttrReader
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+# /sys/block
+BASE_SYSFS_BLOCKDEV_DIR = os.sep + os.path.join('sys', 'block')
+
+SECTOR_SIZE = 512
+
+LOOP_MAJOR = 7
+
+RE_MAJOR_MINOR = re.compile(r'^\s*(\d+):(\d+)')
+
+
+# =============================================================================
+def _to_int(value):
+
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+# =============================================================================
+def _to_bool(value):
+
+    if value is None:
+        return None
+    return value == '1'
+
+
+# =============================================================================
+def _list_dir(path):
+
+    try:
+        return tuple(sorted(os.listdir(path)))
+    except (IOError, OSError):
+        return None
+
+
+# =============================================================================
+class BlockDeviceInfo(object):
+    """
+    Lightweight read-only record of a block device.
+    """
+
+    __slots__ = (
+        '_name', '_sysfs_dir', '_major_number', '_minor_number',
+        '_removable', '_readonly', '_sectors', '_holders', '_slaves')
+
+    sysfs_attrs = ('dev', 'removable', 'ro', 'size')
+    """
+    @cvar: the attribute files in sysfs read for this record
+    @type: tuple of str
+    """
+
+    handler_module = 'pb_blockdev.base'
+    handler_class = 'BlockDevice'
+
+    # -------------------------------------------------------------------------
+    def __init__(self, name, sysfs_dir=BASE_SYSFS_BLOCKDEV_DIR, attrs=None):
+        """
+        Constructor.
+
+        @param name: name of the blockdevice, like used under /sys/block
+        @type name: str
+        @param sysfs_dir: the sysfs directory of all blockdevices
+        @type sysfs_dir: str
+        @param attrs: the already read attribute files of the device,
+                      if not given, they are read from sysfs
+        @type attrs: dict or None
+
+        """
+
+        self._name = name
+        self._sysfs_dir = sysfs_dir
+        if attrs is None:
+            attrs = self.read_sysfs(name, sysfs_dir)
+        self._load(attrs)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def read_sysfs(cls, name, sysfs_dir=BASE_SYSFS_BLOCKDEV_DIR):
+        """
+        Reads all attribute files of the given device needed by this class.
+
+        @rtype: dict
+        """
+
+        with SysfsAttrReader(os.path.join(sysfs_dir, name)) as reader:
+            return reader.read_many(cls.sysfs_attrs)
+
+    # -------------------------------------------------------------------------
+    def _load(self, attrs):
+
+        self._major_number = None
+        self._minor_number = None
+        match = RE_MAJOR_MINOR.search(attrs.get('dev') or '')
+        if match:
+            self._major_number = int(match.group(1))
+            self._minor_number = int(match.group(2))
+        self._removable = _to_bool(attrs.get('removable'))
+        self._readonly = _to_bool(attrs.get('ro'))
+        self._sectors = _to_int(attrs.get('size'))
+        self._holders = _list_dir(os.path.join(self.sysfs_bd_dir, 'holders'))
+        self._slaves = _list_dir(os.path.join(self.sysfs_bd_dir, 'slaves'))
+
+    # -----------------------------------------------------------
+    @property
+    def name(self):
+        """The name of the blockdevice, like used under /sys/block"""
+        return self._name
+
+    # -----------------------------------------------------------
+    @property
+    def device(self):
+        """The file name of the approriate device file under /dev."""
+        return os.sep + os.path.join('dev', self.name)
+
+    # -----------------------------------------------------------
+    @property
+    def sysfs_bd_dir(self):
+        """The apropriate directory under /sys/block, e.g. /sys/block/sda"""
+        return os.path.join(self._sysfs_dir, self.name)
+
+    # -----------------------------------------------------------
+    @property
+    def exists(self):
+        """Does the blockdevice currently exists?"""
+        return os.path.exists(self.sysfs_bd_dir)
+
+    # -----------------------------------------------------------
+    @property
+    def major_number(self):
+        """The major device number."""
+        return self._major_number
+
+    # -----------------------------------------------------------
+    @property
+    def minor_number(self):
+        """The minor device number."""
+        return self._minor_number
+
+    # -----------------------------------------------------------
+    @property
+    def major_minor_number(self):
+        """The major and the minor number together."""
+        if self.major_number is None or self.minor_number is None:
+            return None
+        return "%d:%d" % (self.major_number, self.minor_number)
+
+    # -----------------------------------------------------------
+    @property
+    def removable(self):
+        """A flag, whether the device is removeable, e.g. CD-ROM."""
+        return self._removable
+
+    # -----------------------------------------------------------
+    @property
+    def readonly(self):
+        """A flag, whether the device is readonly, e.g. CD-ROM."""
+        return self._readonly
+
+    # -----------------------------------------------------------
+    @property
+    def sectors(self):
+        """The size of the blockdevice in 512-byte sectors."""
+        return self._sectors
+
+    # -----------------------------------------------------------
+    @property
+    def size(self):
+        """The size of the blockdevice in bytes."""
+        if self.sectors is None:
+            return None
+        return self.sectors * SECTOR_SIZE
+
+    # -----------------------------------------------------------
+    @property
+    def size_mb(self):
+        """The size of the blockdevice in MiBytes."""
+        if self.size is None:
+            return None
+        return int(self.size / 1024 / 1024)
+
+    # -----------------------------------------------------------
+    @property
+    def holders(self):
+        """A list of all holders of the blockdevice."""
+        return self._holders
+
+    # -----------------------------------------------------------
+    @property
+    def slaves(self):
+        """A list of all slaves of the blockdevice."""
+        return self._slaves
+
+    # -------------------------------------------------------------------------
+    def get_handler_class(self):
+        """
+        Gives back the handler class of this record, the module
+        is imported herewith.
+
+        @rtype: class
+        """
+
+        module = importlib.import_module(self.handler_module)
+        return getattr(module, self.handler_class)
+
+    # -------------------------------------------------------------------------
+    def promote(self, **kwargs):
+        """
+        Creates the full handler object of the device, e.g. for
+        a mutating operation.
+
+        @param kwargs: additional arguments for the constructor of
+                       the handler class, e.g. appname, verbose, sudo
+        @type kwargs: dict
+
+        @return: the handler object
+        @rtype: BlockDevice
+        """
+
+        cls = self.get_handler_class()
+        return cls(name=self.name, **kwargs)
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        res = {'__class_name__': self.__class__.__name__}
+        for cls in self.__class__.__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if slot.startswith('_') and slot != '_sysfs_dir':
+                    res[slot[1:]] = getattr(self, slot)
+        res['device'] = self.device
+        res['sysfs_bd_dir'] = self.sysfs_bd_dir
+        return res
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+        """Typecasting into a string for reproduction."""
+
+        return "<%s(name=%r)>" % (self.__class__.__name__, self.name)
+
+
+# =============================================================================
+class DmDeviceInfo(BlockDeviceInfo):
+    """
+    Lightweight read-only record of a devicemapper device.
+    """
+
+    __slots__ = ('_dm_name', '_uuid', '_suspended')
+
+    sysfs_attrs = BlockDeviceInfo.sysfs_attrs + (
+        os.path.join('dm', 'name'), os.path.join('dm', 'uuid'),
+        os.path.join('dm', 'suspended'))
+
+    handler_module = 'pb_blockdev.dm'
+    handler_class = 'DeviceMapperDevice'
+
+    # -------------------------------------------------------------------------
+    def _load(self, attrs):
+
+        super(DmDeviceInfo, self)._load(attrs)
+        self._dm_name = attrs.get(os.path.join('dm', 'name'))
+        self._uuid = attrs.get(os.path.join('dm', 'uuid'))
+        self._suspended = _to_bool(attrs.get(os.path.join('dm', 'suspended')))
+
+    # -----------------------------------------------------------
+    @property
+    def dm_name(self):
+        """The devicemapper name of the device."""
+        return self._dm_name
+
+    # -----------------------------------------------------------
+    @property
+    def uuid(self):
+        """The UUID of the devicemapper device."""
+        return self._uuid
+
+    # -----------------------------------------------------------
+    @property
+    def suspended(self):
+        """A flag, whether the device is suspended."""
+        return self._suspended
+
+    # -----------------------------------------------------------
+    @property
+    def is_multipath(self):
+        """Is this devicemapper device a multipath device?"""
+        return bool(self.uuid and self.uuid.startswith('mpath-'))
+
+    # -------------------------------------------------------------------------
+    def get_handler_class(self):
+        """
+        Gives back the handler class of this record, MultipathDevice
+        for multipath devices, else DeviceMapperDevice.
+
+        @rtype: class
+        """
+
+        if self.is_multipath:
+            from pb_blockdev.multipath.device import MultipathDevice
+            return MultipathDevice
+        return super(DmDeviceInfo, self).get_handler_class()
+
+
+# =============================================================================
+class ScsiDeviceInfo(BlockDeviceInfo):
+    """
+    Lightweight read-only record of a SCSI device.
+    """
+
+    __slots__ = ('_scsi_type_id', '_vendor', '_model', '_revision', '_scsi_level')
+
+    sysfs_attrs = BlockDeviceInfo.sysfs_attrs + tuple([
+        os.path.join('device', x) for x in (
+            'type', 'vendor', 'model', 'rev', 'scsi_level')])
+
+    handler_module = 'pb_blockdev.scsi'
+    handler_class = 'ScsiDevice'
+
+    # -------------------------------------------------------------------------
+    def _load(self, attrs):
+
+        super(ScsiDeviceInfo, self)._load(attrs)
+        self._scsi_type_id = _to_int(attrs.get(os.path.join('device', 'type')))
+        self._vendor = attrs.get(os.path.join('device', 'vendor'))
+        self._model = attrs.get(os.path.join('device', 'model'))
+        self._revision = attrs.get(os.path.join('device', 'rev'))
+        self._scsi_level = _to_int(attrs.get(os.path.join('device', 'scsi_level')))
+
+    # -----------------------------------------------------------
+    @property
+    def scsi_type_id(self):
+        """The numeric SCSI type Id."""
+        return self._scsi_type_id
+
+    # -----------------------------------------------------------
+    @property
+    def vendor(self):
+        """The vendor of the SCSI device."""
+        return self._vendor
+
+    # -----------------------------------------------------------
+    @property
+    def model(self):
+        """The model of the SCSI device."""
+        return self._model
+
+    # -----------------------------------------------------------
+    @property
+    def revision(self):
+        """The revision of the SCSI device."""
+        return self._revision
+
+    # -----------------------------------------------------------
+    @property
+    def scsi_level(self):
+        """The numeric SCSI level of the SCSI device."""
+        return self._scsi_level
+
+
+# =============================================================================
+class LoopDeviceInfo(BlockDeviceInfo):
+    """
+    Lightweight read-only record of a loop device.
+    """
+
+    __slots__ = ('_backing_file', '_offset', '_sizelimit')
+
+    sysfs_attrs = BlockDeviceInfo.sysfs_attrs + (
+        os.path.join('loop', 'backing_file'), os.path.join('loop', 'offset'),
+        os.path.join('loop', 'sizelimit'))
+
+    handler_module = 'pb_blockdev.loop'
+    handler_class = 'LoopDevice'
+
+    # -------------------------------------------------------------------------
+    def _load(self, attrs):
+
+        super(LoopDeviceInfo, self)._load(attrs)
+        self._backing_file = attrs.get(os.path.join('loop', 'backing_file'))
+        self._offset = _to_int(attrs.get(os.path.join('loop', 'offset')))
+        self._sizelimit = _to_int(attrs.get(os.path.join('loop', 'sizelimit')))
+
+    # -----------------------------------------------------------
+    @property
+    def attached(self):
+        """Was the loop device attached to a backing file on reading?"""
+        return self._backing_file is not None
+
+    # -----------------------------------------------------------
+    @property
+    def backing_file(self):
+        """The file name of the backing file of the loop device."""
+        return self._backing_file
+
+    # -----------------------------------------------------------
+    @property
+    def offset(self):
+        """The offset of the loop device in the backing file."""
+        return self._offset
+
+    # -----------------------------------------------------------
+    @property
+    def sizelimit(self):
+        """The sizelimit of the loop device."""
+        return self._sizelimit
+
+
+# =============================================================================
+class MdDeviceInfo(BlockDeviceInfo):
+    """
+    Lightweight read-only record of a MD Raid device.
+    """
+
+    __slots__ = (
+        '_level', '_md_version', '_chunk_size', '_state', '_degraded',
+        '_raid_disks')
+
+    sysfs_attrs = BlockDeviceInfo.sysfs_attrs + tuple([
+        os.path.join('md', x) for x in (
+            'level', 'metadata_version', 'chunk_size', 'array_state',
+            'degraded', 'raid_disks')])
+
+    handler_module = 'pb_blockdev.md.device'
+    handler_class = 'MdDevice'
+
+    # -------------------------------------------------------------------------
+    def _load(self, attrs):
+
+        super(MdDeviceInfo, self)._load(attrs)
+        self._level = attrs.get(os.path.join('md', 'level'))
+        self._md_version = attrs.get(os.path.join('md', 'metadata_version'))
+        self._chunk_size = _to_int(attrs.get(os.path.join('md', 'chunk_size')))
+        self._state = attrs.get(os.path.join('md', 'array_state'))
+        self._degraded = None
+        degraded = attrs.get(os.path.join('md', 'degraded'))
+        if degraded is not None:
+            self._degraded = degraded != '0'
+        self._raid_disks = _to_int(attrs.get(os.path.join('md', 'raid_disks')))
+
+    # -----------------------------------------------------------
+    @property
+    def level(self):
+        """The RAID level of this RAID device."""
+        return self._level
+
+    # -----------------------------------------------------------
+    @property
+    def md_version(self):
+        """The version of the metadata of this RAID device."""
+        return self._md_version
+
+    # -----------------------------------------------------------
+    @property
+    def chunk_size(self):
+        """The chunk size of the MD Raid device."""
+        return self._chunk_size
+
+    # -----------------------------------------------------------
+    @property
+    def state(self):
+        """The state of the MD Raid device."""
+        return self._state
+
+    # -----------------------------------------------------------
+    @property
+    def degraded(self):
+        """The degraded state of the MD Raid device."""
+        return self._degraded
+
+    # -----------------------------------------------------------
+    @property
+    def raid_disks(self):
+        """The number of raid disks of the MD Raid device."""
+        return self._raid_disks
+
+
+# =============================================================================
+def get_device_info(name, sysfs_dir=BASE_SYSFS_BLOCKDEV_DIR):
+    """
+    Gives back the appropriate lightweight record of the given block
+    device, or None, if it doesn't exists.
+
+    @param name: name of the blockdevice, like used under /sys/block
+    @type name: str
+    @param sysfs_dir: the sysfs directory of all blockdevices
+    @type sysfs_dir: str
+
+    @rtype: BlockDeviceInfo or None
+    """
+
+    bd_dir = os.path.join(sysfs_dir, name)
+    if not os.path.isdir(bd_dir):
+        return None
+
+    if os.path.isdir(os.path.join(bd_dir, 'md')):
+        return MdDeviceInfo(name, sysfs_dir)
+    if os.path.isdir(os.path.join(bd_dir, 'dm')):
+        return DmDeviceInfo(name, sysfs_dir)
+    if os.path.isdir(os.path.join(bd_dir, 'device', 'scsi_device')):
+        return ScsiDeviceInfo(name, sysfs_dir)
+
+    # Reading the loop attributes together with the base attributes,
+    # because a loop device is detected by its major number
+    attrs = LoopDeviceInfo.read_sysfs(name, sysfs_dir)
+    match = RE_MAJOR_MINOR.search(attrs.get('dev') or '')
+    if match and int(match.group(1)) == LOOP_MAJOR:
+        return LoopDeviceInfo(name, sysfs_dir, attrs=attrs)
+    return BlockDeviceInfo(name, sysfs_dir, attrs=attrs)
+
+
+# =============================================================================
+def get_all_device_infos(sysfs_dir=BASE_SYSFS_BLOCKDEV_DIR):
+    """
+    Gives back the lightweight records of all block devices
+    sorted by their names.
+
+    @rtype: list of BlockDeviceInfo
+    """
+
+    result = []
+    names = _list_dir(sysfs_dir) or ()
+    for name in names:
+        info = get_device_info(name, sysfs_dir)
+        if info is not None:
+            result.append(info)
+    return result
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
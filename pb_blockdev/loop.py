@@ -24,12 +24,16 @@ from pb_base.handler import PbBaseHandler
 from pb_blockdev.base import BlockDeviceError
 from pb_blockdev.base import BlockDevice
 
+from pb_blockdev.attr_cache import ATTR_SLOW
+
+from pb_blockdev.tools import TOOLS, find_tool
+
 from pb_blockdev.translate import pb_gettext, pb_ngettext
 
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.3.7'
+__version__ = '0.6.0'
 
 log = logging.getLogger(__name__)
 
@@ -51,6 +55,13 @@ class LoopDeviceError(BlockDeviceError):
 # =============================================================================
 class LoopDevice(BlockDevice):
 
+    cached_attrs = dict(
+        BlockDevice.cached_attrs,
+        backing_file=ATTR_SLOW,
+        offset=ATTR_SLOW,
+        sizelimit=ATTR_SLOW,
+    )
+
     # -------------------------------------------------------------------------
     def __init__(
         self, name, appname=None, verbose=0, version=__version__,
@@ -96,14 +107,11 @@ class LoopDevice(BlockDevice):
 
         failed_commands = []
 
-        self._losetup_cmd = LOSETUP_CMD
+        self._losetup_cmd = find_tool('losetup', LOSETUP_CMD)
         """
         @ivar: the losetup command for manipulating the loop device
         @type: str
         """
-        if not os.path.exists(self.losetup_cmd) or not os.access(
-                self.losetup_cmd, os.X_OK):
-            self._losetup_cmd = self.get_command('losetup')
         if not self.losetup_cmd:
             failed_commands.append('losetup')
 
@@ -202,33 +210,36 @@ class LoopDevice(BlockDevice):
     @property
     def backing_file(self):
         """The file name of the backing file of the loop device."""
-        if self._backing_file is not None:
+        if self.cache_valid('backing_file'):
             return self._backing_file
         if not self.attached:
             return None
         self.retr_backing_file()
+        self.cache_loaded('backing_file')
         return self._backing_file
 
     # -----------------------------------------------------------
     @property
     def offset(self):
         """The offset of the loop device in the backing file."""
-        if self._offset is not None:
+        if self.cache_valid('offset'):
             return self._offset
         if not self.attached:
             return None
         self.retr_offset()
+        self.cache_loaded('offset')
         return self._offset
 
     # -----------------------------------------------------------
     @property
     def sizelimit(self):
         """The sizelimit of the loop device."""
-        if self._sizelimit is not None:
+        if self.cache_valid('sizelimit'):
             return self._sizelimit
         if not self.attached:
             return None
         self.retr_sizelimit()
+        self.cache_loaded('sizelimit')
         return self._sizelimit
 
     # -------------------------------------------------------------------------
@@ -300,183 +311,117 @@ class LoopDevice(BlockDevice):
         return res
 
     # -------------------------------------------------------------------------
-    def retr_backing_file(self):
+    def retr_loop_attrs(self):
         """
-        A method to retrieve the backing file of the loop device
+        Retrieves the backing file, the offset and the sizelimit of the
+        loop device, reading all appropriate files in sysfs together.
 
-        @raise LoopDeviceError: if the backing_file file in sysfs doesn't exists
+        @raise LoopDeviceError: if one of the files in sysfs doesn't exists
                                 or could not read
 
         """
 
+        self._check_attached(_('loop attributes'))
+        attrs = self._read_sysfs_attrs(
+            ['loop/backing_file', 'loop/offset', 'loop/sizelimit'],
+            _('loop attributes'), LoopDeviceError)
+
+        self.retr_backing_file(attrs)
+        self.retr_offset(attrs)
+        self.retr_sizelimit(attrs)
+
+    # -------------------------------------------------------------------------
+    def _check_attached(self, what):
+
         if not self.name:
             msg = _(
-                "Cannot retrieve backing file, "
-                "because it's an unnamed loop device object.")
+                "Cannot retrieve %s, "
+                "because it's an unnamed loop device object.") % (what)
             raise LoopDeviceError(msg)
 
         if not self.exists:
             msg = _(
-                "Cannot retrieve backing file of %r, "
-                "because the loop device doesn't exists.") % (self.name)
+                "Cannot retrieve %(what)s of %(bd)r, "
+                "because the loop device doesn't exists.") % {
+                    'what': what, 'bd': self.name}
             raise LoopDeviceError(msg)
 
         if not self.attached:
             msg = _(
-                "Cannot retrieve backing file of %r, "
-                "because the loop device isn't attached.") % (self.name)
+                "Cannot retrieve %(what)s of %(bd)r, "
+                "because the loop device isn't attached.") % {
+                    'what': what, 'bd': self.name}
             raise LoopDeviceError(msg)
 
-        r_file = self.sysfs_loop_backing_file_file
-        if not os.path.exists(r_file):
-            msg = _(
-                "Cannot retrieve backing file of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                    'bd': self.name, 'file': r_file}
-            raise LoopDeviceError(msg)
+    # -------------------------------------------------------------------------
+    def _retr_loop_number(self, name, what, attrs=None):
 
-        if not os.access(r_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve backing file of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                    'bd': self.name, 'file': r_file}
-            raise LoopDeviceError(msg)
+        if attrs is None:
+            self._check_attached(what)
+        f_content = self._sysfs_attr(
+            'loop/' + name, what, attrs, LoopDeviceError)
 
-        f_content = self.read_file(r_file, quiet=True).strip()
-        if not f_content:
+        try:
+            if sys.version_info[0] <= 2:
+                return long(f_content)
+            return int(f_content)
+        except ValueError as e:
             msg = _(
-                "Cannot retrieve backing file of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                    'bd': self.name, 'file': r_file}
+                "Cannot retrieve %(what)s of %(bd)r, "
+                "because file %(file)r has illegal content: %(err)s") % {
+                    'what': what, 'bd': self.name,
+                    'file': os.path.join(self.sysfs_loop_dir, name),
+                    'err': str(e)}
             raise LoopDeviceError(msg)
 
-        self._backing_file = f_content
-
     # -------------------------------------------------------------------------
-    def retr_offset(self):
+    def retr_backing_file(self, attrs=None):
         """
-        A method to retrieve the offset of the loop device in backing file
+        A method to retrieve the backing file of the loop device
 
-        @raise LoopDeviceError: if the offset file in sysfs doesn't exists
-                                 or could not read
+        @raise LoopDeviceError: if the backing_file file in sysfs doesn't exists
+                                or could not read
+
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
 
         """
 
-        if not self.name:
-            msg = _(
-                "Cannot retrieve offset, "
-                "because it's an unnamed loop device object.")
-            raise LoopDeviceError(msg)
+        if attrs is None:
+            self._check_attached(_('backing file'))
+        self._backing_file = self._sysfs_attr(
+            'loop/backing_file', _('backing file'), attrs, LoopDeviceError)
 
-        if not self.exists:
-            msg = _(
-                "Cannot retrieve offset of %r, "
-                "because the loop device doesn't exists.") % (self.name)
-            raise LoopDeviceError(msg)
-
-        if not self.attached:
-            msg = _(
-                "Cannot retrieve offset of %r, "
-                "because the loop device isn't attached.") % (self.name)
-            raise LoopDeviceError(msg)
+    # -------------------------------------------------------------------------
+    def retr_offset(self, attrs=None):
+        """
+        A method to retrieve the offset of the loop device in backing file
 
-        r_file = self.sysfs_loop_offset_file
-        if not os.path.exists(r_file):
-            msg = _(
-                "Cannot retrieve offset of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                    'bd': self.name, 'file': r_file}
-            raise LoopDeviceError(msg)
+        @raise LoopDeviceError: if the offset file in sysfs doesn't exists
+                                 or could not read
 
-        if not os.access(r_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve offset of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                    'bd': self.name, 'file': r_file}
-            raise LoopDeviceError(msg)
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
 
-        f_content = self.read_file(r_file, quiet=True).strip()
-        if not f_content:
-            msg = _(
-                "Cannot retrieve offset of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                    'bd': self.name, 'file': r_file}
-            raise LoopDeviceError(msg)
+        """
 
-        try:
-            if sys.version_info[0] <= 2:
-                self._offset = long(f_content)
-            else:
-                self._offset = int(f_content)
-        except ValueError as e:
-            msg = _(
-                "Cannot retrieve offset of %(bd)r, "
-                "because file %(file)r has illegal content: %(err)s") % {
-                    'bd': self.name, 'file': r_file, 'err': str(e)}
-            raise LoopDeviceError(msg)
+        self._offset = self._retr_loop_number('offset', _('offset'), attrs)
 
     # -------------------------------------------------------------------------
-    def retr_sizelimit(self):
+    def retr_sizelimit(self, attrs=None):
         """
         A method to retrieve the sizelimit of the loop device.
 
         @raise LoopDeviceError: if the sizelimit file in sysfs doesn't exists
                                  or could not read
 
-        """
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
 
-        if not self.name:
-            msg = _(
-                "Cannot retrieve sizelimit, "
-                "because it's an unnamed loop device object.")
-            raise LoopDeviceError(msg)
-
-        if not self.exists:
-            msg = _(
-                "Cannot retrieve sizelimit of %r, "
-                "because the loop device doesn't exists.") % (self.name)
-            raise LoopDeviceError(msg)
-
-        if not self.attached:
-            msg = _(
-                "Cannot retrieve sizelimit of %r, "
-                "because the loop device isn't attached.") % (self.name)
-            raise LoopDeviceError(msg)
-
-        r_file = self.sysfs_loop_sizelimit_file
-        if not os.path.exists(r_file):
-            msg = _(
-                "Cannot retrieve sizelimit of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                    'bd': self.name, 'file': r_file}
-            raise LoopDeviceError(msg)
-
-        if not os.access(r_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve sizelimit of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                    'bd': self.name, 'file': r_file}
-            raise LoopDeviceError(msg)
-
-        f_content = self.read_file(r_file, quiet=True).strip()
-        if not f_content:
-            msg = _(
-                "Cannot retrieve sizelimit of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                    'bd': self.name, 'file': r_file}
-            raise LoopDeviceError(msg)
+        """
 
-        try:
-            if sys.version_info[0] <= 2:
-                self._sizelimit = long(f_content)
-            else:
-                self._sizelimit = int(f_content)
-        except ValueError as e:
-            msg = _(
-                "Cannot retrieve sizelimit of %(bd)r, "
-                "because file %(file)r has illegal content: %(err)s") % {
-                    'bd': self.name, 'file': r_file, 'err': str(e)}
-            raise LoopDeviceError(msg)
+        self._sizelimit = self._retr_loop_number(
+            'sizelimit', _('sizelimit'), attrs)
 
     # -------------------------------------------------------------------------
     def attach(self, filename, sudo=None, offset=None, sizelimit=None):
@@ -502,6 +447,24 @@ class LoopDevice(BlockDevice):
 
         """
 
+        cmd = self._build_attach_cmd(filename, offset=offset, sizelimit=sizelimit)
+
+        (ret_code, std_out, std_err) = self.call(cmd, sudo=sudo)
+
+        self._eval_attach_result(filename, ret_code, std_out, std_err)
+
+    # -------------------------------------------------------------------------
+    def _build_attach_cmd(self, filename, offset=None, sizelimit=None):
+        """
+        Checks the requirements for attaching the given file and builds
+        the command line for 'losetup'. See attach() for the parameters.
+
+        @raise LoopDeviceError: if the requirements are not fulfilled.
+
+        @return: the command line
+        @rtype: list of str
+        """
+
         if self.name and self.attached:
             msg = _(
                 "The current loop device %(lo)r is even attached "
@@ -555,12 +518,25 @@ class LoopDevice(BlockDevice):
         if self.name:
             cmd.append(self.device)
         else:
+            if not TOOLS.has_capability('losetup', 'find'):
+                msg = _(
+                    "Cannot attach %r to a free loop device, because "
+                    "losetup doesn't support the option '--find'.") % (filename)
+                raise LoopDeviceError(msg)
             cmd.append('--find')
             cmd.append('--show')
 
         cmd.append(filename)
 
-        (ret_code, std_out, std_err) = self.call(cmd, sudo=sudo)
+        return cmd
+
+    # -------------------------------------------------------------------------
+    def _eval_attach_result(self, filename, ret_code, std_out, std_err):
+        """
+        Evaluates the result of 'losetup' on attaching the given file.
+
+        @raise LoopDeviceError: if the call of 'losetup' was not successful.
+        """
 
         if ret_code:
             err = _('undefined error')
@@ -596,7 +572,9 @@ class LoopDevice(BlockDevice):
                     'lo': self.name, 'file': filename, 'dir': self.sysfs_loop_dir}
             raise LoopDeviceError(msg)
 
+        self.invalidate('offset', 'sizelimit', 'sectors')
         self.retr_backing_file()
+        self.cache_loaded('backing_file')
 
     # -------------------------------------------------------------------------
     def detach(self, sudo=None):
@@ -615,9 +593,7 @@ class LoopDevice(BlockDevice):
 
         if not self.attached:
             log.warn(_("Device %r is even detached from some backing file."), self.device)
-            self._backing_file = None
-            self._offset = None
-            self._sizelimit = None
+            self.invalidate('backing_file', 'offset', 'sizelimit')
             return
 
         self.check_for_deletion()
@@ -628,6 +604,18 @@ class LoopDevice(BlockDevice):
 
         (ret_code, std_out, std_err) = self.call(cmd, sudo=sudo)
 
+        self._eval_detach_result(ret_code, std_err)
+
+        return
+
+    # -------------------------------------------------------------------------
+    def _eval_detach_result(self, ret_code, std_err):
+        """
+        Evaluates the result of 'losetup --detach'.
+
+        @raise LoopDeviceError: if the call of 'losetup' was not successful.
+        """
+
         if ret_code:
             err = _('undefined error')
             if std_err:
@@ -639,11 +627,7 @@ class LoopDevice(BlockDevice):
                     'no': ret_code, 'dev': self.device, 'msg': err}
             raise LoopDeviceError(msg)
 
-        self._backing_file = None
-        self._offset = None
-        self._sizelimit = None
-
-        return
+        self.invalidate('backing_file', 'offset', 'sizelimit', 'sectors')
 
 # =============================================================================
 
@@ -12,7 +12,6 @@ import os
 import logging
 import errno
 import pipes
-import signal
 
 # Third party modules
 
@@ -20,16 +19,19 @@ import signal
 from pb_base.handler import CommandNotFoundError
 from pb_base.handler import PbBaseHandler
 
-from pb_base.handler.lock import PbLockHandler
-
 from pb_blockdev.base import BlockDeviceError
 
+from pb_blockdev.process import ExecTimeoutError
+from pb_blockdev.process import handler_call_with_timeout
+
+from pb_blockdev.tools import find_tool
+
 from pb_blockdev.translate import pb_gettext, pb_ngettext
 
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.1.1'
+__version__ = '0.4.1'
 
 # LVM_PATH = "/usr/sbin"
 LVM_PATH = os.sep + os.path.join('usr', 'sbin')
@@ -117,7 +119,7 @@ class GenericLvmHandler(PbBaseHandler):
     # -------------------------------------------------------------------------
     def __init__(
         self, lvm_command=None, lvm_lockfile=DEFAULT_LVM_LOCKFILE,
-            lvm_timeout=DEFAULT_LVM_TIMEOUT,
+            lvm_timeout=DEFAULT_LVM_TIMEOUT, use_lvm_shell=False,
             appname=None, verbose=0, version=__version__, base_dir=None,
             use_stderr=False, initialized=False, simulate=False, sudo=False,
             quiet=False, *targs, **kwargs
@@ -136,6 +138,10 @@ class GenericLvmHandler(PbBaseHandler):
         @type lvm_lockfile: str
         @param lvm_timeout: timeout for execution the lvm command
         @type lvm_timeout: int or None
+        @param use_lvm_shell: execute the LVM commands in a persistent
+                              'lvm shell' session instead of forking 'lvm'
+                              for each command
+        @type use_lvm_shell: bool
 
         @param appname: name of the current running application
         @type appname: str
@@ -180,16 +186,23 @@ class GenericLvmHandler(PbBaseHandler):
 
         self._lvm_timeout = DEFAULT_LVM_TIMEOUT
 
-        self.locker = None
+        self.global_lock = None
         """
-        @ivar: a handler object for handling locks
-        @type: PbLockHandler
+        @ivar: a lock object after successful claiming the global lock
+               with lock_global().
+        @type: LvmRwLock or None
         """
 
-        self.global_lock = None
+        self.use_lvm_shell = bool(use_lvm_shell)
         """
-        @ivar: a lock object after successful claiming the global lock.
-        @type: PbLock or None
+        @ivar: execute the LVM commands in a persistent 'lvm shell' session
+        @type: bool
+        """
+
+        self.lvm_shell = None
+        """
+        @ivar: the persistent 'lvm shell' session, created on first use
+        @type: LvmShell or None
         """
 
         # Initialisation of the parent object
@@ -210,8 +223,12 @@ class GenericLvmHandler(PbBaseHandler):
         # Check of the lvm command
         if lvm_command:
             self._lvm_command = lvm_command
-        if not os.path.exists(self._lvm_command):
-            failed_commands.append('lvm')
+            if not os.path.exists(self._lvm_command):
+                failed_commands.append('lvm')
+        else:
+            self._lvm_command = find_tool('lvm', LVM_BIN_PATH)
+            if not self._lvm_command:
+                failed_commands.append('lvm')
 
         # Some commands are missing
         if failed_commands:
@@ -220,22 +237,6 @@ class GenericLvmHandler(PbBaseHandler):
         if lvm_timeout:
             self.lvm_timeout = lvm_timeout
 
-        self.locker = PbLockHandler(
-            lockretry_delay_start=0.1,
-            lockretry_delay_increase=0.1,
-            lockretry_max_delay=15,
-            max_lockfile_age=600,
-            locking_use_pid=True,
-            appname=appname,
-            verbose=verbose,
-            base_dir=base_dir,
-            initialized=False,
-            simulate=simulate,
-            sudo=sudo,
-            quiet=quiet,
-        )
-        self.locker.initialized = True
-
         if initialized:
             self.initialized = True
             if self.verbose > 3:
@@ -267,6 +268,13 @@ class GenericLvmHandler(PbBaseHandler):
             raise ValueError(msg)
         self._lvm_timeout = v
 
+    # -------------------------------------------------------------------------
+    @property
+    def lock_statistics(self):
+        """The process wide statistics of waiting for the LVM lock."""
+        from pb_blockdev.lvm.lock import LVM_LOCK_STATISTICS
+        return LVM_LOCK_STATISTICS.as_dict()
+
     # -------------------------------------------------------------------------
     def as_dict(self, short=False):
         """
@@ -283,6 +291,11 @@ class GenericLvmHandler(PbBaseHandler):
         res['lvm_command'] = self.lvm_command
         res['lvm_lockfile'] = self.lvm_lockfile
         res['lvm_timeout'] = self.lvm_timeout
+        res['lock_statistics'] = self.lock_statistics
+        res['use_lvm_shell'] = self.use_lvm_shell
+        res['lvm_shell'] = None
+        if self.lvm_shell:
+            res['lvm_shell'] = self.lvm_shell.as_dict(short=short)
 
         return res
 
@@ -292,32 +305,170 @@ class GenericLvmHandler(PbBaseHandler):
         Destructor
         """
 
-        self.global_lock = None
+        self.unlock_global()
+        self.close_lvm_shell()
+
+    # -------------------------------------------------------------------------
+    def get_lvm_shell(self):
+        """
+        Gives back a running 'lvm shell' session, it will be started,
+        if necessary.
+
+        @return: the running shell session or None, if it could not be
+                 started or if it is disabled after too many failures
+        @rtype: LvmShell or None
+
+        """
+
+        from pb_blockdev.lvm.shell import LvmShell
+
+        if self.lvm_shell is None:
+            self.lvm_shell = LvmShell(
+                lvm_command=self.lvm_command,
+                timeout=self.lvm_timeout,
+                appname=self.appname,
+                verbose=self.verbose,
+                base_dir=self.base_dir,
+                use_stderr=self.use_stderr,
+            )
+
+        if self.lvm_shell.disabled:
+            return None
+
+        self.lvm_shell.timeout = self.lvm_timeout
+        if not self.lvm_shell.running:
+            try:
+                self.lvm_shell.ensure_running()
+            except LvmExecError as e:
+                LOG.warn(_("Could not start lvm shell, forking 'lvm': %s"), e)
+                return None
+
+        return self.lvm_shell
+
+    # -------------------------------------------------------------------------
+    def close_lvm_shell(self):
+        """
+        Terminates the persistent 'lvm shell' session, if there is one.
+        """
+
+        if getattr(self, 'lvm_shell', None):
+            self.lvm_shell.close()
+        self.lvm_shell = None
 
     # -------------------------------------------------------------------------
     def lock_global(self):
         """
-        Creates a global lock for all executions of 'lvm'.
+        Creates a global exclusive lock for all executions of 'lvm'.
+        It's held until unlock_global(), so a sequence of reading and
+        changing commands is never interrupted by other writers.
 
-        @raise CouldntOccupyLockfileError: the lock could not be occupied.
+        @raise LvmLockTimeoutError: the lock could not be occupied in time.
+        @raise LvmLockError: on other errors
 
         """
 
-        if self.global_lock:
-            msg = _("Global lockfile %r already occupied.")
-            LOG.warn(msg, self.lvm_lockfile)
+        from pb_blockdev.lvm.lock import LvmRwLock
+
+        if self.global_lock and self.global_lock.locked:
+            if self.verbose > 2:
+                LOG.debug(
+                    _("Global lockfile %r already occupied."),
+                    self.lvm_lockfile)
             return
 
-        self.global_lock = self.locker.create_lockfile(self.lvm_lockfile)
-        self.global_lock.autoremove = True
+        self.global_lock = LvmRwLock(self.lvm_lockfile)
+        self.global_lock.acquire()
 
     # -------------------------------------------------------------------------
     def unlock_global(self):
         """
-        Removes the global mdadm lock.
+        Removes the global lvm lock.
         """
 
+        lock = getattr(self, 'global_lock', None)
         self.global_lock = None
+        if lock:
+            lock.release()
+
+    # -------------------------------------------------------------------------
+    def _acquire_lvm_lock(self, cmd_params, release_lock=True):
+        """
+        Acquires the lock for the execution of the given LVM command.
+
+        If the lock should be kept after execution or if a global lock is
+        already held, the global exclusive lock is used. Otherwise an own
+        lock object is used for this single execution, so concurrent
+        threads using the same handler don't interfere. Only such a
+        single execution of a read-only command takes a shared lock.
+
+        @return: the lock object for this single execution or None,
+                 if the global lock of the handler is used
+        @rtype: LvmRwLock or None
+        """
+
+        from pb_blockdev.lvm.lock import LvmRwLock, is_readonly_lvm_command
+
+        if (self.global_lock and self.global_lock.locked) or not release_lock:
+            self.lock_global()
+            return None
+
+        call_lock = LvmRwLock(self.lvm_lockfile)
+        call_lock.acquire(shared=is_readonly_lvm_command(cmd_params))
+        return call_lock
+
+    # -------------------------------------------------------------------------
+    def _release_lvm_lock(self, call_lock, release_lock=True):
+        """
+        Releases the lock acquired by _acquire_lvm_lock().
+        """
+
+        if call_lock:
+            call_lock.release()
+        elif release_lock:
+            self.unlock_global()
+
+    # -------------------------------------------------------------------------
+    def _build_lvm_cmd(self, cmd_params, quiet=True):
+        """
+        Builds the command line for executing 'lvm' with the given parameters.
+
+        @raise LvmExecError: if no parameters were given
+
+        @return: the command as a list and as a quoted string
+        @rtype: tuple of list and str
+        """
+
+        if not cmd_params:
+            msg = _("No arguments given on calling %s()." % ('exec_lvm'))
+            raise LvmExecError(msg)
+
+        cmd = [self.lvm_command]
+        if self.verbose > 1 and not quiet:
+            cmd.append('--verbose')
+
+        if isinstance(cmd_params, list):
+            for p in cmd_params:
+                cmd.append(p)
+        else:
+            cmd.append(str(cmd_params))
+        cmd = [str(element) for element in cmd]
+        cmd_str = ' '.join(map(lambda x: pipes.quote(x), cmd))
+
+        return (cmd, cmd_str)
+
+    # -------------------------------------------------------------------------
+    def _check_lvm_result(self, cmd_str, ret_code, std_err, force=False):
+        """
+        Checks the result of an execution of 'lvm'.
+
+        @raise LvmExecError: if the return value is not zero and force
+                             is not set.
+        """
+
+        if ret_code and not force:
+            msg = _("Error %(rc)d executing \"%(cmd)s\": %(msg)s") % {
+                'rc': ret_code, 'cmd': cmd_str, 'msg': std_err}
+            raise LvmExecError(msg)
 
     # -------------------------------------------------------------------------
     def exec_lvm(
@@ -326,13 +477,18 @@ class GenericLvmHandler(PbBaseHandler):
         """
         Execute 'lvm' serialized by setting a global lock file (or not).
 
+        If self.use_lvm_shell is set, the command is executed in the
+        persistent 'lvm shell' session, as long as it should not be
+        executed by sudo or simulated.
+
         @raise LvmTimeoutError: On timeout execution of 'lvm'
         @raise LvmExecError: On some errors on execution
 
         @param cmd_params: all parameters for calling 'lvm' (except --verbose)
         @type cmd_params: list of str
         @param locked: should the execution of 'lvm' be executed after
-                       Occupying the global lock
+                       Occupying the global lock (shared for read-only
+                       commands, exclusive for all other commands)
         @type locked: bool
         @param release_lock: should the global lock removed after execution
         @type release_lock: bool
@@ -352,21 +508,7 @@ class GenericLvmHandler(PbBaseHandler):
 
         """
 
-        if not cmd_params:
-            msg = _("No arguments given on calling %s()." % ('exec_lvm'))
-            raise LvmExecError(msg)
-
-        cmd = [self.lvm_command]
-        if self.verbose > 1 and not quiet:
-            cmd.append('--verbose')
-
-        if isinstance(cmd_params, list):
-            for p in cmd_params:
-                cmd.append(p)
-        else:
-            cmd.append(str(cmd_params))
-        cmd = [str(element) for element in cmd]
-        cmd_str = ' '.join(map(lambda x: pipes.quote(x), cmd))
+        (cmd, cmd_str) = self._build_lvm_cmd(cmd_params, quiet=quiet)
 
         do_sudo = False
         if os.geteuid():
@@ -378,46 +520,43 @@ class GenericLvmHandler(PbBaseHandler):
         else:
             LOG.debug(_("Executing:") + " %s", cmd_str)
 
-        if locked and not self.global_lock:
-            self.lock_global()
+        call_lock = None
+        if locked:
+            call_lock = self._acquire_lvm_lock(cmd_params, release_lock)
 
         ret_code = None
         std_out = None
         std_err = None
 
-        def exec_alarm_caller(signum, sigframe):
-            '''
-            This nested function will be called in event of a timeout
-
-            @param signum:   the signal number (POSIX) which happend
-            @type signum:    int
-            @param sigframe: the frame of the signal
-            @type sigframe:  object
-            '''
+        do_simulate = self.simulate
+        if simulate is not None:
+            do_simulate = bool(simulate)
 
-            raise LvmTimeoutError(self.lvm_timeout, cmd_str)
+        lvm_shell = None
+        if self.use_lvm_shell and not do_sudo and not do_simulate:
+            lvm_shell = self.get_lvm_shell()
 
         if self.verbose > 1:
             LOG.debug(__(
                 "Timeout on executing: %d second.",
                 "Timeout on executing: %d seconds.",
                 self.lvm_timeout), self.lvm_timeout)
-        signal.signal(signal.SIGALRM, exec_alarm_caller)
-        signal.alarm(self.lvm_timeout)
         try:
-            (ret_code, std_out, std_err) = self.call(
-                cmd, quiet=quiet, sudo=do_sudo, simulate=simulate)
-
-            if ret_code and not force:
-                cmd_str = ' '.join(map(lambda x: pipes.quote(x), cmd))
-                msg = _("Error %(rc)d executing \"%(cmd)s\": %(msg)s") % {
-                    'rc': ret_code, 'cmd': cmd_str, 'msg': std_err}
-                raise LvmExecError(msg)
+            if lvm_shell:
+                (ret_code, std_out, std_err) = lvm_shell.execute(cmd[1:])
+            else:
+                try:
+                    (ret_code, std_out, std_err) = handler_call_with_timeout(
+                        self, cmd, timeout=self.lvm_timeout, quiet=quiet,
+                        sudo=do_sudo, simulate=simulate)
+                except ExecTimeoutError:
+                    raise LvmTimeoutError(self.lvm_timeout, cmd_str)
+
+            self._check_lvm_result(cmd_str, ret_code, std_err, force=force)
 
         finally:
-            signal.alarm(0)
-            if locked and release_lock:
-                self.global_lock = None
+            if locked:
+                self._release_lvm_lock(call_lock, release_lock)
 
         return (ret_code, std_out, std_err)
 
@@ -0,0 +1,361 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, Berlin
+@summary: module for a reader/writer lock for the execution of LVM commands
+"""
+
+# Standard modules
+import os
+import time
+import errno
+import fcntl
+import logging
+import threading
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.lvm import GenericLvmError
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.1'
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_LVM_LOCK_TIMEOUT = 600
+
+LOCK_RETRY_DELAY_START = 0.01
+LOCK_RETRY_DELAY_MAX = 0.5
+
+READONLY_LVM_COMMANDS = (
+    'lvs', 'vgs', 'pvs', 'fullreport', 'lvdisplay', 'vgdisplay', 'pvdisplay',
+    'lvmdiskscan', 'lvmconfig', 'dumpconfig', 'config', 'formats',
+    'segtypes', 'systemid', 'tags', 'version', 'help',
+)
+"""
+LVM commands, which don't change anything and may be executed
+under a shared lock.
+"""
+
+
+# =============================================================================
+class LvmLockError(GenericLvmError):
+    """Exception class for errors on locking the LVM lockfile."""
+    pass
+
+
+# =============================================================================
+class LvmLockTimeoutError(LvmLockError):
+    """Exception class for a timeout on waiting for the LVM lock."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, lockfile, shared, timeout):
+
+        self.lockfile = lockfile
+        self.shared = shared
+        self.timeout = timeout
+
+        super(LvmLockTimeoutError, self).__init__(str(self))
+
+    # -------------------------------------------------------------------------
+    def __str__(self):
+
+        mode = 'exclusive'
+        if self.shared:
+            mode = 'shared'
+        return _(
+            "Could not get a %(mode)s lock on %(file)r "
+            "within %(to)0.1f seconds.") % {
+            'mode': mode, 'file': self.lockfile, 'to': self.timeout}
+
+
+# =============================================================================
+class LvmLockStatistics(object):
+    """
+    Thread safe collection of lock wait times.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self.reset()
+
+    # -------------------------------------------------------------------------
+    def reset(self):
+        """Resets all counters."""
+
+        with self._lock:
+            self._stats = {}
+            for mode in ('shared', 'exclusive'):
+                self._stats[mode] = {
+                    'count': 0,
+                    'contended': 0,
+                    'timeouts': 0,
+                    'wait_total': 0.0,
+                    'wait_max': 0.0,
+                }
+
+    # -------------------------------------------------------------------------
+    def record(self, shared, wait_time, contended=False, timeout=False):
+        """
+        Records a lock acquisition.
+
+        @param shared: was it a shared lock
+        @type shared: bool
+        @param wait_time: the time in seconds waiting for the lock
+        @type wait_time: float
+        @param contended: the lock could not be acquired immediately
+        @type contended: bool
+        @param timeout: the lock could not be acquired at all
+        @type timeout: bool
+
+        """
+
+        mode = 'exclusive'
+        if shared:
+            mode = 'shared'
+
+        with self._lock:
+            stats = self._stats[mode]
+            if timeout:
+                stats['timeouts'] += 1
+            else:
+                stats['count'] += 1
+            if contended:
+                stats['contended'] += 1
+            stats['wait_total'] += wait_time
+            if wait_time > stats['wait_max']:
+                stats['wait_max'] = wait_time
+
+    # -------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Gives back a copy of the counters, including the average wait time.
+
+        @rtype: dict
+        """
+
+        res = {}
+        with self._lock:
+            for mode in self._stats:
+                stats = dict(self._stats[mode])
+                stats['wait_avg'] = 0.0
+                if stats['count']:
+                    stats['wait_avg'] = stats['wait_total'] / stats['count']
+                res[mode] = stats
+
+        return res
+
+
+LVM_LOCK_STATISTICS = LvmLockStatistics()
+"""
+The process wide statistics of waiting for the LVM lock.
+"""
+
+
+# =============================================================================
+class LvmRwLock(object):
+    """
+    A reader/writer lock on a lockfile based on fcntl.flock().
+
+    A shared lock is used for read-only LVM commands (reports), an exclusive
+    lock for all other commands. Because every lock object uses its own
+    open file description, the lock works between processes as well
+    as between threads of the same process.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, lockfile, timeout=DEFAULT_LVM_LOCK_TIMEOUT, statistics=None):
+        """
+        Constructor.
+
+        @param lockfile: the lockfile to use
+        @type lockfile: str
+        @param timeout: the maximum time in seconds waiting for the lock
+        @type timeout: float
+        @param statistics: the statistics object recording the wait times,
+                           defaults to LVM_LOCK_STATISTICS
+        @type statistics: LvmLockStatistics
+
+        """
+
+        self.lockfile = lockfile
+        self.timeout = timeout
+        self.statistics = statistics
+        if self.statistics is None:
+            self.statistics = LVM_LOCK_STATISTICS
+
+        self._fd = None
+        self._shared = None
+
+    # -----------------------------------------------------------
+    @property
+    def locked(self):
+        """Is the lock currently held?"""
+        return self._fd is not None
+
+    # -----------------------------------------------------------
+    @property
+    def shared(self):
+        """Is the currently held lock a shared lock? None, if not locked."""
+        return self._shared
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+
+        return "%s(lockfile=%r, locked=%r, shared=%r)" % (
+            self.__class__.__name__, self.lockfile, self.locked, self.shared)
+
+    # -------------------------------------------------------------------------
+    def __del__(self):
+
+        self.release()
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+
+        if not self.locked:
+            self.acquire()
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.release()
+
+    # -------------------------------------------------------------------------
+    def _open(self):
+
+        lock_dir = os.path.dirname(self.lockfile)
+        if lock_dir and not os.path.isdir(lock_dir):
+            try:
+                os.makedirs(lock_dir, 0o700)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    msg = _("Could not create lock directory %(dir)r: %(e)s") % {
+                        'dir': lock_dir, 'e': e}
+                    raise LvmLockError(msg)
+
+        try:
+            return os.open(self.lockfile, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as e:
+            msg = _("Could not open lockfile %(file)r: %(e)s") % {
+                'file': self.lockfile, 'e': e}
+            raise LvmLockError(msg)
+
+    # -------------------------------------------------------------------------
+    def acquire(self, shared=False):
+        """
+        Acquires the lock in the given mode. A lock already held by this
+        object in another mode is released before, because flock() can't
+        convert a lock atomically. So another process may get the lock
+        in between.
+
+        @raise LvmLockTimeoutError: if the lock could not be acquired
+                                    within self.timeout seconds.
+        @raise LvmLockError: on other errors
+
+        @param shared: acquire a shared lock instead of an exclusive one
+        @type shared: bool
+
+        """
+
+        shared = bool(shared)
+        if self.locked:
+            if self._shared == shared:
+                return
+            self.release()
+
+        self._fd = self._open()
+
+        operation = fcntl.LOCK_EX
+        if shared:
+            operation = fcntl.LOCK_SH
+
+        start = time.time()
+        delay = LOCK_RETRY_DELAY_START
+        contended = False
+
+        while True:
+            try:
+                fcntl.flock(self._fd, operation | fcntl.LOCK_NB)
+                break
+            except (IOError, OSError) as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES, errno.EINTR):
+                    self.release()
+                    msg = _("Could not lock %(file)r: %(e)s") % {
+                        'file': self.lockfile, 'e': e}
+                    raise LvmLockError(msg)
+            contended = True
+            waited = time.time() - start
+            if self.timeout is not None and waited >= self.timeout:
+                self.statistics.record(shared, waited, contended, timeout=True)
+                self.release()
+                raise LvmLockTimeoutError(self.lockfile, shared, self.timeout)
+            time.sleep(delay)
+            delay = min(delay * 2, LOCK_RETRY_DELAY_MAX)
+
+        waited = time.time() - start
+        self.statistics.record(shared, waited, contended)
+        self._shared = shared
+
+        if contended:
+            LOG.debug(_("Waited %(sec)0.3f seconds for the LVM lock %(file)r.") % {
+                'sec': waited, 'file': self.lockfile})
+
+    # -------------------------------------------------------------------------
+    def release(self):
+        """
+        Releases the lock, if it is held.
+        """
+
+        fd = getattr(self, '_fd', None)
+        self._fd = None
+        self._shared = None
+        if fd is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+
+
+# =============================================================================
+def is_readonly_lvm_command(cmd_params):
+    """
+    Checks, whether the given parameters of 'lvm' describe
+    a read-only command.
+
+    @param cmd_params: all parameters for calling 'lvm'
+    @type cmd_params: list of str or str
+
+    @rtype: bool
+    """
+
+    if not cmd_params:
+        return False
+    if isinstance(cmd_params, (list, tuple)):
+        command = str(cmd_params[0])
+    else:
+        command = str(cmd_params).split()[0]
+
+    return command in READONLY_LVM_COMMANDS
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
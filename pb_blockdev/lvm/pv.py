@@ -0,0 +1,388 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, Berlin
+@summary: module for a encapsulation class of a LVM physical volume
+"""
+
+# Standard modules
+import os
+import logging
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.lvm import DEFAULT_LVM_LOCKFILE, DEFAULT_LVM_TIMEOUT
+
+from pb_blockdev.lvm.volume import LvmVolumeError
+from pb_blockdev.lvm.volume import LvmVolume
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+PV_REPORT_FIELDS = (
+    'pv_name', 'vg_name', 'pv_attr', 'pv_uuid', 'vg_extent_size',
+    'pv_pe_count', 'pv_pe_alloc_count', 'pv_size', 'dev_size')
+"""
+The fields of the report of 'pvs' used to fill a PhysicalVolume object.
+"""
+
+
+# =============================================================================
+class PhysicalVolume(LvmVolume):
+    """
+    Capsulation class for LVM physical volumes.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+        self, name, path=None, vgname=None, used=False, discovered=None,
+            attr=None, uuid=None,
+            lvm_command=None, lvm_lockfile=DEFAULT_LVM_LOCKFILE, lvm_timeout=DEFAULT_LVM_TIMEOUT,
+            appname=None, verbose=0, version=__version__,
+            base_dir=None, use_stderr=False, simulate=False, sudo=False,
+            quiet=False,
+            ):
+        """
+        Initialisation of the LVM physical volume object.
+
+        @raise CommandNotFoundError: if the needed commands could not be found.
+        @raise LvmVolumeError: on a uncoverable error.
+
+        @param name: name of the LVM physical volume, this is the device
+                     path as shown by 'pvs', e.g. '/dev/sdb'
+        @type name: str
+        @param path: path to the device file (under /dev), defaults to name
+        @type path: str
+        @param vgname: name of the volume group, where this PV belongs to,
+                       maybe None
+        @type vgname: str
+        @param used: is this PV initialized
+        @type used: bool
+        @param discovered: is this object already discovered?
+                           (True, False or None)
+        @type discovered: bool or None
+        @param attr: attributes of this physical volume
+        @type attr: str
+        @param uuid: the UUID of this physical volume
+        @type uuid: uuid
+
+        @param lvm_command: path to executable 'lvm' command
+        @type lvm_command: str
+        @param lvm_lockfile: the global lockfile used for lvm execution
+        @type lvm_lockfile: str
+        @param lvm_timeout: timeout for execution the lvm command
+        @type lvm_timeout: int or None
+
+        @param appname: name of the current running application
+        @type appname: str
+        @param verbose: verbose level
+        @type verbose: int
+        @param version: the version string of the current object or application
+        @type version: str
+        @param base_dir: the base directory of all operations
+        @type base_dir: str
+        @param use_stderr: a flag indicating, that on handle_error() the output
+                           should go to STDERR, even if logging has
+                           initialized logging handlers.
+        @type use_stderr: bool
+        @param simulate: don't execute actions, only display them
+        @type simulate: bool
+        @param sudo: should the command executed by sudo by default
+        @type sudo: bool
+        @param quiet: don't display ouput of action after calling
+        @type quiet: bool
+
+        @return: None
+        """
+
+        if path is None:
+            path = name
+
+        # Initialisation of the parent object
+        super(PhysicalVolume, self).__init__(
+            name=name,
+            path=path,
+            vgname=vgname,
+            attr=attr,
+            uuid=uuid,
+            used=used,
+            discovered=discovered,
+            lvm_command=lvm_command,
+            lvm_lockfile=lvm_lockfile,
+            lvm_timeout=lvm_timeout,
+            appname=appname,
+            verbose=verbose,
+            version=version,
+            base_dir=base_dir,
+            use_stderr=use_stderr,
+            simulate=simulate,
+            sudo=sudo,
+            quiet=quiet,
+        )
+
+        self._dev_size = None
+        """
+        @ivar: the size of the underlying block device in Bytes
+        @type: long
+        """
+
+        self.segments = []
+        """
+        @ivar: all allocated segments on this PV as tuples with
+               the LV name, the number of the start extent and the
+               number of extents of the segment
+        @type: list of tuples
+        """
+
+        self.initialized = True
+
+    # -----------------------------------------------------------
+    @property
+    def dev_size(self):
+        'The size of the underlying block device in Bytes.'
+
+        if not self.discovered:
+            self.discover()
+        return self._dev_size
+
+    # -----------------------------------------------------------
+    @property
+    def allocatable(self):
+        """Is this PV allocatable?"""
+
+        if not self.discovered:
+            self.discover()
+
+        if not self.attr:
+            return None
+
+        attr_str = self.attr.strip()
+        if attr_str[0] == 'a':
+            return True
+        return False
+
+    # -----------------------------------------------------------
+    @property
+    def blockdevice_name(self):
+        """
+        The name of the appropriate block device under /sys/block,
+        e.g. 'sdb' or 'dm-4'.
+        """
+
+        if not self.path:
+            return None
+        if not os.path.exists(self.path):
+            return None
+        return os.path.basename(os.path.realpath(self.path))
+
+    # -----------------------------------------------------------
+    @property
+    def blockdevice(self):
+        """
+        Returns an object of the appropriate block device class
+        of the device, where this PV lies on.
+        """
+
+        from pb_blockdev.devices import get_blockdev_class
+
+        bd_name = self.blockdevice_name
+        if not bd_name:
+            return None
+
+        bd_class = get_blockdev_class(bd_name)
+        if not bd_class:
+            return None
+
+        dev = bd_class(
+            name=bd_name,
+            appname=self.appname,
+            verbose=self.verbose,
+            base_dir=self.base_dir,
+            use_stderr=self.use_stderr,
+            simulate=self.simulate,
+            sudo=self.sudo,
+            quiet=self.quiet,
+        )
+        return dev
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        res = super(PhysicalVolume, self).as_dict(short=short)
+
+        res['dev_size'] = self.dev_size
+        res['allocatable'] = self.allocatable
+        res['blockdevice_name'] = self.blockdevice_name
+        res['segments'] = self.segments[:]
+
+        return res
+
+    # -------------------------------------------------------------------------
+    def add_segment(self, lvname, start_extent, extents):
+        """
+        Adds the given allocated segment to the list self.segments.
+
+        @param lvname: the name of the LV using this segment
+        @type lvname: str
+        @param start_extent: the number of the start extent on this PV
+        @type start_extent: int
+        @param extents: the number of extents of this segment
+        @type extents: int
+
+        @return: None
+
+        """
+
+        self.segments.append((lvname, int(start_extent), int(extents)))
+
+    # -------------------------------------------------------------------------
+    def get_attribute(self, position, char):
+        """
+        Gives back a textual description of the attribute give by the
+        position in the attr string and the attr character.
+
+        @param position: the position in the attr string (start at 0)
+        @type position: int
+        @param char: the character describing the attribute
+        @type char: str
+
+        @return: attribute description
+        @rtype: str
+
+        """
+
+        descr = "unknown_%s" % (char)
+        if position == 0:
+            if char == 'a':
+                descr = 'allocatable'
+            elif char == 'd':
+                descr = 'duplicate'
+        elif position == 1:
+            if char == 'x':
+                descr = 'exported'
+            elif char == 'u':
+                descr = 'used'
+        elif position == 2:
+            if char == 'm':
+                descr = 'missing'
+
+        return descr
+
+    # -------------------------------------------------------------------------
+    def init_from_report(self, fields):
+        """
+        Sets all properties of this PV from the fields of a line
+        of the 'pvs' report.
+
+        @param fields: the values of the report fields, the keys are
+                       the field names from PV_REPORT_FIELDS
+        @type fields: dict
+
+        @return: None
+
+        """
+
+        vgname = fields['vg_name'].strip()
+        if vgname == '':
+            vgname = None
+        self._vgname = vgname
+        self.attr = fields['pv_attr'].strip()
+        self._uuid = fields['pv_uuid'].strip()
+        self.used = True
+        self.segments = []
+
+        self.discovered = True
+
+        extent_size = fields['vg_extent_size'].strip()
+        if extent_size == '':
+            extent_size = 0
+        self.extent_size = extent_size
+        self.set_extent_count(
+            int(fields['pv_pe_count']), int(fields['pv_pe_alloc_count']))
+
+        self._dev_size = int(fields['dev_size'])
+        if not self.extent_size:
+            # An orphaned PV without extents
+            self._total = int(fields['pv_size'])
+            self._allocated = 0
+            self._free = self._total
+
+    # -------------------------------------------------------------------------
+    def discover(self):
+        """
+        Discovers the current PV object by calling 'pvs'
+
+        @raise LvmVolumeError: on some error calling the discover command.
+
+        @return: success of discovering
+
+        """
+
+        if self.verbose > 2:
+            LOG.debug(_("Discovering physical volume %r ..."), self.name)
+
+        self.discovered = False
+
+        cmd_params = [
+            "pvs",
+            "--nosuffix",
+            "--noheadings",
+            "--units",
+            "b",
+            "--separator",
+            ";",
+            "-o",
+            ','.join(PV_REPORT_FIELDS),
+            self.name
+        ]
+
+        (ret_code, std_out, std_err) = self.exec_lvm(
+            cmd_params, quiet=True, simulate=False, force=True)
+        if ret_code:
+            if ret_code == 5:
+                LOG.debug(_("Physical volume %r not found."), self.name)
+                return False
+            msg = _("Error %(rc)d getting LVM physical volume %(name)s: %(msg)s") % {
+                'rc': ret_code, 'name': self.name, 'msg': std_err}
+            raise LvmVolumeError(msg)
+
+        for line in std_out.splitlines():
+
+            line = line.strip()
+            if line == '':
+                continue
+
+            words = line.split(";")
+            fields = dict(zip(PV_REPORT_FIELDS, words))
+            self.init_from_report(fields)
+            break
+
+        return self.discovered
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,574 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, Berlin
+@summary: module for a persistent 'lvm shell' session
+"""
+
+# Standard modules
+import os
+import sys
+import time
+import json
+import errno
+import pipes
+import select
+import logging
+import threading
+import subprocess
+
+from collections import OrderedDict
+
+# Third party modules
+
+# Own modules
+from pb_base.object import PbBaseObject
+
+from pb_blockdev.lvm import LVM_BIN_PATH, DEFAULT_LVM_TIMEOUT
+from pb_blockdev.lvm import LvmExecError
+from pb_blockdev.lvm import LvmTimeoutError
+
+from pb_blockdev.tools import TOOLS
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.2.2'
+
+LOG = logging.getLogger(__name__)
+
+LVM_SHELL_PROMPT = 'lvm> '
+
+DEFAULT_LVM_SHELL_MAX_RESTARTS = 3
+
+# Internal return codes of LVM commands, as reported in the command log
+LVM_ECMD_PROCESSED = 1
+
+# Options of a report command, which are meaningless for
+# JSON reports and which are applied during rendering
+REPORT_TEXT_OPTIONS_WITH_ARG = ('--separator', )
+REPORT_TEXT_OPTIONS = ('--noheadings', '--aligned', '--unbuffered')
+REPORT_FIELD_OPTIONS = ('-o', '--options')
+
+
+# =============================================================================
+class LvmShellError(LvmExecError):
+    """Exception class for errors in communication with 'lvm shell'."""
+    pass
+
+
+# =============================================================================
+class LvmShell(PbBaseObject):
+    """
+    Encapsulation of a long-lived 'lvm shell' process.
+
+    Each command is written as a single line to STDIN of the shell.
+    The response is framed by the next shell prompt on STDOUT and by a
+    complete JSON document on the file descriptor given in the
+    environment variable LVM_REPORT_FD. The JSON document contains the
+    report (if any) and the command log including the return code.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+        self, lvm_command=LVM_BIN_PATH, timeout=DEFAULT_LVM_TIMEOUT,
+            max_restarts=DEFAULT_LVM_SHELL_MAX_RESTARTS,
+            appname=None, verbose=0, version=__version__, base_dir=None,
+            use_stderr=False,
+            ):
+        """
+        Initialisation of the lvm shell object. The shell process itself
+        is started on the first command.
+
+        @param lvm_command: path to executable 'lvm' command
+        @type lvm_command: str
+        @param timeout: timeout in seconds for a single command
+        @type timeout: int
+        @param max_restarts: the maximum number of consecutive failed
+                             sessions, before the shell is disabled
+        @type max_restarts: int
+
+        @param appname: name of the current running application
+        @type appname: str
+        @param verbose: verbose level
+        @type verbose: int
+        @param version: the version string of the current object or application
+        @type version: str
+        @param base_dir: the base directory of all operations
+        @type base_dir: str
+        @param use_stderr: a flag indicating, that on handle_error() the output
+                           should go to STDERR, even if logging has
+                           initialized logging handlers.
+        @type use_stderr: bool
+
+        @return: None
+        """
+
+        super(LvmShell, self).__init__(
+            appname=appname,
+            verbose=verbose,
+            version=version,
+            base_dir=base_dir,
+            use_stderr=use_stderr,
+            initialized=False,
+        )
+
+        self.lvm_command = lvm_command
+        """
+        @ivar: the 'lvm' command in operating system
+        @type: str
+        """
+
+        self.timeout = timeout
+        """
+        @ivar: timeout in seconds for a single command
+        @type: int
+        """
+
+        self.max_restarts = int(max_restarts)
+        """
+        @ivar: the maximum number of consecutive failed sessions
+        @type: int
+        """
+
+        self.failures = 0
+        """
+        @ivar: the number of consecutive failed sessions
+        @type: int
+        """
+
+        self.starts = 0
+        """
+        @ivar: the number of started shell processes
+        @type: int
+        """
+
+        self.commands = 0
+        """
+        @ivar: the number of commands executed in the shell
+        @type: int
+        """
+
+        self._proc = None
+        self._report_fd = None
+
+        self._lock = threading.RLock()
+        """
+        @ivar: serializes the commands of different threads to the shell
+        @type: threading.RLock
+        """
+
+        self.initialized = True
+
+    # -----------------------------------------------------------
+    @property
+    def running(self):
+        """Is the shell process currently running?"""
+        if self._proc is None:
+            return False
+        return self._proc.poll() is None
+
+    # -----------------------------------------------------------
+    @property
+    def disabled(self):
+        """Is the shell disabled because of too many failures?"""
+        return self.failures >= self.max_restarts
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        res = super(LvmShell, self).as_dict(short=short)
+        res['lvm_command'] = self.lvm_command
+        res['timeout'] = self.timeout
+        res['max_restarts'] = self.max_restarts
+        res['failures'] = self.failures
+        res['starts'] = self.starts
+        res['commands'] = self.commands
+        res['running'] = self.running
+        res['disabled'] = self.disabled
+
+        return res
+
+    # -------------------------------------------------------------------------
+    def __del__(self):
+        """
+        Destructor, terminates the shell process.
+        """
+
+        self.close()
+
+    # -------------------------------------------------------------------------
+    def start(self):
+        """
+        Starts a new 'lvm shell' process and waits for its first prompt.
+
+        @raise LvmShellError: if the shell could not be started.
+        """
+
+        self.close()
+
+        if TOOLS.find('lvm', LVM_BIN_PATH) == self.lvm_command:
+            if not TOOLS.has_capability('lvm', 'json'):
+                msg = _(
+                    "%(cmd)r doesn't support JSON reports (%(version)s).") % {
+                    'cmd': self.lvm_command, 'version': TOOLS.version('lvm', ['version'])}
+                raise LvmShellError(msg)
+
+        (report_rfd, report_wfd) = os.pipe()
+        env = dict(os.environ)
+        env['LVM_REPORT_FD'] = str(report_wfd)
+        env['LVM_SUPPRESS_FD_WARNINGS'] = '1'
+        env['LC_ALL'] = 'C'
+
+        popen_args = {}
+        if sys.version_info[0] > 2:
+            popen_args['pass_fds'] = (report_wfd, )
+        else:
+            popen_args['close_fds'] = False
+
+        cmd = [self.lvm_command, 'shell']
+        if self.verbose > 1:
+            LOG.debug(_("Starting %r ..."), ' '.join(cmd))
+
+        try:
+            self._proc = subprocess.Popen(
+                cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE, env=env, **popen_args)
+        except OSError as e:
+            os.close(report_rfd)
+            os.close(report_wfd)
+            self.failures += 1
+            msg = _("Could not start %(cmd)r: %(e)s") % {
+                'cmd': ' '.join(cmd), 'e': e}
+            raise LvmShellError(msg)
+
+        os.close(report_wfd)
+        self._report_fd = report_rfd
+        self.starts += 1
+
+        try:
+            self._read_response(' '.join(cmd), need_report=False)
+        except LvmExecError:
+            self.failures += 1
+            self.close()
+            raise
+
+    # -------------------------------------------------------------------------
+    def ensure_running(self):
+        """
+        Starts the shell process, if it is not running.
+
+        @raise LvmShellError: if the shell could not be started.
+        """
+
+        with self._lock:
+            if not self.running:
+                self.start()
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        """
+        Terminates the shell process, if there is one.
+        """
+
+        proc = getattr(self, '_proc', None)
+        self._proc = None
+        if proc is not None:
+            try:
+                if proc.poll() is None:
+                    proc.stdin.write(b'exit\n')
+                    proc.stdin.flush()
+            except (IOError, OSError):
+                pass
+            for fh in (proc.stdin, proc.stdout, proc.stderr):
+                try:
+                    fh.close()
+                except (IOError, OSError):
+                    pass
+            if proc.poll() is None:
+                try:
+                    proc.kill()
+                except OSError:
+                    pass
+            proc.wait()
+
+        if getattr(self, '_report_fd', None) is not None:
+            try:
+                os.close(self._report_fd)
+            except OSError:
+                pass
+            self._report_fd = None
+
+    # -------------------------------------------------------------------------
+    def _read_response(self, cmd_str, need_report=True):
+        """
+        Reads STDOUT, STDERR and the report descriptor of the shell,
+        until the next prompt has appeared on STDOUT and a complete
+        JSON document was read from the report descriptor.
+
+        @raise LvmTimeoutError: if the response was not complete in time
+        @raise LvmShellError: if the shell has died
+
+        @return: a tuple of output on STDOUT, output on STDERR and
+                 the parsed JSON report (or None)
+        @rtype: tuple
+        """
+
+        fds = {
+            self._proc.stdout.fileno(): [],
+            self._proc.stderr.fileno(): [],
+            self._report_fd: [],
+        }
+        stdout_fd = self._proc.stdout.fileno()
+        prompt = LVM_SHELL_PROMPT.encode('utf-8')
+        deadline = time.time() + self.timeout
+
+        got_prompt = False
+        report = None
+
+        while True:
+
+            if got_prompt:
+                if not need_report:
+                    break
+                raw = b''.join(fds[self._report_fd]).strip()
+                if raw:
+                    try:
+                        report = json.loads(
+                            raw.decode('utf-8'), object_pairs_hook=OrderedDict)
+                        break
+                    except ValueError:
+                        pass
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise LvmTimeoutError(self.timeout, cmd_str)
+
+            try:
+                (readable, _w, _x) = select.select(list(fds.keys()), [], [], remaining)
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            for fd in readable:
+                data = os.read(fd, 65536)
+                if not data:
+                    msg = _("The lvm shell terminated unexpectedly on executing %r.") % (
+                        cmd_str)
+                    raise LvmShellError(msg)
+                fds[fd].append(data)
+                if fd == stdout_fd:
+                    if b''.join(fds[fd]).endswith(prompt):
+                        got_prompt = True
+
+        std_out = b''.join(fds[stdout_fd])[:-len(prompt)].decode('utf-8', 'replace')
+        std_err = b''.join(fds[self._proc.stderr.fileno()]).decode('utf-8', 'replace')
+
+        return (std_out, std_err, report)
+
+    # -------------------------------------------------------------------------
+    def _split_params(self, cmd_params):
+        """
+        Splits the given parameters into the parameters for the shell
+        and the options for rendering the JSON report as text.
+
+        The fields requested by '-o' are kept in the parameters and
+        additionally given back as the order of the rendered columns.
+        """
+
+        params = []
+        opts = {'separator': ' ', 'headings': True, 'fields': None}
+
+        i = 0
+        while i < len(cmd_params):
+            p = str(cmd_params[i])
+            if p in REPORT_TEXT_OPTIONS_WITH_ARG and i + 1 < len(cmd_params):
+                opts[p[2:]] = str(cmd_params[i + 1])
+                i += 2
+                continue
+            if p in REPORT_FIELD_OPTIONS and i + 1 < len(cmd_params):
+                value = str(cmd_params[i + 1])
+                # '+field' extends the default fields, whose order is
+                # unknown here
+                if not value.startswith('+'):
+                    if opts['fields'] is None:
+                        opts['fields'] = []
+                    opts['fields'] += [x.strip() for x in value.split(',') if x.strip()]
+                params += [p, value]
+                i += 2
+                continue
+            if p == '--noheadings':
+                opts['headings'] = False
+            if p not in REPORT_TEXT_OPTIONS:
+                params.append(p)
+            i += 1
+
+        return (params, opts)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def render_report(report, separator=' ', headings=True, fields=None):
+        """
+        Renders the rows of a JSON report as text lines in the same
+        manner as the report commands do it with '--separator'.
+
+        The columns are ordered by the given fields, the order of the keys
+        in the JSON report is only used for fields not requested by name
+        (e.g. field name aliases).
+
+        @param report: the parsed JSON report
+        @type report: dict
+        @param separator: the separator between the field values
+        @type separator: str
+        @param headings: output a line with the field names
+        @type headings: bool
+        @param fields: the requested report fields in the order of '-o'
+        @type fields: list of str or None
+
+        @return: the report as text
+        @rtype: str
+        """
+
+        lines = []
+        if not report:
+            return ''
+
+        for section in report.get('report', []):
+            for rows in section.values():
+                first = True
+                for row in rows:
+                    keys = list(row.keys())
+                    if fields:
+                        keys = [x for x in fields if x in row] + [
+                            x for x in keys if x not in fields]
+                    if first and headings:
+                        lines.append('  ' + separator.join(keys))
+                    first = False
+                    lines.append('  ' + separator.join(
+                        [str(row[x]) for x in keys]))
+
+        if not lines:
+            return ''
+        return '\n'.join(lines) + '\n'
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def report_ret_code(report):
+        """
+        Evaluates the return code and the error messages of a command
+        from its command log.
+
+        @return: the return code (0 on success) and the error messages
+        @rtype: tuple of int and str
+        """
+
+        ret_code = 0
+        errors = []
+        if not report:
+            return (ret_code, '')
+
+        for entry in report.get('log', []):
+            if entry.get('log_type') == 'error':
+                errors.append(entry.get('log_message', ''))
+            elif entry.get('log_type') == 'status':
+                code = int(entry.get('log_ret_code', LVM_ECMD_PROCESSED))
+                if code == LVM_ECMD_PROCESSED:
+                    ret_code = 0
+                else:
+                    ret_code = code
+
+        msg = ''
+        if errors:
+            msg = '\n'.join(errors) + '\n'
+        return (ret_code, msg)
+
+    # -------------------------------------------------------------------------
+    def execute(self, cmd_params):
+        """
+        Executes the given LVM command in the shell. The shell process
+        is (re)started, if necessary. Commands of different threads
+        are serialized.
+
+        @raise LvmTimeoutError: on timeout, the shell will be terminated
+        @raise LvmShellError: on a failed communication with the shell,
+                              the shell will be terminated
+
+        @param cmd_params: all parameters for the LVM command
+        @type cmd_params: list of str
+
+        @return: a tuple of::
+            - return value of the LVM command,
+            - output on STDOUT (with the rendered report),
+            - output on STDERR
+        """
+
+        with self._lock:
+            return self._execute(cmd_params)
+
+    # -------------------------------------------------------------------------
+    def _execute(self, cmd_params):
+        """
+        Executes the given LVM command in the shell, see execute().
+        """
+
+        if not self.running:
+            self.start()
+
+        (params, opts) = self._split_params(cmd_params)
+        params += ['--reportformat', 'json', '--config', 'log/report_command_log=1']
+        cmd_str = ' '.join(map(lambda x: pipes.quote(x), params))
+
+        if self.verbose > 2:
+            LOG.debug(_("Executing in lvm shell:") + " %s", cmd_str)
+
+        try:
+            self._proc.stdin.write((cmd_str + '\n').encode('utf-8'))
+            self._proc.stdin.flush()
+            (std_out, std_err, report) = self._read_response(cmd_str)
+        except LvmExecError:
+            # Must be caught before IOError, because LvmTimeoutError
+            # is derived from both
+            self.failures += 1
+            self.close()
+            raise
+        except (IOError, OSError) as e:
+            self.failures += 1
+            self.close()
+            msg = _("Error communicating with the lvm shell on %(cmd)r: %(e)s") % {
+                'cmd': cmd_str, 'e': e}
+            raise LvmShellError(msg)
+
+        self.failures = 0
+        self.commands += 1
+
+        (ret_code, errors) = self.report_ret_code(report)
+        std_out += self.render_report(
+            report, opts['separator'], opts['headings'], opts['fields'])
+        std_err += errors
+
+        return (ret_code, std_out, std_err)
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
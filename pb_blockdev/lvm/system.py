@@ -0,0 +1,402 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, Berlin
+@summary: Module for a bulk discovery of all LVM objects of the system
+"""
+
+# Standard modules
+import os
+import sys
+import logging
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.lvm import GenericLvmError
+from pb_blockdev.lvm import GenericLvmHandler
+from pb_blockdev.lvm import DEFAULT_LVM_LOCKFILE, DEFAULT_LVM_TIMEOUT
+
+from pb_blockdev.lvm.vg import VG_REPORT_FIELDS
+from pb_blockdev.lvm.vg import VolumeGroup
+
+from pb_blockdev.lvm.pv import PV_REPORT_FIELDS
+from pb_blockdev.lvm.pv import PhysicalVolume
+
+from pb_blockdev.lvm.lv import LogicalVolume
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.1'
+
+LOG = logging.getLogger(__name__)
+
+if sys.version_info[0] > 2:
+    basestring = str
+
+PVSEG_REPORT_FIELDS = PV_REPORT_FIELDS + (
+    'lv_name', 'lv_attr', 'lv_uuid', 'lv_size', 'pvseg_start', 'pvseg_size')
+"""
+The fields of the report of 'pvs --segments' used by LvmSystem.
+"""
+
+
+# =============================================================================
+class LvmSystemError(GenericLvmError):
+    """Base exception class for errors in the LVM system handler."""
+    pass
+
+
+# =============================================================================
+class LvmSystem(GenericLvmHandler):
+    """
+    Object for capsulating all volume groups, physical volumes and
+    logical volumes of the system. All of them are discovered
+    by one call of 'vgs' and one call of 'pvs' during refresh().
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+        self, lvm_command=None, lvm_lockfile=DEFAULT_LVM_LOCKFILE,
+            lvm_timeout=DEFAULT_LVM_TIMEOUT, appname=None, verbose=0,
+            version=__version__, base_dir=None, use_stderr=False,
+            initialized=False, simulate=False, sudo=False, quiet=False,
+            ):
+        """
+        Initialisation of the LVM system handler object.
+
+        @raise CommandNotFoundError: if the needed commands could not be found.
+        @raise LvmSystemError: on a uncoverable error.
+
+        @param lvm_command: path to executable 'lvm' command
+        @type lvm_command: str
+        @param lvm_lockfile: the global lockfile used for lvm execution
+        @type lvm_lockfile: str
+        @param lvm_timeout: timeout for execution the lvm command
+        @type lvm_timeout: int or None
+
+        @param appname: name of the current running application
+        @type appname: str
+        @param verbose: verbose level
+        @type verbose: int
+        @param version: the version string of the current object or application
+        @type version: str
+        @param base_dir: the base directory of all operations
+        @type base_dir: str
+        @param use_stderr: a flag indicating, that on handle_error() the output
+                           should go to STDERR, even if logging has
+                           initialized logging handlers.
+        @type use_stderr: bool
+        @param initialized: initialisation is complete after __init__()
+                            of this object
+        @type initialized: bool
+        @param simulate: don't execute actions, only display them
+        @type simulate: bool
+        @param sudo: should the command executed by sudo by default
+        @type sudo: bool
+        @param quiet: don't display ouput of action after calling
+        @type quiet: bool
+
+        @return: None
+
+        """
+
+        # Initialisation of the parent object
+        super(LvmSystem, self).__init__(
+            lvm_command=lvm_command,
+            lvm_lockfile=lvm_lockfile,
+            lvm_timeout=lvm_timeout,
+            appname=appname,
+            verbose=verbose,
+            version=version,
+            base_dir=base_dir,
+            use_stderr=use_stderr,
+            simulate=simulate,
+            sudo=sudo,
+            quiet=quiet,
+        )
+
+        self.vgs = {}
+        """
+        @ivar: all volume groups of the system, the keys are the VG names
+        @type: dict
+        """
+
+        self.pvs = {}
+        """
+        @ivar: all physical volumes of the system, the keys are the
+               PV names (device paths)
+        @type: dict
+        """
+
+        self.lvs = {}
+        """
+        @ivar: all logical volumes of the system, the keys are
+               in the form 'vgname/lvname'
+        @type: dict
+        """
+
+        self.pv_by_blockdev = {}
+        """
+        @ivar: all physical volumes of the system, the keys are the names
+               of the underlying block devices (e.g. 'sdb' or 'dm-3')
+        @type: dict
+        """
+
+        if initialized:
+            self.initialized = True
+            if self.verbose > 3:
+                LOG.debug(_("Initialized."))
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        res = super(LvmSystem, self).as_dict(short=short)
+
+        res['vgs'] = sorted(self.vgs.keys())
+        res['pvs'] = sorted(self.pvs.keys())
+        res['lvs'] = sorted(self.lvs.keys())
+        res['pv_by_blockdev'] = {}
+        for bd_name in self.pv_by_blockdev:
+            res['pv_by_blockdev'][bd_name] = self.pv_by_blockdev[bd_name].name
+
+        return res
+
+    # -------------------------------------------------------------------------
+    def _volume_params(self):
+        """
+        Gives back the common parameters for the initialisation
+        of VG, PV and LV objects, derived from the current object.
+        """
+
+        return {
+            'lvm_command': self.lvm_command,
+            'lvm_lockfile': self.lvm_lockfile,
+            'lvm_timeout': self.lvm_timeout,
+            'appname': self.appname,
+            'verbose': self.verbose,
+            'base_dir': self.base_dir,
+            'use_stderr': self.use_stderr,
+            'simulate': self.simulate,
+            'sudo': self.sudo,
+            'quiet': self.quiet,
+        }
+
+    # -------------------------------------------------------------------------
+    def _report(self, command, fields, extra_params=None):
+        """
+        Executes the given LVM report command and gives back the
+        lines of its output splitted into dicts.
+
+        @raise LvmSystemError: on an error executing the command
+
+        @param command: the LVM report command ('vgs', 'pvs' ...)
+        @type command: str
+        @param fields: the names of the report fields
+        @type fields: tuple of str
+        @param extra_params: additional parameters for the report command
+        @type extra_params: list of str
+
+        @return: all lines of the report
+        @rtype: list of dict
+
+        """
+
+        cmd_params = self._report_params(command, fields, extra_params)
+
+        (ret_code, std_out, std_err) = self.exec_lvm(
+            cmd_params, quiet=True, simulate=False, force=True)
+
+        return self._parse_report(command, fields, ret_code, std_out, std_err)
+
+    # -------------------------------------------------------------------------
+    def _report_params(self, command, fields, extra_params=None):
+        """
+        Gives back the parameters of 'lvm' for the given report command.
+        """
+
+        cmd_params = [
+            command,
+            "--nosuffix",
+            "--noheadings",
+            "--units",
+            "b",
+            "--separator",
+            ";",
+        ]
+        if extra_params:
+            cmd_params += extra_params
+        cmd_params += ["-o", ','.join(fields)]
+
+        return cmd_params
+
+    # -------------------------------------------------------------------------
+    def _parse_report(self, command, fields, ret_code, std_out, std_err):
+        """
+        Splits the output of the given report command into dicts.
+
+        @raise LvmSystemError: on an error executing the command
+
+        @return: all lines of the report
+        @rtype: list of dict
+        """
+
+        if ret_code:
+            msg = _("Error %(rc)d executing %(cmd)r: %(msg)s") % {
+                'rc': ret_code, 'cmd': command, 'msg': std_err}
+            raise LvmSystemError(msg)
+
+        result = []
+        for line in std_out.splitlines():
+            line = line.strip()
+            if line == '':
+                continue
+            words = line.split(";")
+            result.append(dict(zip(fields, words)))
+
+        return result
+
+    # -------------------------------------------------------------------------
+    def refresh(self):
+        """
+        Discovers all volume groups, physical volumes and logical volumes
+        of the system by one call of 'vgs' and one call of 'pvs --segments'
+        and links them together.
+
+        @raise LvmSystemError: on an error executing the LVM commands
+
+        @return: None
+
+        """
+
+        if self.verbose > 1:
+            LOG.debug(_("Discovering all LVM objects of the system ..."))
+
+        vg_rows = self._report('vgs', VG_REPORT_FIELDS)
+        pv_rows = self._report('pvs', PVSEG_REPORT_FIELDS, ['--segments'])
+
+        self._init_from_reports(vg_rows, pv_rows)
+
+    # -------------------------------------------------------------------------
+    def _init_from_reports(self, vg_rows, pv_rows):
+        """
+        Creates and links all VG, PV and LV objects from the lines of
+        the reports of 'vgs' and 'pvs --segments'.
+
+        @param vg_rows: the lines of the report of 'vgs'
+        @type vg_rows: list of dict
+        @param pv_rows: the lines of the report of 'pvs --segments'
+        @type pv_rows: list of dict
+
+        @return: None
+        """
+
+        params = self._volume_params()
+
+        vgs = {}
+        pvs = {}
+        lvs = {}
+        pv_by_blockdev = {}
+
+        for fields in vg_rows:
+            vgname = fields['vg_name'].strip()
+            vg = VolumeGroup(vgname, **params)
+            vg.init_from_report(fields)
+            vgs[vgname] = vg
+
+        for fields in pv_rows:
+
+            pvname = fields['pv_name'].strip()
+            pv = pvs.get(pvname)
+            if pv is None:
+                pv = PhysicalVolume(pvname, **params)
+                pv.init_from_report(fields)
+                pvs[pvname] = pv
+                bd_name = pv.blockdevice_name
+                if bd_name:
+                    pv_by_blockdev[bd_name] = pv
+                if pv.vgname and pv.vgname in vgs:
+                    vgs[pv.vgname].pvs.append(pv)
+
+            lvname = fields['lv_name'].strip()
+            if not lvname or not pv.vgname:
+                # Free segment or orphaned PV
+                continue
+            if lvname.startswith('[') and lvname.endswith(']'):
+                # Hidden LV
+                lvname = lvname[1:-1]
+
+            start = int(fields['pvseg_start'])
+            pv.add_segment(lvname, start, int(fields['pvseg_size']))
+
+            cname = pv.vgname + '/' + lvname
+            lv = lvs.get(cname)
+            if lv is None:
+                lv = LogicalVolume(
+                    lvname, os.path.join(os.sep, 'dev', pv.vgname, lvname),
+                    pv.vgname, used=True, discovered=True,
+                    attr=fields['lv_attr'].strip(),
+                    uuid=fields['lv_uuid'].strip(),
+                    total=int(fields['lv_size']),
+                    extent_size=int(fields['vg_extent_size']), **params)
+                lvs[cname] = lv
+                if pv.vgname in vgs:
+                    vgs[pv.vgname].lvs.append(lv)
+            lv.add_device(pvname, start)
+
+        self.vgs = vgs
+        self.pvs = pvs
+        self.lvs = lvs
+        self.pv_by_blockdev = pv_by_blockdev
+
+        if self.verbose > 2:
+            LOG.debug(_(
+                "Found %(vgs)d volume groups, %(pvs)d physical volumes and "
+                "%(lvs)d logical volumes.") % {
+                'vgs': len(vgs), 'pvs': len(pvs), 'lvs': len(lvs)})
+
+    # -------------------------------------------------------------------------
+    def get_pv_for_blockdevice(self, blockdevice):
+        """
+        Gives back the physical volume, which lies on the given
+        block device.
+
+        @param blockdevice: the block device object or the name of the
+                            block device (e.g. 'sdb') or its device path
+        @type blockdevice: BlockDevice or str
+
+        @return: the appropriate physical volume or None
+        @rtype: PhysicalVolume or None
+
+        """
+
+        if isinstance(blockdevice, basestring):
+            bd_name = os.path.basename(os.path.realpath(blockdevice))
+        else:
+            bd_name = blockdevice.name
+
+        return self.pv_by_blockdev.get(bd_name)
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
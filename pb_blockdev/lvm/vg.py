@@ -0,0 +1,349 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, Berlin
+@summary: module for a encapsulation class of a LVM volume group
+"""
+
+# Standard modules
+import logging
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.lvm import DEFAULT_LVM_LOCKFILE, DEFAULT_LVM_TIMEOUT
+
+from pb_blockdev.lvm.volume import LvmVolumeError
+from pb_blockdev.lvm.volume import LvmVolume
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+VG_REPORT_FIELDS = (
+    'vg_name', 'vg_attr', 'vg_uuid', 'vg_extent_size', 'vg_extent_count',
+    'vg_free_count', 'pv_count', 'lv_count')
+"""
+The fields of the report of 'vgs' used to fill a VolumeGroup object.
+"""
+
+
+# =============================================================================
+class VolumeGroup(LvmVolume):
+    """
+    Capsulation class for LVM volume groups.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+        self, name, used=False, discovered=None, attr=None, uuid=None,
+            lvm_command=None, lvm_lockfile=DEFAULT_LVM_LOCKFILE, lvm_timeout=DEFAULT_LVM_TIMEOUT,
+            appname=None, verbose=0, version=__version__,
+            base_dir=None, use_stderr=False, simulate=False, sudo=False,
+            quiet=False,
+            ):
+        """
+        Initialisation of the LVM volume group object.
+
+        @raise CommandNotFoundError: if the needed commands could not be found.
+        @raise LvmVolumeError: on a uncoverable error.
+
+        @param name: name of the LVM volume group
+        @type name: str
+        @param used: is this VG used
+        @type used: bool
+        @param discovered: is this object already discovered?
+                           (True, False or None)
+        @type discovered: bool or None
+        @param attr: attributes of this volume group
+        @type attr: str
+        @param uuid: the UUID of this volume group
+        @type uuid: uuid
+
+        @param lvm_command: path to executable 'lvm' command
+        @type lvm_command: str
+        @param lvm_lockfile: the global lockfile used for lvm execution
+        @type lvm_lockfile: str
+        @param lvm_timeout: timeout for execution the lvm command
+        @type lvm_timeout: int or None
+
+        @param appname: name of the current running application
+        @type appname: str
+        @param verbose: verbose level
+        @type verbose: int
+        @param version: the version string of the current object or application
+        @type version: str
+        @param base_dir: the base directory of all operations
+        @type base_dir: str
+        @param use_stderr: a flag indicating, that on handle_error() the output
+                           should go to STDERR, even if logging has
+                           initialized logging handlers.
+        @type use_stderr: bool
+        @param simulate: don't execute actions, only display them
+        @type simulate: bool
+        @param sudo: should the command executed by sudo by default
+        @type sudo: bool
+        @param quiet: don't display ouput of action after calling
+        @type quiet: bool
+
+        @return: None
+        """
+
+        # Initialisation of the parent object
+        super(VolumeGroup, self).__init__(
+            name=name,
+            path=None,
+            vgname=name,
+            attr=attr,
+            uuid=uuid,
+            used=used,
+            discovered=discovered,
+            lvm_command=lvm_command,
+            lvm_lockfile=lvm_lockfile,
+            lvm_timeout=lvm_timeout,
+            appname=appname,
+            verbose=verbose,
+            version=version,
+            base_dir=base_dir,
+            use_stderr=use_stderr,
+            simulate=simulate,
+            sudo=sudo,
+            quiet=quiet,
+        )
+
+        self._pv_count = None
+        """
+        @ivar: the number of PVs of this VG as reported by 'vgs'
+        @type: int
+        """
+
+        self._lv_count = None
+        """
+        @ivar: the number of LVs of this VG as reported by 'vgs'
+        @type: int
+        """
+
+        self.pvs = []
+        """
+        @ivar: all physical volumes of this VG, filled by LvmSystem
+        @type: list of PhysicalVolume
+        """
+
+        self.lvs = []
+        """
+        @ivar: all logical volumes of this VG, filled by LvmSystem
+        @type: list of LogicalVolume
+        """
+
+        self.initialized = True
+
+    # -----------------------------------------------------------
+    @property
+    def pv_count(self):
+        'The number of physical volumes of this VG.'
+
+        if not self.discovered:
+            self.discover()
+        return self._pv_count
+
+    # -----------------------------------------------------------
+    @property
+    def lv_count(self):
+        'The number of logical volumes of this VG.'
+
+        if not self.discovered:
+            self.discover()
+        return self._lv_count
+
+    # -----------------------------------------------------------
+    @property
+    def exported(self):
+        """Is this VG exported?"""
+
+        if not self.discovered:
+            self.discover()
+
+        if not self.attr:
+            return None
+
+        attr_str = self.attr.strip()
+        if len(attr_str) > 2 and attr_str[2] == 'x':
+            return True
+        return False
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        res = super(VolumeGroup, self).as_dict(short=short)
+
+        res['pv_count'] = self.pv_count
+        res['lv_count'] = self.lv_count
+        res['exported'] = self.exported
+        res['pvs'] = [x.name for x in self.pvs]
+        res['lvs'] = [x.name for x in self.lvs]
+
+        return res
+
+    # -------------------------------------------------------------------------
+    def exists(self):
+        """
+        Checks the existence of the volume group by calling 'vgs'.
+
+        @return: exists or not
+        @rtype: bool
+        """
+
+        return self.discover()
+
+    # -------------------------------------------------------------------------
+    def get_attribute(self, position, char):
+        """
+        Gives back a textual description of the attribute give by the
+        position in the attr string and the attr character.
+
+        @param position: the position in the attr string (start at 0)
+        @type position: int
+        @param char: the character describing the attribute
+        @type char: str
+
+        @return: attribute description
+        @rtype: str
+
+        """
+
+        descr = "unknown_%s" % (char)
+        if position == 0:
+            if char == 'w':
+                descr = 'writeable'
+            elif char == 'r':
+                descr = 'readonly'
+        elif position == 1:
+            if char == 'z':
+                descr = 'resizeable'
+        elif position == 2:
+            if char == 'x':
+                descr = 'exported'
+        elif position == 3:
+            if char == 'p':
+                descr = 'partial'
+        elif position == 4:
+            if char == 'c':
+                descr = 'contiguous'
+            elif char == 'l':
+                descr = 'cling'
+            elif char == 'n':
+                descr = 'normal'
+            elif char == 'a':
+                descr = 'anywhere'
+        elif position == 5:
+            if char == 'c':
+                descr = 'clustered'
+            elif char == 's':
+                descr = 'shared'
+
+        return descr
+
+    # -------------------------------------------------------------------------
+    def init_from_report(self, fields):
+        """
+        Sets all properties of this VG from the fields of a line
+        of the 'vgs' report.
+
+        @param fields: the values of the report fields, the keys are
+                       the field names from VG_REPORT_FIELDS
+        @type fields: dict
+
+        @return: None
+
+        """
+
+        self.attr = fields['vg_attr'].strip()
+        self._uuid = fields['vg_uuid'].strip()
+        self._pv_count = int(fields['pv_count'])
+        self._lv_count = int(fields['lv_count'])
+        self.used = True
+
+        self.discovered = True
+
+        self.extent_size = int(fields['vg_extent_size'])
+        total = int(fields['vg_extent_count'])
+        free = int(fields['vg_free_count'])
+        self.set_extent_count(total, total - free)
+
+    # -------------------------------------------------------------------------
+    def discover(self):
+        """
+        Discovers the current VG object by calling 'vgs'
+
+        @raise LvmVolumeError: on some error calling the discover command.
+
+        @return: success of discovering
+
+        """
+
+        if self.verbose > 2:
+            LOG.debug(_("Discovering volume group %r ..."), self.name)
+
+        self.discovered = False
+
+        cmd_params = [
+            "vgs",
+            "--nosuffix",
+            "--noheadings",
+            "--units",
+            "b",
+            "--separator",
+            ";",
+            "-o",
+            ','.join(VG_REPORT_FIELDS),
+            self.name
+        ]
+
+        (ret_code, std_out, std_err) = self.exec_lvm(
+            cmd_params, quiet=True, simulate=False, force=True)
+        if ret_code:
+            if ret_code == 5:
+                LOG.debug(_("Volume group %r not found."), self.name)
+                return False
+            msg = _("Error %(rc)d getting LVM volume group %(name)s: %(msg)s") % {
+                'rc': ret_code, 'name': self.name, 'msg': std_err}
+            raise LvmVolumeError(msg)
+
+        for line in std_out.splitlines():
+
+            line = line.strip()
+            if line == '':
+                continue
+
+            words = line.split(";")
+            fields = dict(zip(VG_REPORT_FIELDS, words))
+            self.init_from_report(fields)
+            break
+
+        return self.discovered
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -25,7 +25,7 @@ from pb_blockdev.translate import pb_gettext, pb_ngettext
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.2.1'
+__version__ = '0.2.2'
 
 LOG = logging.getLogger(__name__)
 
@@ -360,6 +360,14 @@ class LvmVolume(GenericLvmHandler):
             self.discover()
         return self._free
 
+    # -----------------------------------------------------------
+    @property
+    def free_mb(self):
+        """The free volume size in MiBytes."""
+        if self.free is None:
+            return None
+        return self.free / 1024 / 1024
+
     # -------------------------------------------------------------------------
     def as_dict(self, short=False):
         """
@@ -13,7 +13,6 @@ import re
 import logging
 import socket
 import uuid
-import signal
 import errno
 
 # Third party modules
@@ -26,12 +25,17 @@ from pb_base.handler.lock import PbLockHandler
 
 from pb_blockdev.base import BlockDeviceError
 
+from pb_blockdev.process import ExecTimeoutError
+from pb_blockdev.process import handler_call_with_timeout
+
+from pb_blockdev.tools import find_tool
+
 from pb_blockdev.translate import pb_gettext, pb_ngettext
 
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.2.5'
+__version__ = '0.4.0'
 
 MDADM_PATH = os.sep + os.path.join('sbin', 'mdadm')
 LOG = logging.getLogger(__name__)
@@ -266,8 +270,12 @@ class GenericMdHandler(PbBaseHandler):
         # Check of the mdadm command
         if mdadm_command:
             self._mdadm_command = mdadm_command
-        if not os.path.exists(self._mdadm_command):
-            failed_commands.append('mdadm')
+            if not os.path.exists(self._mdadm_command):
+                failed_commands.append('mdadm')
+        else:
+            self._mdadm_command = find_tool('mdadm', MDADM_PATH)
+            if not self._mdadm_command:
+                failed_commands.append('mdadm')
 
         # Some commands are missing
         if failed_commands:
@@ -375,6 +383,61 @@ class GenericMdHandler(PbBaseHandler):
 
         self.global_lock = None
 
+    # -------------------------------------------------------------------------
+    def _build_mdadm_cmd(self, mode, cmd_params, quiet=True):
+        """
+        Builds the command line for executing 'mdadm' in the given mode
+        with the given parameters.
+
+        @raise MdadmError: on wrong parameters
+
+        @return: the command as a list and as a string
+        @rtype: tuple of list and str
+        """
+
+        if not cmd_params:
+            msg = _("No arguments given on calling exec_mdadm().")
+            raise MdadmError(msg)
+
+        if mode not in MDADM_MODES:
+            msg = _("Invalid mode %r on calling exec_mdadm() given.") % (mode)
+            raise MdadmError(msg)
+        mode_arg = MDADM_MODES[mode]
+
+        cmd = [self.mdadm_command]
+        cmd_str = self.mdadm_command
+
+        if mode_arg:
+            cmd.append(mode_arg)
+            cmd_str += " " + mode_arg
+        if self.verbose > 1 and not quiet:
+            cmd.append('--verbose')
+            cmd_str += " --verbose"
+
+        if isinstance(cmd_params, list):
+            for p in cmd_params:
+                cmd.append(p)
+                cmd_str += " " + ("%r" % (str(p)))
+        else:
+            cmd.append(str(cmd_params))
+            cmd_str += " " + ("%r" % (str(cmd_params)))
+
+        return (cmd, cmd_str)
+
+    # -------------------------------------------------------------------------
+    def _check_mdadm_result(self, cmd_str, ret_code, std_err, force=False):
+        """
+        Checks the result of an execution of 'mdadm'.
+
+        @raise MdadmError: if the return value is not zero and force
+                           is not set.
+        """
+
+        if ret_code and not force:
+            msg = _("Error %(rc)d executing \"%(cmd)s\": %(msg)s") % {
+                'rc': ret_code, 'cmd': cmd_str, 'msg': std_err}
+            raise MdadmError(msg)
+
     # -------------------------------------------------------------------------
     def exec_mdadm(
         self, mode='manage', cmd_params=None, locked=False, release_lock=True,
@@ -411,32 +474,7 @@ class GenericMdHandler(PbBaseHandler):
 
         """
 
-        if not cmd_params:
-            msg = _("No arguments given on calling exec_mdadm().")
-            raise MdadmError(msg)
-
-        if mode not in MDADM_MODES:
-            msg = _("Invalid mode %r on calling exec_mdadm() given.") % (mode)
-            raise MdadmError(msg)
-        mode_arg = MDADM_MODES[mode]
-
-        cmd = [self.mdadm_command]
-        cmd_str = self.mdadm_command
-
-        if mode_arg:
-            cmd.append(mode_arg)
-            cmd_str += " " + mode_arg
-        if self.verbose > 1 and not quiet:
-            cmd.append('--verbose')
-            cmd_str += " --verbose"
-
-        if isinstance(cmd_params, list):
-            for p in cmd_params:
-                cmd.append(p)
-                cmd_str += " " + ("%r" % (str(p)))
-        else:
-            cmd.append(str(cmd_params))
-            cmd_str += " " + ("%r" % (str(cmd_params)))
+        (cmd, cmd_str) = self._build_mdadm_cmd(mode, cmd_params, quiet=quiet)
 
         do_sudo = False
         if os.geteuid():
@@ -457,36 +495,22 @@ class GenericMdHandler(PbBaseHandler):
         std_out = None
         std_err = None
 
-        def exec_alarm_caller(signum, sigframe):
-            '''
-            This nested function will be called in event of a timeout
-
-            @param signum:   the signal number (POSIX) which happend
-            @type signum:    int
-            @param sigframe: the frame of the signal
-            @type sigframe:  object
-            '''
-
-            raise MdadmTimeoutError(self.mdadm_timeout, cmd_str)
-
         if self.verbose > 1:
             LOG.debug(__(
                 "Timeout on executing: %d second.",
                 "Timeout on executing: %d seconds.",
                 self.mdadm_timeout), self.mdadm_timeout)
-        signal.signal(signal.SIGALRM, exec_alarm_caller)
-        signal.alarm(self.mdadm_timeout)
         try:
-            (ret_code, std_out, std_err) = self.call(
-                cmd, quiet=quiet, sudo=do_sudo, simulate=simulate)
+            try:
+                (ret_code, std_out, std_err) = handler_call_with_timeout(
+                    self, cmd, timeout=self.mdadm_timeout, quiet=quiet,
+                    sudo=do_sudo, simulate=simulate)
+            except ExecTimeoutError:
+                raise MdadmTimeoutError(self.mdadm_timeout, cmd_str)
 
-            if ret_code and not force:
-                msg = _("Error %(rc)d executing \"%(cmd)s\": %(msg)s") % {
-                    'rc': ret_code, 'cmd': cmd_str, 'msg': std_err}
-                raise MdadmError(msg)
+            self._check_mdadm_result(cmd_str, ret_code, std_err, force=force)
 
         finally:
-            signal.alarm(0)
             if locked and release_lock:
                 self.global_lock = None
 
@@ -25,6 +25,8 @@ from pb_base.handler import PbBaseHandler
 from pb_blockdev.base import BlockDeviceError
 from pb_blockdev.base import BlockDevice
 
+from pb_blockdev.attr_cache import ATTR_STATIC, ATTR_SLOW, ATTR_VOLATILE
+
 from pb_blockdev.md import uuid_from_md
 from pb_blockdev.md import GenericMdError, MdadmError
 from pb_blockdev.md import DEFAULT_MDADM_LOCKFILE
@@ -36,7 +38,7 @@ from pb_blockdev.translate import pb_gettext, pb_ngettext
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.4.2'
+__version__ = '0.6.0'
 
 LOG = logging.getLogger(__name__)
 RE_MD_ID = re.compile(r'^md(\d+)$')
@@ -357,6 +359,20 @@ class MdSubDevice(PbBaseHandler):
 class MdDevice(BlockDevice, GenericMdHandler):
     """Encapsulation class for a multipath device."""
 
+    cached_attrs = dict(
+        BlockDevice.cached_attrs,
+        md_version=ATTR_STATIC,
+        uuid=ATTR_STATIC,
+        level=ATTR_SLOW,
+        chunk_size=ATTR_SLOW,
+        raid_disks=ATTR_SLOW,
+        state=ATTR_VOLATILE,
+        degraded=ATTR_VOLATILE,
+        sync_action=ATTR_VOLATILE,
+        sync_completed=ATTR_VOLATILE,
+        sync_speed=ATTR_VOLATILE,
+    )
+
     # -------------------------------------------------------------------------
     def __init__(
         self, name=None, auto_discover=False,
@@ -575,11 +591,12 @@ class MdDevice(BlockDevice, GenericMdHandler):
     @property
     def md_version(self):
         """The version of the metadata of this RAID device."""
-        if self._md_version is not None:
+        if self.cache_valid('md_version'):
             return self._md_version
         if not self.exists:
             return None
         self.retr_md_version()
+        self.cache_loaded('md_version')
         return self._md_version
 
     # -----------------------------------------------------------
@@ -594,11 +611,12 @@ class MdDevice(BlockDevice, GenericMdHandler):
     @property
     def chunk_size(self):
         """The chunk size of the MD Raid device."""
-        if self._chunk_size is not None:
+        if self.cache_valid('chunk_size'):
             return self._chunk_size
         if not self.exists:
             return None
         self.retr_chunk_size()
+        self.cache_loaded('chunk_size')
         return self._chunk_size
 
     # -----------------------------------------------------------
@@ -613,11 +631,12 @@ class MdDevice(BlockDevice, GenericMdHandler):
     @property
     def state(self):
         """The state of the MD Raid device."""
-        if self._state is not None:
+        if self.cache_valid('state'):
             return self._state
         if not self.exists:
             return None
         self.retr_state()
+        self.cache_loaded('state')
         return self._state
 
     # -----------------------------------------------------------
@@ -632,11 +651,12 @@ class MdDevice(BlockDevice, GenericMdHandler):
     @property
     def degraded(self):
         """The degraded state of the MD Raid device."""
-        if self._degraded is not None:
+        if self.cache_valid('degraded'):
             return self._degraded
         if not self.exists:
             return None
         self.retr_degraded()
+        self.cache_loaded('degraded')
         return self._degraded
 
     # -----------------------------------------------------------
@@ -651,11 +671,12 @@ class MdDevice(BlockDevice, GenericMdHandler):
     @property
     def raid_disks(self):
         """The number of raid disks of the MD Raid device."""
-        if self._raid_disks is not None:
+        if self.cache_valid('raid_disks'):
             return self._raid_disks
         if not self.exists:
             return None
         self.retr_raid_disks()
+        self.cache_loaded('raid_disks')
         return self._raid_disks
 
     # -----------------------------------------------------------
@@ -668,11 +689,12 @@ class MdDevice(BlockDevice, GenericMdHandler):
     @property
     def level(self):
         """The RAID level of this RAID device."""
-        if self._level is not None:
+        if self.cache_valid('level'):
             return self._level
         if not self.exists:
             return None
         self.retr_level()
+        self.cache_loaded('level')
         return self._level
 
     # -----------------------------------------------------------
@@ -687,11 +709,12 @@ class MdDevice(BlockDevice, GenericMdHandler):
     @property
     def uuid(self):
         """The uuid of the MD Raid device."""
-        if self._uuid is not None:
+        if self.cache_valid('uuid'):
             return self._uuid
         if not self.exists:
             return None
         self.retr_uuid()
+        self.cache_loaded('uuid')
         return self._uuid
 
     # -----------------------------------------------------------
@@ -706,11 +729,12 @@ class MdDevice(BlockDevice, GenericMdHandler):
     @property
     def sync_action(self):
         """The state of the MD Raid device."""
-        if self._sync_action is not None:
+        if self.cache_valid('sync_action'):
             return self._sync_action
         if not self.exists:
             return None
         self.retr_sync_state()
+        self.cache_loaded('sync_action')
         return self._sync_action
 
     # -----------------------------------------------------------
@@ -725,11 +749,12 @@ class MdDevice(BlockDevice, GenericMdHandler):
     @property
     def sync_completed(self):
         """The current number of synced blocks of the MD Raid device."""
-        if self._sync_completed is not None:
+        if self.cache_valid('sync_completed'):
             return self._sync_completed
         if not self.exists:
             return None
         self.retr_sync_state()
+        self.cache_loaded('sync_completed')
         return self._sync_completed
 
     # -----------------------------------------------------------
@@ -758,11 +783,12 @@ class MdDevice(BlockDevice, GenericMdHandler):
     @property
     def sync_speed(self):
         """The current sync speed of the MD Raid device."""
-        if self._sync_speed is not None:
+        if self.cache_valid('sync_speed'):
             return self._sync_speed
         if not self.exists:
             return None
         self.retr_sync_state()
+        self.cache_loaded('sync_speed')
         return self._sync_speed
 
     # -------------------------------------------------------------------------
@@ -865,11 +891,7 @@ class MdDevice(BlockDevice, GenericMdHandler):
         if not self.exists:
             return
 
-        self.retr_level()
-        self.retr_md_version()
-        self.retr_chunk_size()
-        self.retr_state()
-        self.retr_raid_disks()
+        self.retr_md_attrs()
         self.retr_uuid()
         self.retr_sync_state()
 
@@ -878,287 +900,139 @@ class MdDevice(BlockDevice, GenericMdHandler):
         self._discovered = True
 
     # -------------------------------------------------------------------------
-    def retr_level(self):
+    def retr_md_attrs(self):
         """
-        A method to retrieve the raid level from sysfs
+        Retrieves the raid level, the metadata version, the chunk size,
+        the state, the degraded state and the number of raid disks of
+        the MD Raid device, reading all appropriate files in sysfs together.
 
-        @raise MdDeviceError: if the level file in sysfs doesn't exists
-                                 or could not read
+        @raise MdDeviceError: if one of the files in sysfs doesn't exists
+                              or could not read
 
         """
 
-        if not self.name:
-            msg = _("Cannot retrieve RAID level, because it's an unnamed MD device object.")
-            raise MdDeviceError(msg)
+        names = []
+        for name in (
+                'level', 'metadata_version', 'chunk_size', 'array_state',
+                'degraded', 'raid_disks'):
+            names.append(os.path.join('md', name))
+        attrs = self._read_sysfs_attrs(names, _('MD device attributes'), MdDeviceError)
 
-        if not self.exists:
-            msg = _(
-                "Cannot retrieve RAID level of %r, because the MD device "
-                "doesn't exists.") % (self.name)
-            raise MdDeviceError(msg)
+        self.retr_level(attrs)
+        self.retr_md_version(attrs)
+        self.retr_chunk_size(attrs)
+        self.retr_state(attrs)
+        self.retr_degraded(attrs)
+        self.retr_raid_disks(attrs)
 
-        l_file = self.level_file
-        if not os.path.exists(l_file):
-            msg = _(
-                "Cannot retrieve RAID level of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                'bd': self.name, 'file': l_file}
-            raise MdDeviceError(msg)
+    # -------------------------------------------------------------------------
+    def retr_level(self, attrs=None):
+        """
+        A method to retrieve the raid level from sysfs
 
-        if not os.access(l_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve RAID level of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                'bd': self.name, 'file': l_file}
-            raise MdDeviceError(msg)
+        @raise MdDeviceError: if the level file in sysfs doesn't exists
+                                 or could not read
 
-        f_content = self.read_file(l_file, quiet=True).strip()
-        if not f_content:
-            msg = _(
-                "Cannot retrieve RAID level of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                'bd': self.name, 'file': l_file}
-            raise MdDeviceError(msg)
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
+
+        """
 
-        self._level = f_content
+        self._level = self._sysfs_attr(
+            os.path.join('md', 'level'), _('RAID level'), attrs, MdDeviceError)
 
     # -------------------------------------------------------------------------
-    def retr_md_version(self):
+    def retr_md_version(self, attrs=None):
         """
         A method to retrieve the version of the metadata from sysfs
 
         @raise MdDeviceError: if the md_version file in sysfs doesn't exists
                               or could not read
 
-        """
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
 
-        if not self.name:
-            msg = _(
-                "Cannot retrieve metadata version, "
-                "because it's an unnamed MD device object.")
-            raise MdDeviceError(msg)
-
-        if not self.exists:
-            msg = _(
-                "Cannot retrieve metadata version of %r, "
-                "because the MD device doesn't exists.") % (self.name)
-            raise MdDeviceError(msg)
-
-        v_file = self.md_version_file
-        if not os.path.exists(v_file):
-            msg = _(
-                "Cannot retrieve metadata version of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                'bd': self.name, 'file': v_file}
-            raise MdDeviceError(msg)
-
-        if not os.access(v_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve metadata version of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                'bd': self.name, 'file': v_file}
-            raise MdDeviceError(msg)
-
-        f_content = self.read_file(v_file, quiet=True).strip()
-        if not f_content:
-            msg = _(
-                "Cannot retrieve metadata version of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                'bd': self.name, 'file': v_file}
-            raise MdDeviceError(msg)
+        """
 
-        self._md_version = f_content
+        self._md_version = self._sysfs_attr(
+            os.path.join('md', 'metadata_version'), _('metadata version'),
+            attrs, MdDeviceError)
 
     # -------------------------------------------------------------------------
-    def retr_chunk_size(self):
+    def retr_chunk_size(self, attrs=None):
         """
         A method to retrieve the chunk size of the MD Raid device from sysfs
 
         @raise MdDeviceError: if the chunk_size file in sysfs doesn't exists
                                  or could not read
 
-        """
-
-        if not self.name:
-            msg = _(
-                "Cannot retrieve chunk size, "
-                "because it's an unnamed MD device object.")
-            raise MdDeviceError(msg)
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
 
-        if not self.exists:
-            msg = _(
-                "Cannot retrieve chunk size of %r, "
-                "because the MD device doesn't exists.") % (self.name)
-            raise MdDeviceError(msg)
-
-        v_file = self.chunk_size_file
-        if not os.path.exists(v_file):
-            msg = _(
-                "Cannot retrieve chunk size of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                'bd': self.name, 'file': v_file}
-            raise MdDeviceError(msg)
-
-        if not os.access(v_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve chunk size of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                'bd': self.name, 'file': v_file}
-            raise MdDeviceError(msg)
+        """
 
-        f_content = self.read_file(v_file, quiet=True).strip()
-        if not f_content:
-            msg = _(
-                "Cannot retrieve chunk size of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                'bd': self.name, 'file': v_file}
-            raise MdDeviceError(msg)
+        f_content = self._sysfs_attr(
+            os.path.join('md', 'chunk_size'), _('chunk size'), attrs, MdDeviceError)
 
         self._chunk_size = int(f_content)
 
     # -------------------------------------------------------------------------
-    def retr_state(self):
+    def retr_state(self, attrs=None):
         """
         A method to retrieve the state of the MD Raid device from sysfs
 
         @raise MdDeviceError: if the array_size file in sysfs doesn't exists
                                  or could not read
 
-        """
-
-        if not self.name:
-            msg = _(
-                "Cannot retrieve state, "
-                "because it's an unnamed MD device object.")
-            raise MdDeviceError(msg)
-
-        if not self.exists:
-            msg = _(
-                "Cannot retrieve state of %r, "
-                "because the MD device doesn't exists.") % (self.name)
-            raise MdDeviceError(msg)
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
 
-        v_file = self.state_file
-        if not os.path.exists(v_file):
-            msg = _(
-                "Cannot retrieve state of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                'bd': self.name, 'file': v_file}
-            raise MdDeviceError(msg)
-
-        if not os.access(v_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve state of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                'bd': self.name, 'file': v_file}
-            raise MdDeviceError(msg)
-
-        f_content = self.read_file(v_file, quiet=True).strip()
-        if not f_content:
-            msg = _(
-                "Cannot retrieve state of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                'bd': self.name, 'file': v_file}
-            raise MdDeviceError(msg)
+        """
 
-        self._state = f_content
+        self._state = self._sysfs_attr(
+            os.path.join('md', 'array_state'), _('state'), attrs, MdDeviceError)
 
     # -------------------------------------------------------------------------
-    def retr_degraded(self):
+    def retr_degraded(self, attrs=None):
         """
-        A method to retrieve the degraded state of the MD Raid device from sysfs
+        A method to retrieve the degraded state of the MD Raid device from sysfs.
+        If the degraded file doesn't exists (e.g. on RAID 0),
+        the degraded state is None.
 
-        @raise MdDeviceError: if the degraded file in sysfs doesn't exists
-                                 or could not read
+        @raise MdDeviceError: if the degraded file in sysfs could not read
 
-        """
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
 
-        if not self.name:
-            msg = _(
-                "Cannot retrieve degraded state, "
-                "because it's an unnamed MD device object.")
-            raise MdDeviceError(msg)
-
-        if not self.exists:
-            msg = _(
-                "Cannot retrieve degraded state of %r, "
-                "because the MD device doesn't exists.") % (self.name)
-            raise MdDeviceError(msg)
+        """
 
-        v_file = self.degraded_file
-        if not os.path.exists(v_file):
-            msg = _(
-                "Cannot retrieve degraded state of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                'bd': self.name, 'file': v_file}
-            if self.verbose > 1:
-                LOG.debug(msg)
+        f_content = self._sysfs_attr(
+            os.path.join('md', 'degraded'), _('degraded state'), attrs,
+            MdDeviceError, required=False)
+        if f_content is None:
             self._degraded = None
             return
 
-        if not os.access(v_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve degraded state of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                'bd': self.name, 'file': v_file}
-            raise MdDeviceError(msg)
-
-        f_content = self.read_file(v_file, quiet=True).strip()
-        if not f_content:
-            msg = _(
-                "Cannot retrieve degraded state of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                'bd': self.name, 'file': v_file}
-            raise MdDeviceError(msg)
-
         self._degraded = True
         if f_content == '0':
             self._degraded = False
 
     # -------------------------------------------------------------------------
-    def retr_raid_disks(self):
+    def retr_raid_disks(self, attrs=None):
         """
         A method to retrieve the number of raid disks of the MD Raid device from sysfs
 
         @raise MdDeviceError: if the raid_disks file in sysfs doesn't exists
                                  or could not read
 
-        """
-
-        if not self.name:
-            msg = _(
-                "Cannot retrieve the number of raid disks, "
-                "because it's an unnamed MD device object.")
-            raise MdDeviceError(msg)
-
-        if not self.exists:
-            msg = _(
-                "Cannot retrieve the number of raid disks of %r, "
-                "because the MD device doesn't exists.") % (self.name)
-            raise MdDeviceError(msg)
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
 
-        v_file = self.raid_disks_file
-        if not os.path.exists(v_file):
-            msg = _(
-                "Cannot retrieve the number of raid disks of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                'bd': self.name, 'file': v_file}
-            raise MdDeviceError(msg)
-
-        if not os.access(v_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve the number of raid disks of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                'bd': self.name, 'file': v_file}
-            raise MdDeviceError(msg)
+        """
 
-        f_content = self.read_file(v_file, quiet=True).strip()
-        if not f_content:
-            msg = _(
-                "Cannot retrieve the number of raid disks of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                'bd': self.name, 'file': v_file}
-            raise MdDeviceError(msg)
+        f_content = self._sysfs_attr(
+            os.path.join('md', 'raid_disks'), _('number of raid disks'), attrs,
+            MdDeviceError)
 
         self._raid_disks = int(f_content)
 
@@ -0,0 +1,437 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, ProfitBricks GmbH, Berlin
+@summary: The module for collecting MegaRaid data of all adapters concurrently
+"""
+
+# Standard modules
+import sys
+import time
+import logging
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Third party modules
+
+# Own modules
+from pb_base.object import PbBaseObject
+
+from pb_blockdev.megaraid.handler import MegaraidHandler
+from pb_blockdev.megaraid.handler import DEFAULT_MEGACLI_CACHE_TTL
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.2.1'
+
+log = logging.getLogger(__name__)
+
+# The worker threads don't run more MegaCli processes in parallel than
+# MEGACLI_MAX_CONCURRENCY of the handler module, they only overlap the
+# parsing of the output and the lookups in the caches
+DEFAULT_MAX_WORKERS = 4
+
+
+# =============================================================================
+def run_parallel(func, items, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Executes the given function for all given items in a bounded pool
+    of threads.
+
+    If the function raises an exception for any item, the first of them
+    is raised again after all threads have finished.
+
+    @param func: the function to execute with one item as argument
+    @type func: callable
+    @param items: all items to process
+    @type items: list
+    @param max_workers: the maximum number of concurrent threads
+    @type max_workers: int
+
+    @return: the results of the function, the keys are the items
+    @rtype: dict
+
+    """
+
+    items = list(items)
+    results = {}
+    errors = []
+    if not items:
+        return results
+
+    nr_workers = max(1, min(int(max_workers), len(items)))
+    if nr_workers == 1:
+        for item in items:
+            results[item] = func(item)
+        return results
+
+    todo = queue.Queue()
+    for item in items:
+        todo.put(item)
+    result_lock = threading.Lock()
+
+    def worker():
+        while True:
+            try:
+                item = todo.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                result = func(item)
+            except Exception:
+                with result_lock:
+                    errors.append(sys.exc_info())
+                continue
+            with result_lock:
+                results[item] = result
+
+    threads = []
+    for i in range(nr_workers):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        (exc_type, exc_value, exc_tb) = errors[0]
+        raise exc_value
+
+    return results
+
+
+# =============================================================================
+def iter_parallel(func, items, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Generator executing the given function for all given items in a bounded
+    pool of threads, like run_parallel(). Every result is given back,
+    as soon as it is available, so the results come in the order
+    of completion.
+
+    If the function raises an exception for any item, the first of them
+    is raised again after all other results were given back.
+
+    @param func: the function to execute with one item as argument
+    @type func: callable
+    @param items: all items to process
+    @type items: list
+    @param max_workers: the maximum number of concurrent threads
+    @type max_workers: int
+
+    @return: tuples of (item, result, the execution time in seconds)
+    @rtype: iterator of tuple
+
+    """
+
+    items = list(items)
+    if not items:
+        return
+
+    nr_workers = max(1, min(int(max_workers), len(items)))
+    if nr_workers == 1:
+        for item in items:
+            start = time.time()
+            result = func(item)
+            yield (item, result, time.time() - start)
+        return
+
+    todo = queue.Queue()
+    for item in items:
+        todo.put(item)
+    done = queue.Queue()
+
+    def worker():
+        while True:
+            try:
+                item = todo.get_nowait()
+            except queue.Empty:
+                return
+            start = time.time()
+            try:
+                result = func(item)
+            except Exception:
+                done.put((item, None, None, sys.exc_info()))
+                continue
+            done.put((item, result, time.time() - start, None))
+
+    for i in range(nr_workers):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+
+    errors = []
+    for i in range(len(items)):
+        (item, result, duration, exc_info) = done.get()
+        if exc_info is not None:
+            errors.append(exc_info)
+            continue
+        yield (item, result, duration)
+
+    if errors:
+        (exc_type, exc_value, exc_tb) = errors[0]
+        raise exc_value
+
+
+# =============================================================================
+class MegaraidCollector(PbBaseObject):
+    """
+    Collects the data of all MegaRaid adapters by running the per adapter
+    queries for all adapters concurrently. The raw output of MegaCli is
+    cached by the underlying MegaraidHandler, which also serializes the
+    executions of MegaCli (see MEGACLI_MAX_CONCURRENCY).
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+        self, handler=None, max_workers=DEFAULT_MAX_WORKERS,
+            cache_ttl=DEFAULT_MEGACLI_CACHE_TTL, appname=None, verbose=0,
+            version=__version__, base_dir=None, use_stderr=False,
+            ):
+        """
+        Initialisation of the collector object.
+
+        @raise CommandNotFoundError: if the MegaCLI command could not be found.
+
+        @param handler: the handler object to execute the MegaCli commands,
+                        if not given, a new one is created
+        @type handler: MegaraidHandler
+        @param max_workers: the maximum number of adapters queried concurrently
+        @type max_workers: int
+        @param cache_ttl: the time in seconds, the output of MegaCli is
+                          reused, only used for a new handler object
+        @type cache_ttl: float
+        @param appname: name of the current running application
+        @type appname: str
+        @param verbose: verbose level
+        @type verbose: int
+        @param version: the version string of the current object or application
+        @type version: str
+        @param base_dir: the base directory of all operations
+        @type base_dir: str
+        @param use_stderr: a flag indicating, that on handle_error() the output
+                           should go to STDERR, even if logging has
+                           initialized logging handlers.
+        @type use_stderr: bool
+
+        @return: None
+
+        """
+
+        super(MegaraidCollector, self).__init__(
+            appname=appname,
+            verbose=verbose,
+            version=version,
+            base_dir=base_dir,
+            use_stderr=use_stderr,
+            initialized=False,
+        )
+
+        self.max_workers = int(max_workers)
+        """
+        @ivar: the maximum number of adapters queried concurrently
+        @type: int
+        """
+
+        if handler is None:
+            handler = MegaraidHandler(
+                appname=self.appname,
+                verbose=self.verbose,
+                base_dir=self.base_dir,
+                use_stderr=self.use_stderr,
+                cache_ttl=cache_ttl,
+            )
+
+        self.handler = handler
+        """
+        @ivar: the handler object to execute the MegaCli commands
+        @type: MegaraidHandler
+        """
+
+        self._adapter_ids = None
+
+        self.initialized = True
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        res = super(MegaraidCollector, self).as_dict(short=short)
+        res['max_workers'] = self.max_workers
+        res['handler'] = self.handler.as_dict(short=short)
+        res['adapter_ids'] = self._adapter_ids
+
+        return res
+
+    # -------------------------------------------------------------------------
+    def adapter_ids(self, refresh=False):
+        """
+        Gives back the Ids of all MegaRaid adapters.
+
+        @param refresh: retrieve the number of adapters again
+        @type refresh: bool
+
+        @rtype: list of int
+        """
+
+        if self._adapter_ids is None or refresh:
+            count = self.handler.adapter_count()
+            self._adapter_ids = list(range(count))
+
+        return list(self._adapter_ids)
+
+    # -------------------------------------------------------------------------
+    def collect(self, func, adapter_ids=None):
+        """
+        Executes the given function for all given adapters concurrently.
+
+        @param func: the function to execute, it gets the adapter Id
+                     as its single argument
+        @type func: callable
+        @param adapter_ids: the Ids of the adapters to query, if not given,
+                            all adapters are queried
+        @type adapter_ids: list of int
+
+        @return: the results of the function, the keys are the adapter Ids
+        @rtype: dict
+
+        """
+
+        if adapter_ids is None:
+            adapter_ids = self.adapter_ids()
+
+        return run_parallel(func, adapter_ids, self.max_workers)
+
+    # -------------------------------------------------------------------------
+    def iter_collect(self, func, adapter_ids=None):
+        """
+        Generator executing the given function for all given adapters
+        concurrently and giving back the result of every adapter,
+        as soon as it is available.
+
+        @param func: the function to execute, it gets the adapter Id
+                     as its single argument
+        @type func: callable
+        @param adapter_ids: the Ids of the adapters to query, if not given,
+                            all adapters are queried
+        @type adapter_ids: list of int
+
+        @return: tuples of (adapter Id, result, the time in seconds
+                 needed for this adapter)
+        @rtype: iterator of tuple
+
+        """
+
+        if adapter_ids is None:
+            adapter_ids = self.adapter_ids()
+
+        return iter_parallel(func, adapter_ids, self.max_workers)
+
+    # -------------------------------------------------------------------------
+    def get_all_pds(self, adapter_ids=None):
+        """
+        Retrieves all physical drives of all given adapters.
+
+        @return: the physical drives, the keys are the adapter Ids
+        @rtype: dict of list of MegaraidPd
+        """
+
+        return self.collect(self.handler.get_all_pds, adapter_ids)
+
+    # -------------------------------------------------------------------------
+    def iter_all_pds(self, adapter_ids=None):
+        """
+        Retrieves all physical drives of all given adapters and gives
+        them back per adapter in the order of completion.
+
+        @return: tuples of (adapter Id, list of MegaraidPd, seconds)
+        @rtype: iterator of tuple
+        """
+
+        return self.iter_collect(self.handler.get_all_pds, adapter_ids)
+
+    # -------------------------------------------------------------------------
+    def get_enclosures(self, adapter_ids=None):
+        """
+        Retrieves all enclosures of all given adapters.
+
+        @return: the enclosures, the keys are the adapter Ids
+        @rtype: dict of list of MegaraidEnclosure
+        """
+
+        return self.collect(self.handler.get_enclosures, adapter_ids)
+
+    # -------------------------------------------------------------------------
+    def get_all_lds(self, adapter_ids=None, ld_info=True):
+        """
+        Retrieves all logical drives of all given adapters.
+
+        @param adapter_ids: the Ids of the adapters to query, if not given,
+                            all adapters are queried
+        @type adapter_ids: list of int
+        @param ld_info: complete the data of cached logical drives
+                        by 'MegaCLI -LdInfo'
+        @type ld_info: bool
+
+        @return: the logical drives, the keys are the adapter Ids
+        @rtype: dict of list of MegaraidLogicalDrive
+        """
+
+        return self.collect(self._lds_getter(ld_info), adapter_ids)
+
+    # -------------------------------------------------------------------------
+    def iter_all_lds(self, adapter_ids=None, ld_info=True):
+        """
+        Retrieves all logical drives of all given adapters and gives
+        them back per adapter in the order of completion.
+
+        @return: tuples of (adapter Id, list of MegaraidLogicalDrive, seconds)
+        @rtype: iterator of tuple
+        """
+
+        return self.iter_collect(self._lds_getter(ld_info), adapter_ids)
+
+    # -------------------------------------------------------------------------
+    def _lds_getter(self, ld_info=True):
+        """
+        Gives back a function retrieving all logical drives of an adapter,
+        the data of cached logical drives are completed, if ld_info is set.
+        """
+
+        def get_lds(adapter_id):
+            lds = self.handler.get_all_lds(adapter_id)
+            if ld_info:
+                for ld in lds:
+                    if ld.cached:
+                        self.handler.get_ld_info(adapter_id, ld.number, ld=ld)
+            return lds
+
+        return get_lds
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -18,15 +18,25 @@ from pb_base.common import pp
 
 from pb_base.object import PbBaseObject
 
+from pb_blockdev.megaraid.parser import tokenize, apply_tokens
+from pb_blockdev.megaraid.parser import field_setter
+from pb_blockdev.megaraid.parser import to_text_avail, to_int
+
 from pb_blockdev.translate import pb_gettext, pb_ngettext
 
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.5.2'
+__version__ = '0.6.1'
 
 log = logging.getLogger(__name__)
 
+# Voltage Value                     :5010 milli volts
+re_voltage_value = re.compile(
+    r'^(\d+(?:\.\d*)?)\s*(milli)?\s*volt', re.IGNORECASE)
+
+re_not_avail = re.compile(r'^Not\s+Available', re.IGNORECASE)
+
 
 # =============================================================================
 class VoltageSensor(PbBaseObject):
@@ -906,10 +916,30 @@ class MegaraidEnclosure(PbBaseObject):
 #
 #        Exit Code: 0x00
 
+        self.init_from_tokens(tokenize(lines))
+
+    # -------------------------------------------------------------------------
+    def init_from_tokens(self, tokens, dispatch=None):
+        """
+        Init of all properties from the tokens of the output of
+        'MegaCLI -EncInfo' as given back by
+        pb_blockdev.megaraid.parser.tokenize().
+
+        @param tokens: the tokens of the MegaCLI output
+        @type tokens: iterable of tuple
+        @param dispatch: the dispatch table to use instead of ENC_DISPATCH
+        @type dispatch: dict or None
+
+        """
+
+        if dispatch is None:
+            dispatch = ENC_DISPATCH
+
         self.initialized = False
 
         if self.verbose > 3:
-            log.debug(_("Analyzing lines:") + "\n" + pp(lines))
+            tokens = list(tokens)
+            log.debug(_("Analyzing tokens:") + "\n" + pp(tokens))
 
         self._id = None
         self._nr_slots = None
@@ -929,282 +959,137 @@ class MegaraidEnclosure(PbBaseObject):
         self._vendor_specific = None
 
         self.voltage_sensors = []
-        cur_voltage_sensor = None
-
         self.fans = []
-        cur_fan_status = None
-
         self.temperature_sensors = []
-        cur_temperature_sensor = None
-
-        re_enc_id = re.compile(r'^Device\s+ID\s*:\s*(\d+)', re.IGNORECASE)
-        re_nr_slots = re.compile(r'^Number\s+of\s+Slots\s*:\s*(\d+)', re.IGNORECASE)
-        re_nr_power_supplies = re.compile(
-            r'^Number\s+of\s+Power\s+Supplies\s*:\s*(\d+)', re.IGNORECASE)
-        re_nr_fans = re.compile(r'^Number\s+of\s+Fans\s*:\s*(\d+)', re.IGNORECASE)
-        re_nr_temp_sensors = re.compile(
-            r'^Number\s+of\s+Temperature\s+Sensors\s*:\s*(\d+)', re.IGNORECASE)
-        re_nr_alarms = re.compile(r'^Number\s+of\s+Alarms\s*:\s*(\d+)', re.IGNORECASE)
-        re_nr_pds = re.compile(
-            r'^Number\s+of\s+Physical\s+Drives\s*:\s*(\d+)', re.IGNORECASE)
-        re_nr_voltage_sensors = re.compile(
-            r'^Number\s+of\s+Voltage\s+Sensors\s*:\s*(\d+)', re.IGNORECASE)
-
-        re_status = re.compile(r'^Status\s*:\s*(\S+.*)', re.IGNORECASE)
-        re_connector_name = re.compile(
-            r'^Connector\s+Name\s*:\s*(\S+.*)', re.IGNORECASE)
-        re_enc_type = re.compile(
-            r'^Enclosure\s+type\s*:\s*(\S+.*)', re.IGNORECASE)
-        re_vendor = re.compile(
-            r'^Vendor\s+Identification\s*:\s*(\S+.*)', re.IGNORECASE)
-        re_product_name = re.compile(
-            r'^Product\s+Identification\s*:\s*(\S+.*)', re.IGNORECASE)
-        re_product_revision = re.compile(
-            r'^Product\s+Revision\s+Level\s*:\s*(\S+.*)', re.IGNORECASE)
-        re_vendor_specific = re.compile(
-            r'^Vendor\s+Specific\s*:\s*(\S+.*)', re.IGNORECASE)
-
-        re_voltage_sensor = re.compile(
-            r'^Voltage\s+Sensor\s*:\s*(\d+)', re.IGNORECASE)
-        re_voltage_sensor_status = re.compile(
-            r'^Voltage\s+Sensor\s+Status\s*:\s*(\S+.*)', re.IGNORECASE)
-        re_voltage_value = re.compile(
-            r'^Voltage\s+Value\s*:\s*(\d+(?:\.\d*)?)\s*(milli)?\s*volt', re.IGNORECASE)
-
-        re_fan = re.compile(r'^Fan\s*:\s*(\d+)', re.IGNORECASE)
-        re_fan_status = re.compile(r'^Fan\s+Status\s*:\s*(\S+.*)', re.IGNORECASE)
-        re_fan_speed = re.compile(r'^Fan\s+Speed\s*:\s*(\S+.*)', re.IGNORECASE)
-
-        re_temp_sensor = re.compile(r'^Temp\s+Sensor\s*:\s*(\d+)', re.IGNORECASE)
-        re_temperature = re.compile(r'^Temperature\s*:\s*(\d+)', re.IGNORECASE)
-        re_temp_status = re.compile(
-            r'^Temperature\s+Sensor\s+Status\s*:\s*(\S+.*)', re.IGNORECASE)
-
-        re_not_avail = re.compile(r'^Not\s+Available', re.IGNORECASE)
-
-        for line in lines:
-
-            # Checking for Device Id
-            match = re_enc_id.search(line)
-            if match:
-                self.id = match.group(1)
-                if self.verbose > 2:
-                    log.debug(_(
-                        "Id of enclosure No %(enc)d: %(id)d.") % {
-                        'enc': self.number, 'id': self.id})
-                continue
-
-            # Checking for the number of slots
-            match = re_nr_slots.search(line)
-            if match:
-                self._nr_slots = int(match.group(1))
-                continue
-
-            # Checking for the number of power supplies
-            match = re_nr_power_supplies.search(line)
-            if match:
-                self._nr_power_supplies = int(match.group(1))
-                continue
-
-            # Checking for the number of fans
-            match = re_nr_fans.search(line)
-            if match:
-                self._nr_fans = int(match.group(1))
-                continue
-
-            # Checking for the number of Temperature Sensors
-            match = re_nr_temp_sensors.search(line)
-            if match:
-                self._nr_temp_sensors = int(match.group(1))
-                continue
-
-            # Checking for the number of alarms
-            match = re_nr_alarms.search(line)
-            if match:
-                self._nr_alarms = int(match.group(1))
-                continue
-
-            # Checking for the number of mounted physical drives
-            match = re_nr_pds.search(line)
-            if match:
-                self._nr_pds = int(match.group(1))
-                continue
-
-            # Checking for the number of voltage sensors
-            match = re_nr_voltage_sensors.search(line)
-            if match:
-                self._nr_voltage_sensors = int(match.group(1))
-                continue
-
-            # Checking for the state
-            match = re_status.search(line)
-            if match:
-                if match.group(1).lower() != 'n/a':
-                    self._status = match.group(1)
-                continue
-
-            # Checking for the connector name
-            match = re_connector_name.search(line)
-            if match:
-                if match.group(1).lower() != 'n/a':
-                    self._connector_name = match.group(1)
-                continue
-
-            # Checking for the enclosure type
-            match = re_enc_type.search(line)
-            if match:
-                if match.group(1).lower() != 'n/a':
-                    self._enc_type = match.group(1)
-                continue
-
-            # Checking for the vendor name
-            match = re_vendor.search(line)
-            if match:
-                if match.group(1).lower() != 'n/a':
-                    self._vendor = match.group(1)
-                continue
-
-            # Checking for the product name
-            match = re_product_name.search(line)
-            if match:
-                if match.group(1).lower() != 'n/a':
-                    self._product_name = match.group(1)
-                continue
-
-            # Checking for the product revision
-            match = re_product_revision.search(line)
-            if match:
-                if match.group(1).lower() != 'n/a':
-                    self._product_revision = match.group(1)
-                continue
-
-            # Checking for the vendore specific product name
-            match = re_vendor_specific.search(line)
-            if match:
-                if match.group(1).lower() != 'n/a':
-                    self._vendor_specific = match.group(1)
-                continue
-
-            # Check for start of a voltage sensor
-            match = re_voltage_sensor.search(line)
-            if match:
-                if cur_voltage_sensor:
-                    self.voltage_sensors.append(cur_voltage_sensor)
-                nr = int(match.group(1))
-                if self.verbose > 3:
-                    log.debug(_("Found voltage sensor %d."), nr)
-                cur_voltage_sensor = VoltageSensor(
-                    nr,
-                    appname=self.appname,
-                    verbose=self.verbose,
-                    base_dir=self.base_dir,
-                    use_stderr=self.use_stderr,
-                )
-
-            # Check for the voltage sensor status
-            match = re_voltage_sensor_status.search(line)
-            if match:
-                st = match.group(1)
-                if self.verbose > 3:
-                    log.debug(_("Found voltage sensor status %r."), st)
-                if cur_voltage_sensor:
-                    cur_voltage_sensor.status = st
-                continue
-
-            # Check for the voltage sensor value
-            match = re_voltage_value.search(line)
-            if match:
-                value = float(match.group(1))
-                if match.group(2):
-                    value /= 1000.0
-                if self.verbose > 3:
-                    log.debug(_("Found voltage sensor value %f."), value)
-                if cur_voltage_sensor:
-                    cur_voltage_sensor.voltage = value
-                continue
-
-            # Check for start of a fan status
-            match = re_fan.search(line)
-            if match:
-                if cur_fan_status:
-                    self.fans.append(cur_fan_status)
-                nr = int(match.group(1))
-                if self.verbose > 3:
-                    log.debug(_("Found Fan %d."), nr)
-                cur_fan_status = FanStatus(
-                    nr,
-                    appname=self.appname,
-                    verbose=self.verbose,
-                    base_dir=self.base_dir,
-                    use_stderr=self.use_stderr,
-                )
-
-            # Check for the fan status
-            match = re_fan_status.search(line)
-            if match:
-                st = match.group(1)
-                if re_not_avail.search(st):
-                    continue
-                if self.verbose > 3:
-                    log.debug(_("Found fan status %r."), st)
-                if cur_fan_status:
-                    cur_fan_status.status = st
-                continue
-
-            # Check for the fan speed
-            match = re_fan_speed.search(line)
-            if match:
-                value = match.group(1)
-                if self.verbose > 3:
-                    log.debug(_("Found fan speed %r."), value)
-                if cur_fan_status:
-                    cur_fan_status.speed = value
-                continue
-
-            # Check for start of a temperature sensor
-            match = re_temp_sensor.search(line)
-            if match:
-                if cur_temperature_sensor:
-                    self.temperature_sensors.append(cur_temperature_sensor)
-                nr = int(match.group(1))
-                if self.verbose > 3:
-                    log.debug(_("Found temperature sensor %d."), nr)
-                cur_temperature_sensor = TemperatureSensor(
-                    nr,
-                    appname=self.appname,
-                    verbose=self.verbose,
-                    base_dir=self.base_dir,
-                    use_stderr=self.use_stderr,
-                )
-
-            # Check for the temperature sensor status
-            match = re_temp_status.search(line)
-            if match:
-                st = match.group(1)
-                if self.verbose > 3:
-                    log.debug(_("Found temperature sensor status %r."), st)
-                if cur_temperature_sensor:
-                    cur_temperature_sensor.status = st
-                continue
-
-            # Check for the temperature value
-            match = re_temperature.search(line)
-            if match:
-                value = int(match.group(1))
-                if self.verbose > 3:
-                    log.debug(_("Found temperature value %d."), value)
-                if cur_temperature_sensor:
-                    cur_temperature_sensor.temperature = value
-                continue
-
-        if cur_voltage_sensor:
-            self.voltage_sensors.append(cur_voltage_sensor)
-        if cur_fan_status:
-            self.fans.append(cur_fan_status)
-        if cur_temperature_sensor:
-            self.temperature_sensors.append(cur_temperature_sensor)
+
+        apply_tokens(self, tokens, dispatch)
+
         self.initialized = True
 
+    # -------------------------------------------------------------------------
+    def _sensor_params(self):
+        """
+        Gives back the common parameters for the initialisation of the
+        sensor objects of this enclosure.
+        """
+
+        return {
+            'appname': self.appname,
+            'verbose': self.verbose,
+            'base_dir': self.base_dir,
+            'use_stderr': self.use_stderr,
+        }
+
+
+# =============================================================================
+def _add_voltage_sensor(enc, value):
+    """Setter for 'Voltage Sensor :0', the start of a new voltage sensor."""
+    nr = int(value)
+    if enc.verbose > 3:
+        log.debug(_("Found voltage sensor %d."), nr)
+    enc.voltage_sensors.append(VoltageSensor(nr, **enc._sensor_params()))
+
+
+# =============================================================================
+def _set_voltage_status(enc, value):
+    """Setter for 'Voltage Sensor Status :OK'."""
+    if value and enc.voltage_sensors:
+        enc.voltage_sensors[-1].status = value
+
+
+# =============================================================================
+def _set_voltage_value(enc, value):
+    """Setter for 'Voltage Value :5010 milli volts'."""
+    match = re_voltage_value.search(value)
+    if not match:
+        raise ValueError(_("Invalid voltage value."))
+    voltage = float(match.group(1))
+    if match.group(2):
+        voltage /= 1000.0
+    if enc.voltage_sensors:
+        enc.voltage_sensors[-1].voltage = voltage
+
+
+# =============================================================================
+def _add_fan(enc, value):
+    """Setter for 'Fan : 0', the start of a new fan."""
+    nr = int(value)
+    if enc.verbose > 3:
+        log.debug(_("Found Fan %d."), nr)
+    enc.fans.append(FanStatus(nr, **enc._sensor_params()))
+
+
+# =============================================================================
+def _set_fan_status(enc, value):
+    """Setter for 'Fan Status : OK'."""
+    if not value or re_not_avail.search(value):
+        return
+    if enc.fans:
+        enc.fans[-1].status = value
+
+
+# =============================================================================
+def _set_fan_speed(enc, value):
+    """Setter for 'Fan Speed :Medium Speed'."""
+    if value and enc.fans:
+        enc.fans[-1].speed = value
+
+
+# =============================================================================
+def _add_temperature_sensor(enc, value):
+    """Setter for 'Temp Sensor : 0', the start of a new temperature sensor."""
+    nr = int(value)
+    if enc.verbose > 3:
+        log.debug(_("Found temperature sensor %d."), nr)
+    enc.temperature_sensors.append(TemperatureSensor(nr, **enc._sensor_params()))
+
+
+# =============================================================================
+def _set_temperature(enc, value):
+    """Setter for 'Temperature : 28'."""
+    temperature = int(value)
+    if enc.temperature_sensors:
+        enc.temperature_sensors[-1].temperature = temperature
+
+
+# =============================================================================
+def _set_temperature_status(enc, value):
+    """Setter for 'Temperature Sensor Status : OK'."""
+    if value and enc.temperature_sensors:
+        enc.temperature_sensors[-1].status = value
+
+
+ENC_DISPATCH = {
+    'device id': field_setter('id', to_int),
+    'number of slots': field_setter('_nr_slots', to_int),
+    'number of power supplies': field_setter('_nr_power_supplies', to_int),
+    'number of fans': field_setter('_nr_fans', to_int),
+    'number of temperature sensors': field_setter('_nr_temp_sensors', to_int),
+    'number of alarms': field_setter('_nr_alarms', to_int),
+    'number of physical drives': field_setter('_nr_pds', to_int),
+    'number of voltage sensors': field_setter('_nr_voltage_sensors', to_int),
+    'status': field_setter('_status', to_text_avail),
+    'connector name': field_setter('_connector_name', to_text_avail),
+    'enclosure type': field_setter('_enc_type', to_text_avail),
+    'vendor identification': field_setter('_vendor', to_text_avail),
+    'product identification': field_setter('_product_name', to_text_avail),
+    'product revision level': field_setter('_product_revision', to_text_avail),
+    'vendor specific': field_setter('_vendor_specific', to_text_avail),
+    'voltage sensor': _add_voltage_sensor,
+    'voltage sensor status': _set_voltage_status,
+    'voltage value': _set_voltage_value,
+    'fan': _add_fan,
+    'fan status': _set_fan_status,
+    'fan speed': _set_fan_speed,
+    'temp sensor': _add_temperature_sensor,
+    'temperature': _set_temperature,
+    'temperature sensor status': _set_temperature_status,
+}
+"""
+The dispatch table for the evaluation of the tokens of 'MegaCLI -EncInfo',
+the keys are the normalized keys of the output of MegaCli.
+"""
+
 
 # =============================================================================
 
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, ProfitBricks GmbH, Berlin
+@summary: The module for a cache of MegaCli results, which are valid
+          as long as the event log sequence number of the adapter
+          has not advanced
+"""
+
+# Standard modules
+import os
+import errno
+import json
+import logging
+import tempfile
+import threading
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_EVENT_CACHE_FILE = os.sep + os.path.join(
+    'var', 'cache', 'pb-blockdev', 'megaraid-events.json')
+
+EVENT_CACHE_FORMAT_VERSION = 1
+
+
+# =============================================================================
+class MegaraidEventCache(object):
+    """
+    Thread safe cache of the output of MegaCli and of the objects parsed
+    from it. Every entry is tagged with the newest event log sequence
+    number of the adapter at the time of the execution of MegaCli and
+    is valid only as long as this number has not advanced.
+
+    If a filename is given, the raw output is persisted in this file,
+    so it can be used by later invocations. The parsed objects are
+    only held in memory, after loading they are created again from
+    the persisted output.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, filename=None):
+        """
+        Constructor.
+
+        @param filename: the file to persist the cache in, if None,
+                         the cache is held only in memory
+        @type filename: str or None
+
+        """
+
+        self.filename = filename
+        """
+        @ivar: the file to persist the cache in
+        @type: str or None
+        """
+
+        self.hits = 0
+        """
+        @ivar: the number of lookups answered from the cache
+        @type: int
+        """
+
+        self.misses = 0
+        """
+        @ivar: the number of lookups not answered from the cache
+        @type: int
+        """
+
+        self._entries = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    # -------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Transforms the elements of the object into a dict
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        with self._lock:
+            return {
+                '__class_name__': self.__class__.__name__,
+                'filename': self.filename,
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+            }
+
+    # -------------------------------------------------------------------------
+    def get(self, key, seq):
+        """
+        Gives back the cache entry of the given key, if it was created
+        with the given event log sequence number.
+
+        @param key: the key of the entry (the arguments of MegaCli)
+        @type key: str
+        @param seq: the current event log sequence number of the adapter
+        @type seq: int
+
+        @return: the entry with the keys 'seq', 'out' and 'objects' (only,
+                 if the output was already parsed), or None
+        @rtype: dict or None
+
+        """
+
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is None or entry['seq'] != seq:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+    # -------------------------------------------------------------------------
+    def set_objects(self, key, seq, objects):
+        """
+        Saves the parsed objects of an entry loaded from disk.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['seq'] == seq:
+                entry['objects'] = objects
+
+    # -------------------------------------------------------------------------
+    def store(self, key, seq, out, objects):
+        """
+        Saves the output of MegaCli and the parsed objects under
+        the given key and persists the cache, if a filename was given.
+
+        @param key: the key of the entry (the arguments of MegaCli)
+        @type key: str
+        @param seq: the event log sequence number of the adapter
+                    before executing MegaCli
+        @type seq: int
+        @param out: the output of MegaCli
+        @type out: str
+        @param objects: the objects parsed from the output
+        @type objects: object
+
+        """
+
+        with self._lock:
+            self._load()
+            self._entries[key] = {
+                'seq': seq,
+                'out': out,
+                'objects': objects,
+            }
+            self._save()
+
+    # -------------------------------------------------------------------------
+    def clear(self):
+        """
+        Removes all entries, also from disk.
+        """
+
+        with self._lock:
+            self._entries = {}
+            self._loaded = True
+            self._save()
+
+    # -------------------------------------------------------------------------
+    def _load(self):
+        """
+        Loads the persisted entries once. A missing or damaged file
+        leads to an empty cache.
+        """
+
+        if self._loaded:
+            return
+        self._loaded = True
+
+        if not self.filename or not os.path.exists(self.filename):
+            return
+
+        try:
+            with open(self.filename, 'r') as fh:
+                data = json.load(fh)
+        except (IOError, OSError, ValueError) as e:
+            log.warn(_("Could not load MegaCli event cache %(f)r: %(e)s") % {
+                'f': self.filename, 'e': e})
+            return
+
+        if not isinstance(data, dict) or \
+                data.get('version') != EVENT_CACHE_FORMAT_VERSION:
+            log.debug(_("Ignoring MegaCli event cache %r of another format."),
+                      self.filename)
+            return
+
+        for key in data.get('entries', {}):
+            entry = data['entries'][key]
+            try:
+                self._entries[key] = {
+                    'seq': int(entry['seq']),
+                    'out': entry['out'],
+                }
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    # -------------------------------------------------------------------------
+    def _save(self):
+        """
+        Persists the output of all entries atomically, if a filename
+        was given. Errors are logged, but not raised.
+        """
+
+        if not self.filename:
+            return
+
+        data = {
+            'version': EVENT_CACHE_FORMAT_VERSION,
+            'entries': {},
+        }
+        for key in self._entries:
+            entry = self._entries[key]
+            data['entries'][key] = {'seq': entry['seq'], 'out': entry['out']}
+
+        cache_dir = os.path.dirname(self.filename)
+        tmp_name = None
+        try:
+            if cache_dir and not os.path.isdir(cache_dir):
+                try:
+                    os.makedirs(cache_dir, 0o755)
+                except OSError as e:
+                    if e.errno != errno.EEXIST:
+                        raise
+            (fd, tmp_name) = tempfile.mkstemp(
+                prefix='.megaraid-events.', dir=cache_dir or None)
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(data, fh)
+            os.rename(tmp_name, self.filename)
+            tmp_name = None
+        except (IOError, OSError) as e:
+            log.warn(_("Could not save MegaCli event cache %(f)r: %(e)s") % {
+                'f': self.filename, 'e': e})
+        finally:
+            if tmp_name and os.path.exists(tmp_name):
+                os.remove(tmp_name)
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -12,12 +12,13 @@ import sys
 import os
 import logging
 import re
+import time
+import threading
 
 # Third party modules
 
 # Own modules
 from pb_base.common import pp
-from pb_base.common import caller_search_path
 
 from pb_base.handler import CommandNotFoundError
 from pb_base.handler import PbBaseHandler
@@ -30,15 +31,38 @@ from pb_blockdev.megaraid.enc import MegaraidEnclosure
 
 from pb_blockdev.megaraid.pd import MegaraidPd
 
+from pb_blockdev.megaraid.parser import tokenize, iter_blocks
+from pb_blockdev.megaraid.parser import to_int_hex
+
+from pb_blockdev.megaraid.event_cache import MegaraidEventCache
+
+from pb_blockdev.tools import find_tool
+
 from pb_blockdev.translate import pb_gettext, pb_ngettext
 
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.7.2'
+__version__ = '0.13.2'
 
 log = logging.getLogger(__name__)
 
+if sys.version_info[0] > 2:
+    basestring = str
+
+DEFAULT_MEGACLI_CACHE_TTL = 60
+
+# The maximum number of concurrently running MegaCli or StorCLI processes
+# of the current process. All of them are talking to the firmware of the
+# controllers over the same management device and are writing the same
+# log file, so they are executed one after the other.
+MEGACLI_MAX_CONCURRENCY = 1
+
+_megacli_semaphore = threading.BoundedSemaphore(MEGACLI_MAX_CONCURRENCY)
+
+MEGACLI_COMMANDS = ('MegaCli64', 'MegaCli', 'megacli')
+STORCLI_COMMANDS = ('storcli64', 'storcli')
+
 re_exit_code = re.compile(
     r'^\s*Exit\s+Code\s*:\s*(?:0x)?([\da-f]+)', re.IGNORECASE | re.MULTILINE)
 re_adp_count = re.compile(
@@ -48,11 +72,12 @@ re_adp_count = re.compile(
 re_slot_empty = re.compile(
     r'Device\s+at\s+Enclosure.*is\s+not\s+found.', re.IGNORECASE)
 
-# Virtual Drive: 0 (Target Id: 0)
-start_ld_pattern = r'^(?:\S.*\s)?Virtual\s+Drive\s*:\s+(\d+)'
-start_ld_pattern += r'(?:\s*\(\s*Target\s+Id\s*:\s*(\d+)\s*\))\s*$'
-re_start_ld = re.compile(start_ld_pattern, re.IGNORECASE)
-del start_ld_pattern
+# 0 (Target Id: 0)
+re_ld_number = re.compile(
+    r'^(\d+)(?:\s*\(\s*Target\s+Id\s*:\s*(\d+)\s*\))?', re.IGNORECASE)
+
+# Enclosure 0:
+re_enc_number = re.compile(r'^enclosure\s+(\d+)$')
 
 # Adapter 0: Virtual Drive 77 Does not Exist.
 re_ld_not_exists = re.compile(
@@ -60,22 +85,127 @@ re_ld_not_exists = re.compile(
     re.IGNORECASE | re.MULTILINE)
 
 
+# =============================================================================
+class MegaraidBackend(object):
+    """
+    Base class of an alternative backend of the MegaraidHandler, which
+    retrieves the data of the MegaRaid adapters by another tool than
+    MegaCli and fills the same MegaraidPd, MegaraidLogicalDrive and
+    MegaraidEnclosure objects. Without a backend the MegaraidHandler
+    evaluates the text output of MegaCli itself.
+    """
+
+    name = None
+    """
+    @cvar: the name of the backend
+    @type: str
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, handler, command):
+        """
+        Constructor.
+
+        @param handler: the handler object executing the commands, may be
+                        None for only evaluating already retrieved output
+        @type handler: MegaraidHandler or None
+        @param command: the absolute path to the command of the backend
+        @type command: str
+
+        """
+
+        self.handler = handler
+        """
+        @ivar: the handler object executing the commands
+        @type: MegaraidHandler or None
+        """
+
+        self.command = command
+        """
+        @ivar: the absolute path to the command of the backend
+        @type: str
+        """
+
+    # -------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Transforms the elements of the object into a dict
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        return {
+            '__class_name__': self.__class__.__name__,
+            'name': self.name,
+            'command': self.command,
+        }
+
+    # -------------------------------------------------------------------------
+    def _not_implemented(self, method):
+
+        msg = _("Method %(m)s() is not implemented by backend %(b)r.") % {
+            'm': method, 'b': self.name}
+        raise NotImplementedError(msg)
+
+    # -------------------------------------------------------------------------
+    def adapter_count(self):
+        """Gives back the number of MegaRaid adapters."""
+        self._not_implemented('adapter_count')
+
+    # -------------------------------------------------------------------------
+    def get_event_seq(self, adapter_id):
+        """Gives back the newest event log sequence number of the adapter."""
+        self._not_implemented('get_event_seq')
+
+    # -------------------------------------------------------------------------
+    def get_pd(self, adapter_id, enc_id, slot, use_event_cache=True):
+        """Gives back the given physical drive or None."""
+        self._not_implemented('get_pd')
+
+    # -------------------------------------------------------------------------
+    def get_all_pds(self, adapter_id, use_event_cache=True):
+        """Gives back all physical drives of the adapter."""
+        self._not_implemented('get_all_pds')
+
+    # -------------------------------------------------------------------------
+    def get_enclosures(self, adapter_id, use_event_cache=True):
+        """Gives back all enclosures of the adapter."""
+        self._not_implemented('get_enclosures')
+
+    # -------------------------------------------------------------------------
+    def get_all_lds(self, adapter_id, use_event_cache=True):
+        """Gives back all logical drives of the adapter."""
+        self._not_implemented('get_all_lds')
+
+    # -------------------------------------------------------------------------
+    def get_ld_info(self, adapter_id, ld_nr, target_id=None, ld=None):
+        """Gives back the given logical drive or None."""
+        self._not_implemented('get_ld_info')
+
+
 # =============================================================================
 class MegaraidHandler(PbBaseHandler):
     """
     Handler class for executing MegaCLI commands.
+
+    If StorCLI is found and JSON output is preferred, all data are
+    retrieved by the StorCLI JSON backend instead of evaluating
+    the text output of MegaCli.
     """
 
     # -----------------------------------------------------------
     def __init__(
         self, appname=None, verbose=0, version=__version__, base_dir=None,
-            use_stderr=False, simulate=False, sudo=False,
+            use_stderr=False, simulate=False, sudo=False, cache_ttl=0,
+            event_cache=False, event_cache_file=None, prefer_json=True,
             *targs, **kwargs
             ):
         """
         Initialisation of the megaraid handler object.
 
-        @raise CommandNotFoundError: if the MegaCLI command could not be found.
+        @raise CommandNotFoundError: if neither the MegaCLI nor the StorCLI
+                                     command could be found.
 
         @param appname: name of the current running application
         @type appname: str
@@ -93,6 +223,21 @@ class MegaraidHandler(PbBaseHandler):
         @type simulate: bool
         @param sudo: should the command executed by sudo by default
         @type sudo: bool
+        @param cache_ttl: the time in seconds, the output of a MegaCli
+                          execution is reused for the same arguments,
+                          0 disables caching
+        @type cache_ttl: float
+        @param event_cache: reuse the results of get_pd(), get_all_pds(),
+                            get_enclosures() and get_all_lds() as long as
+                            the event log sequence number of the adapter
+                            has not advanced
+        @type event_cache: bool
+        @param event_cache_file: a file to persist the event cache in,
+                                 implies event_cache
+        @type event_cache_file: str or None
+        @param prefer_json: use the StorCLI JSON backend, if StorCLI is found,
+                            even if MegaCli is found too
+        @type prefer_json: bool
 
         @return: None
 
@@ -104,6 +249,38 @@ class MegaraidHandler(PbBaseHandler):
         @type: str
         """
 
+        self._storcli = None
+        """
+        @ivar: The absolute path to the StorCLI command.
+        @type: str
+        """
+
+        self.backend = None
+        """
+        @ivar: the backend retrieving the data instead of evaluating
+               the output of MegaCli, if any
+        @type: MegaraidBackend or None
+        """
+
+        self.cache_ttl = float(cache_ttl or 0)
+        """
+        @ivar: the time in seconds, the output of a MegaCli execution
+               is reused for the same arguments, 0 disables caching
+        @type: float
+        """
+
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
+        self.event_cache = None
+        """
+        @ivar: the cache of results, which are valid as long as the event
+               log sequence number of the adapter has not advanced
+        @type: MegaraidEventCache or None
+        """
+        if event_cache or event_cache_file:
+            self.event_cache = MegaraidEventCache(event_cache_file)
+
         super(MegaraidHandler, self).__init__(
             appname=appname,
             verbose=verbose,
@@ -117,6 +294,13 @@ class MegaraidHandler(PbBaseHandler):
         )
 
         self._init_megacli()
+        self._init_storcli()
+        if not self.megacli and not self.storcli:
+            raise CommandNotFoundError('MegaCli')
+
+        if self.storcli and (prefer_json or not self.megacli):
+            from pb_blockdev.megaraid.storcli import StorcliJsonBackend
+            self.backend = StorcliJsonBackend(self, self.storcli)
 
         self.initialized = True
 
@@ -126,6 +310,12 @@ class MegaraidHandler(PbBaseHandler):
         """The absolute path to the MegaCLI command."""
         return self._megacli
 
+    # -----------------------------------------------------------
+    @property
+    def storcli(self):
+        """The absolute path to the StorCLI command."""
+        return self._storcli
+
     # -------------------------------------------------------------------------
     def as_dict(self, short=False):
         """
@@ -140,6 +330,15 @@ class MegaraidHandler(PbBaseHandler):
 
         res = super(MegaraidHandler, self).as_dict(short=short)
         res['megacli'] = self.megacli
+        res['storcli'] = self.storcli
+        res['backend'] = None
+        if self.backend:
+            res['backend'] = self.backend.as_dict()
+        res['cache_ttl'] = self.cache_ttl
+        res['cached_results'] = len(self._cache)
+        res['event_cache'] = None
+        if self.event_cache:
+            res['event_cache'] = self.event_cache.as_dict()
 
         return res
 
@@ -148,57 +347,58 @@ class MegaraidHandler(PbBaseHandler):
         """
         Searches in path for the MegaCLI command and set self.megacli
         with the found path.
-
-        @raise CommandNotFoundError: if the MegaCLI could not be found
-
         """
 
         if self.verbose > 2:
             log.debug(_("Searching for the MegaCLI command ..."))
 
-        paths = caller_search_path()
         add_paths = (
             os.sep + os.path.join('opt', 'MegaRAID', 'MegaCli'),
             os.sep + os.path.join('opt', 'lsi', 'megacli'),
             os.sep + os.path.join('opt', 'megacli'),
         )
-        for d in add_paths:
-            if os.path.isdir(d) and d not in paths:
-                paths.append(d)
+        self._megacli = find_tool(
+            'megacli', add_paths=add_paths, alt_names=MEGACLI_COMMANDS)
 
-        if self.verbose > 3:
-            log.debug(_("Searching command in paths:") + "\n" + pp(paths))
+    # -------------------------------------------------------------------------
+    def _init_storcli(self):
+        """
+        Searches in path for the StorCLI command and set self.storcli
+        with the found path.
+        """
 
-        commands = ('MegaCli64', 'MegaCli', 'megacli')
-        for cmd in commands:
-            for d in paths:
-                if self.verbose > 3:
-                    log.debug(_(
-                        "Searching command %(cmd)r in %(dir)r ...") % {
-                        'cmd': cmd, 'dir': d})
-                p = os.path.join(d, cmd)
-                if os.path.exists(p):
-                    if self.verbose > 2:
-                        log.debug(_("Found %r ..."), p)
-                    if os.access(p, os.X_OK):
-                        self._megacli = p
-                        return
-                    else:
-                        log.debug(_("File %r is not executable."), p)
+        if self.verbose > 2:
+            log.debug(_("Searching for the StorCLI command ..."))
 
-        raise CommandNotFoundError('MegaCli')
+        add_paths = (
+            os.sep + os.path.join('opt', 'MegaRAID', 'storcli'),
+            os.sep + os.path.join('opt', 'lsi', 'storcli'),
+            os.sep + os.path.join('opt', 'storcli'),
+        )
+        self._storcli = find_tool(
+            'storcli', add_paths=add_paths, alt_names=STORCLI_COMMANDS)
 
     # -------------------------------------------------------------------------
-    def exec_megacli(self, args, nolog=True):
+    def exec_megacli(self, args, nolog=True, use_cache=True):
         """
         Executes the MegaCli command with the given arguments.
 
+        If caching is enabled by self.cache_ttl, the result of a former
+        execution with the same arguments is given back, if it is not
+        older than self.cache_ttl seconds.
+
+        Not more than MEGACLI_MAX_CONCURRENCY processes of MegaCli
+        are executed at the same time, independent of the handler object,
+        all other threads are waiting for them.
+
         @raise CommandNotFoundError: if the MegaCli command could not be found.
 
         @param args: the arguments for calling MegaCli
         @type args: str or list of str
         @param nolog: executes MegaCli with the '-NoLog' option
         @type nolog: bool
+        @param use_cache: use a cached result, if available
+        @type use_cache: bool
 
         @return: a dictionary with the following keys:
             * out - the output from STDOUT
@@ -209,6 +409,127 @@ class MegaraidHandler(PbBaseHandler):
 
         """
 
+        cmd = self._build_megacli_cmd(args, nolog=nolog)
+
+        key = tuple(cmd)
+        if use_cache:
+            result = self._get_cached(key)
+            if result is not None:
+                return result
+
+        with _megacli_semaphore:
+            (ret, stdoutdata, stderrdata) = self.call(cmd, quiet=True)
+
+        result = self._megacli_result(ret, stdoutdata, stderrdata)
+        self._set_cached(key, result)
+
+        return result
+
+    # -------------------------------------------------------------------------
+    def exec_storcli(self, args, use_cache=True):
+        """
+        Executes the StorCLI command with the given arguments. The result
+        is cached in the same way like the result of exec_megacli().
+
+        @raise CommandNotFoundError: if the StorCLI command could not be found.
+
+        @param args: the arguments for calling StorCLI
+        @type args: str or list of str
+        @param use_cache: use a cached result, if available
+        @type use_cache: bool
+
+        @return: a dictionary with the following keys:
+            * out - the output from STDOUT
+            * err - the output from SRDERR
+            * retval - the return value from OS
+        @retval: dict
+
+        """
+
+        if not self.storcli:
+            raise CommandNotFoundError('storcli')
+
+        cmd = [self.storcli]
+        if isinstance(args, basestring):
+            cmd.append(args)
+        else:
+            for arg in args:
+                cmd.append(arg)
+
+        key = tuple(cmd)
+        if use_cache:
+            result = self._get_cached(key)
+            if result is not None:
+                return result
+
+        with _megacli_semaphore:
+            (ret, stdoutdata, stderrdata) = self.call(cmd, quiet=True)
+
+        result = {
+            'out': stdoutdata,
+            'err': stderrdata,
+            'retval': ret,
+        }
+        self._set_cached(key, result)
+
+        return result
+
+    # -------------------------------------------------------------------------
+    def _get_cached(self, key):
+        """
+        Gives back a copy of the cached result of the MegaCli or StorCLI
+        execution with the given command line, or None, if there is no valid one.
+        """
+
+        if self.cache_ttl <= 0:
+            return None
+
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            (timestamp, result) = entry
+            if time.time() - timestamp > self.cache_ttl:
+                del self._cache[key]
+                return None
+
+        if self.verbose > 2:
+            log.debug(_("Using cached result of %r."), ' '.join(key))
+        return dict(result)
+
+    # -------------------------------------------------------------------------
+    def _set_cached(self, key, result):
+        """
+        Saves the result of the MegaCli or StorCLI execution with the given
+        command line in the cache, if caching is enabled.
+        """
+
+        if self.cache_ttl <= 0:
+            return
+
+        with self._cache_lock:
+            self._cache[key] = (time.time(), dict(result))
+
+    # -------------------------------------------------------------------------
+    def clear_cache(self):
+        """
+        Removes all cached results of MegaCli and StorCLI executions.
+        """
+
+        with self._cache_lock:
+            self._cache = {}
+
+    # -------------------------------------------------------------------------
+    def _build_megacli_cmd(self, args, nolog=True):
+        """
+        Builds the command line for executing MegaCli with the given arguments.
+
+        @raise CommandNotFoundError: if the MegaCli command could not be found.
+
+        @return: the command line
+        @rtype: list of str
+        """
+
         if not self.megacli:
             raise CommandNotFoundError('MegaCli')
 
@@ -223,7 +544,14 @@ class MegaraidHandler(PbBaseHandler):
         if nolog:
             cmd.append('-NoLog')
 
-        (ret, stdoutdata, stderrdata) = self.call(cmd, quiet=True)
+        return cmd
+
+    # -------------------------------------------------------------------------
+    def _megacli_result(self, ret, stdoutdata, stderrdata):
+        """
+        Transforms the result of an execution of MegaCli into the
+        dictionary given back by exec_megacli().
+        """
 
         result = {
             'out': stdoutdata,
@@ -257,6 +585,9 @@ class MegaraidHandler(PbBaseHandler):
 
         """
 
+        if self.backend:
+            return self.backend.adapter_count()
+
         log.debug(_("Retrieving number of MegaRaid controllers ..."))
         result = self.exec_megacli('-adpCount', nolog)
 
@@ -281,7 +612,114 @@ class MegaraidHandler(PbBaseHandler):
         return count
 
     # -------------------------------------------------------------------------
-    def get_pd(self, adapter_id, enc_id, slot, nolog=True):
+    def get_event_seq(self, adapter_id, nolog=True):
+        """
+        Executes 'MegaCLI -AdpEventLog -GetEventLogInfo' and returns the
+        newest sequence number of the event log of the given adapter.
+        Every change of the state of the adapter, its drives and its
+        enclosures leads to a new event and so to a higher number.
+
+        @raise CommandNotFoundError: if the MegaCli command could not be found.
+
+        @param adapter_id: the numeric ID of the MegaRaid adapter
+        @type adapter_id: int
+        @param nolog: executes MegaCli with the '-NoLog' option
+        @type nolog: bool
+
+        @return: the newest event sequence number, or None, if it could
+                 not be found in the output
+        @rtype: int or None
+
+        """
+
+        adapter_id = int(adapter_id)
+        if self.backend:
+            return self.backend.get_event_seq(adapter_id)
+
+        args = [
+            '-AdpEventLog',
+            '-GetEventLogInfo',
+            ('-a%d' % (adapter_id)),
+        ]
+        result = self.exec_megacli(args, nolog, use_cache=False)
+
+        for (key, value) in tokenize(result['out']):
+            if key == 'newest sequence number' and value:
+                try:
+                    if value.lower().startswith('0x'):
+                        return to_int_hex(value)
+                    return int(value)
+                except ValueError:
+                    break
+
+        log.debug(_(
+            "Could not detect the event sequence number of MegaRaid "
+            "controller %d."), adapter_id)
+        return None
+
+    # -------------------------------------------------------------------------
+    def _get_objects(
+            self, adapter_id, args, parse, nolog=True, use_event_cache=True,
+            execute=None):
+        """
+        Executes MegaCli with the given arguments and gives back the objects
+        created by the given parse function from its output.
+
+        If the event cache is enabled, the event log sequence number of
+        the adapter is retrieved first, and the cached objects are given
+        back, if the number has not advanced since their creation.
+        The cached objects are shared between all callers.
+
+        @param adapter_id: the numeric ID of the MegaRaid adapter
+        @type adapter_id: int
+        @param args: the arguments for calling MegaCli
+        @type args: list of str
+        @param parse: the function creating the objects from the output
+        @type parse: callable
+        @param nolog: executes MegaCli with the '-NoLog' option
+        @type nolog: bool
+        @param use_event_cache: use the event cache, if enabled
+        @type use_event_cache: bool
+        @param execute: the function executing the command instead of
+                        MegaCli with the given arguments, it must give back
+                        a dictionary with the output in the key 'out'
+        @type execute: callable or None
+
+        @return: the objects given back by the parse function
+
+        """
+
+        seq = None
+        key = ' '.join(args)
+        if self.event_cache and use_event_cache:
+            seq = self.get_event_seq(adapter_id, nolog)
+
+        if seq is not None:
+            entry = self.event_cache.get(key, seq)
+            if entry is not None:
+                if self.verbose > 2:
+                    log.debug(_(
+                        "Using result of %(args)r of event sequence %(seq)d.") % {
+                        'args': key, 'seq': seq})
+                if 'objects' in entry:
+                    return entry['objects']
+                objects = parse(entry['out'])
+                self.event_cache.set_objects(key, seq, objects)
+                return objects
+
+        if execute is None:
+            result = self.exec_megacli(args, nolog)
+        else:
+            result = execute()
+        objects = parse(result['out'])
+
+        if seq is not None:
+            self.event_cache.store(key, seq, result['out'], objects)
+
+        return objects
+
+    # -------------------------------------------------------------------------
+    def get_pd(self, adapter_id, enc_id, slot, nolog=True, use_event_cache=True):
         """
         Executes 'MegaCLI -pdInfo ...' for a particular physical device.
 
@@ -297,6 +735,8 @@ class MegaraidHandler(PbBaseHandler):
         @type slot: int
         @param nolog: executes MegaCli with the '-NoLog' option
         @type nolog: bool
+        @param use_event_cache: use the event cache, if enabled
+        @type use_event_cache: bool
 
         @return: the found physical device or None, if nothing was found.
         @rtype: MegaraidPd or None
@@ -306,6 +746,8 @@ class MegaraidHandler(PbBaseHandler):
         adapter_id = int(adapter_id)
         enc_id = int(enc_id)
         slot = int(slot)
+        if self.backend:
+            return self.backend.get_pd(adapter_id, enc_id, slot, use_event_cache)
 
         pd_name = "%d:%d" % (enc_id, slot)
 
@@ -317,30 +759,144 @@ class MegaraidHandler(PbBaseHandler):
             ('-PhysDrv[%s]' % (pd_name)),
             ('-a%d' % (adapter_id)),
         ]
-        result = self.exec_megacli(args, nolog)
 
-        if re_slot_empty.search(result['out']):
-            log.debug(_(
-                "PD [%(pd)s] (adapter %(a)d) doesn't exists.") % {
-                'pd': pd_name, 'a': adapter_id})
-            return None
+        def parse(output):
+            if re_slot_empty.search(output):
+                log.debug(_(
+                    "PD [%(pd)s] (adapter %(a)d) doesn't exists.") % {
+                    'pd': pd_name, 'a': adapter_id})
+                return None
 
-        pd = MegaraidPd(
-            adapter=adapter_id,
-            enclosure=enc_id,
-            slot=slot,
-            appname=self.appname,
-            verbose=self.verbose,
-            base_dir=self.base_dir,
-            use_stderr=self.use_stderr,
-        )
+            pd = MegaraidPd(
+                adapter=adapter_id,
+                enclosure=enc_id,
+                slot=slot,
+                appname=self.appname,
+                verbose=self.verbose,
+                base_dir=self.base_dir,
+                use_stderr=self.use_stderr,
+            )
+            pd.init_from_lines(output)
+            return pd
+
+        return self._get_objects(adapter_id, args, parse, nolog, use_event_cache)
+
+    # -------------------------------------------------------------------------
+    def get_all_pds(self, adapter_id, nolog=True, use_event_cache=True):
+        """
+        Executes 'MegaCLI -PDList' and returns a list of all physical drives
+        connected with the given MegaRaid adapter. In contrast to get_pd()
+        MegaCli is executed only once for all physical drives.
+
+        @raise CommandNotFoundError: if the MegaCli command could not be found.
+        @raise MegaraidHandlerError: if the output of 'MegaCLI -PDList' could
+                                     not analyzed.
+
+        @param adapter_id: the numeric ID of the MegaRaid adapter
+        @type adapter_id: int
+        @param nolog: executes MegaCli with the '-NoLog' option
+        @type nolog: bool
+        @param use_event_cache: use the event cache, if enabled
+        @type use_event_cache: bool
+
+        @return: all found physical drives, sorted by enclosure and slot
+        @rtype: list of MegaraidPd
+
+        """
+
+        adapter_id = int(adapter_id)
+        if self.backend:
+            return self.backend.get_all_pds(adapter_id, use_event_cache)
+
+        log.debug(_(
+            "Retrieving all physical drives of MegaRaid controller %d ..."),
+            adapter_id)
+        args = [
+            '-PDList',
+            ('-a%d' % (adapter_id)),
+        ]
 
-        pd.init_from_lines(result['out'])
+        def parse(output):
+            if self.verbose > 4:
+                log.debug(_("Got:"))
+                sys.stderr.write(output)
+            return self._parse_pd_list(adapter_id, output)
 
-        return pd
+        return self._get_objects(adapter_id, args, parse, nolog, use_event_cache)
 
     # -------------------------------------------------------------------------
-    def get_enclosures(self, adapter_id, nolog=True):
+    def _parse_pd_list(self, adapter_id, output):
+        """
+        Creates MegaraidPd objects from the output of 'MegaCLI -PDList'.
+
+        @return: all found physical drives, sorted by enclosure and slot
+        @rtype: list of MegaraidPd
+        """
+
+        pds = list(self.iter_pds(adapter_id, output))
+        pds.sort(key=lambda x: (x.enclosure, x.slot))
+
+        return pds
+
+    # -------------------------------------------------------------------------
+    def iter_pds(self, adapter_id, output):
+        """
+        Generator evaluating the output of 'MegaCLI -PDList' in a single
+        pass. Every physical drive is given back, as soon as its block,
+        beginning with 'Enclosure Device ID', is finished. Physical drives
+        without an enclosure are ignored.
+
+        @raise MegaraidHandlerError: if the slot number of a physical drive
+                                     could not be found.
+
+        @param adapter_id: the numeric ID of the MegaRaid adapter
+        @type adapter_id: int
+        @param output: the output of 'MegaCLI -PDList'
+        @type output: str or iterable of str
+
+        @return: the physical drives in the order of the output
+        @rtype: iterator of MegaraidPd
+
+        """
+
+        def is_start(token):
+            return token[0] == 'enclosure device id'
+
+        for ((key, enc_id), tokens) in iter_blocks(tokenize(output), is_start):
+
+            if not enc_id.isdigit():
+                log.debug(_(
+                    "Ignoring physical drive without enclosure on MegaRaid "
+                    "controller %d."), adapter_id)
+                continue
+
+            slot = None
+            for (key, value) in tokens:
+                if key == 'slot number':
+                    slot = int(value)
+                    break
+            if slot is None:
+                msg = _(
+                    "Could not detect slot number of physical drive in "
+                    "enclosure %(enc)s on MegaRaid controller %(a)d.") % {
+                    'enc': enc_id, 'a': adapter_id}
+                raise MegaraidHandlerError(msg)
+
+            pd = MegaraidPd(
+                adapter=adapter_id,
+                enclosure=int(enc_id),
+                slot=slot,
+                appname=self.appname,
+                verbose=self.verbose,
+                base_dir=self.base_dir,
+                use_stderr=self.use_stderr,
+            )
+            pd.init_from_tokens(tokens)
+
+            yield pd
+
+    # -------------------------------------------------------------------------
+    def get_enclosures(self, adapter_id, nolog=True, use_event_cache=True):
         """
         Executes 'MegaCLI -EncInfo' and returns a list of found enclosures
         connected with the given MegaRaid adapter.
@@ -353,6 +909,10 @@ class MegaraidHandler(PbBaseHandler):
         @type adapter_id: int
         @param nolog: executes MegaCli with the '-NoLog' option
         @type nolog: bool
+        @param use_event_cache: use the event cache, if enabled; sensor
+                                readings don't create events, so they
+                                may be outdated in cached enclosures
+        @type use_event_cache: bool
 
         @return: all found enclosures
         @rtype: list of MegaraidEnclosure
@@ -360,7 +920,9 @@ class MegaraidHandler(PbBaseHandler):
         """
 
         adapter_id = int(adapter_id)
-        enclosures = []
+        if self.backend:
+            return self.backend.get_enclosures(adapter_id, use_event_cache)
+
         log.debug(_(
             "Retrieving enclosures connected with MegaRaid controller %d ..."),
             adapter_id)
@@ -368,59 +930,55 @@ class MegaraidHandler(PbBaseHandler):
             '-EncInfo',
             ('-a%d' % (adapter_id)),
         ]
-        result = self.exec_megacli(args, nolog)
 
-        re_start_enc = re.compile(r'^Enclosure\s+(\d+)\s*:$', re.IGNORECASE)
+        def parse(output):
+            if self.verbose > 3:
+                log.debug(_("Got:"))
+                sys.stderr.write(output)
+            return list(self.iter_enclosures(adapter_id, output))
 
-        if self.verbose > 3:
-            log.debug(_("Got:"))
-            sys.stderr.write(result['out'])
+        return self._get_objects(adapter_id, args, parse, nolog, use_event_cache)
 
-        # Defaults for enclosure ...
-        enc_nr = None
-        enclosure = None
-        lines = []
+    # -------------------------------------------------------------------------
+    def iter_enclosures(self, adapter_id, output):
+        """
+        Generator evaluating the output of 'MegaCLI -EncInfo' in a single
+        pass. Every enclosure is given back, as soon as its block,
+        beginning with 'Enclosure 0:', is finished.
 
-        for line in result['out'].splitlines():
+        @param adapter_id: the numeric ID of the MegaRaid adapter
+        @type adapter_id: int
+        @param output: the output of 'MegaCLI -EncInfo'
+        @type output: str or iterable of str
 
-            line = line.strip()
-            if not line:
-                continue
+        @return: the enclosures in the order of the output
+        @rtype: iterator of MegaraidEnclosure
 
-            match = re_start_enc.search(line)
-            if match:
-                enc_nr = int(match.group(1))
-                if self.verbose > 2:
-                    log.debug(_("Starting with new enclosure No %d."), enc_nr)
-
-                # New defaults for enclosure ...
-                if enclosure:
-                    if lines:
-                        enclosure.init_from_lines(lines)
-                    enclosures.append(enclosure)
-                enclosure = MegaraidEnclosure(
-                    adapter=adapter_id,
-                    number=enc_nr,
-                    appname=self.appname,
-                    verbose=self.verbose,
-                    base_dir=self.base_dir,
-                    use_stderr=self.use_stderr,
-                )
-                lines = []
+        """
 
-                continue
+        def is_start(token):
+            return token[1] == '' and re_enc_number.search(token[0])
 
-            lines.append(line)
+        for ((key, value), tokens) in iter_blocks(tokenize(output), is_start):
 
-        if enclosure:
-            if lines:
-                enclosure.init_from_lines(lines)
-            enclosures.append(enclosure)
+            enc_nr = int(re_enc_number.search(key).group(1))
+            if self.verbose > 2:
+                log.debug(_("Starting with new enclosure No %d."), enc_nr)
+
+            enclosure = MegaraidEnclosure(
+                adapter=adapter_id,
+                number=enc_nr,
+                appname=self.appname,
+                verbose=self.verbose,
+                base_dir=self.base_dir,
+                use_stderr=self.use_stderr,
+            )
+            enclosure.init_from_tokens(tokens)
 
-        return enclosures
+            yield enclosure
 
     # -------------------------------------------------------------------------
-    def get_all_lds(self, adapter_id, nolog=True):
+    def get_all_lds(self, adapter_id, nolog=True, use_event_cache=True):
         """
         Executes 'MegaCLI -LdPdInfo' and returns a list of found logical drives
         of the given MegaRaid adapter.
@@ -433,6 +991,8 @@ class MegaraidHandler(PbBaseHandler):
         @type adapter_id: int
         @param nolog: executes MegaCli with the '-NoLog' option
         @type nolog: bool
+        @param use_event_cache: use the event cache, if enabled
+        @type use_event_cache: bool
 
         @return: all found logical drives
         @rtype: list of MegaraidLogicalDrive
@@ -440,7 +1000,9 @@ class MegaraidHandler(PbBaseHandler):
         """
 
         adapter_id = int(adapter_id)
-        lds = []
+        if self.backend:
+            return self.backend.get_all_lds(adapter_id, use_event_cache)
+
         log.debug(_(
             "Retrieving logical drives of MegaRaid controller %d ..."),
             adapter_id)
@@ -448,66 +1010,64 @@ class MegaraidHandler(PbBaseHandler):
             '-LdPdInfo',
             ('-a%d' % (adapter_id)),
         ]
-        result = self.exec_megacli(args, nolog)
 
-        # Virtual Drive: 0 (Target Id: 0)
-        re_start_ld = re.compile(
-            r'^(?:\S.*\s)?Virtual\s+Drive\s*:\s+(\d+)(?:\s*\(\s*Target\s+Id\s*:\s*(\d+)\s*\))\s*$',
-            re.IGNORECASE)
+        def parse(output):
+            if self.verbose > 4:
+                log.debug(_("Got:"))
+                sys.stderr.write(output)
+            return list(self.iter_lds(adapter_id, output))
 
-        if self.verbose > 4:
-            log.debug(_("Got:"))
-            sys.stderr.write(result['out'])
+        return self._get_objects(adapter_id, args, parse, nolog, use_event_cache)
 
-        # Defaults for ld ...
-        ld_nr = None
-        target_id = None
-        ld = None
-        lines = []
-
-        for line in result['out'].splitlines():
+    # -------------------------------------------------------------------------
+    def iter_lds(self, adapter_id, output):
+        """
+        Generator evaluating the output of 'MegaCLI -LdPdInfo' in a single
+        pass. Every logical drive is given back, as soon as its block,
+        beginning with 'Virtual Drive: 0 (Target Id: 0)', is finished.
 
-            line = line.strip()
-            if not line:
-                continue
+        @param adapter_id: the numeric ID of the MegaRaid adapter
+        @type adapter_id: int
+        @param output: the output of 'MegaCLI -LdPdInfo'
+        @type output: str or iterable of str
 
-            match = re_start_ld.search(line)
-            if match:
-                ld_nr = int(match.group(1))
-                if match.group(2) is not None:
-                    target_id = int(match.group(2))
-                if self.verbose > 2:
-                    log.debug(_(
-                        "Starting with new LD %(ld)r (target Id %(tid)r).") % {
-                        'ld': ld_nr, 'tid': target_id})
-
-                # New defaults for LD ...
-                if ld:
-                    if lines:
-                        ld.init_from_lines(lines)
-                    lds.append(ld)
-                ld = MegaraidLogicalDrive(
-                    adapter=adapter_id,
-                    number=ld_nr,
-                    target_id=target_id,
-                    appname=self.appname,
-                    verbose=self.verbose,
-                    base_dir=self.base_dir,
-                    use_stderr=self.use_stderr,
-                )
-                lines = []
-                target_id = None
+        @return: the logical drives in the order of the output
+        @rtype: iterator of MegaraidLogicalDrive
 
-                continue
+        """
 
-            lines.append(line)
+        def is_start(token):
+            (key, value) = token
+            if not key.endswith('virtual drive') or value is None:
+                return False
+            if re_ld_number.search(value):
+                return True
+            return False
+
+        for ((key, value), tokens) in iter_blocks(tokenize(output), is_start):
+
+            match = re_ld_number.search(value)
+            ld_nr = int(match.group(1))
+            target_id = None
+            if match.group(2) is not None:
+                target_id = int(match.group(2))
+            if self.verbose > 2:
+                log.debug(_(
+                    "Starting with new LD %(ld)r (target Id %(tid)r).") % {
+                    'ld': ld_nr, 'tid': target_id})
 
-        if ld:
-            if lines:
-                ld.init_from_lines(lines)
-            lds.append(ld)
+            ld = MegaraidLogicalDrive(
+                adapter=adapter_id,
+                number=ld_nr,
+                target_id=target_id,
+                appname=self.appname,
+                verbose=self.verbose,
+                base_dir=self.base_dir,
+                use_stderr=self.use_stderr,
+            )
+            ld.init_from_tokens(tokens)
 
-        return lds
+            yield ld
 
     # -------------------------------------------------------------------------
     def get_ld_info(self, adapter_id, ld_nr, target_id=None, ld=None, nolog=True):
@@ -544,6 +1104,9 @@ class MegaraidHandler(PbBaseHandler):
                     'lbl': 'ld', 'val': ld, 'cls': 'MegaraidLogicalDrive'}
                 raise ValueError(msg)
 
+        if self.backend:
+            return self.backend.get_ld_info(adapter_id, ld_nr, target_id, ld)
+
         no_override = False
         if ld:
             no_override = True
@@ -577,14 +1140,7 @@ class MegaraidHandler(PbBaseHandler):
             log.warn(match.group(1))
             return None
 
-        lines = []
-        for line in result['out'].splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            lines.append(line)
-
-        ld.init_from_lines(lines, no_override)
+        ld.init_from_tokens(tokenize(result['out']), no_override)
 
         if self.verbose > 3:
             log.debug((
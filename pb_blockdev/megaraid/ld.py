@@ -20,55 +20,31 @@ from pb_base.object import PbBaseObject
 
 from pb_blockdev.megaraid.pd import MegaraidPd
 
+from pb_blockdev.megaraid.parser import tokenize, apply_tokens
+from pb_blockdev.megaraid.parser import field_setter
+from pb_blockdev.megaraid.parser import to_text, to_bool
+
 from pb_blockdev.translate import pb_gettext, pb_ngettext
 
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.3.5'
+__version__ = '0.4.1'
 
 log = logging.getLogger(__name__)
 
-# RAID Level          : Primary-1, Secondary-0, RAID Level Qualifier-0
-raid_level_pattern = r'^RAID\s+Level\s*:\s*'
-raid_level_pattern += r'Primary-(\d+)'
+# Primary-1, Secondary-0, RAID Level Qualifier-0
+raid_level_pattern = r'^Primary-(\d+)'
 raid_level_pattern += r',\s*Secondary-(\d+)'
 raid_level_pattern += r'(?:,\s*RAID\s+Level\s+Qualifier-(\d+))?'
 re_raid_level = re.compile(raid_level_pattern, re.IGNORECASE)
 del raid_level_pattern
 
 # Virtual Drive Type    : CacheCade
-re_drive_type = re.compile(
-    r'^Virtual\s+Drive\s+Type\s*:\s*(\S.*)', re.IGNORECASE)
 re_cachecade = re.compile(r'^\s*CacheCade\s*$', re.IGNORECASE)
 
-# Name                :
-re_name = re.compile(r'^Name\s*:\s*(\S.*)', re.IGNORECASE)
-
-# Size                : 2.728 TB
-re_size = re.compile(r'^Size\s*:\s*(\S.*)', re.IGNORECASE)
-
-# State               : Optimal
-re_state = re.compile(r'^State\s*:\s*(\S.*)', re.IGNORECASE)
-
-# PD: 0 Information
-re_start_pd = re.compile(r'^PD\s*:\s*(\d+)\s*Information\s*$', re.IGNORECASE)
-
-# Enclosure Device ID: 9
-re_pd_enc = re.compile(
-    r'^Enclosure\s+Device\s+ID\s*:\s*(\d+)\s*$', re.IGNORECASE)
-
-# Slot Number: 0
-re_pd_slot = re.compile(r'^Slot\s+Number\s*:\s*(\d+)\s*$', re.IGNORECASE)
-
-# Is VD Cached: No
-re_cached = re.compile(r'^Is\s+VD\s+Cached\s*:\s*(\S.*)', re.IGNORECASE)
-
-re_yes = re.compile(r'^\s*y(?:es)?\s*$', re.IGNORECASE)
-
 # Cache Cade Type : Read Only
 # Cache Cade Type : Read and Write
-re_cache_rw = re.compile(r'^Cache\s+Cade\s+Type\s*:\s*(\S.*)', re.IGNORECASE)
 re_rw = re.compile(r'^\s*Read\s+and\s+Write\s*$', re.IGNORECASE)
 
 
@@ -480,10 +456,32 @@ class MegaraidLogicalDrive(PbBaseObject):
 #
 #
 
+        self.init_from_tokens(tokenize(lines), no_override)
+
+    # -------------------------------------------------------------------------
+    def init_from_tokens(self, tokens, no_override=False, dispatch=None):
+        """
+        Init of all properties from the tokens of the output of
+        'MegaCLI -LdPdInfo' or 'MegaCLI -LdInfo' as given back by
+        pb_blockdev.megaraid.parser.tokenize().
+
+        @param tokens: the tokens of the MegaCLI output
+        @type tokens: iterable of tuple
+        @param no_override: don't reset all properties before inspecting
+        @type no_override: bool
+        @param dispatch: the dispatch table to use instead of LD_DISPATCH
+        @type dispatch: dict or None
+
+        """
+
+        if dispatch is None:
+            dispatch = LD_DISPATCH
+
         self.initialized = False
 
         if self.verbose > 3:
-            log.debug(_("Analyzing lines:") + "\n%s", pp(lines))
+            tokens = list(tokens)
+            log.debug(_("Analyzing tokens:") + "\n%s", pp(tokens))
 
         if not no_override:
             self._name = None
@@ -495,144 +493,108 @@ class MegaraidLogicalDrive(PbBaseObject):
             self._cached = False
             self._cache_rw = None
 
-        pd_lines = []
+        apply_tokens(self, self._split_pd_tokens(tokens), dispatch)
 
-        pd_nr = None
-        pd_enc = None
-        pd_slot = None
-        pd = None
-
-        for line in lines:
+        self.initialized = True
 
-            # Checking for the Drive type
-            match = re_drive_type.search(line)
-            if match:
-                self._drive_type = match.group(1)
-                continue
+    # -------------------------------------------------------------------------
+    def _split_pd_tokens(self, tokens):
+        """
+        Generator giving back all tokens belonging to the LD itself.
+        The tokens of the PD blocks, beginning with 'PD: 0 Information',
+        are collected, and a new PD is added to self.pds, as soon
+        as its block is finished.
+        """
 
-            # Checking for RAID level
-            match = re_raid_level.search(line)
-            if match:
-                self._raid_level_primary = int(match.group(1))
-                self._raid_level_secondary = int(match.group(2))
-                if match.group(3) is not None:
-                    self._raid_level_qualifier = int(match.group(3))
-                if self.verbose > 2:
-                    log.debug(
-                        _("RAID level of LD No %(nr)d: %(l)s.") % {
-                            'nr': self.number, 'l': self.raid_level})
-                continue
+        pd_tokens = None
 
-            # Checking for the name of the LD
-            match = re_name.search(line)
-            if match:
-                self._name = match.group(1)
-                if self.verbose > 2:
-                    log.debug(_("Got %(n)r as name of LD %(nr)d.") % {
-                        'n': self.name, 'nr': self.number})
+        for token in tokens:
+            if token[0] == 'pd':
+                if pd_tokens:
+                    self._add_pd(pd_tokens)
+                pd_tokens = []
                 continue
-
-            # Checking for the text size
-            match = re_size.search(line)
-            if match:
-                self._size = match.group(1)
-                if self.verbose > 2:
-                    log.debug(_("Got %(s)r as size of LD %(n)d.") % {
-                        's': self.size, 'n': self.number})
+            if pd_tokens is not None:
+                pd_tokens.append(token)
                 continue
+            yield token
 
-            # Checking for the state
-            match = re_state.search(line)
-            if match:
-                self._state = match.group(1)
-                if self.verbose > 3:
-                    log.debug(_("Got %(s)r as state of LD %(n)d.") % {
-                        's': self.state, 'n': self.number})
-                continue
+        if pd_tokens:
+            self._add_pd(pd_tokens)
 
-            # Check for cache state
-            match = re_cached.search(line)
-            if match:
-                cached = match.group(1)
-                if re_yes.search(cached):
-                    self._cached = True
-                else:
-                    self._cached = False
-                continue
+    # -------------------------------------------------------------------------
+    def _add_pd(self, tokens):
+        """
+        Creates a new MegaraidPd object from the given tokens
+        and adds it to self.pds.
+        """
 
-            # Check, whether the cache is r/w
-            match = re_cache_rw.search(line)
-            if match:
-                ctype = match.group(1)
-                if re_rw.search(ctype):
-                    self._cache_rw = True
-                else:
-                    self._cache_rw = False
-
-            # Check for start of a new PD definition
-            match = re_start_pd.search(line)
-            if match:
-                pd_nr = int(match.group(1))
-                if pd_lines and pd_enc is not None and pd_slot is not None:
-                    if pd:
-                        self.pds.append(pd)
-                    if self.verbose > 2:
-                        log.debug(_(
-                            "Init of PD %(pd_nr)d [%(enc)d:%(slot)d] of LD %(nr)d.") % {
-                            'pd_nr': pd_nr, 'enc': pd_enc, 'slot': pd_slot, 'nr': self.number})
-                    pd = MegaraidPd(
-                        adapter=self.adapter,
-                        enclosure=pd_enc,
-                        slot=pd_slot,
-                        appname=self.appname,
-                        verbose=self.verbose,
-                        base_dir=self.base_dir,
-                        use_stderr=self.use_stderr,
-                    )
-                    pd.init_from_lines(pd_lines)
-                    if self.verbose > 3:
-                        log.debug(_("Got PD:") + "\n%s", pp(pd.as_dict(True)))
-                pd_lines = []
-                pd_nr = None
-                pd_enc = None
-                pd_slot = None
-                continue
+        pd_enc = None
+        pd_slot = None
+        for (key, value) in tokens:
+            if key == 'enclosure device id' and value.isdigit():
+                pd_enc = int(value)
+            elif key == 'slot number' and value.isdigit():
+                pd_slot = int(value)
+            if pd_enc is not None and pd_slot is not None:
+                break
+
+        if pd_enc is None or pd_slot is None:
+            return
+
+        if self.verbose > 2:
+            log.debug(_("Init of PD [%(enc)d:%(slot)d] of LD %(nr)d.") % {
+                'enc': pd_enc, 'slot': pd_slot, 'nr': self.number})
+        pd = MegaraidPd(
+            adapter=self.adapter,
+            enclosure=pd_enc,
+            slot=pd_slot,
+            appname=self.appname,
+            verbose=self.verbose,
+            base_dir=self.base_dir,
+            use_stderr=self.use_stderr,
+        )
+        pd.init_from_tokens(tokens)
+        if self.verbose > 3:
+            log.debug(_("Got PD:") + "\n%s", pp(pd.as_dict(True)))
+        self.pds.append(pd)
 
-            # Check for PD Enclosure
-            match = re_pd_enc.search(line)
-            if match:
-                pd_enc = int(match.group(1))
-                continue
 
-            # Checkfor PD slot
-            match = re_pd_slot.search(line)
-            if match:
-                pd_slot = int(match.group(1))
-                continue
+# =============================================================================
+def _set_raid_level(ld, value):
+    """Setter for 'RAID Level: Primary-1, Secondary-0, RAID Level Qualifier-0'."""
+    match = re_raid_level.search(value)
+    if not match:
+        raise ValueError(_("Invalid RAID level."))
+    ld._raid_level_primary = int(match.group(1))
+    ld._raid_level_secondary = int(match.group(2))
+    if match.group(3) is not None:
+        ld._raid_level_qualifier = int(match.group(3))
 
-            pd_lines.append(line)
-
-        if pd:
-            self.pds.append(pd)
-        if pd_lines and pd_enc is not None and pd_slot is not None:
-            if self.verbose > 2:
-                log.debug(_("Init of PD [%(enc)d:%(slot)d] of LD %(nr)d.") % {
-                    'enc': pd_enc, 'slot': pd_slot, 'nr': self.number})
-            pd = MegaraidPd(
-                adapter=self.adapter,
-                enclosure=pd_enc,
-                slot=pd_slot,
-                appname=self.appname,
-                verbose=self.verbose,
-                base_dir=self.base_dir,
-                use_stderr=self.use_stderr,
-            )
-            pd.init_from_lines(pd_lines)
-            if self.verbose > 3:
-                log.debug(_("Got PD:") + "\n%s", pp(pd.as_dict(True)))
-            self.pds.append(pd)
 
-        self.initialized = True
+# =============================================================================
+def _set_cache_rw(ld, value):
+    """Setter for 'Cache Cade Type : Read and Write'."""
+    if re_rw.search(value or ''):
+        ld._cache_rw = True
+    else:
+        ld._cache_rw = False
+
+
+LD_DISPATCH = {
+    'virtual drive type': field_setter('_drive_type', to_text),
+    'raid level': _set_raid_level,
+    'name': field_setter('_name', to_text),
+    'size': field_setter('_size', to_text),
+    'state': field_setter('_state', to_text),
+    'is vd cached': field_setter('_cached', to_bool),
+    'cache cade type': _set_cache_rw,
+}
+"""
+The dispatch table for the evaluation of the tokens of 'MegaCLI -LdPdInfo'
+and 'MegaCLI -LdInfo', the keys are the normalized keys of the output
+of MegaCli.
+"""
 
 # =============================================================================
 
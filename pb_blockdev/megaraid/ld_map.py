@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, ProfitBricks GmbH, Berlin
+@summary: The module for mapping MegaRaid logical drives to Linux block devices
+
+The mapping is done only with the sysfs entries of the SCSI hosts
+of the megaraid_sas driver, without executing MegaCli or lsscsi.
+
+The megaraid_sas driver exposes its logical drives on the SCSI channels
+starting with 2 (the channels 0 and 1 are used for system PDs), with
+128 targets per channel, so the target Id of a logical drive is::
+
+    (bus - 2) * 128 + target
+
+The MegaRaid adapter Ids are assigned by the driver in the order of
+probing the controllers, which is the order of the SCSI host Ids of
+the megaraid_sas hosts. If this assumption doesn't hold on a system,
+an explicit mapping of the adapter Ids to SCSI host Ids may be given.
+"""
+
+# Standard modules
+import os
+import logging
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.hbtl import HBTL
+
+from pb_blockdev.scsi_host import BASE_SYSFS_SCSIHOST_DIR
+from pb_blockdev.scsi_host import BASE_SYSFS_SCSI_DEVICES_DIR
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+MEGARAID_PROC_NAME = 'megaraid_sas'
+
+# The first SCSI channel used for logical drives by megaraid_sas
+MEGARAID_LD_CHANNEL = 2
+
+# The number of targets per SCSI channel of megaraid_sas
+MEGARAID_TARGETS_PER_CHANNEL = 128
+
+
+# =============================================================================
+class MegaraidLdDevice(object):
+    """
+    A single entry of the mapping of a MegaRaid logical drive
+    to its Linux block device.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, adapter, target_id, hbtl, device=None):
+        """
+        Constructor.
+
+        @param adapter: the Id of the Megaraid controller
+        @type adapter: int
+        @param target_id: the SCSI target Id of the Logical Drive
+        @type target_id: int
+        @param hbtl: the SCSI address of the Logical Drive
+        @type hbtl: HBTL
+        @param device: the name of the block device, e.g. 'sdb', or None,
+                       if there is no block device (yet)
+        @type device: str or None
+
+        """
+
+        self.adapter = int(adapter)
+        self.target_id = int(target_id)
+        self.hbtl = hbtl
+        self.device = device
+
+    # -----------------------------------------------------------
+    @property
+    def device_path(self):
+        """The path of the block device below /dev, if there is any."""
+        if not self.device:
+            return None
+        return os.sep + os.path.join('dev', self.device)
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'adapter': self.adapter,
+            'target_id': self.target_id,
+            'hbtl': str(self.hbtl),
+            'device': self.device,
+            'device_path': self.device_path,
+        }
+        return res
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+        """Typecasting into a string for reproduction."""
+
+        out = "<%s(" % (self.__class__.__name__)
+        out += "adapter=%r, target_id=%r, hbtl=%r, device=%r" % (
+            self.adapter, self.target_id, str(self.hbtl), self.device)
+        out += ")>"
+        return out
+
+
+# =============================================================================
+def ld_target_id(bus, target):
+    """
+    Gives back the target Id of a logical drive from the given SCSI bus
+    and target of a megaraid_sas host, or None, if the address doesn't
+    belong to a logical drive.
+    """
+
+    if bus < MEGARAID_LD_CHANNEL:
+        return None
+    return (bus - MEGARAID_LD_CHANNEL) * MEGARAID_TARGETS_PER_CHANNEL + target
+
+
+# =============================================================================
+class MegaraidLdMap(object):
+    """
+    Index of all MegaRaid logical drives of all adapters to their Linux
+    block devices and back, built in one pass over sysfs.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, host_map=None, scsi_host_dir=BASE_SYSFS_SCSIHOST_DIR,
+            scsi_devices_dir=BASE_SYSFS_SCSI_DEVICES_DIR):
+        """
+        Constructor.
+
+        @param host_map: an explicit mapping of MegaRaid adapter Ids
+                         to SCSI host Ids, if not given, it is taken from
+                         the order of the megaraid_sas SCSI hosts
+        @type host_map: dict
+        @param scsi_host_dir: the sysfs directory of the SCSI hosts
+        @type scsi_host_dir: str
+        @param scsi_devices_dir: the sysfs directory of the SCSI devices
+        @type scsi_devices_dir: str
+
+        """
+
+        self.host_map = None
+        if host_map is not None:
+            self.host_map = dict(host_map)
+        self.scsi_host_dir = scsi_host_dir
+        self.scsi_devices_dir = scsi_devices_dir
+
+        self.hosts = {}
+        """
+        @ivar: mapping of the SCSI host Ids to the MegaRaid adapter Ids
+        @type: dict
+        """
+
+        self._by_ld = {}
+        self._by_device = {}
+
+    # -------------------------------------------------------------------------
+    def _read_proc_name(self, host_name):
+
+        filename = os.path.join(self.scsi_host_dir, host_name, 'proc_name')
+        try:
+            with open(filename) as fh:
+                return fh.read().strip()
+        except (IOError, OSError) as e:
+            log.debug(_("Could not read %(f)r: %(e)s") % {
+                'f': filename, 'e': e})
+        return None
+
+    # -------------------------------------------------------------------------
+    def _find_hosts(self):
+
+        host_ids = []
+        if os.path.isdir(self.scsi_host_dir):
+            for host_name in os.listdir(self.scsi_host_dir):
+                if not host_name.startswith('host'):
+                    continue
+                try:
+                    host_id = int(host_name[4:])
+                except ValueError:
+                    continue
+                if self._read_proc_name(host_name) == MEGARAID_PROC_NAME:
+                    host_ids.append(host_id)
+        host_ids.sort()
+
+        if self.host_map is not None:
+            hosts = {}
+            for adapter_id in self.host_map:
+                host_id = self.host_map[adapter_id]
+                if host_id not in host_ids:
+                    log.warn(_(
+                        "SCSI host %(h)d of MegaRaid adapter %(a)d is not "
+                        "a megaraid_sas host.") % {'h': host_id, 'a': adapter_id})
+                hosts[host_id] = adapter_id
+            return hosts
+
+        hosts = {}
+        for adapter_id, host_id in enumerate(host_ids):
+            hosts[host_id] = adapter_id
+        return hosts
+
+    # -------------------------------------------------------------------------
+    def _block_device(self, hbtl_str):
+
+        block_dir = os.path.join(self.scsi_devices_dir, hbtl_str, 'block')
+        try:
+            names = os.listdir(block_dir)
+        except (IOError, OSError):
+            return None
+        if not names:
+            return None
+        return sorted(names)[0]
+
+    # -------------------------------------------------------------------------
+    def build(self):
+        """
+        (Re)builds the index of all logical drives of all MegaRaid adapters.
+
+        @return: the number of found logical drives
+        @rtype: int
+        """
+
+        self.hosts = self._find_hosts()
+        self._by_ld = {}
+        self._by_device = {}
+        if not self.hosts:
+            log.debug(_("No megaraid_sas SCSI hosts found."))
+            return 0
+
+        names = []
+        if os.path.isdir(self.scsi_devices_dir):
+            names = os.listdir(self.scsi_devices_dir)
+
+        for name in names:
+            try:
+                hbtl = HBTL.from_string(name)
+            except ValueError:
+                continue
+            adapter_id = self.hosts.get(hbtl.host)
+            if adapter_id is None:
+                continue
+            target_id = ld_target_id(hbtl.bus, hbtl.target)
+            if target_id is None:
+                continue
+
+            entry = MegaraidLdDevice(
+                adapter_id, target_id, hbtl, self._block_device(name))
+            self._by_ld[(adapter_id, target_id)] = entry
+            if entry.device:
+                self._by_device[entry.device] = entry
+
+        log.debug(__(
+            "Found %d MegaRaid logical drive in sysfs.",
+            "Found %d MegaRaid logical drives in sysfs.",
+            len(self._by_ld)) % (len(self._by_ld)))
+
+        return len(self._by_ld)
+
+    # -------------------------------------------------------------------------
+    def by_ld(self, adapter_id, target_id):
+        """
+        Gives back the entry of the given logical drive, or None,
+        if it was not found in sysfs.
+
+        @rtype: MegaraidLdDevice or None
+        """
+        return self._by_ld.get((int(adapter_id), int(target_id)))
+
+    # -------------------------------------------------------------------------
+    def by_device(self, device):
+        """
+        Gives back the entry of the logical drive of the given block
+        device, or None, if it's not a MegaRaid logical drive.
+
+        @param device: the name or the path of the block device,
+                       e.g. 'sdb' or '/dev/sdb'
+        @type device: str
+
+        @rtype: MegaraidLdDevice or None
+        """
+        return self._by_device.get(os.path.basename(device))
+
+    # -------------------------------------------------------------------------
+    def resolve(self, ld):
+        """
+        Gives back the entry of the given logical drive object, or None,
+        if it was not found in sysfs.
+
+        @param ld: the logical drive
+        @type ld: MegaraidLogicalDrive
+
+        @rtype: MegaraidLdDevice or None
+        """
+
+        target_id = ld.target_id
+        if target_id is None:
+            target_id = ld.number
+        return self.by_ld(ld.adapter, target_id)
+
+    # -------------------------------------------------------------------------
+    def entries(self):
+        """
+        Gives back all entries sorted by adapter and target Id.
+
+        @rtype: list of MegaraidLdDevice
+        """
+        return [self._by_ld[x] for x in sorted(self._by_ld.keys())]
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._by_ld)
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        res = {
+            '__class_name__': self.__class__.__name__,
+            'host_map': self.host_map,
+            'hosts': self.hosts,
+            'scsi_host_dir': self.scsi_host_dir,
+            'scsi_devices_dir': self.scsi_devices_dir,
+            'entries': [x.as_dict(short=short) for x in self.entries()],
+        }
+        return res
+
+
+# =============================================================================
+def get_ld_map(host_map=None):
+    """
+    Gives back a new built index of all MegaRaid logical drives
+    to their Linux block devices.
+
+    @rtype: MegaraidLdMap
+    """
+
+    ld_map = MegaraidLdMap(host_map=host_map)
+    ld_map.build()
+    return ld_map
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -9,6 +9,7 @@
 
 # Standard modules
 import sys
+import time
 import logging
 
 # Third party modules
@@ -23,13 +24,24 @@ from pb_base.handler import CommandNotFoundError
 import pb_blockdev.megaraid
 
 from pb_blockdev.megaraid.handler import MegaraidHandler
+from pb_blockdev.megaraid.handler import DEFAULT_MEGACLI_CACHE_TTL
+
+from pb_blockdev.megaraid.collector import MegaraidCollector
+
+from pb_blockdev.megaraid.event_cache import DEFAULT_EVENT_CACHE_FILE
+
+from pb_blockdev.megaraid.output import OUTPUT_FORMATS, LD_FIELDS
+from pb_blockdev.megaraid.output import ADAPTER_FIELDS, SUMMARY_FIELDS
+from pb_blockdev.megaraid.output import get_record_writer, record_fields
+from pb_blockdev.megaraid.output import ld_record, adapter_record
+from pb_blockdev.megaraid.output import summary_record
 
 from pb_blockdev.translate import pb_gettext, pb_ngettext
 
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.3.6'
+__version__ = '0.6.0'
 
 LOG = logging.getLogger(__name__)
 
@@ -54,6 +66,12 @@ class MegaraidLdsApp(PbApplication):
         @type: MegaraidHandler
         """
 
+        self.collector = None
+        """
+        @ivar: a collector object for querying all adapters concurrently
+        @type: MegaraidCollector
+        """
+
         indent = ' ' * self.usage_term_len
 
         usage = _("%(prog)s [General options]")
@@ -69,12 +87,25 @@ class MegaraidLdsApp(PbApplication):
         @type: bool
         """
 
+        self.output_format = 'table'
+        """
+        @ivar: the output format, one of OUTPUT_FORMATS
+        @type: str
+        """
+
         self.hotspares = False
         """
         @ivar: retrieve the assigned hotspares and display them
         @type: bool
         """
 
+        self.event_cache_file = None
+        """
+        @ivar: the file to persist the results of MegaCli in between
+               invocations, as long as the event log has not changed
+        @type: str or None
+        """
+
         super(MegaraidLdsApp, self).__init__(
             usage=usage,
             verbose=verbose,
@@ -90,11 +121,20 @@ class MegaraidLdsApp(PbApplication):
                 appname=self.appname,
                 verbose=self.verbose,
                 base_dir=self.base_dir,
+                cache_ttl=DEFAULT_MEGACLI_CACHE_TTL,
+                event_cache_file=self.event_cache_file,
             )
         except CommandNotFoundError as e:
             sys.stderr.write(str(e) + "\n\n")
             sys.exit(5)
 
+        self.collector = MegaraidCollector(
+            handler=self.handler,
+            appname=self.appname,
+            verbose=self.verbose,
+            base_dir=self.base_dir,
+        )
+
         self.initialized = True
 
     # -------------------------------------------------------------------------
@@ -114,6 +154,27 @@ class MegaraidLdsApp(PbApplication):
                 'without headers and footers'),
         )
 
+        self.arg_parser.add_argument(
+            '--format',
+            choices=OUTPUT_FORMATS,
+            default='table',
+            dest='output_format',
+            help=_(
+                'The output format, the machine readable formats are written '
+                'incrementally per adapter and finished by a summary '
+                'record (default: %(default)s)'),
+        )
+
+        self.arg_parser.add_argument(
+            '-C', '--event-cache',
+            action='store_true',
+            dest='event_cache',
+            help=_(
+                'Reuse the results of former invocations as long as the event '
+                'log of the MegaRaid adapter has not changed (stored in %r).') % (
+                DEFAULT_EVENT_CACHE_FILE),
+        )
+
         self.arg_parser.add_argument(
             '-H', '--hotspares',
             action='store_true',
@@ -130,17 +191,24 @@ class MegaraidLdsApp(PbApplication):
         super(MegaraidLdsApp, self).perform_arg_parser()
 
         self.parsable = self.args.parsable
+        self.output_format = self.args.output_format
+        if self.args.event_cache:
+            self.event_cache_file = DEFAULT_EVENT_CACHE_FILE
         self.hotspares = self.args.hotspares
 
     # -------------------------------------------------------------------------
     def _run(self):
         """The underlaying startpoint of the application."""
 
-        count_adapters = self.handler.adapter_count()
-        if not count_adapters:
+        adapter_ids = self.collector.adapter_ids()
+        if not adapter_ids:
             sys.stderr.write(_("No MegaRaid controllers found.") + "\n\n")
             sys.exit(1)
 
+        if self.output_format != 'table':
+            self._write_records(adapter_ids)
+            return
+
         if self.parsable:
             line_templ = "%d;%d;%s;%s;%s;%s"
 
@@ -160,10 +228,11 @@ class MegaraidLdsApp(PbApplication):
         size_total = 0
         all_lds = []
 
-        adapter_id = 0
-        while adapter_id < count_adapters:
+        lds_per_adapter = self.collector.get_all_lds(adapter_ids, ld_info=True)
 
-            lds = self.handler.get_all_lds(adapter_id)
+        for adapter_id in adapter_ids:
+
+            lds = lds_per_adapter[adapter_id]
             if self.verbose > 3:
                 if lds:
                     ldlist = []
@@ -175,13 +244,8 @@ class MegaraidLdsApp(PbApplication):
                 for ld in lds:
                     all_lds.append(ld)
 
-            adapter_id += 1
-
         for ld in sorted(all_lds):
 
-            if ld.cached:
-                ld = self.handler.get_ld_info(ld.adapter, ld.number, ld)
-
             info = {}
             info['adp'] = ld.adapter
             info['id'] = ld.number
@@ -207,14 +271,41 @@ class MegaraidLdsApp(PbApplication):
 
             print(line_templ % (info))
 
-            adapter_id += 1
-
         size_mb = int(size_total / 1024 / 1024)
         size_gb = float(size_total) / 1024.0 / 1024.0 / 1024.0
 
         if not self.parsable and size_total:
             print("\n%-13s  %11d  %10.f" % (_('Total:'), size_mb, size_gb))
 
+    # -------------------------------------------------------------------------
+    def _write_records(self, adapter_ids):
+        """
+        Writes the logical drives of every adapter in the machine readable
+        output format, as soon as the adapter has finished, followed by
+        a record with the time needed for the adapter. The output is
+        finished by a summary record. The logical drives are sorted
+        only per adapter.
+        """
+
+        start = time.time()
+        writer = get_record_writer(
+            self.output_format, sys.stdout,
+            record_fields(LD_FIELDS, ADAPTER_FIELDS, SUMMARY_FIELDS))
+
+        count_total = 0
+
+        with writer:
+            for (adapter_id, lds, seconds) in self.collector.iter_all_lds(
+                    adapter_ids, ld_info=True):
+                for ld in sorted(lds, key=lambda x: x.number):
+                    writer.write(ld_record(ld))
+                writer.write(adapter_record(adapter_id, len(lds), None, seconds))
+                writer.flush()
+                count_total += len(lds)
+
+            writer.write(summary_record(
+                len(adapter_ids), count_total, None, time.time() - start))
+
 # =============================================================================
 
 if __name__ == "__main__":
@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, ProfitBricks GmbH, Berlin
+@summary: The module for the machine readable output of the megaraid-pds
+          and megaraid-lds applications
+
+The records are written incrementally, so every record is written out,
+as soon as the data of its adapter are available. Every record has
+a 'record' field with its type: 'pd', 'ld', 'adapter' or 'summary'.
+"""
+
+# Standard modules
+import sys
+import csv
+import json
+import logging
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ('table', 'json', 'jsonl', 'csv')
+"""
+The output formats of the megaraid-pds and megaraid-lds applications,
+all except 'table' are written by a RecordWriter.
+"""
+
+PD_FIELDS = (
+    'adapter', 'enclosure', 'slot', 'device_id', 'type', 'size', 'vendor',
+    'model', 'serial', 'wwn', 'firmware_state', 'is_hotspare',
+    'media_errors', 'other_errors', 'predictive_failures',
+)
+
+LD_FIELDS = (
+    'adapter', 'number', 'target_id', 'name', 'raid_level', 'size', 'state',
+    'cache', 'pds',
+)
+
+ADAPTER_FIELDS = ('adapter', 'count', 'size', 'seconds')
+
+SUMMARY_FIELDS = ('adapters', 'count', 'size', 'seconds')
+
+
+# =============================================================================
+class RecordWriter(object):
+    """
+    Base class for writing records incrementally to a file object.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, fh=None, fields=None):
+        """
+        Constructor.
+
+        @param fh: the file object to write to, defaults to STDOUT
+        @type fh: file
+        @param fields: all fields of all records in the order of output,
+                       needed for formats with columns
+        @type fields: list of str
+
+        """
+
+        self.fh = fh
+        if self.fh is None:
+            self.fh = sys.stdout
+        self.fields = []
+        if fields:
+            self.fields = list(fields)
+        self.count = 0
+
+    # -------------------------------------------------------------------------
+    def begin(self):
+        """Writes anything needed before the first record."""
+        pass
+
+    # -------------------------------------------------------------------------
+    def write(self, record):
+        """
+        Writes a single record.
+
+        @param record: the record to write
+        @type record: dict
+        """
+
+        self._write(record)
+        self.count += 1
+
+    # -------------------------------------------------------------------------
+    def _write(self, record):
+        raise NotImplementedError()
+
+    # -------------------------------------------------------------------------
+    def end(self):
+        """Writes anything needed after the last record and flushes."""
+        self.flush()
+
+    # -------------------------------------------------------------------------
+    def flush(self):
+        """Flushes the underlying file object."""
+        self.fh.flush()
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+
+        self.begin()
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.end()
+
+
+# =============================================================================
+class JsonLinesWriter(RecordWriter):
+    """
+    Writes every record as a compact JSON object on a single line.
+    """
+
+    # -------------------------------------------------------------------------
+    def _write(self, record):
+
+        self.fh.write(json.dumps(record, separators=(',', ':')) + "\n")
+
+
+# =============================================================================
+class JsonWriter(RecordWriter):
+    """
+    Writes all records as a single compact JSON list, one record per line.
+    """
+
+    # -------------------------------------------------------------------------
+    def begin(self):
+
+        self.fh.write('[')
+
+    # -------------------------------------------------------------------------
+    def _write(self, record):
+
+        if self.count:
+            self.fh.write(",\n")
+        self.fh.write(json.dumps(record, separators=(',', ':')))
+
+    # -------------------------------------------------------------------------
+    def end(self):
+
+        self.fh.write("]\n")
+        super(JsonWriter, self).end()
+
+
+# =============================================================================
+class CsvWriter(RecordWriter):
+    """
+    Writes all records as CSV with a header line. The first column is the
+    type of the record, the other ones are the given fields, fields not
+    belonging to a record are left empty. Lists are joined by commas.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, fh=None, fields=None):
+
+        super(CsvWriter, self).__init__(fh=fh, fields=fields)
+        self._writer = csv.writer(self.fh, lineterminator="\n")
+
+    # -------------------------------------------------------------------------
+    def begin(self):
+
+        self._writer.writerow(['record'] + self.fields)
+
+    # -------------------------------------------------------------------------
+    def _write(self, record):
+
+        row = [record.get('record')]
+        for field in self.fields:
+            value = record.get(field)
+            if value is None:
+                value = ''
+            elif isinstance(value, (list, tuple)):
+                value = ','.join([str(x) for x in value])
+            row.append(value)
+        self._writer.writerow(row)
+
+
+RECORD_WRITERS = {
+    'json': JsonWriter,
+    'jsonl': JsonLinesWriter,
+    'csv': CsvWriter,
+}
+
+
+# =============================================================================
+def get_record_writer(output_format, fh=None, fields=None):
+    """
+    Gives back a new record writer for the given output format.
+
+    @raise ValueError: on an unknown output format
+
+    @param output_format: the output format, 'json', 'jsonl' or 'csv'
+    @type output_format: str
+    @param fh: the file object to write to, defaults to STDOUT
+    @type fh: file
+    @param fields: all fields of all records in the order of output
+    @type fields: list of str
+
+    @rtype: RecordWriter
+    """
+
+    cls = RECORD_WRITERS.get(output_format)
+    if cls is None:
+        msg = _("Invalid output format %r.") % (output_format)
+        raise ValueError(msg)
+
+    return cls(fh=fh, fields=fields)
+
+
+# =============================================================================
+def record_fields(*field_lists):
+    """
+    Gives back the union of the given field lists in the order
+    of their first occurrence.
+
+    @rtype: list of str
+    """
+
+    fields = []
+    for field_list in field_lists:
+        for field in field_list:
+            if field not in fields:
+                fields.append(field)
+    return fields
+
+
+# =============================================================================
+def pd_record(pd):
+    """
+    Gives back the output record of the given physical drive.
+
+    @param pd: the physical drive
+    @type pd: MegaraidPd
+
+    @rtype: dict
+    """
+
+    return {
+        'record': 'pd',
+        'adapter': pd.adapter,
+        'enclosure': pd.enclosure,
+        'slot': pd.slot,
+        'device_id': pd.device_id,
+        'type': pd.type,
+        'size': pd.size,
+        'vendor': pd.vendor,
+        'model': pd.model,
+        'serial': pd.serial,
+        'wwn': pd.wwn_hex,
+        'firmware_state': pd.firmware_state,
+        'is_hotspare': pd.is_hotspare,
+        'media_errors': pd.media_errors,
+        'other_errors': pd.other_errors,
+        'predictive_failures': pd.predictive_failures,
+    }
+
+
+# =============================================================================
+def ld_record(ld):
+    """
+    Gives back the output record of the given logical drive.
+
+    @param ld: the logical drive
+    @type ld: MegaraidLogicalDrive
+
+    @rtype: dict
+    """
+
+    cache = None
+    if ld.cached:
+        cache = 'ro'
+        if ld.cache_rw:
+            cache = 'rw'
+    elif ld.is_cachecade_drive:
+        cache = 'cachecade'
+
+    pds = []
+    for pd in ld.pds:
+        pds.append("%d:%d" % (pd.enclosure, pd.slot))
+
+    return {
+        'record': 'ld',
+        'adapter': ld.adapter,
+        'number': ld.number,
+        'target_id': ld.target_id,
+        'name': ld.name,
+        'raid_level': ld.raid_level,
+        'size': ld.size,
+        'state': ld.state,
+        'cache': cache,
+        'pds': pds,
+    }
+
+
+# =============================================================================
+def adapter_record(adapter_id, count, size, seconds):
+    """
+    Gives back the record finishing the output of an adapter.
+
+    @param adapter_id: the numeric ID of the MegaRaid adapter
+    @type adapter_id: int
+    @param count: the number of records of the adapter
+    @type count: int
+    @param size: the total size in bytes or None, if not known
+    @type size: int or None
+    @param seconds: the time needed for retrieving the data of the adapter
+    @type seconds: float
+
+    @rtype: dict
+    """
+
+    return {
+        'record': 'adapter',
+        'adapter': adapter_id,
+        'count': count,
+        'size': size,
+        'seconds': round(seconds, 3),
+    }
+
+
+# =============================================================================
+def summary_record(adapters, count, size, seconds):
+    """
+    Gives back the record finishing the whole output.
+
+    @param adapters: the number of adapters
+    @type adapters: int
+    @param count: the number of records of all adapters
+    @type count: int
+    @param size: the total size in bytes or None, if not known
+    @type size: int or None
+    @param seconds: the total time needed
+    @type seconds: float
+
+    @rtype: dict
+    """
+
+    return {
+        'record': 'summary',
+        'adapters': adapters,
+        'count': count,
+        'size': size,
+        'seconds': round(seconds, 3),
+    }
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
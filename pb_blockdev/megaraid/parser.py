@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, ProfitBricks GmbH, Berlin
+@summary: The module for a single pass tokenizer of the output of MegaCli
+
+Every line of the output of MegaCli is splitted exactly once into
+a normalized key and its value. The objects evaluate these tokens
+by looking up the key in a dispatch table of typed setters instead
+of testing the line against a long series of regular expressions.
+"""
+
+# Standard modules
+import sys
+import logging
+import re
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.1'
+
+log = logging.getLogger(__name__)
+
+if sys.version_info[0] > 2:
+    basestring = str
+
+# SAS Address(0) -> sas address
+re_key_index = re.compile(r'\s*\(\s*\d+\s*\)$')
+
+# 2.728 TB [0x15d50a3b0 Sectors]
+re_sectors = re.compile(r'\[(?:0x)?([\da-f]+)\s+Sectors\]', re.IGNORECASE)
+
+re_yes = re.compile(r'^\s*y(?:es)?\s*$', re.IGNORECASE)
+
+
+# =============================================================================
+def normalize_key(key):
+    """
+    Normalizes the key of a line of MegaCli output: lowercase, single
+    spaces and without a trailing index in parenthesis.
+
+    @param key: the key as found in the output of MegaCli
+    @type key: str
+
+    @return: the normalized key
+    @rtype: str
+    """
+
+    key = ' '.join(key.lower().split())
+    return re_key_index.sub('', key)
+
+
+# =============================================================================
+def tokenize(lines):
+    """
+    Generator splitting every non empty line of the given MegaCli output
+    at its first colon into a normalized key and a stripped value. Lines
+    without a colon give None as value.
+
+    @param lines: the output of MegaCli, a file object or a list of lines
+    @type lines: str or iterable of str
+
+    @return: tuples of (key, value)
+    @rtype: iterator of tuple
+    """
+
+    if isinstance(lines, basestring):
+        lines = lines.splitlines()
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        (key, sep, value) = line.partition(':')
+        if sep:
+            value = value.strip()
+        else:
+            value = None
+        yield (normalize_key(key), value)
+
+
+# =============================================================================
+def iter_blocks(tokens, is_start):
+    """
+    Generator splitting the tokens into blocks, every block begins with
+    a token, for which is_start() gives back True. A block is given back,
+    as soon as the next block begins. Tokens before the first block
+    are ignored.
+
+    @param tokens: the tokens of the MegaCli output
+    @type tokens: iterator of tuple
+    @param is_start: function checking a token for the start of a block
+    @type is_start: callable
+
+    @return: tuples of (start_token, list of the following tokens)
+    @rtype: iterator of tuple
+    """
+
+    start = None
+    body = []
+
+    for token in tokens:
+        if is_start(token):
+            if start is not None:
+                yield (start, body)
+            start = token
+            body = []
+            continue
+        if start is not None:
+            body.append(token)
+
+    if start is not None:
+        yield (start, body)
+
+
+# =============================================================================
+def apply_tokens(obj, tokens, dispatch):
+    """
+    Calls for all tokens with a key found in the dispatch table the
+    appropriate setter with the object and the value of the token.
+    Values, which could not be converted, are ignored.
+
+    @param obj: the object to initialize
+    @type obj: object
+    @param tokens: the tokens of the MegaCli output
+    @type tokens: iterable of tuple
+    @param dispatch: the dispatch table, the keys are the normalized keys
+                     of the MegaCli output, the values are functions
+                     called with the object and the value
+    @type dispatch: dict
+
+    """
+
+    for (key, value) in tokens:
+        setter = dispatch.get(key)
+        if setter is None:
+            continue
+        try:
+            setter(obj, value)
+        except ValueError as e:
+            log.debug(_("Could not evaluate %(key)r of %(val)r: %(e)s") % {
+                'key': key, 'val': value, 'e': e})
+
+
+# =============================================================================
+def field_setter(attr, converter=None):
+    """
+    Creates a typed setter for a dispatch table, which sets the given
+    attribute of the object to the converted value. If the converted
+    value is None, the attribute is not touched.
+
+    @param attr: the name of the attribute to set
+    @type attr: str
+    @param converter: the function converting the value
+    @type converter: callable or None
+
+    @return: the setter
+    @rtype: callable
+    """
+
+    def setter(obj, value):
+        if converter is not None:
+            value = converter(value)
+        if value is not None:
+            setattr(obj, attr, value)
+
+    return setter
+
+
+# =============================================================================
+def to_text(value):
+    """Converter for a non empty text."""
+    if not value:
+        return None
+    return value
+
+
+# =============================================================================
+def to_text_avail(value):
+    """Converter for a non empty text, which is not 'N/A'."""
+    if not value or value.lower() == 'n/a':
+        return None
+    return value
+
+
+# =============================================================================
+def to_int(value):
+    """Converter for an integer value."""
+    return int(value)
+
+
+# =============================================================================
+def to_int_hex(value):
+    """Converter for a hexadecimal integer value with an optional '0x'."""
+    if value.lower().startswith('0x'):
+        value = value[2:]
+    return int(value, 16)
+
+
+# =============================================================================
+def to_sectors(value):
+    """Converter for the sector count in '2.728 TB [0x15d50a3b0 Sectors]'."""
+    match = re_sectors.search(value)
+    if not match:
+        raise ValueError(_("No sector count found."))
+    return int(match.group(1), 16)
+
+
+# =============================================================================
+def to_bool(value):
+    """Converter for a 'Yes' or 'No' value."""
+    if re_yes.search(value or ''):
+        return True
+    return False
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -19,76 +19,24 @@ from pb_base.common import pp
 
 from pb_base.object import PbBaseObject
 
+from pb_blockdev.megaraid.parser import tokenize, apply_tokens
+from pb_blockdev.megaraid.parser import field_setter
+from pb_blockdev.megaraid.parser import to_text, to_int, to_int_hex, to_sectors
+
 from pb_blockdev.translate import pb_gettext, pb_ngettext
 
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.3.6'
+__version__ = '0.4.1'
 
 log = logging.getLogger(__name__)
 
-# Device Id: 51
-re_device_id = re.compile(r'^Device\s+Id\s*:\s*(\d+)', re.IGNORECASE)
-
-# Drive's position: DiskGroup: 4, Span: 0, Arm: 0
+# DiskGroup: 4, Span: 0, Arm: 0
 re_disk_group = re.compile(
-    r"^Drive's\s+position\s*:\s+DiskGroup\s*:\s+(\d+),\s+Span\s*:\s+(\d+),\s+Arm\s*:\s+(\d+)",
-    re.IGNORECASE)
-
-# WWN: 5000C50056337998
-re_wwn = re.compile(r'^WWN\s*:\s*(?:0x)?([\da-f]+)', re.IGNORECASE)
-
-# PD Type: SAS
-re_pd_type = re.compile(r'^PD\s+Type\s*:\s*(\S+.*)', re.IGNORECASE)
-
-# Hotspare Information:
-re_hotspare = re.compile(r'^Hotspare\s+Information\s*:', re.IGNORECASE)
-
-# Sector Size:  512
-re_sector_size = re.compile(r'^Sector\s+Size\s*:\s*(\d+)', re.IGNORECASE)
-
-# Raw Size: 2.728 TB [0x15d50a3b0 Sectors]
-re_raw_sectors = re.compile(
-    r'^Raw\s+Size\s*:.*\[(?:0x)?([\da-f]+)\s+Sectors\]',
-    re.IGNORECASE)
-
-# Coerced Size: 2.728 TB [0x15d400000 Sectors]
-re_coerced_sectors = re.compile(
-    r'^Coerced\s+Size\s*:.*\[(?:0x)?([\da-f]+)\s+Sectors\]',
-    re.IGNORECASE)
-
-# Media Error Count: 0
-re_media_errors = re.compile(
-    r'^Media\s+Error\s+Count\s*:\s*(\d+)',
+    r"^DiskGroup\s*:\s+(\d+),\s+Span\s*:\s+(\d+),\s+Arm\s*:\s+(\d+)",
     re.IGNORECASE)
 
-# Other Error Count: 0
-re_other_errors = re.compile(
-    r'^Other\s+Error\s+Count\s*:\s*(\d+)',
-    re.IGNORECASE)
-
-# Predictive Failure Count: 0
-re_predictive_failures = re.compile(
-    r'^Predictive\s+Failure\s+Count\s*:\s*(\d+)',
-    re.IGNORECASE)
-
-# Firmware state: Online, Spun Up
-re_firmware_state = re.compile(
-    r'^Firmware\s+state\s*:\s*(\S+.*)',
-    re.IGNORECASE)
-
-# Foreign State: None
-re_foreign_state = re.compile(r'^Foreign\s+state\s*:\s*(\S+.*)', re.IGNORECASE)
-
-# SAS Address(0): 0x500304800058338c
-re_sas_address = re.compile(
-    r'^SAS\s+Address\s*\(\s*\d+\s*\)\s*:\s*(?:0x)?([\da-f]+)',
-    re.IGNORECASE)
-
-# Inquiry Data: CVCV3053035K060AGN  INTEL SSDSC2CW060A3                     400i
-re_inq_data = re.compile(r'^Inquiry\s+Data\s*:\s*(\S+.*)', re.IGNORECASE)
-
 # CVCV3053035K060AGN  INTEL SSDSC2CW060A3                     400i
 re_inc_intel = re.compile(r'^(\S+)\s+INTEL\s+(\S+)', re.IGNORECASE)
 
@@ -641,8 +589,24 @@ class MegaraidPd(PbBaseObject):
 #            Port's Linkspeed: 6.0Gb/s
 #            Drive has flagged a S.M.A.R.T alert : No
 
-        if isinstance(lines, basestring):
-            lines = lines.splitlines()
+        self.init_from_tokens(tokenize(lines))
+
+    # -------------------------------------------------------------------------
+    def init_from_tokens(self, tokens, dispatch=None):
+        """
+        Init of all properties from the tokens of the output
+        of 'MegaCLI -pdInfo' or 'MegaCLI -PDList' as given back by
+        pb_blockdev.megaraid.parser.tokenize().
+
+        @param tokens: the tokens of the MegaCLI output
+        @type tokens: iterable of tuple
+        @param dispatch: the dispatch table to use instead of PD_DISPATCH
+        @type dispatch: dict or None
+
+        """
+
+        if dispatch is None:
+            dispatch = PD_DISPATCH
 
         self.initialized = False
 
@@ -667,115 +631,10 @@ class MegaraidPd(PbBaseObject):
         self.sas_addresses = []
 
         if self.verbose > 3:
-            log.debug("Analyzing lines:\n%s", pp(lines))
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            # Checking for Device Id
-            match = re_device_id.search(line)
-            if match:
-                self.device_id = match.group(1)
-                if self.verbose > 3:
-                    log.debug(
-                        "Device-Id of [%s]: %d.",
-                        self.device_name, self.device_id)
-                continue
-
-            # Checking for disk position
-            match = re_disk_group.search(line)
-            if match:
-                self._disk_group = (
-                    int(match.group(1)),
-                    int(match.group(2)),
-                    int(match.group(3)),
-                )
-                continue
-
-            # Checking for WWN
-            match = re_wwn.search(line)
-            if match:
-                if sys.version_info[0] <= 2:
-                    self._wwn = long(match.group(1), 16)
-                else:
-                    self._wwn = int(match.group(1), 16)
-                continue
-
-            # Checking for PD type
-            match = re_pd_type.search(line)
-            if match:
-                self._type = match.group(1)
-                continue
-
-            # Checking for hotspare information
-            if re_hotspare.search(line):
-                self._is_hotspare = True
-                continue
-
-            # Checking for sector size
-            match = re_sector_size.search(line)
-            if match:
-                self.sector_size = match.group(1)
-                continue
-
-            # Checking for Raw Size:
-            match = re_raw_sectors.search(line)
-            if match:
-                self._raw_sectors = int(match.group(1), 16)
-                continue
-
-            # Checking for Coerced Size:
-            match = re_coerced_sectors.search(line)
-            if match:
-                self._coerced_sectors = int(match.group(1), 16)
-                continue
-
-            # Checking for Media errors
-            match = re_media_errors.search(line)
-            if match:
-                self._media_errors = int(match.group(1))
-                continue
-
-            # Checking for Other errors
-            match = re_other_errors.search(line)
-            if match:
-                self._other_errors = int(match.group(1))
-                continue
-
-            # Checking for Predictive Failures
-            match = re_predictive_failures.search(line)
-            if match:
-                self._predictive_failures = int(match.group(1))
-                continue
-
-            # Checking for the Firmware state
-            match = re_firmware_state.search(line)
-            if match:
-                self._firmware_state = match.group(1)
-                continue
-
-            # Checking for the Foreign state
-            match = re_foreign_state.search(line)
-            if match:
-                self._foreign_state = match.group(1)
-                continue
-
-            # Checking for a SAS address
-            match = re_sas_address.search(line)
-            if match:
-                addr = int(match.group(1), 16)
-                self.sas_addresses.append(addr)
-                continue
-
-            # Checking for the inqury data
-            match = re_inq_data.search(line)
-            if match:
-                self._inq_data = match.group(1)
-                if self.inq_data:
-                    self.analyze_inq_data(self.inq_data)
-                continue
+            tokens = list(tokens)
+            log.debug("Analyzing tokens:\n%s", pp(tokens))
+
+        apply_tokens(self, tokens, dispatch)
 
         self.initialized = True
 
@@ -821,6 +680,64 @@ class MegaraidPd(PbBaseObject):
         log.warn("Could't interprete inquiry data %r.", inq_data)
         return
 
+
+# =============================================================================
+def _set_disk_group(pd, value):
+    """Setter for "Drive's position: DiskGroup: 4, Span: 0, Arm: 0"."""
+    match = re_disk_group.search(value)
+    if not match:
+        raise ValueError(_("Invalid drive position."))
+    pd._disk_group = (
+        int(match.group(1)),
+        int(match.group(2)),
+        int(match.group(3)),
+    )
+
+
+# =============================================================================
+def _set_hotspare(pd, value):
+    """Setter for 'Hotspare Information:'."""
+    pd._is_hotspare = True
+
+
+# =============================================================================
+def _add_sas_address(pd, value):
+    """Setter for 'SAS Address(0): 0x5000c50056337999'."""
+    pd.sas_addresses.append(to_int_hex(value))
+
+
+# =============================================================================
+def _set_inq_data(pd, value):
+    """Setter for 'Inquiry Data: SEAGATE ST33000650SS    0004Z296Q3B9'."""
+    if not value:
+        return
+    pd._inq_data = value
+    pd.analyze_inq_data(value)
+
+
+PD_DISPATCH = {
+    'device id': field_setter('device_id', to_int),
+    "drive's position": _set_disk_group,
+    'wwn': field_setter('_wwn', to_int_hex),
+    'pd type': field_setter('_type', to_text),
+    'hotspare information': _set_hotspare,
+    'sector size': field_setter('sector_size', to_int),
+    'raw size': field_setter('_raw_sectors', to_sectors),
+    'coerced size': field_setter('_coerced_sectors', to_sectors),
+    'media error count': field_setter('_media_errors', to_int),
+    'other error count': field_setter('_other_errors', to_int),
+    'predictive failure count': field_setter('_predictive_failures', to_int),
+    'firmware state': field_setter('_firmware_state', to_text),
+    'foreign state': field_setter('_foreign_state', to_text),
+    'sas address': _add_sas_address,
+    'inquiry data': _set_inq_data,
+}
+"""
+The dispatch table for the evaluation of the tokens of
+'MegaCLI -pdInfo' and 'MegaCLI -PDList', the keys are the
+normalized keys of the output of MegaCli.
+"""
+
 # =============================================================================
 
 if __name__ == "__main__":
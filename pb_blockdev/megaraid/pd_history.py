@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, ProfitBricks GmbH, Berlin
+@summary: The module for a persistent history of the error counters
+          of MegaRaid physical drives
+"""
+
+# Standard modules
+import os
+import errno
+import logging
+import sqlite3
+import threading
+import time
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.megaraid import MegaraidError
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PD_HISTORY_FILE = os.sep + os.path.join(
+    'var', 'lib', 'pb-blockdev', 'megaraid-pd-history.sqlite')
+
+PD_COUNTERS = ('media_errors', 'other_errors', 'predictive_failures')
+"""
+The error counters of a MegaraidPd tracked by the history.
+"""
+
+DEFAULT_ERROR_WEIGHTS = {
+    'media_errors': 1.0,
+    'other_errors': 0.1,
+    'predictive_failures': 10.0,
+}
+"""
+The weights of the growth of the error counters for ranking the drives.
+"""
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+PD_HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS drives (
+    id INTEGER PRIMARY KEY,
+    wwn TEXT NOT NULL,
+    serial TEXT NOT NULL,
+    vendor TEXT,
+    model TEXT,
+    adapter INTEGER,
+    enclosure INTEGER,
+    slot INTEGER,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    media_errors INTEGER NOT NULL DEFAULT 0,
+    other_errors INTEGER NOT NULL DEFAULT 0,
+    predictive_failures INTEGER NOT NULL DEFAULT 0,
+    total_media_errors INTEGER NOT NULL DEFAULT 0,
+    total_other_errors INTEGER NOT NULL DEFAULT 0,
+    total_predictive_failures INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (wwn, serial)
+);
+CREATE TABLE IF NOT EXISTS deltas (
+    drive_id INTEGER NOT NULL REFERENCES drives (id),
+    timestamp REAL NOT NULL,
+    media_errors INTEGER NOT NULL,
+    other_errors INTEGER NOT NULL,
+    predictive_failures INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deltas_timestamp ON deltas (timestamp, drive_id);
+CREATE INDEX IF NOT EXISTS deltas_drive ON deltas (drive_id, timestamp);
+"""
+
+
+# =============================================================================
+class MegaraidPdHistoryError(MegaraidError):
+    """Error class for errors on the history of the physical drives."""
+    pass
+
+
+# =============================================================================
+class MegaraidPdHistory(object):
+    """
+    Persistent history of the error counters of physical drives in
+    a SQLite database, every drive is identified by its WWN and serial
+    number, independent of its current position.
+
+    The current counters and the sums of all increases are kept per drive,
+    so the drives can be ranked by their error growth rate since their
+    first collection without reading the history. Only changes of
+    the counters are stored as deltas, a counter lower than before
+    (e.g. after a reset) counts as increase by its new value.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, filename=None, weights=None):
+        """
+        Constructor.
+
+        @raise MegaraidPdHistoryError: if the database could not be opened
+
+        @param filename: the SQLite database file, if None, the history
+                         is held only in memory
+        @type filename: str or None
+        @param weights: the weights of the counters for ranking the drives,
+                        defaults to DEFAULT_ERROR_WEIGHTS
+        @type weights: dict
+
+        """
+
+        self.filename = filename
+        """
+        @ivar: the SQLite database file
+        @type: str or None
+        """
+
+        self.weights = dict(DEFAULT_ERROR_WEIGHTS)
+        """
+        @ivar: the weights of the counters for ranking the drives
+        @type: dict
+        """
+        if weights:
+            self.weights.update(weights)
+
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+
+    # -------------------------------------------------------------------------
+    def _connect(self):
+        """
+        Opens the database and creates the tables, if necessary.
+        """
+
+        db = ':memory:'
+        if self.filename:
+            db = self.filename
+            db_dir = os.path.dirname(self.filename)
+            if db_dir and not os.path.isdir(db_dir):
+                try:
+                    os.makedirs(db_dir, 0o755)
+                except OSError as e:
+                    if e.errno != errno.EEXIST:
+                        msg = _("Could not create directory %(d)r: %(e)s") % {
+                            'd': db_dir, 'e': e}
+                        raise MegaraidPdHistoryError(msg)
+
+        try:
+            conn = sqlite3.connect(db, check_same_thread=False)
+            conn.executescript(PD_HISTORY_SCHEMA)
+        except sqlite3.Error as e:
+            msg = _("Could not open the PD history %(f)r: %(e)s") % {
+                'f': db, 'e': e}
+            raise MegaraidPdHistoryError(msg)
+
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        """Closes the database."""
+
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+    # -------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Transforms the elements of the object into a dict
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        with self._lock:
+            drives = self._conn.execute("SELECT COUNT(*) FROM drives").fetchone()[0]
+            deltas = self._conn.execute("SELECT COUNT(*) FROM deltas").fetchone()[0]
+
+        return {
+            '__class_name__': self.__class__.__name__,
+            'filename': self.filename,
+            'weights': dict(self.weights),
+            'drives': drives,
+            'deltas': deltas,
+        }
+
+    # -------------------------------------------------------------------------
+    def record(self, pds, timestamp=None):
+        """
+        Records the current error counters of the given physical drives.
+        Drives without WWN or serial number are ignored.
+
+        @param pds: the physical drives of one collection
+        @type pds: iterable of MegaraidPd
+        @param timestamp: the time of the collection, defaults to now
+        @type timestamp: float or None
+
+        @return: the increases of the counters of all changed drives,
+                 the keys are tuples of (WWN, serial)
+        @rtype: dict of dict
+
+        """
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        changed = {}
+        with self._lock:
+            with self._conn:
+                for pd in pds:
+                    delta = self._record_pd(pd, timestamp)
+                    if delta:
+                        changed[(pd.wwn_hex, pd.serial)] = delta
+
+        return changed
+
+    # -------------------------------------------------------------------------
+    def _record_pd(self, pd, timestamp):
+        """
+        Records the counters of a single drive, must be called with
+        the lock held inside a transaction.
+        """
+
+        wwn = pd.wwn_hex
+        serial = pd.serial
+        if not wwn or not serial:
+            if pd.verbose > 2:
+                log.debug(_(
+                    "Ignoring PD [%(e)d:%(s)d] without WWN or serial.") % {
+                    'e': pd.enclosure, 's': pd.slot})
+            return None
+
+        current = {}
+        for counter in PD_COUNTERS:
+            current[counter] = getattr(pd, counter) or 0
+
+        row = self._conn.execute(
+            "SELECT * FROM drives WHERE wwn = ? AND serial = ?",
+            (wwn, serial)).fetchone()
+
+        if row is None:
+            self._conn.execute(
+                "INSERT INTO drives (wwn, serial, vendor, model, adapter, "
+                "enclosure, slot, first_seen, last_seen, media_errors, "
+                "other_errors, predictive_failures) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (wwn, serial, pd.vendor, pd.model, pd.adapter, pd.enclosure,
+                    pd.slot, timestamp, timestamp, current['media_errors'],
+                    current['other_errors'], current['predictive_failures']))
+            return None
+
+        delta = {}
+        for counter in PD_COUNTERS:
+            diff = current[counter] - row[counter]
+            if diff < 0:
+                diff = current[counter]
+            delta[counter] = diff
+
+        self._conn.execute(
+            "UPDATE drives SET adapter = ?, enclosure = ?, slot = ?, "
+            "last_seen = ?, media_errors = ?, other_errors = ?, "
+            "predictive_failures = ?, "
+            "total_media_errors = total_media_errors + ?, "
+            "total_other_errors = total_other_errors + ?, "
+            "total_predictive_failures = total_predictive_failures + ? "
+            "WHERE id = ?",
+            (pd.adapter, pd.enclosure, pd.slot, timestamp,
+                current['media_errors'], current['other_errors'],
+                current['predictive_failures'], delta['media_errors'],
+                delta['other_errors'], delta['predictive_failures'],
+                row['id']))
+
+        if not any(delta.values()):
+            return None
+
+        self._conn.execute(
+            "INSERT INTO deltas (drive_id, timestamp, media_errors, "
+            "other_errors, predictive_failures) VALUES (?, ?, ?, ?, ?)",
+            (row['id'], timestamp, delta['media_errors'],
+                delta['other_errors'], delta['predictive_failures']))
+
+        return delta
+
+    # -------------------------------------------------------------------------
+    def history(self, wwn, serial):
+        """
+        Gives back all recorded increases of the counters of the given drive.
+
+        @param wwn: the WWN of the drive as hex string
+        @type wwn: str
+        @param serial: the serial number of the drive
+        @type serial: str
+
+        @return: dicts with the timestamp and the increases, the oldest first
+        @rtype: list of dict
+        """
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT d.timestamp, d.media_errors, d.other_errors, "
+                "d.predictive_failures FROM deltas d "
+                "JOIN drives p ON p.id = d.drive_id "
+                "WHERE p.wwn = ? AND p.serial = ? ORDER BY d.timestamp",
+                (wwn, serial)).fetchall()
+
+        return [dict(zip(row.keys(), row)) for row in rows]
+
+    # -------------------------------------------------------------------------
+    def ranking(self, window=None, limit=None, now=None):
+        """
+        Ranks the drives by the weighted growth rate of their error counters
+        per day, the fastest growing first. Drives without any growth
+        are not given back.
+
+        @param window: the time in seconds before now to consider, if None,
+                       the whole time since the first collection of every
+                       drive is considered, without reading the history
+        @type window: float or None
+        @param limit: the maximum number of drives to give back
+        @type limit: int or None
+        @param now: the current time, defaults to now
+        @type now: float or None
+
+        @return: dicts with the data of the drives, the increases of the
+                 counters, their rates per day and the 'score'
+        @rtype: list of dict
+        """
+
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            if window is None:
+                rows = self._conn.execute(
+                    "SELECT *, total_media_errors AS grown_media_errors, "
+                    "total_other_errors AS grown_other_errors, "
+                    "total_predictive_failures AS grown_predictive_failures "
+                    "FROM drives").fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT p.*, SUM(d.media_errors) AS grown_media_errors, "
+                    "SUM(d.other_errors) AS grown_other_errors, "
+                    "SUM(d.predictive_failures) AS grown_predictive_failures "
+                    "FROM deltas d JOIN drives p ON p.id = d.drive_id "
+                    "WHERE d.timestamp >= ? GROUP BY d.drive_id",
+                    (now - window,)).fetchall()
+
+        ranking = []
+        for row in rows:
+            if window is None:
+                days = (row['last_seen'] - row['first_seen']) / SECONDS_PER_DAY
+            else:
+                start = max(row['first_seen'], now - window)
+                days = (now - start) / SECONDS_PER_DAY
+            days = max(days, 1.0 / 24)
+
+            entry = {
+                'wwn': row['wwn'],
+                'serial': row['serial'],
+                'vendor': row['vendor'],
+                'model': row['model'],
+                'adapter': row['adapter'],
+                'enclosure': row['enclosure'],
+                'slot': row['slot'],
+                'days': days,
+            }
+            score = 0.0
+            for counter in PD_COUNTERS:
+                grown = row['grown_' + counter] or 0
+                entry[counter] = row[counter]
+                entry['grown_' + counter] = grown
+                entry[counter + '_per_day'] = grown / days
+                score += self.weights.get(counter, 0) * grown / days
+            entry['score'] = score
+            if score > 0:
+                ranking.append(entry)
+
+        ranking.sort(key=lambda x: x['score'], reverse=True)
+        if limit is not None:
+            ranking = ranking[:limit]
+
+        return ranking
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
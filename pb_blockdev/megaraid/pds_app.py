@@ -9,6 +9,7 @@
 
 # Standard modules
 import sys
+import time
 import logging
 
 # Third party modules
@@ -23,13 +24,27 @@ from pb_base.handler import CommandNotFoundError
 import pb_blockdev.megaraid
 
 from pb_blockdev.megaraid.handler import MegaraidHandler
+from pb_blockdev.megaraid.handler import DEFAULT_MEGACLI_CACHE_TTL
+
+from pb_blockdev.megaraid.collector import MegaraidCollector
+
+from pb_blockdev.megaraid.event_cache import DEFAULT_EVENT_CACHE_FILE
+
+from pb_blockdev.megaraid.pd_history import MegaraidPdHistory
+from pb_blockdev.megaraid.pd_history import DEFAULT_PD_HISTORY_FILE
+
+from pb_blockdev.megaraid.output import OUTPUT_FORMATS, PD_FIELDS
+from pb_blockdev.megaraid.output import ADAPTER_FIELDS, SUMMARY_FIELDS
+from pb_blockdev.megaraid.output import get_record_writer, record_fields
+from pb_blockdev.megaraid.output import pd_record, adapter_record
+from pb_blockdev.megaraid.output import summary_record
 
 from pb_blockdev.translate import pb_gettext, pb_ngettext
 
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.3.5'
+__version__ = '0.8.0'
 
 log = logging.getLogger(__name__)
 
@@ -54,6 +69,12 @@ class MegaraidPdsApp(PbApplication):
         @type: MegaraidHandler
         """
 
+        self.collector = None
+        """
+        @ivar: a collector object for querying all adapters concurrently
+        @type: MegaraidCollector
+        """
+
         indent = ' ' * self.usage_term_len
 
         usage = "%(prog)s [General options]"
@@ -69,6 +90,26 @@ class MegaraidPdsApp(PbApplication):
         @type: bool
         """
 
+        self.output_format = 'table'
+        """
+        @ivar: the output format, one of OUTPUT_FORMATS
+        @type: str
+        """
+
+        self.event_cache_file = None
+        """
+        @ivar: the file to persist the results of MegaCli in between
+               invocations, as long as the event log has not changed
+        @type: str or None
+        """
+
+        self.history = None
+        """
+        @ivar: the history of the error counters of the physical drives,
+               if they should be recorded
+        @type: MegaraidPdHistory or None
+        """
+
         super(MegaraidPdsApp, self).__init__(
             usage=usage,
             verbose=verbose,
@@ -84,11 +125,20 @@ class MegaraidPdsApp(PbApplication):
                 appname=self.appname,
                 verbose=self.verbose,
                 base_dir=self.base_dir,
+                cache_ttl=DEFAULT_MEGACLI_CACHE_TTL,
+                event_cache_file=self.event_cache_file,
             )
         except CommandNotFoundError as e:
             sys.stderr.write(str(e) + "\n\n")
             sys.exit(5)
 
+        self.collector = MegaraidCollector(
+            handler=self.handler,
+            appname=self.appname,
+            verbose=self.verbose,
+            base_dir=self.base_dir,
+        )
+
         self.initialized = True
 
     # -------------------------------------------------------------------------
@@ -108,6 +158,37 @@ class MegaraidPdsApp(PbApplication):
                 'without headers and footers'),
         )
 
+        self.arg_parser.add_argument(
+            '--format',
+            choices=OUTPUT_FORMATS,
+            default='table',
+            dest='output_format',
+            help=(
+                'The output format, the machine readable formats are written '
+                'incrementally per adapter and finished by a summary '
+                'record (default: %(default)s)'),
+        )
+
+        self.arg_parser.add_argument(
+            '--history',
+            action='store_true',
+            dest='history',
+            help=(
+                'Record the error counters of all physical drives in the '
+                'history of the drives (stored in %r).') % (
+                DEFAULT_PD_HISTORY_FILE),
+        )
+
+        self.arg_parser.add_argument(
+            '-C', '--event-cache',
+            action='store_true',
+            dest='event_cache',
+            help=(
+                'Reuse the results of former invocations as long as the event '
+                'log of the MegaRaid adapter has not changed (stored in %r).') % (
+                DEFAULT_EVENT_CACHE_FILE),
+        )
+
     # -------------------------------------------------------------------------
     def perform_arg_parser(self):
         """
@@ -117,16 +198,29 @@ class MegaraidPdsApp(PbApplication):
         super(MegaraidPdsApp, self).perform_arg_parser()
 
         self.parsable = self.args.parsable
+        self.output_format = self.args.output_format
+        if self.args.event_cache:
+            self.event_cache_file = DEFAULT_EVENT_CACHE_FILE
+        if self.args.history:
+            self.history = MegaraidPdHistory(DEFAULT_PD_HISTORY_FILE)
 
     # -------------------------------------------------------------------------
     def _run(self):
         """The underlaying startpoint of the application."""
 
-        count_adapters = self.handler.adapter_count()
-        if not count_adapters:
+        adapter_ids = self.collector.adapter_ids()
+        if not adapter_ids:
             sys.stderr.write("No MegaRaid controllers found.\n\n")
             sys.exit(1)
 
+        if self.output_format != 'table':
+            self._write_records(adapter_ids)
+            return
+
+        all_pds = self.collector.get_all_pds(adapter_ids)
+        for adapter_id in adapter_ids:
+            self._record_history(all_pds[adapter_id])
+
         line_templ = "%2d  %3d  %4d  %11d  %10.f  %-68s  %s"
         inq_templ = "%-8s %-20s %s"
         if self.parsable:
@@ -140,45 +234,26 @@ class MegaraidPdsApp(PbApplication):
 
         size_total = 0
 
-        adapter_id = 0
-        while adapter_id < count_adapters:
-            enclosures = self.handler.get_enclosures(adapter_id)
-            if self.verbose > 2:
-                if enclosures:
-                    encs = []
-                    for enclosure in enclosures:
-                        encs.append(enclosure.as_dict(True))
-                    log.debug("Got enclosures:\n%s", pp(encs))
-
-            for enc in sorted(enclosures):
-                if not enc.nr_pds:
-                    continue
-                slot = 0
-                first = True
-                while slot < enc.nr_slots:
-                    pd = self.handler.get_pd(adapter_id, enc.id, slot)
-                    if not pd:
-                        slot += 1
-                        continue
-                    if self.verbose > 2 and first:
-                        log.debug("Got physical device:\n%s", pp(pd.as_dict(True)))
-                        first = False
-
-                    inq_data = pd.inq_data
-                    if pd.vendor:
-                        inq_data = inq_templ % (pd.vendor, pd.model, pd.serial)
+        for adapter_id in adapter_ids:
+            pds = all_pds[adapter_id]
+            first = True
 
-                    if pd.size:
-                        size_total += pd.size
+            for pd in pds:
+                if self.verbose > 2 and first:
+                    log.debug("Got physical device:\n%s", pp(pd.as_dict(True)))
+                    first = False
 
-                    print(line_templ % (
-                        adapter_id, enc.id, slot, pd.size_mb,
-                        pd.size_gb, inq_data, pd.firmware_state)
-                    )
+                inq_data = pd.inq_data
+                if pd.vendor:
+                    inq_data = inq_templ % (pd.vendor, pd.model, pd.serial)
 
-                    slot += 1
+                if pd.size:
+                    size_total += pd.size
 
-            adapter_id += 1
+                print(line_templ % (
+                    adapter_id, pd.enclosure, pd.slot, pd.size_mb,
+                    pd.size_gb, inq_data, pd.firmware_state)
+                )
 
         size_mb = int(size_total / 1024 / 1024)
         size_gb = float(size_total) / 1024.0 / 1024.0 / 1024.0
@@ -186,6 +261,59 @@ class MegaraidPdsApp(PbApplication):
         if not self.parsable:
             print("\n%-13s  %11d  %10.f" % ('Total:', size_mb, size_gb))
 
+    # -------------------------------------------------------------------------
+    def _write_records(self, adapter_ids):
+        """
+        Writes the physical drives of every adapter in the machine readable
+        output format, as soon as the adapter has finished, followed by
+        a record with the time needed for the adapter. The output is
+        finished by a summary record.
+        """
+
+        start = time.time()
+        writer = get_record_writer(
+            self.output_format, sys.stdout,
+            record_fields(PD_FIELDS, ADAPTER_FIELDS, SUMMARY_FIELDS))
+
+        count_total = 0
+        size_total = 0
+
+        with writer:
+            for (adapter_id, pds, seconds) in self.collector.iter_all_pds(adapter_ids):
+                size = 0
+                for pd in pds:
+                    writer.write(pd_record(pd))
+                    if pd.size:
+                        size += pd.size
+                writer.write(adapter_record(adapter_id, len(pds), size, seconds))
+                writer.flush()
+                self._record_history(pds)
+                count_total += len(pds)
+                size_total += size
+
+            writer.write(summary_record(
+                len(adapter_ids), count_total, size_total, time.time() - start))
+
+    # -------------------------------------------------------------------------
+    def _record_history(self, pds):
+        """
+        Records the error counters of the given physical drives in the
+        history, if requested, and warns about growing counters.
+        """
+
+        if not self.history:
+            return
+
+        changed = self.history.record(pds)
+        for (wwn, serial) in sorted(changed.keys()):
+            delta = changed[(wwn, serial)]
+            log.warn((
+                "Growing error counters of drive %(wwn)s (serial %(sn)s): "
+                "%(me)d media errors, %(oe)d other errors, %(pf)d predictive "
+                "failures.") % {
+                'wwn': wwn, 'sn': serial, 'me': delta['media_errors'],
+                'oe': delta['other_errors'], 'pf': delta['predictive_failures']})
+
 # =============================================================================
 
 if __name__ == "__main__":
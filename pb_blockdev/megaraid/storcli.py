@@ -0,0 +1,815 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, ProfitBricks GmbH, Berlin
+@summary: The module for the backend of the MegaraidHandler evaluating
+          the JSON output of StorCLI
+
+The JSON output of StorCLI is flattened into the same (key, value) tokens
+like the text output of MegaCli, so the objects are filled by the same
+typed setters, only with some additional entries in their dispatch tables
+for the abbreviated keys of StorCLI.
+"""
+
+# Standard modules
+import sys
+import logging
+import re
+import json
+
+from collections import OrderedDict
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.megaraid import MegaraidHandlerError
+
+from pb_blockdev.megaraid.handler import MegaraidBackend
+
+from pb_blockdev.megaraid.ld import MegaraidLogicalDrive
+from pb_blockdev.megaraid.ld import LD_DISPATCH
+
+from pb_blockdev.megaraid.enc import MegaraidEnclosure
+from pb_blockdev.megaraid.enc import VoltageSensor, FanStatus
+from pb_blockdev.megaraid.enc import TemperatureSensor
+from pb_blockdev.megaraid.enc import ENC_DISPATCH
+
+from pb_blockdev.megaraid.pd import MegaraidPd
+from pb_blockdev.megaraid.pd import PD_DISPATCH
+
+from pb_blockdev.megaraid.parser import normalize_key
+from pb_blockdev.megaraid.parser import field_setter
+from pb_blockdev.megaraid.parser import to_text, to_text_avail, to_int
+from pb_blockdev.megaraid.parser import to_int_hex
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+# Drive /c0/e252/s3
+re_drive_key = re.compile(r'^Drive\s+/c\d+/e(\d+)/s(\d+)$', re.IGNORECASE)
+
+# /c0/v1
+re_vd_key = re.compile(r'^/c\d+/v(\d+)$', re.IGNORECASE)
+
+# Enclosure /c0/e252  :
+re_enc_key = re.compile(r'^Enclosure\s+/c\d+/e(\d+)\s*:?\s*$', re.IGNORECASE)
+
+# 252:3
+re_eid_slot = re.compile(r'^\s*(\d+)\s*:\s*(\d+)\s*$')
+
+# DriveGroup:0, Span:0, Row:1
+re_drive_position = re.compile(
+    r'DriveGroup\s*:\s*(\d+),\s*Span\s*:\s*(\d+),\s*Row\s*:\s*(\d+)',
+    re.IGNORECASE)
+
+# 512B
+re_bytes = re.compile(r'^\s*(\d+)\s*B?\s*$', re.IGNORECASE)
+
+# 5.010 V, 11810 mV
+re_voltage = re.compile(r'^\s*(\d+(?:\.\d*)?)\s*(m)?V', re.IGNORECASE)
+
+# RAID10, Cac1
+re_vd_type = re.compile(r'^(RAID|Cac)(\d+)$', re.IGNORECASE)
+
+PD_STATES = {
+    'onln': 'Online',
+    'offln': 'Offline',
+    'ugood': 'Unconfigured(good)',
+    'ubad': 'Unconfigured(bad)',
+    'ghs': 'Hotspare',
+    'dhs': 'Hotspare',
+    'rbld': 'Rebuild',
+    'cpybck': 'Copyback',
+    'failed': 'Failed',
+    'msng': 'Missing',
+    'jbod': 'JBOD',
+}
+"""
+The firmware states of MegaCli for the abbreviated states of StorCLI.
+"""
+
+SPUN_PD_STATES = ('Online', 'Unconfigured(good)', 'Unconfigured(bad)', 'Hotspare')
+"""
+The firmware states, which are completed by the spin state of the drive.
+"""
+
+LD_STATES = {
+    'optl': 'Optimal',
+    'ofln': 'Offline',
+    'pdgd': 'Partially Degraded',
+    'dgrd': 'Degraded',
+    'rec': 'Recovery',
+    'cbshld': 'Copyback Shielded',
+    'hd': 'Hidden',
+}
+"""
+The states of MegaCli for the abbreviated states of logical drives of StorCLI.
+"""
+
+RAID_LEVELS = {
+    '0': (0, 0, 0),
+    '1': (1, 0, 0),
+    '5': (5, 0, 3),
+    '6': (6, 0, 3),
+    '00': (0, 3, 0),
+    '10': (1, 3, 0),
+    '50': (5, 3, 3),
+    '60': (6, 3, 3),
+}
+"""
+The primary and secondary RAID level and the RAID level qualifier
+of MegaCli for the RAID levels of StorCLI.
+"""
+
+
+# =============================================================================
+def json_text(value):
+    """
+    Converts a scalar value of the JSON output into the text
+    of a token like in the output of MegaCli.
+    """
+
+    if value is None:
+        return ''
+    if value is True:
+        return 'Yes'
+    if value is False:
+        return 'No'
+    return ('%s' % (value)).strip()
+
+
+# =============================================================================
+def json_tokens(data):
+    """
+    Generator flattening the given part of the JSON output of StorCLI
+    into tuples of a normalized key and a text value, like they are given
+    back by pb_blockdev.megaraid.parser.tokenize(). Nested dictionaries
+    and lists are resolved depth first in the order of the output.
+
+    @param data: a part of the decoded JSON output
+    @type data: dict or list
+
+    @return: tuples of (key, value)
+    @rtype: iterator of tuple
+    """
+
+    if isinstance(data, dict):
+        for key in data:
+            value = data[key]
+            if isinstance(value, (dict, list)):
+                for token in json_tokens(value):
+                    yield token
+            else:
+                yield (normalize_key(key), json_text(value))
+    elif isinstance(data, list):
+        for item in data:
+            for token in json_tokens(item):
+                yield token
+
+
+# =============================================================================
+def to_bytes(value):
+    """Converter for a size in bytes like '512B'."""
+    match = re_bytes.search(value)
+    if not match:
+        raise ValueError(_("Invalid size in bytes."))
+    return int(match.group(1))
+
+
+# =============================================================================
+def _set_pd_state(pd, value):
+    """Setter for '"State": "Onln"'."""
+    state = value.lower()
+    pd._firmware_state = PD_STATES.get(state, value)
+    if state in ('ghs', 'dhs'):
+        pd._is_hotspare = True
+
+
+# =============================================================================
+def _set_pd_spin(pd, value):
+    """Setter for '"Sp": "U"', completing the firmware state."""
+    if pd._firmware_state not in SPUN_PD_STATES:
+        return
+    if value.upper() == 'U':
+        pd._firmware_state += ', Spun Up'
+    elif value.upper() == 'D':
+        pd._firmware_state += ', Spun down'
+
+
+# =============================================================================
+def _set_drive_position(pd, value):
+    """Setter for '"Drive position": "DriveGroup:0, Span:0, Row:1"'."""
+    match = re_drive_position.search(value)
+    if not match:
+        raise ValueError(_("Invalid drive position."))
+    pd._disk_group = (
+        int(match.group(1)),
+        int(match.group(2)),
+        int(match.group(3)),
+    )
+
+
+STORCLI_PD_DISPATCH = {
+    'did': field_setter('device_id', to_int),
+    'drive position': _set_drive_position,
+    'wwn': PD_DISPATCH['wwn'],
+    'intf': field_setter('_type', to_text),
+    'state': _set_pd_state,
+    'sp': _set_pd_spin,
+    'sesz': field_setter('sector_size', to_bytes),
+    'raw size': PD_DISPATCH['raw size'],
+    'coerced size': PD_DISPATCH['coerced size'],
+    'media error count': PD_DISPATCH['media error count'],
+    'other error count': PD_DISPATCH['other error count'],
+    'predictive failure count': PD_DISPATCH['predictive failure count'],
+    'sas address': PD_DISPATCH['sas address'],
+    'model': field_setter('_model', to_text_avail),
+    'manufacturer id': field_setter('_vendor', to_text_avail),
+    'model number': field_setter('_model', to_text_avail),
+    'sn': field_setter('_serial', to_text_avail),
+}
+"""
+The dispatch table for the evaluation of the tokens of the physical drives
+in the JSON output of StorCLI.
+"""
+
+
+# =============================================================================
+def _set_vd_type(ld, value):
+    """Setter for '"TYPE": "RAID10"'."""
+    match = re_vd_type.search(value)
+    if not match:
+        raise ValueError(_("Invalid RAID level."))
+    if match.group(1).lower() == 'cac':
+        ld._drive_type = 'CacheCade'
+    level = RAID_LEVELS.get(match.group(2))
+    if level is None:
+        raise ValueError(_("Invalid RAID level."))
+    (ld._raid_level_primary, ld._raid_level_secondary,
+        ld._raid_level_qualifier) = level
+
+
+# =============================================================================
+def _set_vd_state(ld, value):
+    """Setter for '"State": "Optl"'."""
+    if value:
+        ld._state = LD_STATES.get(value.lower(), value)
+
+
+# =============================================================================
+def _set_vd_cached(ld, value):
+    """Setter for '"Cac": "-"', the CacheCade association of the VD."""
+    if value and value not in ('-', 'N/A'):
+        ld._cached = True
+
+
+STORCLI_LD_DISPATCH = {
+    'type': _set_vd_type,
+    'state': _set_vd_state,
+    'cac': _set_vd_cached,
+    'name': LD_DISPATCH['name'],
+    'size': LD_DISPATCH['size'],
+}
+"""
+The dispatch table for the evaluation of the tokens of the logical drives
+in the JSON output of StorCLI.
+"""
+
+STORCLI_ENC_DISPATCH = {
+    'device id': ENC_DISPATCH['device id'],
+    'slots': field_setter('_nr_slots', to_int),
+    'pd': field_setter('_nr_pds', to_int),
+    'ps': field_setter('_nr_power_supplies', to_int),
+    'fans': field_setter('_nr_fans', to_int),
+    'tss': field_setter('_nr_temp_sensors', to_int),
+    'alms': field_setter('_nr_alarms', to_int),
+    'status': ENC_DISPATCH['status'],
+    'connector name': ENC_DISPATCH['connector name'],
+    'enclosure type': ENC_DISPATCH['enclosure type'],
+    'vendor identification': ENC_DISPATCH['vendor identification'],
+    'product identification': ENC_DISPATCH['product identification'],
+    'product revision level': ENC_DISPATCH['product revision level'],
+    'vendor specific': ENC_DISPATCH['vendor specific'],
+}
+"""
+The dispatch table for the evaluation of the tokens of the enclosures
+in the JSON output of StorCLI, the sensors are evaluated separately.
+"""
+
+
+# =============================================================================
+class StorcliJsonBackend(MegaraidBackend):
+    """
+    Backend of the MegaraidHandler executing StorCLI with JSON output.
+    """
+
+    name = 'storcli-json'
+
+    # -------------------------------------------------------------------------
+    def _obj_params(self):
+        """
+        Gives back the common parameters for the initialisation of
+        the MegaraidPd, MegaraidLogicalDrive and MegaraidEnclosure objects.
+        """
+
+        if self.handler is None:
+            return {}
+
+        return {
+            'appname': self.handler.appname,
+            'verbose': self.handler.verbose,
+            'base_dir': self.handler.base_dir,
+            'use_stderr': self.handler.use_stderr,
+        }
+
+    # -----------------------------------------------------------
+    @property
+    def verbose(self):
+        """The verbose level of the handler."""
+        if self.handler is None:
+            return 0
+        return self.handler.verbose
+
+    # -------------------------------------------------------------------------
+    def exec_json(self, args, use_cache=True):
+        """
+        Executes StorCLI with the given arguments and the option for
+        JSON output.
+
+        @param args: the arguments for calling StorCLI
+        @type args: list of str
+        @param use_cache: use a cached result, if available
+        @type use_cache: bool
+
+        @return: the result of MegaraidHandler.exec_storcli()
+        @rtype: dict
+
+        """
+
+        return self.handler.exec_storcli(list(args) + ['J'], use_cache=use_cache)
+
+    # -------------------------------------------------------------------------
+    def response_data(self, output):
+        """
+        Decodes the JSON output of StorCLI and gives back the response data
+        of the first controller. A failed command, e.g. for a controller
+        without any logical drives, leads to empty response data.
+
+        @raise MegaraidHandlerError: if the output could not be decoded
+
+        @param output: the JSON output of StorCLI
+        @type output: str
+
+        @return: the response data
+        @rtype: OrderedDict
+
+        """
+
+        try:
+            data = json.loads(output, object_pairs_hook=OrderedDict)
+        except ValueError as e:
+            msg = _("Could not decode the JSON output of StorCLI: %s") % (e)
+            raise MegaraidHandlerError(msg)
+
+        controllers = None
+        if isinstance(data, dict):
+            controllers = data.get('Controllers')
+        if not controllers:
+            msg = _("No controllers found in the JSON output of StorCLI.")
+            raise MegaraidHandlerError(msg)
+
+        controller = controllers[0]
+        status = controller.get('Command Status', {})
+        if status.get('Status', 'Success') != 'Success':
+            log.debug(_("StorCLI command failed: %s"), status.get('Description'))
+            return OrderedDict()
+
+        return controller.get('Response Data', OrderedDict())
+
+    # -------------------------------------------------------------------------
+    def _get_objects(self, adapter_id, args, parse, use_event_cache=True):
+        """
+        Executes StorCLI with the given arguments by the event cache
+        of the handler and gives back the objects created by the given
+        parse function from its output.
+        """
+
+        args = list(args) + ['J']
+
+        def execute():
+            return self.handler.exec_storcli(args)
+
+        return self.handler._get_objects(
+            adapter_id, args, parse, use_event_cache=use_event_cache,
+            execute=execute)
+
+    # -------------------------------------------------------------------------
+    def adapter_count(self):
+        """
+        Executes 'storcli show ctrlcount J' and returns the number of found
+        MegaRaid adapters.
+
+        @raise MegaraidHandlerError: if the number of adapters could not detect
+                                     in output of StorCLI
+
+        @rtype: int
+        """
+
+        log.debug(_("Retrieving number of MegaRaid controllers ..."))
+        result = self.exec_json(['show', 'ctrlcount'])
+
+        for (key, value) in json_tokens(self.response_data(result['out'])):
+            if key == 'controller count':
+                return int(value)
+
+        msg = _("Could not detect number of MegaRaid controllers in output of %r.") % (
+            'storcli show ctrlcount')
+        raise MegaraidHandlerError(msg)
+
+    # -------------------------------------------------------------------------
+    def get_event_seq(self, adapter_id):
+        """
+        Executes 'storcli /cN show eventloginfo J' and returns the newest
+        sequence number of the event log of the given adapter.
+
+        @rtype: int or None
+        """
+
+        adapter_id = int(adapter_id)
+        result = self.exec_json(
+            [('/c%d' % (adapter_id)), 'show', 'eventloginfo'], use_cache=False)
+
+        for (key, value) in json_tokens(self.response_data(result['out'])):
+            if key.startswith('newest seq'):
+                try:
+                    if value.lower().startswith('0x'):
+                        return to_int_hex(value)
+                    return int(value)
+                except ValueError:
+                    break
+
+        log.debug(_(
+            "Could not detect the event sequence number of MegaRaid "
+            "controller %d."), adapter_id)
+        return None
+
+    # -------------------------------------------------------------------------
+    def get_pd(self, adapter_id, enc_id, slot, use_event_cache=True):
+        """
+        Executes 'storcli /cN/eE/sS show all J' for a particular
+        physical device.
+
+        @return: the found physical device or None, if nothing was found.
+        @rtype: MegaraidPd or None
+        """
+
+        args = [('/c%d/e%d/s%d' % (adapter_id, enc_id, slot)), 'show', 'all']
+
+        def parse(output):
+            pds = self.parse_pds(adapter_id, output)
+            if not pds:
+                return None
+            return pds[0]
+
+        return self._get_objects(adapter_id, args, parse, use_event_cache)
+
+    # -------------------------------------------------------------------------
+    def get_all_pds(self, adapter_id, use_event_cache=True):
+        """
+        Executes 'storcli /cN/eall/sall show all J' and returns a list
+        of all physical drives connected with the given MegaRaid adapter.
+
+        @return: all found physical drives, sorted by enclosure and slot
+        @rtype: list of MegaraidPd
+        """
+
+        log.debug(_(
+            "Retrieving all physical drives of MegaRaid controller %d ..."),
+            adapter_id)
+        args = [('/c%d/eall/sall' % (adapter_id)), 'show', 'all']
+
+        def parse(output):
+            return self.parse_pds(adapter_id, output)
+
+        return self._get_objects(adapter_id, args, parse, use_event_cache)
+
+    # -------------------------------------------------------------------------
+    def parse_pds(self, adapter_id, output):
+        """
+        Creates MegaraidPd objects from the JSON output of
+        'storcli /cN/eall/sall show all J'.
+
+        @param adapter_id: the numeric ID of the MegaRaid adapter
+        @type adapter_id: int
+        @param output: the JSON output of StorCLI
+        @type output: str
+
+        @return: all found physical drives, sorted by enclosure and slot
+        @rtype: list of MegaraidPd
+
+        """
+
+        if self.verbose > 4:
+            log.debug(_("Got:"))
+            sys.stderr.write(output)
+
+        data = self.response_data(output)
+        pds = []
+
+        for key in data:
+            match = re_drive_key.search(key)
+            if not match:
+                continue
+            pd = MegaraidPd(
+                adapter=adapter_id,
+                enclosure=int(match.group(1)),
+                slot=int(match.group(2)),
+                **self._obj_params()
+            )
+            details = data.get(key + ' - Detailed Information', {})
+            self.init_pd(pd, [data[key], details])
+            pds.append(pd)
+
+        pds.sort(key=lambda x: (x.enclosure, x.slot))
+        return pds
+
+    # -------------------------------------------------------------------------
+    def init_pd(self, pd, data):
+        """
+        Init of all properties of the given physical drive from
+        the given part of the JSON output of StorCLI.
+        """
+
+        pd.init_from_tokens(json_tokens(data), STORCLI_PD_DISPATCH)
+
+    # -------------------------------------------------------------------------
+    def get_enclosures(self, adapter_id, use_event_cache=True):
+        """
+        Executes 'storcli /cN/eall show all J' and returns a list of found
+        enclosures connected with the given MegaRaid adapter.
+
+        @rtype: list of MegaraidEnclosure
+        """
+
+        log.debug(_(
+            "Retrieving enclosures connected with MegaRaid controller %d ..."),
+            adapter_id)
+        args = [('/c%d/eall' % (adapter_id)), 'show', 'all']
+
+        def parse(output):
+            return self.parse_enclosures(adapter_id, output)
+
+        return self._get_objects(adapter_id, args, parse, use_event_cache)
+
+    # -------------------------------------------------------------------------
+    def parse_enclosures(self, adapter_id, output):
+        """
+        Creates MegaraidEnclosure objects from the JSON output of
+        'storcli /cN/eall show all J'. The enclosures are numbered
+        in the order of the output.
+
+        @param adapter_id: the numeric ID of the MegaRaid adapter
+        @type adapter_id: int
+        @param output: the JSON output of StorCLI
+        @type output: str
+
+        @return: all found enclosures
+        @rtype: list of MegaraidEnclosure
+
+        """
+
+        if self.verbose > 3:
+            log.debug(_("Got:"))
+            sys.stderr.write(output)
+
+        data = self.response_data(output)
+        enclosures = []
+
+        for key in data:
+            if not re_enc_key.search(key):
+                continue
+            enclosure = MegaraidEnclosure(
+                adapter=adapter_id,
+                number=len(enclosures),
+                **self._obj_params()
+            )
+            self.init_enclosure(enclosure, data[key])
+            enclosures.append(enclosure)
+
+        return enclosures
+
+    # -------------------------------------------------------------------------
+    def init_enclosure(self, enclosure, data):
+        """
+        Init of all properties and sensors of the given enclosure from
+        its part of the JSON output of StorCLI.
+        """
+
+        sections = []
+        sensors = {}
+        for name in data:
+            lname = normalize_key(name)
+            if lname in ('information', 'inquiry data', 'properties'):
+                sections.append(data[name])
+            elif not isinstance(data[name], list):
+                continue
+            elif 'voltage' in lname:
+                sensors['voltage'] = data[name]
+            elif 'temp' in lname:
+                sensors['temperature'] = data[name]
+            elif 'fan' in lname:
+                sensors['fan'] = data[name]
+
+        enclosure.init_from_tokens(json_tokens(sections), STORCLI_ENC_DISPATCH)
+
+        params = enclosure._sensor_params()
+        for (i, item) in enumerate(sensors.get('voltage', [])):
+            values = self._sensor_values(item, i)
+            sensor = VoltageSensor(values['number'], values['status'], **params)
+            match = re_voltage.search(values.get('voltage', ''))
+            if match:
+                voltage = float(match.group(1))
+                if match.group(2):
+                    voltage /= 1000.0
+                sensor.voltage = voltage
+            enclosure.voltage_sensors.append(sensor)
+        if 'voltage' in sensors:
+            enclosure._nr_voltage_sensors = len(enclosure.voltage_sensors)
+
+        for (i, item) in enumerate(sensors.get('fan', [])):
+            values = self._sensor_values(item, i)
+            enclosure.fans.append(FanStatus(
+                values['number'], values['status'], values.get('speed'),
+                **params))
+
+        for (i, item) in enumerate(sensors.get('temperature', [])):
+            values = self._sensor_values(item, i)
+            sensor = TemperatureSensor(values['number'], values['status'], **params)
+            try:
+                sensor.temperature = int(values.get('temperature'))
+            except (TypeError, ValueError):
+                pass
+            enclosure.temperature_sensors.append(sensor)
+
+    # -------------------------------------------------------------------------
+    def _sensor_values(self, item, index):
+        """
+        Gives back the number, the status and the reading of a sensor
+        from its entry in the JSON output of StorCLI, the keys of the reading
+        are 'voltage', 'speed' or 'temperature'.
+        """
+
+        values = {'number': index, 'status': None}
+        for (key, value) in json_tokens(item):
+            if key in ('sensor', 'fan') and value.isdigit():
+                values['number'] = int(value)
+            elif 'status' in key:
+                if value and value.lower() not in ('n/a', 'not available'):
+                    values['status'] = value
+            elif key.startswith('voltage'):
+                values['voltage'] = value
+            elif key.startswith('speed'):
+                values['speed'] = value
+            elif key.startswith('temp'):
+                values['temperature'] = value
+
+        return values
+
+    # -------------------------------------------------------------------------
+    def get_all_lds(self, adapter_id, use_event_cache=True):
+        """
+        Executes 'storcli /cN/vall show all J' and returns a list of found
+        logical drives of the given MegaRaid adapter.
+
+        @rtype: list of MegaraidLogicalDrive
+        """
+
+        log.debug(_(
+            "Retrieving logical drives of MegaRaid controller %d ..."),
+            adapter_id)
+        args = [('/c%d/vall' % (adapter_id)), 'show', 'all']
+
+        def parse(output):
+            return self.parse_lds(adapter_id, output)
+
+        return self._get_objects(adapter_id, args, parse, use_event_cache)
+
+    # -------------------------------------------------------------------------
+    def get_ld_info(self, adapter_id, ld_nr, target_id=None, ld=None):
+        """
+        Executes 'storcli /cN/vM show all J' and returns the logical drive
+        of the given MegaRaid adapter.
+
+        @rtype: MegaraidLogicalDrive or None
+        """
+
+        log.debug(_(
+            "Retrieving infos about logical drive %(ld)d of MegaRaid controller %(adp)d ...") % {
+            'ld': ld_nr, 'adp': adapter_id})
+        result = self.exec_json([('/c%d/v%d' % (adapter_id, ld_nr)), 'show', 'all'])
+
+        lds = self.parse_lds(adapter_id, result['out'], ld)
+        if not lds:
+            log.warn(_(
+                "Adapter %(adp)d: Virtual Drive %(ld)d Does not Exist.") % {
+                'ld': ld_nr, 'adp': adapter_id})
+            return None
+
+        return lds[0]
+
+    # -------------------------------------------------------------------------
+    def parse_lds(self, adapter_id, output, ld=None):
+        """
+        Creates MegaraidLogicalDrive objects from the JSON output of
+        'storcli /cN/vall show all J'. StorCLI doesn't show the SCSI
+        target Id, it is assumed to be the number of the virtual drive,
+        like it is assigned by the MegaRaid firmware.
+
+        @param adapter_id: the numeric ID of the MegaRaid adapter
+        @type adapter_id: int
+        @param output: the JSON output of StorCLI
+        @type output: str
+        @param ld: a MegaraidLogicalDrive, which should completed
+                   by the first found logical drive
+        @type ld: MegaraidLogicalDrive or None
+
+        @return: all found logical drives
+        @rtype: list of MegaraidLogicalDrive
+
+        """
+
+        if self.verbose > 4:
+            log.debug(_("Got:"))
+            sys.stderr.write(output)
+
+        data = self.response_data(output)
+        lds = []
+
+        for key in data:
+            match = re_vd_key.search(key)
+            if not match:
+                continue
+            ld_nr = int(match.group(1))
+
+            no_override = False
+            if ld is not None and not lds:
+                no_override = True
+                this_ld = ld
+            else:
+                this_ld = MegaraidLogicalDrive(
+                    adapter=adapter_id,
+                    number=ld_nr,
+                    target_id=ld_nr,
+                    **self._obj_params()
+                )
+
+            props = data.get('VD%d Properties' % (ld_nr), {})
+            this_ld.init_from_tokens(
+                json_tokens([data[key], props]), no_override,
+                STORCLI_LD_DISPATCH)
+
+            if not this_ld.pds:
+                for item in data.get('PDs for VD %d' % (ld_nr), []):
+                    self._add_ld_pd(this_ld, item)
+
+            lds.append(this_ld)
+
+        return lds
+
+    # -------------------------------------------------------------------------
+    def _add_ld_pd(self, ld, item):
+        """
+        Creates a new MegaraidPd object from an entry of the physical drives
+        of a virtual drive and adds it to the logical drive.
+        """
+
+        match = re_eid_slot.search(json_text(item.get('EID:Slt')))
+        if not match:
+            return
+
+        pd = MegaraidPd(
+            adapter=ld.adapter,
+            enclosure=int(match.group(1)),
+            slot=int(match.group(2)),
+            **self._obj_params()
+        )
+        self.init_pd(pd, item)
+        ld.pds.append(pd)
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
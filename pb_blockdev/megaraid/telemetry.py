@@ -0,0 +1,522 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, ProfitBricks GmbH, Berlin
+@summary: The module for a compact time series store of the sensor readings
+          of MegaRaid enclosures, its threshold engine and a periodic poller
+"""
+
+# Standard modules
+import logging
+import threading
+import time
+
+from array import array
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.megaraid.collector import run_parallel
+from pb_blockdev.megaraid.collector import DEFAULT_MAX_WORKERS
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.0'
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TELEMETRY_CAPACITY = 360
+DEFAULT_POLL_INTERVAL = 60
+
+NAN = float('nan')
+
+SENSOR_KINDS = ('voltage', 'temperature', 'fan')
+"""
+The kinds of sensors in the store. The value of a fan is 1.0,
+if its status is 'OK', else 0.0.
+"""
+
+
+# =============================================================================
+class SensorThreshold(object):
+    """
+    The limits of the readings of all sensors of one kind.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, kind, min_value=None, max_value=None, max_rate=None):
+        """
+        Constructor.
+
+        @param kind: the kind of sensors, one of SENSOR_KINDS
+        @type kind: str
+        @param min_value: the lowest allowed reading
+        @type min_value: float or None
+        @param max_value: the highest allowed reading
+        @type max_value: float or None
+        @param max_rate: the highest allowed absolute change of the reading
+                         per minute between two polls
+        @type max_rate: float or None
+
+        """
+
+        if kind not in SENSOR_KINDS:
+            msg = _("Invalid sensor kind %r.") % (kind)
+            raise ValueError(msg)
+
+        self.kind = kind
+        self.min_value = min_value
+        self.max_value = max_value
+        self.max_rate = max_rate
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+
+        return "%s(%r, min_value=%r, max_value=%r, max_rate=%r)" % (
+            self.__class__.__name__, self.kind, self.min_value,
+            self.max_value, self.max_rate)
+
+
+DEFAULT_THRESHOLDS = (
+    SensorThreshold('temperature', max_value=50, max_rate=5),
+    SensorThreshold('fan', min_value=1),
+)
+"""
+The thresholds used, if no others are given.
+"""
+
+
+# =============================================================================
+class SensorAlarm(object):
+    """
+    A threshold violation of a single sensor.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, key, reason, value, limit, timestamp):
+
+        self.key = key
+        """
+        @ivar: the key of the sensor (adapter, enclosure Id, kind, number)
+        @type: tuple
+        """
+
+        self.reason = reason
+        """
+        @ivar: the violated limit, 'min', 'max' or 'rate'
+        @type: str
+        """
+
+        self.value = value
+        """
+        @ivar: the reading or the rate of change per minute
+        @type: float
+        """
+
+        self.limit = limit
+        self.timestamp = timestamp
+
+    # -------------------------------------------------------------------------
+    def as_dict(self):
+        """
+        Transforms the elements of the object into a dict
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        (adapter, enc_id, kind, number) = self.key
+        return {
+            'adapter': adapter,
+            'enclosure': enc_id,
+            'kind': kind,
+            'sensor': number,
+            'reason': self.reason,
+            'value': self.value,
+            'limit': self.limit,
+            'timestamp': self.timestamp,
+        }
+
+    # -------------------------------------------------------------------------
+    def __str__(self):
+
+        (adapter, enc_id, kind, number) = self.key
+        return _(
+            "Adapter %(a)d, enclosure %(e)d, %(k)s sensor %(n)d: "
+            "%(r)s limit %(l)r exceeded by %(v)r.") % {
+            'a': adapter, 'e': enc_id, 'k': kind, 'n': number,
+            'r': self.reason, 'l': self.limit, 'v': self.value}
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+
+        return "<%s(%s)>" % (self.__class__.__name__, self)
+
+
+# =============================================================================
+class EnclosureTelemetry(object):
+    """
+    Thread safe store of the sensor readings of all enclosures of a host.
+
+    All readings of one poll share one timestamp. Every sensor has its own
+    ring buffer of doubles with a fixed number of entries, missing readings
+    are stored as NaN. So the memory needed doesn't grow over the time,
+    and no objects are kept per reading.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, capacity=DEFAULT_TELEMETRY_CAPACITY):
+        """
+        Constructor.
+
+        @param capacity: the number of polls kept per sensor
+        @type capacity: int
+
+        """
+
+        self.capacity = int(capacity)
+        if self.capacity < 2:
+            msg = _("The capacity must be at least %d.") % (2)
+            raise ValueError(msg)
+
+        self._times = array('d', [NAN] * self.capacity)
+        self._values = {}
+        self._status = {}
+        self._pos = -1
+        self._count = 0
+        self._lock = threading.Lock()
+
+    # -----------------------------------------------------------
+    @property
+    def count(self):
+        """The number of polls currently kept."""
+        return self._count
+
+    # -------------------------------------------------------------------------
+    def keys(self):
+        """
+        Gives back the keys of all known sensors, every key is a tuple
+        of (adapter, enclosure Id, kind, number).
+
+        @rtype: list of tuple
+        """
+
+        with self._lock:
+            return sorted(self._values.keys())
+
+    # -------------------------------------------------------------------------
+    def record(self, enclosures, timestamp=None):
+        """
+        Records the current readings of all sensors of the given enclosures
+        as one poll.
+
+        @param enclosures: the enclosures as given back by
+                           MegaraidHandler.get_enclosures()
+        @type enclosures: iterable of MegaraidEnclosure
+        @param timestamp: the time of the poll, defaults to now
+        @type timestamp: float or None
+
+        """
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        readings = {}
+        for enc in enclosures:
+            if enc.id is None:
+                continue
+            for sensor in enc.voltage_sensors:
+                key = (enc.adapter, enc.id, 'voltage', sensor.number)
+                readings[key] = (sensor.voltage, sensor.status)
+            for sensor in enc.temperature_sensors:
+                key = (enc.adapter, enc.id, 'temperature', sensor.number)
+                readings[key] = (sensor.temperature, sensor.status)
+            for fan in enc.fans:
+                key = (enc.adapter, enc.id, 'fan', fan.number)
+                value = 0.0
+                if fan.status and fan.status.upper() == 'OK':
+                    value = 1.0
+                readings[key] = (value, fan.status)
+
+        with self._lock:
+            self._pos = (self._pos + 1) % self.capacity
+            self._times[self._pos] = timestamp
+            if self._count < self.capacity:
+                self._count += 1
+
+            for key in self._values:
+                self._values[key][self._pos] = NAN
+
+            for key in readings:
+                (value, status) = readings[key]
+                values = self._values.get(key)
+                if values is None:
+                    values = array('d', [NAN] * self.capacity)
+                    self._values[key] = values
+                if value is not None:
+                    values[self._pos] = float(value)
+                self._status[key] = status
+
+    # -------------------------------------------------------------------------
+    def series(self, key):
+        """
+        Gives back all kept readings of the given sensor, the oldest first.
+
+        @param key: the key of the sensor
+        @type key: tuple
+
+        @return: tuples of (timestamp, value), value is None for
+                 missing readings
+        @rtype: list of tuple
+        """
+
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                return []
+            res = []
+            for i in self._indices():
+                value = values[i]
+                if value != value:
+                    value = None
+                res.append((self._times[i], value))
+            return res
+
+    # -------------------------------------------------------------------------
+    def latest(self, key):
+        """
+        Gives back the newest reading and the textual status of the given
+        sensor, the reading is None, if it was missing in the last poll.
+
+        @rtype: tuple of (float or None, str or None)
+        """
+
+        with self._lock:
+            values = self._values.get(key)
+            if values is None or self._pos < 0:
+                return (None, None)
+            value = values[self._pos]
+            if value != value:
+                value = None
+            return (value, self._status.get(key))
+
+    # -------------------------------------------------------------------------
+    def _indices(self):
+        """
+        Gives back the ring buffer indices of all kept polls, the oldest
+        first. Must be called with the lock held.
+        """
+
+        start = (self._pos - self._count + 1) % self.capacity
+        return [(start + i) % self.capacity for i in range(self._count)]
+
+    # -------------------------------------------------------------------------
+    def evaluate(self, thresholds=DEFAULT_THRESHOLDS):
+        """
+        Evaluates the given thresholds against the readings of the last poll
+        of all sensors of all enclosures. The rate of change is computed
+        between the last two polls.
+
+        @param thresholds: the thresholds, at most one per kind of sensors
+        @type thresholds: iterable of SensorThreshold
+
+        @return: all threshold violations
+        @rtype: list of SensorAlarm
+        """
+
+        by_kind = {}
+        for threshold in thresholds:
+            by_kind[threshold.kind] = threshold
+
+        alarms = []
+        with self._lock:
+            if self._count < 1:
+                return alarms
+
+            cur = self._pos
+            now = self._times[cur]
+            prev = None
+            minutes = None
+            if self._count > 1:
+                prev = (cur - 1) % self.capacity
+                minutes = (now - self._times[prev]) / 60.0
+                if minutes <= 0:
+                    prev = None
+
+            for key in sorted(self._values.keys()):
+                threshold = by_kind.get(key[2])
+                if threshold is None:
+                    continue
+                values = self._values[key]
+                value = values[cur]
+                if value != value:
+                    continue
+
+                if threshold.min_value is not None and value < threshold.min_value:
+                    alarms.append(SensorAlarm(
+                        key, 'min', value, threshold.min_value, now))
+                if threshold.max_value is not None and value > threshold.max_value:
+                    alarms.append(SensorAlarm(
+                        key, 'max', value, threshold.max_value, now))
+
+                if threshold.max_rate is None or prev is None:
+                    continue
+                last = values[prev]
+                if last != last:
+                    continue
+                rate = (value - last) / minutes
+                if abs(rate) > threshold.max_rate:
+                    alarms.append(SensorAlarm(
+                        key, 'rate', rate, threshold.max_rate, now))
+
+        return alarms
+
+
+# =============================================================================
+class EnclosurePoller(object):
+    """
+    Polls the enclosures of all MegaRaid adapters periodically in a thread,
+    records their sensor readings and evaluates the thresholds.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+        self, handler, telemetry=None, interval=DEFAULT_POLL_INTERVAL,
+            thresholds=DEFAULT_THRESHOLDS, adapter_ids=None,
+            max_workers=DEFAULT_MAX_WORKERS, on_alarms=None):
+        """
+        Constructor.
+
+        @param handler: the handler object to retrieve the enclosures
+        @type handler: MegaraidHandler
+        @param telemetry: the store of the readings, a new one is created,
+                          if not given
+        @type telemetry: EnclosureTelemetry
+        @param interval: the time in seconds between two polls
+        @type interval: float
+        @param thresholds: the thresholds to evaluate after every poll
+        @type thresholds: iterable of SensorThreshold
+        @param adapter_ids: the Ids of the adapters to poll, if not given,
+                            all adapters are polled
+        @type adapter_ids: list of int
+        @param max_workers: the maximum number of adapters polled concurrently
+        @type max_workers: int
+        @param on_alarms: a function called with the list of alarms,
+                          if a poll leads to any alarms
+        @type on_alarms: callable or None
+
+        """
+
+        self.handler = handler
+        self.telemetry = telemetry
+        if self.telemetry is None:
+            self.telemetry = EnclosureTelemetry()
+        self.interval = float(interval)
+        self.thresholds = list(thresholds)
+        self.adapter_ids = adapter_ids
+        self.max_workers = max_workers
+        self.on_alarms = on_alarms
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # -------------------------------------------------------------------------
+    def poll(self):
+        """
+        Retrieves the enclosures of all adapters once, records their
+        sensor readings and evaluates the thresholds. The event cache
+        of the handler is bypassed, because sensor readings don't
+        create events.
+
+        @return: all threshold violations of this poll
+        @rtype: list of SensorAlarm
+        """
+
+        adapter_ids = self.adapter_ids
+        if adapter_ids is None:
+            adapter_ids = list(range(self.handler.adapter_count()))
+
+        def get_enclosures(adapter_id):
+            return self.handler.get_enclosures(adapter_id, use_event_cache=False)
+
+        timestamp = time.time()
+        results = run_parallel(get_enclosures, adapter_ids, self.max_workers)
+
+        enclosures = []
+        for adapter_id in sorted(results.keys()):
+            enclosures += results[adapter_id]
+        self.telemetry.record(enclosures, timestamp)
+
+        alarms = self.telemetry.evaluate(self.thresholds)
+        for alarm in alarms:
+            log.warn(str(alarm))
+        if alarms and self.on_alarms:
+            self.on_alarms(alarms)
+
+        return alarms
+
+    # -------------------------------------------------------------------------
+    def run(self, count=None):
+        """
+        Polls every self.interval seconds, until stop() is called or
+        the given number of polls is reached. Errors of a single poll
+        are logged, but don't stop polling.
+
+        @param count: the maximum number of polls
+        @type count: int or None
+
+        """
+
+        done = 0
+        while not self._stop_event.is_set():
+            start = time.time()
+            try:
+                self.poll()
+            except Exception as e:
+                log.error(_("Polling of the MegaRaid enclosures failed: %s"), e)
+            done += 1
+            if count is not None and done >= count:
+                break
+            wait = self.interval - (time.time() - start)
+            if wait > 0:
+                self._stop_event.wait(wait)
+
+    # -------------------------------------------------------------------------
+    def start(self):
+        """
+        Starts polling in a daemon thread.
+        """
+
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    # -------------------------------------------------------------------------
+    def stop(self, timeout=None):
+        """
+        Stops polling and waits for the end of the thread.
+        """
+
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
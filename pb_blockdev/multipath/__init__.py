@@ -20,12 +20,14 @@ from pb_base.handler import PbBaseHandler
 
 from pb_blockdev.base import BlockDeviceError
 
+from pb_blockdev.tools import find_tool
+
 from pb_blockdev.translate import pb_gettext, pb_ngettext
 
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.5.3'
+__version__ = '0.6.0'
 
 MULTIPATHD_PATH = os.sep + os.path.join('sbin', 'multipathd')
 LOG = logging.getLogger(__name__)
@@ -136,8 +138,12 @@ class GenericMultipathHandler(PbBaseHandler):
         # Check of the multipathd command
         if multipathd_command:
             self._multipathd_command = multipathd_command
-        if not os.path.exists(self._multipathd_command):
-            failed_commands.append('multipathd')
+            if not os.path.exists(self._multipathd_command):
+                failed_commands.append('multipathd')
+        else:
+            self._multipathd_command = find_tool('multipathd', MULTIPATHD_PATH)
+            if not self._multipathd_command:
+                failed_commands.append('multipathd')
 
         # Some commands are missing
         if failed_commands:
@@ -194,15 +200,7 @@ class GenericMultipathHandler(PbBaseHandler):
 
         """
 
-        cmd = [self.multipathd_command]
-        cmd_str = self.multipathd_command
-        if isinstance(cmd_params, list):
-            for p in cmd_params:
-                cmd.append(p)
-                cmd_str += " " + ("%r" % (str(p)))
-        else:
-            cmd.append(str(cmd_params))
-            cmd_str += " " + ("%r" % (str(cmd_params)))
+        (cmd, cmd_str) = self._build_multipathd_cmd(cmd_params)
 
         do_sudo = False
         if os.geteuid():
@@ -215,6 +213,41 @@ class GenericMultipathHandler(PbBaseHandler):
         (ret_code, std_out, std_err) = self.call(
             cmd, quiet=True, sudo=do_sudo, simulate=simulate)
 
+        self._check_multipathd_result(cmd_str, ret_code, std_err)
+        return (ret_code, std_out, std_err)
+
+    # -------------------------------------------------------------------------
+    def _build_multipathd_cmd(self, cmd_params):
+        """
+        Builds the command line for executing 'multipathd'
+        with the given parameters.
+
+        @return: the command as a list and as a string
+        @rtype: tuple of list and str
+        """
+
+        cmd = [self.multipathd_command]
+        cmd_str = self.multipathd_command
+        if isinstance(cmd_params, list):
+            for p in cmd_params:
+                cmd.append(p)
+                cmd_str += " " + ("%r" % (str(p)))
+        else:
+            cmd.append(str(cmd_params))
+            cmd_str += " " + ("%r" % (str(cmd_params)))
+
+        return (cmd, cmd_str)
+
+    # -------------------------------------------------------------------------
+    def _check_multipathd_result(self, cmd_str, ret_code, std_err):
+        """
+        Checks the result of an execution of 'multipathd'.
+
+        @raise MultipathdNotRunningError: if the command fails, because
+                                          the multipathd is not running
+        @raise ExecMultipathdError: on other errors
+        """
+
         if ret_code:
             # ux_socket_connect: No such file or directory
             p_ux_socket_connect = r'^\s*ux_socket_connect:\s+No\s+such'
@@ -225,7 +258,6 @@ class GenericMultipathHandler(PbBaseHandler):
             msg = _("Error %(rc)d executing \"%(cmd)s\": %(msg)s") % {
                 'rc': ret_code, 'cmd': cmd_str, 'msg': std_err}
             raise ExecMultipathdError(msg)
-        return (ret_code, std_out, std_err)
 
 # =============================================================================
 
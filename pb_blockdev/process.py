@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@organization: Profitbricks GmbH
+@copyright: © 2010 - 2015 by Profitbricks GmbH
+@license: GPL3
+@summary: Module for a thread safe execution of commands with a timeout
+"""
+
+# Standard modules
+import sys
+import os
+import logging
+import errno
+import time
+import signal
+import select
+import subprocess
+
+# Third party modules
+
+# Own modules
+from pb_base.handler import CommandNotFoundError
+
+from pb_blockdev.base import BlockDeviceError
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+# Seconds to wait after SIGTERM to the process group before sending SIGKILL
+KILL_GRACE_PERIOD = 2.0
+
+
+# =============================================================================
+class ExecTimeoutError(BlockDeviceError):
+    """
+    Exception class for a timeout on execution of a command
+    by call_with_timeout().
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, timeout, cmd, std_out=None, std_err=None):
+        """
+        Constructor.
+
+        @param timeout: the timout in seconds leading to the error
+        @type timeout: float
+        @param cmd: the command, which execution lead to a timeout.
+        @type cmd: list of str
+        @param std_out: the output on STDOUT until the timeout
+        @type std_out: str
+        @param std_err: the output on STDERR until the timeout
+        @type std_err: str
+
+        """
+
+        self.timeout = timeout
+        self.cmd = cmd
+        self.std_out = std_out
+        self.std_err = std_err
+
+        super(ExecTimeoutError, self).__init__(str(self))
+
+    # -------------------------------------------------------------------------
+    def __str__(self):
+
+        return _("Timeout on executing %(cmd)r after %(to)0.1f secs.") % {
+            'cmd': ' '.join(self.cmd), 'to': self.timeout}
+
+
+# =============================================================================
+def _new_session_args():
+    """
+    Gives back the arguments for subprocess.Popen() to start
+    the command in a new session and process group.
+    """
+
+    if sys.version_info[0] > 2:
+        return {'start_new_session': True, 'close_fds': True}
+    return {'preexec_fn': os.setsid, 'close_fds': True}
+
+
+# =============================================================================
+def kill_process_group(proc, grace_period=KILL_GRACE_PERIOD):
+    """
+    Terminates the process group of the given process, which must be the
+    leader of its own process group. First SIGTERM is sent to the whole
+    group, after the grace period SIGKILL.
+
+    @param proc: the process to kill
+    @type proc: subprocess.Popen
+    @param grace_period: seconds to wait between SIGTERM and SIGKILL
+    @type grace_period: float
+
+    """
+
+    for signum in (signal.SIGTERM, signal.SIGKILL):
+        if proc.poll() is not None:
+            break
+        try:
+            os.killpg(proc.pid, signum)
+        except OSError as e:
+            if e.errno == errno.ESRCH:
+                break
+            # E.g. EPERM on processes executed by sudo
+            LOG.debug(_("Could not kill process group %(pg)d: %(e)s"), {
+                'pg': proc.pid, 'e': e})
+            try:
+                os.kill(proc.pid, signum)
+            except OSError:
+                break
+        if signum == signal.SIGKILL:
+            break
+        deadline = time.time() + grace_period
+        while proc.poll() is None and time.time() < deadline:
+            time.sleep(0.05)
+
+    proc.wait()
+
+
+# =============================================================================
+def call_with_timeout(cmd, timeout=None, sudo_cmd=None, env=None, input_data=None):
+    """
+    Executes the given command in its own process group and waits for
+    its termination at most timeout seconds. On timeout the whole
+    process group is killed. This function doesn't use any signal
+    handlers, so it can be called from any thread.
+
+    @raise ExecTimeoutError: on a timeout of the command
+    @raise OSError: if the command could not be executed
+
+    @param cmd: the command to execute with all its arguments
+    @type cmd: list of str
+    @param timeout: the timeout in seconds, None means no timeout
+    @type timeout: float or None
+    @param sudo_cmd: path to the 'sudo' command, if given, the command
+                     is executed non-interactive by sudo
+    @type sudo_cmd: str or None
+    @param env: the environment of the command
+    @type env: dict
+    @param input_data: data to write to STDIN of the command
+    @type input_data: str or None
+
+    @return: a tuple of::
+        - return value of the command,
+        - output on STDOUT,
+        - output on STDERR
+    @rtype: tuple
+
+    """
+
+    cmd = [str(x) for x in cmd]
+    if sudo_cmd:
+        cmd = [sudo_cmd, '-n'] + cmd
+    deadline = None
+    if timeout is not None:
+        deadline = time.time() + float(timeout)
+
+    stdin = None
+    if input_data is not None:
+        stdin = subprocess.PIPE
+
+    proc = subprocess.Popen(
+        cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        env=env, **_new_session_args())
+
+    if input_data is not None:
+        try:
+            proc.stdin.write(input_data.encode('utf-8'))
+        except (IOError, OSError) as e:
+            if e.errno != errno.EPIPE:
+                raise
+        proc.stdin.close()
+
+    out_fd = proc.stdout.fileno()
+    err_fd = proc.stderr.fileno()
+    outputs = {
+        out_fd: [],
+        err_fd: [],
+    }
+    open_fds = list(outputs.keys())
+
+    try:
+        while open_fds:
+            wait_time = None
+            if deadline is not None:
+                wait_time = deadline - time.time()
+                if wait_time <= 0:
+                    raise ExecTimeoutError(timeout, cmd)
+            try:
+                (readable, _w, _x) = select.select(open_fds, [], [], wait_time)
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            for fd in readable:
+                data = os.read(fd, 65536)
+                if data:
+                    outputs[fd].append(data)
+                else:
+                    open_fds.remove(fd)
+
+        # Both pipes are closed, the process should terminate immediately
+        while proc.poll() is None:
+            if deadline is not None and time.time() >= deadline:
+                raise ExecTimeoutError(timeout, cmd)
+            time.sleep(0.01)
+
+    except ExecTimeoutError as e:
+        LOG.warn(str(e))
+        kill_process_group(proc)
+        e.std_out = b''.join(outputs[out_fd]).decode('utf-8', 'replace')
+        e.std_err = b''.join(outputs[err_fd]).decode('utf-8', 'replace')
+        raise
+
+    finally:
+        proc.stdout.close()
+        proc.stderr.close()
+
+    std_out = b''.join(outputs[out_fd]).decode('utf-8', 'replace')
+    std_err = b''.join(outputs[err_fd]).decode('utf-8', 'replace')
+
+    return (proc.returncode, std_out, std_err)
+
+
+# =============================================================================
+def handler_call_with_timeout(
+        handler, cmd, timeout=None, quiet=True, sudo=False, simulate=None):
+    """
+    Replacement of PbBaseHandler.call() with a thread safe timeout
+    using call_with_timeout(). Simulated commands are given to
+    handler.call(), because they are not really executed.
+
+    @raise ExecTimeoutError: on a timeout of the command
+    @raise CommandNotFoundError: if sudo should be used, but was not found
+
+    @param handler: the handler object executing the command
+    @type handler: PbBaseHandler
+    @param cmd: the command to execute with all its arguments
+    @type cmd: list of str
+    @param timeout: the timeout in seconds, None means no timeout
+    @type timeout: float or None
+    @param quiet: don't log the output of the command
+    @type quiet: bool
+    @param sudo: execute the command with sudo as root
+    @type sudo: bool
+    @param simulate: coerced simulation of the command
+    @type simulate: bool or None
+
+    @return: a tuple of::
+        - return value of the command,
+        - output on STDOUT,
+        - output on STDERR
+    @rtype: tuple
+
+    """
+
+    do_simulate = handler.simulate
+    if simulate is not None:
+        do_simulate = bool(simulate)
+    if do_simulate:
+        return handler.call(cmd, quiet=quiet, sudo=sudo, simulate=True)
+
+    sudo_cmd = None
+    if sudo:
+        sudo_cmd = get_sudo_cmd(handler)
+
+    (ret_code, std_out, std_err) = call_with_timeout(
+        cmd, timeout=timeout, sudo_cmd=sudo_cmd)
+
+    log_output(handler, std_out, std_err, quiet=quiet)
+
+    return (ret_code, std_out, std_err)
+
+
+# =============================================================================
+def get_sudo_cmd(handler):
+    """
+    Gives back the path to the 'sudo' command.
+
+    @raise CommandNotFoundError: if sudo was not found
+
+    @param handler: the handler object executing a command
+    @type handler: PbBaseHandler
+
+    @return: the path to 'sudo'
+    @rtype: str
+    """
+
+    sudo_cmd = handler.get_command('sudo')
+    if not sudo_cmd:
+        raise CommandNotFoundError('sudo')
+    return sudo_cmd
+
+
+# =============================================================================
+def log_output(handler, std_out, std_err, quiet=True):
+    """
+    Logs the output of an executed command, if not quiet or
+    if the handler is verbose enough.
+    """
+
+    if quiet and handler.verbose <= 2:
+        return
+
+    if std_out:
+        LOG.debug(_("Output on %(where)s:") + "\n%(what)s", {
+            'where': 'STDOUT', 'what': std_out.strip()})
+    if std_err:
+        LOG.debug(_("Output on %(where)s:") + "\n%(what)s", {
+            'where': 'STDERR', 'what': std_err.strip()})
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -23,6 +23,8 @@ from pb_base.common import to_str_or_bust
 from pb_blockdev.base import BlockDeviceError
 from pb_blockdev.base import BlockDevice
 
+from pb_blockdev.attr_cache import ATTR_STATIC
+
 from pb_blockdev.hbtl import HBTL
 
 from pb_blockdev.translate import pb_gettext, pb_ngettext
@@ -30,7 +32,7 @@ from pb_blockdev.translate import pb_gettext, pb_ngettext
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.3.5'
+__version__ = '0.5.0'
 
 log = logging.getLogger(__name__)
 
@@ -50,6 +52,15 @@ class ScsiDeviceError(BlockDeviceError):
 # =============================================================================
 class ScsiDevice(BlockDevice):
 
+    cached_attrs = dict(
+        BlockDevice.cached_attrs,
+        vendor=ATTR_STATIC,
+        model=ATTR_STATIC,
+        revision=ATTR_STATIC,
+        scsi_level=ATTR_STATIC,
+        scsi_type_id=ATTR_STATIC,
+    )
+
     # -------------------------------------------------------------------------
     def __init__(
         self, name, appname=None, verbose=0, version=__version__,
@@ -328,13 +339,14 @@ class ScsiDevice(BlockDevice):
     @property
     def model(self):
         """The model of the SCSI device."""
-        if self._model is not None:
+        if self.cache_valid('model'):
             return self._model
 
         if not self.model_file:
             return None
 
         self._retr_model()
+        self.cache_loaded('model')
         return self._model
 
     # -----------------------------------------------------------
@@ -381,13 +393,14 @@ class ScsiDevice(BlockDevice):
     @property
     def revision(self):
         """The revision of the SCSI device."""
-        if self._revision is not None:
+        if self.cache_valid('revision'):
             return self._revision
 
         if not self.rev_file:
             return None
 
         self._retr_revision()
+        self.cache_loaded('revision')
         return self._revision
 
     # -----------------------------------------------------------
@@ -402,13 +415,14 @@ class ScsiDevice(BlockDevice):
     @property
     def scsi_level(self):
         """The numeric SCSI level of the SCSI device."""
-        if self._scsi_level is not None:
+        if self.cache_valid('scsi_level'):
             return self._scsi_level
 
         if not self.scsi_level_file:
             return None
 
         self._retr_scsi_level()
+        self.cache_loaded('scsi_level')
         return self._scsi_level
 
     # -----------------------------------------------------------
@@ -494,13 +508,14 @@ class ScsiDevice(BlockDevice):
     @property
     def scsi_type_id(self):
         """The numeric SCSI type Id."""
-        if self._scsi_type_id is not None:
+        if self.cache_valid('scsi_type_id'):
             return self._scsi_type_id
 
         if not self.type_file:
             return None
 
         self._retr_scsi_type_id()
+        self.cache_loaded('scsi_type_id')
         return self._scsi_type_id
 
     # -----------------------------------------------------------
@@ -543,13 +558,14 @@ class ScsiDevice(BlockDevice):
     @property
     def vendor(self):
         """The vendor of the SCSI device."""
-        if self._vendor is not None:
+        if self.cache_valid('vendor'):
             return self._vendor
 
         if not self.vendor_file:
             return None
 
         self._retr_vendor()
+        self.cache_loaded('vendor')
         return self._vendor
 
     # -------------------------------------------------------------------------
@@ -641,185 +657,136 @@ class ScsiDevice(BlockDevice):
         return
 
     # -------------------------------------------------------------------------
-    def _retr_scsi_type_id(self):
+    def retr_scsi_attrs(self):
         """
-        A method to retrieve the numeric SCSI type id.
+        Retrieves the SCSI type id, the vendor, the model, the revision
+        and the SCSI level of the SCSI device, reading all appropriate
+        files in sysfs together.
 
-        @raise ScsiDeviceError: if the type file sysfs doesn't exists
+        @raise ScsiDeviceError: if one of the files in sysfs doesn't exists
                                 or could not read
 
         """
 
-        if not os.path.exists(self.type_file):
-            msg = _(
-                "Cannot retrieve SCSI type id of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                    'bd': self.name, 'file': self.type_file}
-            raise ScsiDeviceError(msg)
+        names = []
+        for name in ('type', 'vendor', 'model', 'rev', 'scsi_level'):
+            names.append(os.path.join('device', name))
+        attrs = self._read_sysfs_attrs(
+            names, _('SCSI device attributes'), ScsiDeviceError)
 
-        if not os.access(self.type_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve SCSI type id of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                    'bd': self.name, 'file': self.type_file}
-            raise ScsiDeviceError(msg)
+        self._retr_scsi_type_id(attrs)
+        self._retr_vendor(attrs)
+        self._retr_model(attrs)
+        self._retr_revision(attrs)
+        self._retr_scsi_level(attrs)
+
+    # -------------------------------------------------------------------------
+    def _retr_scsi_type_id(self, attrs=None):
+        """
+        A method to retrieve the numeric SCSI type id.
+
+        @raise ScsiDeviceError: if the type file sysfs doesn't exists
+                                or could not read
+
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
+
+        """
 
         if self.verbose > 2:
             log.debug(
                 _("Trying to retrieve the numeric SCSI id of %(bd)r from %(file)r.") % {
                     'bd': self.name, 'file': self.type_file})
-        f_content = self.read_file(self.type_file, quiet=True).strip()
-        if not f_content:
-            msg = _(
-                "Cannot retrieve SCSI type id of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                    'bd': self.name, 'file': self.type_file}
-            raise ScsiDeviceError(msg)
+        f_content = self._sysfs_attr(
+            os.path.join('device', 'type'), _('SCSI type id'), attrs,
+            ScsiDeviceError)
 
         self._scsi_type_id = int(f_content)
 
     # -------------------------------------------------------------------------
-    def _retr_vendor(self):
+    def _retr_vendor(self, attrs=None):
         """
         A method to retrieve the vendor of the SCSI device.
 
         @raise ScsiDeviceError: if the vendor file sysfs doesn't exists
                                 or could not read
 
-        """
-
-        if not os.path.exists(self.vendor_file):
-            msg = _(
-                "Cannot retrieve the vendor of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                    'bd': self.name, 'file': self.vendor_file}
-            raise ScsiDeviceError(msg)
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
 
-        if not os.access(self.vendor_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve vendor of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                    'bd': self.name, 'file': self.vendor_file}
-            raise ScsiDeviceError(msg)
+        """
 
         if self.verbose > 2:
             log.debug(
                 _("Trying to retrieve the vendor of %(bd)r from %(file)r.") % {
                     'bd': self.name, 'file': self.vendor_file})
-        f_content = self.read_file(self.vendor_file, quiet=True).strip()
-        if not f_content:
-            msg = _(
-                "Cannot retrieve vendor of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                    'bd': self.name, 'file': self.vendor_file}
-            raise ScsiDeviceError(msg)
-
-        self._vendor = f_content
+        self._vendor = self._sysfs_attr(
+            os.path.join('device', 'vendor'), _('vendor'), attrs,
+            ScsiDeviceError)
 
     # -------------------------------------------------------------------------
-    def _retr_model(self):
+    def _retr_model(self, attrs=None):
         """
         A method to retrieve the model of the SCSI device.
 
         @raise ScsiDeviceError: if the model file sysfs doesn't exists
                                 or could not read
 
-        """
-
-        if not os.path.exists(self.model_file):
-            msg = _(
-                "Cannot retrieve the model of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                    'bd': self.name, 'file': self.model_file}
-            raise ScsiDeviceError(msg)
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
 
-        if not os.access(self.model_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve model of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                    'bd': self.name, 'file': self.model_file}
-            raise ScsiDeviceError(msg)
+        """
 
         if self.verbose > 2:
             log.debug(
                 _("Trying to retrieve the model of %(bd)r from %(file)r.") % {
                     'bd': self.name, 'file': self.model_file})
-        f_content = self.read_file(self.model_file, quiet=True).strip()
-        if not f_content:
-            msg = _(
-                "Cannot retrieve model of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                    'bd': self.name, 'file': self.model_file}
-            raise ScsiDeviceError(msg)
-
-        self._model = f_content
+        self._model = self._sysfs_attr(
+            os.path.join('device', 'model'), _('model'), attrs,
+            ScsiDeviceError)
 
     # -------------------------------------------------------------------------
-    def _retr_revision(self):
+    def _retr_revision(self, attrs=None):
         """
         A method to retrieve the revision of the SCSI device.
 
         @raise ScsiDeviceError: if the revision file sysfs doesn't exists
                                 or could not read
 
-        """
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
 
-        if not os.path.exists(self.rev_file):
-            msg = _(
-                "Cannot retrieve the revision of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                    'bd': self.name, 'file': self.rev_file}
-            raise ScsiDeviceError(msg)
-
-        if not os.access(self.rev_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve revision of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                    'bd': self.name, 'file': self.rev_file}
-            raise ScsiDeviceError(msg)
+        """
 
         if self.verbose > 2:
             log.debug(
                 _("Trying to retrieve the revision of %(bd)r from %(file)r.") % {
                     'bd': self.name, 'file': self.rev_file})
 
-        self._revision = self.read_file(self.rev_file, quiet=True).strip()
+        self._revision = self._sysfs_attr(
+            os.path.join('device', 'rev'), _('revision'), attrs,
+            ScsiDeviceError, empty_ok=True)
 
     # -------------------------------------------------------------------------
-    def _retr_scsi_level(self):
+    def _retr_scsi_level(self, attrs=None):
         """
         A method to retrieve the SCSI level of the SCSI device.
 
         @raise ScsiDeviceError: if the scsi_level file sysfs doesn't exists
                                 or could not read
 
-        """
-
-        if not os.path.exists(self.scsi_level_file):
-            msg = _(
-                "Cannot retrieve the SCSI level of %(bd)r, "
-                "because the file %(file)r doesn't exists.") % {
-                    'bd': self.name, 'file': self.scsi_level_file}
-            raise ScsiDeviceError(msg)
+        @param attrs: the result of a former read_attrs()
+        @type attrs: dict or None
 
-        if not os.access(self.scsi_level_file, os.R_OK):
-            msg = _(
-                "Cannot retrieve SCSI level of %(bd)r, "
-                "because no read access to %(file)r.") % {
-                    'bd': self.name, 'file': self.scsi_level_file}
-            raise ScsiDeviceError(msg)
+        """
 
         if self.verbose > 2:
             log.debug(
                 _("Trying to retrieve the SCSI level of %(bd)r from %(file)r.") % {
                     'bd': self.name, 'file': self.scsi_level_file})
-        f_content = self.read_file(self.scsi_level_file, quiet=True).strip()
-        if not f_content:
-            msg = _(
-                "Cannot retrieve SCSI level of %(bd)r, "
-                "because file %(file)r has no content.") % {
-                    'bd': self.name, 'file': self.scsi_level_file}
-            raise ScsiDeviceError(msg)
+        f_content = self._sysfs_attr(
+            os.path.join('device', 'scsi_level'), _('SCSI level'), attrs,
+            ScsiDeviceError)
 
         self._scsi_level = int(f_content)
 
@@ -25,14 +25,19 @@ from pb_base.handler import PbBaseHandler
 
 from pb_blockdev.hbtl import HBTL
 
+from pb_blockdev.attr_cache import AttrCacheMixin
+from pb_blockdev.attr_cache import ATTR_STATIC, ATTR_VOLATILE
+
 from pb_blockdev.scsi import ScsiDevice
 
+from pb_blockdev.scsi_topology import ScsiTopology
+
 from pb_blockdev.translate import pb_gettext, pb_ngettext
 
 _ = pb_gettext
 __ = pb_ngettext
 
-__version__ = '0.10.3'
+__version__ = '0.12.1'
 
 LOG = logging.getLogger(__name__)
 
@@ -56,17 +61,23 @@ class ScsiHostError(PbBaseObjectError):
 
 
 # =============================================================================
-class ScsiHost(PbBaseHandler):
+class ScsiHost(PbBaseHandler, AttrCacheMixin):
     """
     Encapsulation class for SCSI hosts.
     """
 
+    cached_attrs = {
+        'active_mode': ATTR_STATIC,
+        'proc_name': ATTR_STATIC,
+        'state': ATTR_VOLATILE,
+    }
+
     # -----------------------------------------------------------
     def __init__(
         self, host_id, wait_on_scan=DEFAULT_WAIT_ON_SCAN,
             appname=None, verbose=0, version=__version__,
             base_dir=None, use_stderr=False, simulate=False, sudo=False,
-            *targs, **kwargs
+            topology=None, *targs, **kwargs
             ):
         """
         Initialisation of the ScsiHost object.
@@ -92,6 +103,11 @@ class ScsiHost(PbBaseHandler):
         @type simulate: bool
         @param sudo: should the command executed by sudo by default
         @type sudo: bool
+        @param topology: a snapshot of the SCSI topology to take the LUNs
+                         and their block devices from instead of
+                         searching them in sysfs, it's read again
+                         after a scan of this host
+        @type topology: ScsiTopology or None
 
         @return: None
 
@@ -109,6 +125,14 @@ class ScsiHost(PbBaseHandler):
 
         self._wait_on_scan = DEFAULT_WAIT_ON_SCAN
 
+        self.topology = topology
+        """
+        @ivar: a snapshot of the SCSI topology, if given
+        @type: ScsiTopology or None
+        """
+
+        self._last_scan = None
+
         self.luns = []
         """
         @ivar: all found LUN devices of this SCSI host.
@@ -183,11 +207,12 @@ class ScsiHost(PbBaseHandler):
     @property
     def active_mode(self):
         """The active mode of the current SCSI host."""
-        if self._active_mode is not None:
+        if self.cache_valid('active_mode'):
             return self._active_mode
         if not self.exists:
             return None
         self._active_mode = self.retr_active_mode()
+        self.cache_loaded('active_mode')
         return self._active_mode
 
     # -----------------------------------------------------------
@@ -200,11 +225,12 @@ class ScsiHost(PbBaseHandler):
     @property
     def proc_name(self):
         """The name of the owning process of the current SCSI host."""
-        if self._proc_name is not None:
+        if self.cache_valid('proc_name'):
             return self._proc_name
         if not self.exists:
             return None
         self._proc_name = self.retr_proc_name()
+        self.cache_loaded('proc_name')
         return self._proc_name
 
     # -----------------------------------------------------------
@@ -223,11 +249,12 @@ class ScsiHost(PbBaseHandler):
     @property
     def state(self):
         """The current state of the current SCSI host."""
-        if self._state is not None:
+        if self.cache_valid('state'):
             return self._state
         if not self.exists:
             return None
         self._state = self.retr_state()
+        self.cache_loaded('state')
         return self._state
 
     # -----------------------------------------------------------
@@ -405,9 +432,22 @@ class ScsiHost(PbBaseHandler):
         """
         Initializes the list self.luns with all found luns
         of this SCSI host.
+
+        A topology older than the last scan of this host is read again
+        before.
         """
 
         self.luns = []
+        if self.topology is not None:
+            if self._last_scan is not None and (
+                    self.topology.timestamp is None or
+                    self.topology.timestamp < self._last_scan):
+                if self.verbose > 2:
+                    LOG.debug(_("Reading SCSI topology again after a scan ..."))
+                self.topology.refresh()
+            self.luns = self.topology.luns(self.host_id)
+            return
+
         if not os.path.exists(self.device_dir):
             return
 
@@ -474,8 +514,19 @@ class ScsiHost(PbBaseHandler):
         """
         Returns the name of the appropriate blockdevice, if there is such
         one existing, else None is returning.
+
+        If a topology was given, it's asked first. A block device found
+        there is only taken, if it still exists in sysfs. A LUN not found
+        there is searched in sysfs, because it may be appeared after a scan.
         """
 
+        if self.topology is not None:
+            hbtl = HBTL(self.host_id, bus_id, target_id, lun_id)
+            bdevname = self.topology.blockdevice_name(hbtl)
+            if bdevname and os.path.exists(os.path.join(
+                    self.topology.scsi_devices_dir, str(hbtl), 'block', bdevname)):
+                return bdevname
+
         bdir = self.lun_block_dir(bus_id, target_id, lun_id)
         if not os.path.exists(bdir):
             return None
@@ -587,6 +638,7 @@ class ScsiHost(PbBaseHandler):
             raise ScsiHostError(msg)
 
         self.write_file(self.scan_file, scan_string, quiet=True)
+        self._last_scan = time.time()
 
     # -------------------------------------------------------------------------
     def scan_for_hbtl(self, hbtl, quiet=False):
@@ -655,26 +707,28 @@ class ScsiHost(PbBaseHandler):
 # =============================================================================
 def get_scsi_hosts(
         appname=None, verbose=0, base_dir=None, use_stderr=False,
-        simulate=False, sudo=False,
+        simulate=False, sudo=False, topology=None,
         *targs, **kwargs
         ):
     """
     Returns a list of all available SCSI hosts on this machine.
-    """
 
-    pattern = os.path.join(BASE_SYSFS_SCSIHOST_DIR, 'host*')
-    if verbose > 2:
-        LOG.debug(_("Searching for SCSI hosts with pattern %r ..."), pattern)
+    A given ScsiTopology is shared by all ScsiHost objects, they take
+    their LUNs and block devices from it. Without one the SCSI hosts
+    are taken from a new topology, but the ScsiHost objects search
+    their LUNs in sysfs as usual.
+    """
 
-    dirs = glob.glob(pattern)
+    host_ids = None
+    if topology is None:
+        if verbose > 2:
+            LOG.debug(_("Reading SCSI topology from sysfs ..."))
+        host_ids = ScsiTopology().hosts
+    else:
+        host_ids = topology.hosts
     result = []
 
-    for host_dir in dirs:
-        match = RE_HOSTID.search(host_dir)
-        if not match:
-            LOG.warn(_("Invalid scsi_host directory %r found."), host_dir)
-            continue
-        host_id = int(match.group(1))
+    for host_id in host_ids:
         scsi_host = ScsiHost(
             host_id,
             appname=appname,
@@ -683,12 +737,11 @@ def get_scsi_hosts(
             use_stderr=use_stderr,
             simulate=simulate,
             sudo=sudo,
+            topology=topology,
             *targs, **kwargs
         )
         result.append(scsi_host)
 
-    result.sort(key=lambda x: x.host_id)
-
     return result
 
 # =============================================================================
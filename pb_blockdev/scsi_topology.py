@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, ProfitBricks GmbH, Berlin
+@summary: Module for a snapshot of the SCSI topology of the current system
+
+The directories /sys/class/scsi_host and /sys/bus/scsi/devices are read
+only once, the block directory of every LUN only once, and all hosts,
+targets, LUNs and block devices are indexed in both directions. There are
+no glob() calls and no handler objects involved.
+"""
+
+# Standard modules
+import os
+import errno
+import time
+import logging
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.hbtl import HBTL
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.1'
+
+LOG = logging.getLogger(__name__)
+
+# /sys/class/scsi_host
+BASE_SYSFS_SCSIHOST_DIR = os.sep + os.path.join('sys', 'class', 'scsi_host')
+
+# /sys/bus/scsi/devices
+BASE_SYSFS_SCSI_DEVICES_DIR = os.sep + os.path.join('sys', 'bus', 'scsi', 'devices')
+
+
+# =============================================================================
+def _list_dir(path):
+
+    try:
+        return os.listdir(path)
+    except OSError as e:
+        if e.errno in (errno.ENOENT, errno.ENOTDIR):
+            return []
+        raise
+
+
+# =============================================================================
+class ScsiTopology(object):
+    """
+    Snapshot of all SCSI hosts, targets, LUNs and their block devices.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, scsi_host_dir=BASE_SYSFS_SCSIHOST_DIR,
+            scsi_devices_dir=BASE_SYSFS_SCSI_DEVICES_DIR):
+        """
+        Constructor, the sysfs is read immediately.
+
+        @param scsi_host_dir: the sysfs directory of all SCSI hosts
+        @type scsi_host_dir: str
+        @param scsi_devices_dir: the sysfs directory of all SCSI devices
+        @type scsi_devices_dir: str
+
+        """
+
+        self.scsi_host_dir = scsi_host_dir
+        self.scsi_devices_dir = scsi_devices_dir
+
+        self.timestamp = None
+        """
+        @ivar: the time of the last read of the sysfs
+        @type: float
+        """
+
+        self._hosts = []
+        self._targets = {}
+        self._luns = {}
+        self._lun_set = frozenset()
+        self._bd_by_hbtl = {}
+        self._hbtl_by_bd = {}
+
+        self.refresh()
+
+    # -------------------------------------------------------------------------
+    def refresh(self):
+        """
+        Reads the complete SCSI topology from sysfs again.
+        """
+
+        hosts = set()
+        targets = {}
+        luns = {}
+        bd_by_hbtl = {}
+        hbtl_by_bd = {}
+
+        for entry in _list_dir(self.scsi_host_dir):
+            if entry.startswith('host') and entry[4:].isdigit():
+                hosts.add(int(entry[4:]))
+            else:
+                LOG.warn(_("Invalid scsi_host directory %r found."), entry)
+
+        entries = _list_dir(self.scsi_devices_dir)
+
+        for entry in entries:
+            if not entry.startswith('target'):
+                continue
+            parts = entry[6:].split(':')
+            if len(parts) != 3 or not ''.join(parts).isdigit() or not all(parts):
+                continue
+            host_id = int(parts[0])
+            if host_id not in targets:
+                targets[host_id] = set()
+            targets[host_id].add((int(parts[1]), int(parts[2])))
+
+        join = os.path.join
+        all_luns = HBTL.parse_many(entries, skip_invalid=True)
+        for hbtl in all_luns:
+            host_id = hbtl.host
+            if host_id not in luns:
+                luns[host_id] = []
+                if host_id not in targets:
+                    targets[host_id] = set()
+            luns[host_id].append(hbtl)
+            targets[host_id].add((hbtl.bus, hbtl.target))
+
+            block_dir = join(self.scsi_devices_dir, str(hbtl), 'block')
+            names = _list_dir(block_dir)
+            if names:
+                bdname = min(names)
+                bd_by_hbtl[hbtl] = bdname
+                hbtl_by_bd[bdname] = hbtl
+
+        hosts.update(luns.keys())
+        # Not sorted by HBTL.key, because LUN Ids of flat or extended
+        # LUN addressing may exceed 16 bits
+        for host_id in luns:
+            luns[host_id].sort(key=HBTL.as_tuple)
+
+        self._hosts = sorted(hosts)
+        self._targets = dict([(x, sorted(targets[x])) for x in targets])
+        self._luns = luns
+        self._lun_set = frozenset(all_luns)
+        self._bd_by_hbtl = bd_by_hbtl
+        self._hbtl_by_bd = hbtl_by_bd
+        self.timestamp = time.time()
+
+    # -----------------------------------------------------------
+    @property
+    def hosts(self):
+        """The sorted list of all numeric SCSI host Ids."""
+        return list(self._hosts)
+
+    # -------------------------------------------------------------------------
+    def targets(self, host_id):
+        """
+        Gives back all targets of the given SCSI host.
+
+        @param host_id: the numeric SCSI host Id
+        @type host_id: int
+
+        @return: the sorted tuples (bus Id, target Id)
+        @rtype: list of tuple
+        """
+
+        return list(self._targets.get(host_id, []))
+
+    # -------------------------------------------------------------------------
+    def luns(self, host_id=None, bus_id=None, target_id=None):
+        """
+        Gives back all LUNs, all LUNs of the given SCSI host or all LUNs
+        of the given target of the given SCSI host.
+
+        @return: the sorted HBTL addresses of the LUNs
+        @rtype: list of HBTL
+        """
+
+        if host_id is None:
+            result = []
+            for hid in self._hosts:
+                result.extend(self._luns.get(hid, []))
+            return result
+
+        result = self._luns.get(host_id, [])
+        if bus_id is not None:
+            result = [x for x in result if x.bus == bus_id]
+        if target_id is not None:
+            result = [x for x in result if x.target == target_id]
+        return list(result)
+
+    # -------------------------------------------------------------------------
+    def blockdevice_name(self, hbtl):
+        """
+        Gives back the name of the block device of the given LUN,
+        e.g. 'sda', or None, if there is no block device.
+
+        @type hbtl: HBTL
+        @rtype: str or None
+        """
+
+        return self._bd_by_hbtl.get(hbtl)
+
+    # -------------------------------------------------------------------------
+    def hbtl_of(self, bdname):
+        """
+        Gives back the HBTL address of the given block device,
+        or None, if it's not a SCSI device.
+
+        @param bdname: the name of the block device, e.g. 'sda'
+        @type bdname: str
+        @rtype: HBTL or None
+        """
+
+        return self._hbtl_by_bd.get(bdname)
+
+    # -------------------------------------------------------------------------
+    def blockdevices(self):
+        """
+        Gives back the mapping of all block device names to the HBTL
+        addresses of their LUNs.
+
+        @rtype: dict
+        """
+
+        return dict(self._hbtl_by_bd)
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+
+        return len(self._lun_set)
+
+    # -------------------------------------------------------------------------
+    def __contains__(self, hbtl):
+
+        return hbtl in self._lun_set
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        hosts = {}
+        for host_id in self._hosts:
+            luns = {}
+            for hbtl in self._luns.get(host_id, []):
+                luns[str(hbtl)] = self._bd_by_hbtl.get(hbtl)
+            hosts[host_id] = {
+                'targets': self.targets(host_id),
+                'luns': luns,
+            }
+
+        return {
+            '__class_name__': self.__class__.__name__,
+            'scsi_host_dir': self.scsi_host_dir,
+            'scsi_devices_dir': self.scsi_devices_dir,
+            'timestamp': self.timestamp,
+            'hosts': hosts,
+        }
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+
+        return "%s(scsi_host_dir=%r, scsi_devices_dir=%r)" % (
+            self.__class__.__name__, self.scsi_host_dir, self.scsi_devices_dir)
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
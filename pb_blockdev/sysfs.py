@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, ProfitBricks GmbH, Berlin
+@summary: Module for reading many sysfs attributes of a device at once
+
+The sysfs directory of a device is opened only once and all attribute
+files are opened relative to it (openat(2) via os.open(..., dir_fd=...)),
+so there are no path lookups from the root and no os.path.exists() or
+os.access() checks before reading. A missing attribute file is detected
+by ENOENT. On Python versions without dir_fd support the files are
+opened by their full path, but also without any checks before.
+"""
+
+# Standard modules
+import os
+import errno
+import logging
+
+# Third party modules
+
+# Own modules
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+HAS_DIR_FD = (
+    hasattr(os, 'supports_dir_fd') and os.open in os.supports_dir_fd and
+    hasattr(os, 'O_DIRECTORY'))
+
+# Sysfs attribute files are never larger than a page
+MAX_ATTR_SIZE = 4096
+
+
+# =============================================================================
+class SysfsAttrReader(object):
+    """
+    Reads attribute files relative to an opened sysfs directory.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, directory):
+        """
+        Constructor.
+
+        @param directory: the sysfs directory of the device
+        @type directory: str
+
+        """
+
+        self.directory = directory
+        self._fd = None
+        self._missing = False
+
+    # -------------------------------------------------------------------------
+    def open(self):
+        """
+        Opens the directory. If it doesn't exists, all attributes
+        are read as missing.
+        """
+
+        if self._fd is not None or self._missing or not HAS_DIR_FD:
+            return
+        try:
+            self._fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+        except OSError as e:
+            if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                raise
+            self._missing = True
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        """Closes the directory."""
+
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+
+        self.open()
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+    # -------------------------------------------------------------------------
+    def read(self, name):
+        """
+        Reads the given attribute file.
+
+        @raise OSError: on other errors than a missing file,
+                        e.g. EACCES or EIO
+
+        @param name: the name of the attribute file relative to the directory,
+                     may contain subdirectories, e.g. 'device/vendor'
+        @type name: str
+
+        @return: the stripped content of the file or None, if the file
+                 doesn't exists
+        @rtype: str or None
+        """
+
+        if self._missing:
+            return None
+
+        try:
+            if self._fd is not None:
+                fd = os.open(name, os.O_RDONLY, dir_fd=self._fd)
+            else:
+                fd = os.open(os.path.join(self.directory, name), os.O_RDONLY)
+        except OSError as e:
+            if e.errno in (errno.ENOENT, errno.ENOTDIR):
+                return None
+            raise
+
+        try:
+            chunks = []
+            while True:
+                chunk = os.read(fd, MAX_ATTR_SIZE)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        finally:
+            os.close(fd)
+
+        content = b''.join(chunks)
+        if not isinstance(content, str):
+            content = content.decode('utf-8', 'replace')
+        return content.strip()
+
+    # -------------------------------------------------------------------------
+    def read_many(self, names):
+        """
+        Reads all given attribute files.
+
+        @return: the stripped contents by the names, None for missing files
+        @rtype: dict
+        """
+
+        result = {}
+        for name in names:
+            result[name] = self.read(name)
+        return result
+
+
+# =============================================================================
+def read_attrs(dev, names):
+    """
+    Reads the given attribute files of a device in one go.
+
+    @raise OSError: on other errors than a missing file
+
+    @param dev: the device object with a sysfs directory (its sysfs_bd_dir)
+                or a sysfs directory
+    @type dev: BlockDevice or str
+    @param names: the names of the attribute files relative to the sysfs
+                  directory, e.g. ['size', 'ro', 'device/vendor']
+    @type names: list of str
+
+    @return: the stripped contents by the names, None for missing files
+    @rtype: dict
+    """
+
+    directory = dev
+    if hasattr(dev, 'sysfs_bd_dir'):
+        directory = dev.sysfs_bd_dir
+    if not directory:
+        return dict([(x, None) for x in names])
+
+    with SysfsAttrReader(directory) as reader:
+        return reader.read_many(names)
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@copyright: © 2010 - 2015 by Frank Brehm, ProfitBricks GmbH, Berlin
+@summary: Module for a process wide registry of external commands
+
+Every external command is searched only once per process, the result
+(also a not found command) is cached together with its version and
+capabilities and shared by all handler objects.
+"""
+
+# Standard modules
+import os
+import re
+import logging
+import threading
+
+# Third party modules
+
+# Own modules
+from pb_base.common import caller_search_path
+
+from pb_blockdev.translate import pb_gettext, pb_ngettext
+
+_ = pb_gettext
+__ = pb_ngettext
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+# Timeout in seconds for calling a command to get its version or help
+PROBE_TIMEOUT = 10
+
+RE_VERSION = re.compile(r'(\d+(?:\.\d+)+)')
+
+
+# =============================================================================
+def version_tuple(version):
+    """
+    Converts a version string like '2.02.166(2)' into a tuple of integers,
+    e.g. (2, 2, 166).
+    """
+
+    if not version:
+        return None
+    match = RE_VERSION.search(version)
+    if not match:
+        return None
+    return tuple([int(x) for x in match.group(1).split('.')])
+
+
+# =============================================================================
+class ToolInfo(object):
+    """
+    The cached informations about an external command.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, name, path):
+
+        self.name = name
+        """
+        @ivar: the name of the command, e.g. 'losetup'
+        @type: str
+        """
+
+        self.path = path
+        """
+        @ivar: the absolute path of the command, None, if not found
+        @type: str or None
+        """
+
+        self.version = None
+        """
+        @ivar: the version string of the command, if already evaluated
+        @type: str or None
+        """
+
+        self.help_text = None
+        """
+        @ivar: the output of '<command> --help', if already evaluated
+        @type: str or None
+        """
+
+        self.capabilities = {}
+        """
+        @ivar: the already evaluated capabilities of the command
+        @type: dict
+        """
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        return {
+            '__class_name__': self.__class__.__name__,
+            'name': self.name,
+            'path': self.path,
+            'version': self.version,
+            'capabilities': dict(self.capabilities),
+        }
+
+
+# =============================================================================
+def _probe_lvm_json(registry):
+    """lvm supports '--reportformat json' since version 2.02.158."""
+    version = version_tuple(registry.version('lvm', ['version']))
+    if not version:
+        return False
+    return version >= (2, 2, 158)
+
+
+# =============================================================================
+def _probe_option(tool, option):
+
+    def probe(registry):
+        return option in (registry.help_text(tool) or '')
+
+    probe.__doc__ = "%s supports the option %r." % (tool, option)
+    return probe
+
+
+# =============================================================================
+class ToolRegistry(object):
+    """
+    Registry of all external commands used by the pb_blockdev modules.
+    """
+
+    capability_probes = {
+        ('lvm', 'json'): _probe_lvm_json,
+        ('losetup', 'find'): _probe_option('losetup', '--find'),
+        ('losetup', 'json'): _probe_option('losetup', '--json'),
+    }
+    """
+    @cvar: the functions to evaluate capabilities of the commands, they
+           get the registry as the only argument and give back a bool
+    @type: dict
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self):
+
+        self._tools = {}
+        self._lock = threading.RLock()
+
+    # -------------------------------------------------------------------------
+    def _search(self, names, default_path=None, add_paths=None):
+
+        if default_path and os.path.isfile(default_path) and os.access(
+                default_path, os.X_OK):
+            return default_path
+
+        paths = caller_search_path()
+        if add_paths:
+            for d in add_paths:
+                if os.path.isdir(d) and d not in paths:
+                    paths.append(d)
+
+        for name in names:
+            for d in paths:
+                p = os.path.join(d, name)
+                if os.path.isfile(p) and os.access(p, os.X_OK):
+                    return p
+
+        return None
+
+    # -------------------------------------------------------------------------
+    def find(self, name, default_path=None, add_paths=None, alt_names=None):
+        """
+        Gives back the absolute path of the given command. The command is
+        searched only on the first call, also a not found command is cached.
+
+        @param name: the name of the command, used as the key of the registry
+        @type name: str
+        @param default_path: the path, where the command is expected first
+        @type default_path: str or None
+        @param add_paths: additional directories to search in after
+                          the search path
+        @type add_paths: list of str or None
+        @param alt_names: the file names of the command in the order of
+                          preference, if different from name
+        @type alt_names: list of str or None
+
+        @return: the absolute path of the command, None, if not found
+        @rtype: str or None
+        """
+
+        with self._lock:
+            info = self._tools.get(name)
+            if info is None:
+                names = alt_names or [name]
+                path = self._search(names, default_path, add_paths)
+                if path:
+                    LOG.debug(_("Found command %(cmd)r: %(path)r.") % {
+                        'cmd': name, 'path': path})
+                else:
+                    LOG.debug(_("Command %r not found."), name)
+                info = ToolInfo(name, path)
+                self._tools[name] = info
+            return info.path
+
+    # -------------------------------------------------------------------------
+    def register(self, name, path):
+        """
+        Registers the given path for the command, e.g. a command given
+        explicitly by the user. Cached informations are dropped.
+        """
+
+        with self._lock:
+            self._tools[name] = ToolInfo(name, path)
+
+    # -------------------------------------------------------------------------
+    def info(self, name):
+        """
+        Gives back the cached informations about the given command,
+        None, if it wasn't searched before.
+
+        @rtype: ToolInfo or None
+        """
+
+        return self._tools.get(name)
+
+    # -------------------------------------------------------------------------
+    def _run(self, path, args):
+
+        from pb_blockdev.process import call_with_timeout
+
+        try:
+            (ret, out, err) = call_with_timeout([path] + list(args), timeout=PROBE_TIMEOUT)
+        except Exception as e:
+            LOG.debug(_("Could not execute %(cmd)r: %(e)s") % {'cmd': path, 'e': e})
+            return None
+        return (out or '') + (err or '')
+
+    # -------------------------------------------------------------------------
+    def version(self, name, args=None):
+        """
+        Gives back the version output of the given command, it's executed
+        only on the first call.
+
+        @param name: the name of the command, must be found before by find()
+        @type name: str
+        @param args: the arguments to get the version, default '--version'
+        @type args: list of str or None
+
+        @return: the first line of the output containing a version number
+        @rtype: str or None
+        """
+
+        with self._lock:
+            info = self._tools.get(name)
+            if info is None or not info.path:
+                return None
+            if info.version is None:
+                output = self._run(info.path, args or ['--version'])
+                info.version = ''
+                for line in (output or '').splitlines():
+                    if RE_VERSION.search(line):
+                        info.version = line.strip()
+                        break
+            return info.version or None
+
+    # -------------------------------------------------------------------------
+    def help_text(self, name):
+        """
+        Gives back the output of '<command> --help', it's executed
+        only on the first call.
+
+        @rtype: str or None
+        """
+
+        with self._lock:
+            info = self._tools.get(name)
+            if info is None or not info.path:
+                return None
+            if info.help_text is None:
+                info.help_text = self._run(info.path, ['--help']) or ''
+            return info.help_text
+
+    # -------------------------------------------------------------------------
+    def has_capability(self, name, capability):
+        """
+        Evaluates, whether the given command has the given capability,
+        it's evaluated only on the first call.
+
+        @raise KeyError: if there is no probe for this capability
+
+        @rtype: bool
+        """
+
+        probe = self.capability_probes[(name, capability)]
+        with self._lock:
+            info = self._tools.get(name)
+            if info is None or not info.path:
+                return False
+            if capability not in info.capabilities:
+                info.capabilities[capability] = bool(probe(self))
+            return info.capabilities[capability]
+
+    # -------------------------------------------------------------------------
+    def clear(self, name=None):
+        """
+        Drops the cached informations about the given command or about
+        all commands.
+        """
+
+        with self._lock:
+            if name is None:
+                self._tools = {}
+            elif name in self._tools:
+                del self._tools[name]
+
+    # -------------------------------------------------------------------------
+    def as_dict(self, short=False):
+        """
+        Transforms the elements of the object into a dict
+
+        @param short: don't include local properties in resulting dict.
+        @type short: bool
+
+        @return: structure as dict
+        @rtype:  dict
+        """
+
+        tools = {}
+        for name in self._tools:
+            tools[name] = self._tools[name].as_dict(short=short)
+        return {
+            '__class_name__': self.__class__.__name__,
+            'tools': tools,
+        }
+
+
+TOOLS = ToolRegistry()
+"""
+The process wide registry of external commands.
+"""
+
+
+# =============================================================================
+def find_tool(name, default_path=None, add_paths=None, alt_names=None):
+    """
+    Gives back the absolute path of the given command from the process
+    wide registry, see ToolRegistry.find().
+    """
+
+    return TOOLS.find(
+        name, default_path=default_path, add_paths=add_paths, alt_names=alt_names)
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -25,29 +25,58 @@ locale_dir = os.path.join(basedir, 'po')
 if not os.path.isdir(locale_dir):
     locale_dir = None
 
-mo_file = gettext.find('py_pb_blockdev', locale_dir)
+_translator = None
 
-translator = gettext.translation('py_pb_blockdev', locale_dir, fallback=True)
-"""
-The main gettext-translator object, which can be imported
-from other modules.
-"""
+
+# =============================================================================
+def get_translator():
+    """
+    Gives back the main gettext-translator object. It's created
+    on the first call, so importing this module doesn't cost
+    the search and the loading of the message catalog.
+    """
+
+    global _translator
+    if _translator is None:
+        _translator = gettext.translation(
+            'py_pb_blockdev', locale_dir, fallback=True)
+    return _translator
+
+
+# =============================================================================
+def __getattr__(name):
+    """
+    Lazy creation of the module attributes 'translator' and 'mo_file'
+    (PEP 562, Python >= 3.7).
+    """
+
+    if name == 'translator':
+        return get_translator()
+    if name == 'mo_file':
+        return gettext.find('py_pb_blockdev', locale_dir)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+# Python < 3.7 doesn't support module level __getattr__
+if sys.version_info < (3, 7):
+    mo_file = gettext.find('py_pb_blockdev', locale_dir)
+    translator = get_translator()
 
 
 # =============================================================================
 def pb_gettext(message):
     if sys.version_info[0] > 2:
-        return to_str_or_bust(translator.gettext(message))
+        return to_str_or_bust(get_translator().gettext(message))
     else:
-        return to_str_or_bust(translator.lgettext(message))
+        return to_str_or_bust(get_translator().lgettext(message))
 
 
 # =============================================================================
 def pb_ngettext(singular, plural, n):
     if sys.version_info[0] > 2:
-        return to_str_or_bust(translator.ngettext(singular, plural, n))
+        return to_str_or_bust(get_translator().ngettext(singular, plural, n))
     else:
-        return to_str_or_bust(translator.lngettext(singular, plural, n))
+        return to_str_or_bust(get_translator().lngettext(singular, plural, n))
 
 
 # =============================================================================
@@ -59,7 +88,7 @@ __ = pb_ngettext
 if __name__ == "__main__":
 
     print(_("Basedir: %r") % (basedir))
-    print(_("Found .mo-file: %r") % (mo_file))
+    print(_("Found .mo-file: %r") % (gettext.find('py_pb_blockdev', locale_dir)))
 
 # =============================================================================
 
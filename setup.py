@@ -5,6 +5,7 @@ import os
 import sys
 import re
 from distutils.core import setup
+from distutils.command.build_py import build_py
 import datetime
 
 # own modules:
@@ -116,6 +117,23 @@ def write_local_version():
 write_local_version()
 
 
+# -----------------------------------
+# Modules, which can only be compiled by Python >= 3.5
+PY35_MODULES = (
+    ('pb_blockdev', 'aio'),
+)
+
+
+class BuildPyVersioned(build_py):
+    """Leaves out the modules not compilable by the current Python."""
+
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info[:2] >= (3, 5):
+            return modules
+        return [x for x in modules if (x[0], x[1]) not in PY35_MODULES]
+
+
 # -----------------------------------
 setup(
     name='pb-blockdev',
@@ -135,6 +153,7 @@ setup(
         'pb_blockdev.multipath',
     ],
     scripts=[],
+    cmdclass={'build_py': BuildPyVersioned},
     classifiers=[
         'Development Status :: 2 - Pre-Alpha',
         'Environment :: Console',
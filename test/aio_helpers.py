@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@organization: Profitbricks GmbH
+@copyright: © 2010 - 2015 by Profitbricks GmbH
+@license: GPL3
+@summary: coroutines used by the unit tests of pb_blockdev.aio
+
+This module uses the async/await syntax of Python 3.5, so it must only
+be imported there, to keep the test modules importing it compilable
+with Python 2.
+"""
+
+import asyncio
+
+
+# =============================================================================
+async def run_many(runner, tool, cmd, count):
+    """
+    Executes the given command count times concurrently by the given
+    AsyncToolRunner and gives back the results in order.
+    """
+
+    return await asyncio.gather(
+        *[runner.run(tool, cmd) for i in range(count)])
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
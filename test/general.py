@@ -31,6 +31,22 @@ from pb_base.common import to_utf8_or_bust
 
 log = logging.getLogger(__name__)
 
+# Wall clock limits of benchmark tests are only enforced, if this
+# environment variable is set to a true value, because they are
+# not reliable on loaded machines.
+TIMING_TESTS_ENV = 'PB_BLOCKDEV_TIMING_TESTS'
+
+
+# =============================================================================
+def timing_tests_enabled():
+    """
+    Checks, whether the wall clock limits of benchmark tests
+    should be enforced.
+    """
+
+    value = os.environ.get(TIMING_TESTS_ENV, '').strip().lower()
+    return value not in ('', '0', 'no', 'false', 'off')
+
 
 # =============================================================================
 def get_arg_verbose():
@@ -338,6 +338,185 @@ class TestBlockDevice(BlockdevTestcase):
                 log.debug("Removing temporary file %r.", filename)
                 os.remove(filename)
 
+    # -------------------------------------------------------------------------
+    def test_read_attrs(self):
+
+        log.info("Testing reading of many sysfs attributes at once.")
+
+        from pb_blockdev.sysfs import SysfsAttrReader, read_attrs
+
+        tmp_dir = tempfile.mkdtemp(prefix='test-blockdev-')
+        try:
+            os.makedirs(os.path.join(tmp_dir, 'device'))
+            for (name, content) in (
+                    ('size', '2097152\n'), ('ro', '0\n'), ('device/vendor', 'ATA     \n'),
+                    ('device/rev', '\n')):
+                with open(os.path.join(tmp_dir, name), 'w') as fh:
+                    fh.write(content)
+
+            attrs = read_attrs(tmp_dir, ['size', 'ro', 'device/vendor', 'device/rev', 'removable'])
+            self.assertEqual(attrs, {
+                'size': '2097152', 'ro': '0', 'device/vendor': 'ATA',
+                'device/rev': '', 'removable': None})
+
+            with SysfsAttrReader(tmp_dir) as reader:
+                self.assertEqual(reader.read('size'), '2097152')
+                self.assertIsNone(reader.read('size/foo'))
+
+            attrs = read_attrs(os.path.join(tmp_dir, 'missing'), ['size'])
+            self.assertEqual(attrs, {'size': None})
+
+        finally:
+            shutil.rmtree(tmp_dir)
+
+        devname = self.get_random_blockdev_name()
+        blockdev = BlockDevice(
+            name=devname,
+            appname=self.appname,
+            verbose=self.verbose,
+        )
+        blockdev.retr_basic_attrs()
+        self.assertIsNotNone(blockdev.sectors)
+        self.assertIsNotNone(blockdev.major_number)
+        self.assertIn(blockdev.readonly, (True, False))
+
+    # -------------------------------------------------------------------------
+    def test_attr_cache(self):
+
+        log.info("Testing the attribute cache with TTLs.")
+
+        from pb_blockdev.attr_cache import ATTR_STATIC, ATTR_SLOW, ATTR_VOLATILE
+
+        devname = self.get_random_blockdev_name()
+        blockdev = BlockDevice(
+            name=devname,
+            appname=self.appname,
+            verbose=self.verbose,
+        )
+        sectors = blockdev.sectors
+        major = blockdev.major_number
+        self.assertIsNotNone(sectors)
+
+        # a slow changing attribute is taken from cache inside its TTL
+        blockdev._sectors = sectors + 1
+        blockdev.cache_loaded('sectors')
+        self.assertEqual(blockdev.sectors, sectors + 1)
+
+        # ... and reread after expiring
+        blockdev.cache_ttls = {ATTR_STATIC: None, ATTR_SLOW: 0.0, ATTR_VOLATILE: 0.0}
+        self.assertEqual(blockdev.sectors, sectors)
+
+        blockdev.cache_ttls = {ATTR_STATIC: None, ATTR_SLOW: 60.0, ATTR_VOLATILE: 0.0}
+        blockdev._sectors = sectors + 1
+        blockdev.invalidate()
+        self.assertIsNone(blockdev._sectors)
+        self.assertEqual(blockdev._major_number, major)
+
+        blockdev._sectors = sectors + 1
+        values = blockdev.refresh('sectors', 'major_number')
+        self.assertEqual(values, {'sectors': sectors, 'major_number': major})
+
+        with self.assertRaises(AttributeError):
+            blockdev.invalidate('name')
+
+    # -------------------------------------------------------------------------
+    def test_tool_registry(self):
+
+        log.info("Testing the process wide registry of external commands.")
+
+        from pb_blockdev.tools import ToolRegistry, version_tuple
+
+        self.assertEqual(version_tuple('  LVM version:     2.02.166(2) (2016-09-26)'), (2, 2, 166))
+        self.assertIsNone(version_tuple('no version'))
+
+        tmp_dir = tempfile.mkdtemp(prefix='test-blockdev-')
+        try:
+            losetup = os.path.join(tmp_dir, 'losetup')
+            with open(losetup, 'w') as fh:
+                fh.write("#!/bin/sh\n")
+                fh.write("echo 'losetup from util-linux 2.29.2'\n")
+                fh.write("echo ' -f, --find   find first unused device'\n")
+            os.chmod(losetup, 0o755)
+
+            registry = ToolRegistry()
+            self.assertEqual(registry.find('losetup', losetup), losetup)
+            self.assertIsNone(registry.find('not-existing-command-xyz'))
+
+            # the results are cached
+            os.remove(losetup)
+            self.assertEqual(registry.find('losetup', losetup), losetup)
+
+            with open(losetup, 'w') as fh:
+                fh.write("#!/bin/sh\n")
+                fh.write("echo 'losetup from util-linux 2.29.2'\n")
+                fh.write("echo ' -f, --find   find first unused device'\n")
+            os.chmod(losetup, 0o755)
+            self.assertTrue(registry.has_capability('losetup', 'find'))
+            self.assertFalse(registry.has_capability('losetup', 'json'))
+            self.assertEqual(registry.version('losetup'), 'losetup from util-linux 2.29.2')
+
+            registry.clear('losetup')
+            self.assertIsNone(registry.info('losetup'))
+
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def test_device_info(self):
+
+        log.info("Testing the lightweight block device records.")
+
+        from pb_blockdev.info import get_device_info, get_all_device_infos
+        from pb_blockdev.info import BlockDeviceInfo, DmDeviceInfo, LoopDeviceInfo
+
+        tmp_dir = tempfile.mkdtemp(prefix='test-blockdev-')
+        try:
+            files = {
+                'dm-3/dev': '253:3', 'dm-3/size': '2048', 'dm-3/ro': '0',
+                'dm-3/removable': '0', 'dm-3/dm/name': 'vg-lv',
+                'dm-3/dm/uuid': 'LVM-abc', 'dm-3/dm/suspended': '1',
+                'loop1/dev': '7:1', 'loop1/size': '0', 'loop1/ro': '1',
+                'loop1/removable': '0',
+                'ram0/dev': '1:0', 'ram0/size': '8192', 'ram0/ro': '0',
+                'ram0/removable': '0',
+            }
+            for name in files:
+                path = os.path.join(tmp_dir, name)
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                with open(path, 'w') as fh:
+                    fh.write(files[name] + "\n")
+            os.makedirs(os.path.join(tmp_dir, 'dm-3', 'holders', 'dm-4'))
+
+            dm_info = get_device_info('dm-3', tmp_dir)
+            self.assertIsInstance(dm_info, DmDeviceInfo)
+            self.assertEqual(dm_info.dm_name, 'vg-lv')
+            self.assertEqual(dm_info.major_minor_number, '253:3')
+            self.assertEqual(dm_info.size, 2048 * 512)
+            self.assertTrue(dm_info.suspended)
+            self.assertEqual(dm_info.holders, ('dm-4', ))
+            self.assertFalse(dm_info.is_multipath)
+            self.assertEqual(dm_info.get_handler_class().__name__, 'DeviceMapperDevice')
+
+            loop_info = get_device_info('loop1', tmp_dir)
+            self.assertIsInstance(loop_info, LoopDeviceInfo)
+            self.assertFalse(loop_info.attached)
+            self.assertTrue(loop_info.readonly)
+
+            infos = get_all_device_infos(tmp_dir)
+            self.assertEqual([x.name for x in infos], ['dm-3', 'loop1', 'ram0'])
+            self.assertIs(infos[2].__class__, BlockDeviceInfo)
+            self.assertEqual(infos[2].as_dict()['sectors'], 8192)
+
+            # read-only records without __dict__
+            with self.assertRaises(AttributeError):
+                infos[2].sectors = 1
+            with self.assertRaises(AttributeError):
+                infos[2].foo = 1
+
+        finally:
+            shutil.rmtree(tmp_dir)
+
 # =============================================================================
 
 if __name__ == '__main__':
@@ -356,6 +535,10 @@ if __name__ == '__main__':
     suite.addTest(TestBlockDevice('test_object', verbose))
     suite.addTest(TestBlockDevice('test_existing', verbose))
     suite.addTest(TestBlockDevice('test_statistics', verbose))
+    suite.addTest(TestBlockDevice('test_read_attrs', verbose))
+    suite.addTest(TestBlockDevice('test_attr_cache', verbose))
+    suite.addTest(TestBlockDevice('test_tool_registry', verbose))
+    suite.addTest(TestBlockDevice('test_device_info', verbose))
     suite.addTest(TestBlockDevice('test_mknod', verbose))
     suite.addTest(TestBlockDevice('test_fuser', verbose))
 
@@ -117,6 +117,299 @@ class TestDmDevice(BlockdevTestcase):
         self.assertIsInstance(dm_dev, DeviceMapperDevice)
         self.assertEqual(dm_dev.exists, True)
 
+    # -------------------------------------------------------------------------
+    def test_snapshot(self):
+
+        log.info("Testing evaluation of a devicemapper snapshot.")
+
+        from pb_blockdev.dm import DmSnapshot
+
+        info_output = (
+            "vg0-root:dm-0:LVM-Xr3kWsdQq1JjxbUcOOXKx9eVDNBB6HcL:L--w:1:1\n"
+            "vg0-swap:dm-1:LVM-Xr3kWsdQq1JjxbUcOOXKx9eVDNBB6Hc2:L-sw:0:2\n"
+            "odd:name:dm-2::L--r:0:0\n")
+        table_output = (
+            "vg0-root: 0 41943040 linear 8:2 2048\n"
+            "vg0-swap: 0 2097152 linear 8:2 41945088\n"
+            "vg0-swap: 2097152 2097152 linear 8:3 2048\n"
+            "odd:name: \n")
+
+        snapshot = DmSnapshot.from_output(info_output, table_output)
+        self.assertEqual(len(snapshot), 3)
+
+        info = snapshot.by_blockdev['dm-1']
+        self.assertEqual(info.name, 'vg0-swap')
+        self.assertEqual(info.open_count, 0)
+        self.assertEqual(info.segments, 2)
+        self.assertTrue(info.suspended)
+        self.assertEqual(len(info.table_lines), 2)
+        self.assertEqual(info.table_lines[1], '2097152 2097152 linear 8:3 2048')
+
+        info = snapshot.get('LVM-Xr3kWsdQq1JjxbUcOOXKx9eVDNBB6HcL')
+        self.assertEqual(info.blockdev, 'dm-0')
+        self.assertFalse(info.suspended)
+        self.assertEqual(info.table, '0 41943040 linear 8:2 2048')
+
+        info = snapshot.get('odd:name')
+        self.assertEqual(info.blockdev, 'dm-2')
+        self.assertIsNone(info.uuid)
+        self.assertTrue(info.read_only)
+        self.assertEqual(info.table, '')
+        self.assertIsNone(snapshot.get('dm-3'))
+
+    # -------------------------------------------------------------------------
+    def test_ioctl_structs(self):
+
+        log.info("Testing the structures of the device mapper ioctl backend.")
+
+        import struct
+        from pb_blockdev import dm_ioctl
+        from pb_blockdev.dm_ioctl import DmIoctlBackend
+
+        self.assertEqual(dm_ioctl.DM_IOCTL_SIZE, 312)
+        self.assertEqual(dm_ioctl.DM_TARGET_SPEC_SIZE, 40)
+        self.assertEqual(dm_ioctl.dm_ioctl_request(dm_ioctl.DM_VERSION_CMD), 0xc138fd00)
+        self.assertEqual(
+            dm_ioctl.dm_ioctl_request(dm_ioctl.DM_DEV_SUSPEND_CMD), 0xc138fd06)
+
+        targets = [
+            (0, 2048, 'linear', '8:16 2048'),
+            (2048, 4096, 'striped', '2 128 8:32 0 8:48 0'),
+        ]
+        data = dm_ioctl.pack_targets(targets)
+        self.assertEqual(len(data) % 8, 0)
+
+        buf = DmIoctlBackend.build_buffer(
+            1024, name='vg0-data', flags=dm_ioctl.DM_SUSPEND_FLAG,
+            data=data, target_count=len(targets))
+        self.assertEqual(len(buf), 1024)
+        header = DmIoctlBackend.parse_header(buf)
+        self.assertEqual(header['version'], dm_ioctl.DM_VERSION)
+        self.assertEqual(header['data_start'], 312)
+        self.assertEqual(header['target_count'], 2)
+        self.assertEqual(header['name'], 'vg0-data')
+
+        # The kernel gives back the offsets relative to the first spec
+        first = struct.unpack_from(dm_ioctl.DM_TARGET_SPEC_FORMAT, data, 0)
+        status_data = bytearray(data)
+        struct.pack_into(
+            dm_ioctl.DM_TARGET_SPEC_FORMAT, status_data, first[3],
+            2048, 4096, 0, len(data), b'striped')
+        self.assertEqual(
+            dm_ioctl.unpack_targets(status_data, 2), targets)
+
+        self.assertEqual(
+            dm_ioctl.parse_table_line('0 2048 linear 8:16 2048'),
+            (0, 2048, 'linear', '8:16 2048'))
+        self.assertEqual(
+            dm_ioctl.parse_table_line('0 2048 error'), (0, 2048, 'error', ''))
+
+    # -------------------------------------------------------------------------
+    def test_table(self):
+
+        log.info("Testing parsing and formatting of device mapper tables.")
+
+        from pb_blockdev.dm_table import DmTable
+        from pb_blockdev.dm_table import DmLinearSegment, DmStripedSegment
+        from pb_blockdev.dm_table import DmMultipathSegment, DmGenericSegment
+
+        text = (
+            "0 2048 linear 8:16 2048\n"
+            "2048 4096 striped 2 128 8:32 0 8:48 384\n"
+            "6144 1024 zero\n"
+            "7168 1024 crypt aes-xts-plain64 - 0 8:64 4096")
+        table = DmTable.parse(text)
+        self.assertEqual(len(table), 4)
+        self.assertEqual(table.size, 8192)
+        self.assertEqual(str(table), text)
+        self.assertIsInstance(table[0], DmLinearSegment)
+        self.assertEqual(table[0].device, '8:16')
+        self.assertIsInstance(table[1], DmStripedSegment)
+        self.assertEqual(table[1].stripes, [('8:32', 0), ('8:48', 384)])
+        self.assertIsInstance(table[3], DmGenericSegment)
+        self.assertEqual(table[3].target_type, 'crypt')
+        self.assertEqual(table.devices(), ['8:16', '8:32', '8:48'])
+        self.assertEqual(table.targets()[2], (6144, 1024, 'zero', ''))
+        with self.assertRaises(AttributeError):
+            table[0].foo = 'bar'
+
+        text = (
+            "0 2097152 multipath 1 queue_if_no_path 1 alua 2 1 "
+            "service-time 0 2 2 8:16 1 1 8:32 1 1 "
+            "service-time 0 1 2 8:48 1 1")
+        table = DmTable.parse(text)
+        segment = table[0]
+        self.assertIsInstance(segment, DmMultipathSegment)
+        self.assertEqual(segment.features, ['queue_if_no_path'])
+        self.assertEqual(segment.hw_handler, ['alua'])
+        self.assertEqual(len(segment.groups), 2)
+        self.assertEqual(segment.groups[0][2][1], ('8:32', ['1', '1']))
+        self.assertEqual(segment.devices(), ['8:16', '8:32', '8:48'])
+        self.assertEqual(str(table), text)
+
+        text = (
+            "0 409600 thin-pool 253:1 253:2 128 0 1 skip_block_zeroing\n")
+        self.assertEqual(str(DmTable.parse(text)), text.strip())
+        self.assertEqual(
+            str(DmTable.parse("0 2048 thin 253:3 1")), "0 2048 thin 253:3 1")
+        self.assertEqual(
+            str(DmTable.parse("0 2048 snapshot 253:4 253:5 P 8")),
+            "0 2048 snapshot 253:4 253:5 P 8")
+
+        with self.assertRaises(ValueError):
+            DmTable.parse("0 2048 linear 8:16")
+        with self.assertRaises(ValueError):
+            DmTable.parse("0 2048 striped 2 128 8:32 0")
+
+    # -------------------------------------------------------------------------
+    def test_transaction(self):
+
+        log.info("Testing a devicemapper transaction.")
+
+        import shutil
+        import tempfile
+        from pb_blockdev.dm_transaction import DmTransaction
+        from pb_blockdev.dm_transaction import DmTransactionError
+
+        calls = []
+
+        class FakeDmDevice(object):
+
+            def __init__(self, name, holders, fail=None):
+                self.name = name
+                self.dm_name = 'dm_' + name
+                self.holders = holders
+                self.fail = fail
+
+            def _get_table(self, force=False):
+                return '0 2048 linear 8:16 0'
+
+            def _do(self, action, *args):
+                calls.append((action, self.name))
+                if action == self.fail:
+                    raise RuntimeError('%s of %s failed' % (action, self.name))
+
+            def reload(self, table):
+                self._do('reload', table)
+
+            def clear(self):
+                self._do('clear')
+
+            def suspend(self):
+                self._do('suspend')
+
+            def resume(self):
+                self._do('resume')
+
+        # dm-0 (multipath) is held by dm-1 (linear), which is held by md0,
+        # which is held by dm-2
+        sysfs_dir = tempfile.mkdtemp(prefix='test-dm-')
+        try:
+            os.makedirs(os.path.join(sysfs_dir, 'md0', 'holders', 'dm-2'))
+
+            trans = DmTransaction(sysfs_block_dir=sysfs_dir)
+            trans.add(FakeDmDevice('dm-0', ('dm-1', )), '0 2048 multipath 0 0 0 0')
+            trans.add(FakeDmDevice('dm-2', ()))
+            trans.add(FakeDmDevice('dm-1', ('md0', )), '0 2048 linear 253:0 0')
+            self.assertEqual(trans.suspend_order(), ['dm-2', 'dm-1', 'dm-0'])
+
+            freeze_times = trans.commit()
+            self.assertEqual(list(freeze_times.keys()), ['dm_dm-0', 'dm_dm-1', 'dm_dm-2'])
+            self.assertEqual(calls, [
+                ('reload', 'dm-1'), ('reload', 'dm-0'),
+                ('suspend', 'dm-2'), ('suspend', 'dm-1'), ('suspend', 'dm-0'),
+                ('resume', 'dm-0'), ('resume', 'dm-1'), ('resume', 'dm-2')])
+
+            # Failing resume of dm-1: the new table of dm-0 is replaced
+            # by the old one, dm-1 gets its inactive table dropped
+            del calls[:]
+            trans = DmTransaction(sysfs_block_dir=sysfs_dir)
+            trans.add(FakeDmDevice('dm-0', ('dm-1', )), '0 2048 multipath 0 0 0 0')
+            trans.add(FakeDmDevice('dm-1', ('md0', ), fail='resume'), '0 2048 zero')
+            trans.add(FakeDmDevice('dm-2', ()))
+            with self.assertRaises(DmTransactionError) as cm:
+                trans.commit()
+            e = cm.exception
+            self.assertEqual((e.step, e.dm_name), ('resume', 'dm_dm-1'))
+            self.assertEqual(len(e.rollback_errors), 1)
+            self.assertEqual(calls[5:], [
+                ('resume', 'dm-0'), ('resume', 'dm-1'),
+                ('clear', 'dm-1'),
+                ('reload', 'dm-0'), ('suspend', 'dm-0'), ('resume', 'dm-0'),
+                ('resume', 'dm-1'), ('resume', 'dm-2')])
+            self.assertEqual(list(trans.freeze_times.keys()), ['dm_dm-0', 'dm_dm-2'])
+
+        finally:
+            shutil.rmtree(sysfs_dir)
+
+    # -------------------------------------------------------------------------
+    def test_snapshot_table_reload(self):
+
+        log.info("Testing the table of a devicemapper snapshot after a reload.")
+
+        from pb_blockdev.dm import DmSnapshot
+        from pb_blockdev.tools import TOOLS
+
+        class FakeDmBackend(object):
+
+            def __init__(self, table):
+                self.live = table
+                self.inactive = None
+
+            def get_table(self, dm_name):
+                return self.live
+
+            def load_table(self, dm_name, table):
+                self.inactive = str(table)
+
+            def clear_table(self, dm_name):
+                self.inactive = None
+
+            def suspend(self, dm_name):
+                pass
+
+            def resume(self, dm_name):
+                if self.inactive is not None:
+                    self.live = self.inactive
+                    self.inactive = None
+
+        class ExistingDmDevice(DeviceMapperDevice):
+
+            @property
+            def exists(self):
+                return True
+
+        old_table = '0 2048 linear 8:2 2048'
+        new_table = '0 2048 linear 8:3 0'
+
+        snapshot = DmSnapshot.from_output(
+            "vg0-data:dm-3:LVM-data:L--w:1:1\n", "vg0-data: %s\n" % (old_table))
+        backend = FakeDmBackend(old_table)
+
+        TOOLS.register('dmsetup', sys.executable)
+        try:
+            dev = ExistingDmDevice(
+                name='dm-3', appname=self.appname, verbose=self.verbose,
+                dm_snapshot=snapshot, dm_backend=backend)
+        finally:
+            TOOLS.clear('dmsetup')
+
+        self.assertEqual(dev.table, old_table)
+
+        dev.reload(new_table)
+        dev.suspend()
+        dev.resume()
+        self.assertEqual(dev.table, new_table)
+        self.assertEqual(dev.dm_table.segments[0].device, '8:3')
+        self.assertIsNone(snapshot.by_blockdev['dm-3'].table)
+
+        # A cleared inactive table doesn't change the live table
+        backend.live = old_table
+        dev.reload(new_table)
+        dev.clear()
+        dev.resume()
+        self.assertEqual(dev.table, old_table)
+
 # =============================================================================
 
 if __name__ == '__main__':
@@ -133,6 +426,11 @@ if __name__ == '__main__':
     suite.addTest(TestDmDevice('test_object', verbose))
     suite.addTest(TestDmDevice('test_empty_object', verbose))
     suite.addTest(TestDmDevice('test_existing', verbose))
+    suite.addTest(TestDmDevice('test_snapshot', verbose))
+    suite.addTest(TestDmDevice('test_ioctl_structs', verbose))
+    suite.addTest(TestDmDevice('test_table', verbose))
+    suite.addTest(TestDmDevice('test_transaction', verbose))
+    suite.addTest(TestDmDevice('test_snapshot_table_reload', verbose))
 
     runner = unittest.TextTestRunner(verbosity=verbose)
 
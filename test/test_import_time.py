@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@organization: Profitbricks GmbH
+@copyright: © 2010 - 2015 by Profitbricks GmbH
+@license: GPL3
+@summary: test script (and module) for a regression benchmark
+          of the import time of the pb_blockdev modules
+'''
+
+import os
+import sys
+import json
+import logging
+import subprocess
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+sys.path.insert(0, libdir)
+
+from general import BlockdevTestcase, get_arg_verbose, init_root_logger
+from general import timing_tests_enabled, TIMING_TESTS_ENV
+
+log = logging.getLogger('test_import_time')
+
+# Maximum import time of a module in seconds, may be overridden
+# by the environment variable PB_BLOCKDEV_MAX_IMPORT_TIME, it's only
+# enforced, if the timing tests are enabled (see general.TIMING_TESTS_ENV)
+MAX_IMPORT_TIME = float(os.environ.get('PB_BLOCKDEV_MAX_IMPORT_TIME', '0.5'))
+
+# Number of imports in fresh interpreters for every module, the best
+# time is taken
+IMPORT_ROUNDS = 3
+
+# The modules, which may not be loaded only by importing pb_blockdev.devices
+LAZY_MODULES = (
+    'parted',
+    'pb_blockdev.disk',
+    'pb_blockdev.dm',
+    'pb_blockdev.loop',
+    'pb_blockdev.scsi',
+    'pb_blockdev.md',
+    'pb_blockdev.md.device',
+    'pb_blockdev.multipath',
+    'pb_blockdev.multipath.device',
+)
+
+IMPORT_SCRIPT = '''
+import sys, time, json
+sys.path.insert(0, %(libdir)r)
+start = time.time()
+import %(module)s
+duration = time.time() - start
+print(json.dumps({
+    'duration': duration,
+    'modules': sorted([x for x in sys.modules if sys.modules[x] is not None]),
+}))
+'''
+
+
+# =============================================================================
+class TestImportTime(BlockdevTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    def import_in_subprocess(self, module):
+        """
+        Imports the given module in a fresh interpreter and gives back
+        the import duration and the loaded modules.
+        """
+
+        script = IMPORT_SCRIPT % {'libdir': libdir, 'module': module}
+        best = None
+        for i in range(IMPORT_ROUNDS):
+            output = subprocess.check_output([sys.executable, '-c', script])
+            result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+            if best is None or result['duration'] < best['duration']:
+                best = result
+        log.debug("Import of %s took %0.4f seconds.", module, best['duration'])
+        return best
+
+    # -------------------------------------------------------------------------
+    @unittest.skipIf(
+        sys.version_info[:2] < (3, 7),
+        "Modules are imported lazily only since Python 3.7.")
+    def test_lazy_modules(self):
+
+        log.info("Testing, that importing pb_blockdev.devices doesn't load all modules ...")
+
+        result = self.import_in_subprocess('pb_blockdev.devices')
+        loaded = [x for x in LAZY_MODULES if x in result['modules']]
+        self.assertEqual(loaded, [])
+
+        result = self.import_in_subprocess('pb_blockdev.disk')
+        self.assertNotIn('parted', result['modules'])
+
+    # -------------------------------------------------------------------------
+    def test_import_time(self):
+
+        log.info("Testing the import time of the pb_blockdev modules ...")
+
+        check_time = timing_tests_enabled()
+        if not check_time:
+            log.info(
+                "Import times are not checked, set %s=1 to enable.",
+                TIMING_TESTS_ENV)
+
+        for module in ('pb_blockdev.translate', 'pb_blockdev.base', 'pb_blockdev.devices'):
+            result = self.import_in_subprocess(module)
+            if check_time:
+                self.assertLess(
+                    result['duration'], MAX_IMPORT_TIME,
+                    "Import of %s took %0.4f seconds." % (module, result['duration']))
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    log.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestImportTime('test_lazy_modules', verbose))
+    suite.addTest(TestImportTime('test_import_time', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
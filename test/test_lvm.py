@@ -11,10 +11,13 @@
 
 import os
 import sys
+import stat
 import logging
 import uuid
 import glob
 import random
+import tempfile
+import shutil
 
 try:
     import unittest2 as unittest
@@ -38,6 +41,49 @@ log = logging.getLogger('test_lvm')
 LVM_PATH = os.sep + os.path.join('sbin', 'lvm')
 NOT_EXISTS_MSG = "Binary %r does not exists." % (LVM_PATH)
 
+# Recorded output of 'vgs' and 'pvs --segments' with the report
+# fields of LvmSystem, two VGs, one orphaned PV, one LV spanning two PVs,
+# one free segment
+VGS_OUTPUT = """\
+  vg0;wz--n-;vg0-uuid;4194304;1000;400;2;2
+  vg1;wz--n-;vg1-uuid;4194304;500;500;1;0
+"""
+
+PVS_SEGMENTS_OUTPUT = """\
+  /dev/sdb;vg0;a--;sdb-uuid;4194304;500;500;2097152000;2097152000;lv_root;-wi-ao----;root-uuid;1677721600;0;400
+  /dev/sdb;vg0;a--;sdb-uuid;4194304;500;500;2097152000;2097152000;lv_data;-wi-a-----;data-uuid;838860800;400;100
+  /dev/sdc;vg0;a--;sdc-uuid;4194304;500;100;2097152000;2097152000;lv_data;-wi-a-----;data-uuid;838860800;0;100
+  /dev/sdc;vg0;a--;sdc-uuid;4194304;500;100;2097152000;2097152000;;;;;100;400
+  /dev/sdd;vg1;a--;sdd-uuid;4194304;500;0;2097152000;2097152000;;;;;0;500
+  /dev/sde;;---;sde-uuid;;0;0;1073741824;1073741824;;;;;0;0
+"""
+
+# A fake 'lvm shell': 'hang' never answers, 'die' terminates the shell,
+# every other command gets a report with one VG
+FAKE_LVM_SHELL = """#!%(python)s
+import os, sys, time, json
+from collections import OrderedDict
+report_fd = int(os.environ['LVM_REPORT_FD'])
+sys.stdout.write('lvm> ')
+sys.stdout.flush()
+while True:
+    line = sys.stdin.readline()
+    if not line or line.startswith('exit'):
+        sys.exit(0)
+    if line.startswith('hang'):
+        time.sleep(60)
+    if line.startswith('die'):
+        sys.exit(1)
+    # the key order of a plain dict is arbitrary before Python 3.7
+    report = OrderedDict([
+        ('report', [{'vg': [OrderedDict([('vg_name', 'vg0'), ('vg_size', '1g')])]}]),
+        ('log', [OrderedDict([('log_type', 'status'), ('log_ret_code', '1')])]),
+    ])
+    os.write(report_fd, json.dumps(report).encode('utf-8'))
+    sys.stdout.write('lvm> ')
+    sys.stdout.flush()
+""" % {'python': sys.executable}
+
 
 # =============================================================================
 class LvmTestcase(BlockdevTestcase):
@@ -81,6 +127,123 @@ class LvmTestcase(BlockdevTestcase):
         log.debug("Importing pb_blockdev.lvm.lv ...")
         import pb_blockdev.lvm.lv                       # noqa
 
+        log.debug("Importing pb_blockdev.lvm.pv ...")
+        import pb_blockdev.lvm.pv                       # noqa
+
+        log.debug("Importing pb_blockdev.lvm.vg ...")
+        import pb_blockdev.lvm.vg                       # noqa
+
+        log.debug("Importing pb_blockdev.lvm.system ...")
+        import pb_blockdev.lvm.system                   # noqa
+
+        log.debug("Importing pb_blockdev.lvm.lock ...")
+        import pb_blockdev.lvm.lock                     # noqa
+
+    # -------------------------------------------------------------------------
+    def test_rw_lock(self):
+
+        log.info("Test the reader/writer lock for LVM commands ...")
+
+        from pb_blockdev.lvm.lock import LvmRwLock, LvmLockStatistics
+        from pb_blockdev.lvm.lock import LvmLockTimeoutError
+        from pb_blockdev.lvm.lock import is_readonly_lvm_command
+
+        self.assertTrue(is_readonly_lvm_command(['lvs', '--noheadings']))
+        self.assertTrue(is_readonly_lvm_command('vgs -o vg_name'))
+        self.assertFalse(is_readonly_lvm_command(['lvcreate', '-L', '1G']))
+
+        tmp_dir = tempfile.mkdtemp(prefix='test-lvm-lock-')
+        lockfile = os.path.join(tmp_dir, 'lvm.lock')
+        stats = LvmLockStatistics()
+
+        try:
+            reader1 = LvmRwLock(lockfile, timeout=0.2, statistics=stats)
+            reader2 = LvmRwLock(lockfile, timeout=0.2, statistics=stats)
+            writer = LvmRwLock(lockfile, timeout=0.2, statistics=stats)
+
+            # Two shared locks at the same time
+            reader1.acquire(shared=True)
+            reader2.acquire(shared=True)
+            self.assertTrue(reader1.locked)
+            self.assertTrue(reader2.shared)
+
+            # No exclusive lock beside shared locks
+            with self.assertRaises(LvmLockTimeoutError):
+                writer.acquire()
+            self.assertFalse(writer.locked)
+
+            reader1.release()
+            reader2.release()
+
+            with writer:
+                self.assertFalse(writer.shared)
+                with self.assertRaises(LvmLockTimeoutError):
+                    reader1.acquire(shared=True)
+            self.assertFalse(writer.locked)
+
+            result = stats.as_dict()
+            if self.verbose > 2:
+                log.debug("Lock statistics:\n%s", pp(result))
+            self.assertEqual(result['shared']['count'], 2)
+            self.assertEqual(result['shared']['timeouts'], 1)
+            self.assertEqual(result['exclusive']['count'], 1)
+            self.assertEqual(result['exclusive']['timeouts'], 1)
+
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def test_handler_lock(self):
+
+        log.info("Test the lock modes of a GenericLvmHandler ...")
+
+        from pb_blockdev.lvm import GenericLvmHandler
+        from pb_blockdev.lvm.lock import LvmRwLock, LvmLockTimeoutError
+
+        tmp_dir = tempfile.mkdtemp(prefix='test-lvm-lock-')
+        lockfile = os.path.join(tmp_dir, 'lvm.lock')
+
+        try:
+            # Any existing file will do, 'lvm' is never executed here
+            hdlr = GenericLvmHandler(
+                lvm_command=sys.executable, lvm_lockfile=lockfile,
+                appname=self.appname, verbose=self.verbose)
+            other = LvmRwLock(hdlr.lvm_lockfile, timeout=0.2)
+
+            # A single read-only command takes a shared lock
+            call_lock = hdlr._acquire_lvm_lock(['vgs'])
+            self.assertTrue(call_lock.shared)
+            other.acquire(shared=True)
+            other.release()
+            hdlr._release_lvm_lock(call_lock)
+            self.assertIsNone(hdlr.global_lock)
+
+            # A kept lock is exclusive, also for read-only commands
+            self.assertIsNone(hdlr._acquire_lvm_lock(['vgs'], release_lock=False))
+            self.assertTrue(hdlr.global_lock.locked)
+            self.assertFalse(hdlr.global_lock.shared)
+            with self.assertRaises(LvmLockTimeoutError):
+                other.acquire(shared=True)
+
+            # The following changing command uses the same lock
+            lock = hdlr.global_lock
+            self.assertIsNone(hdlr._acquire_lvm_lock(['lvcreate', '-L', '1G']))
+            self.assertIs(hdlr.global_lock, lock)
+            hdlr._release_lvm_lock(None)
+            self.assertIsNone(hdlr.global_lock)
+
+            # A failed conversion doesn't pretend to hold the lock
+            reader = LvmRwLock(hdlr.lvm_lockfile, timeout=0.2)
+            reader.acquire(shared=True)
+            other.acquire(shared=True)
+            with self.assertRaises(LvmLockTimeoutError):
+                reader.acquire(shared=False)
+            self.assertFalse(reader.locked)
+            other.release()
+
+        finally:
+            shutil.rmtree(tmp_dir)
+
     # -------------------------------------------------------------------------
     @unittest.skipUnless(os.path.exists(LVM_PATH), NOT_EXISTS_MSG)
     def test_handler_object(self):
@@ -104,6 +267,239 @@ class LvmTestcase(BlockdevTestcase):
         if self.verbose > 2:
             log.debug("GenericLvmHandler object:\n%s", pp(hdlr.as_dict(True)))
 
+    # -------------------------------------------------------------------------
+    @unittest.skipUnless(os.path.exists(LVM_PATH), NOT_EXISTS_MSG)
+    def test_system_object(self):
+
+        log.info("Test init and refresh of a LvmSystem object ...")
+
+        from pb_blockdev.lvm.system import LvmSystem
+
+        try:
+            lvm_system = LvmSystem(
+                appname=self.appname,
+                verbose=self.verbose,
+            )
+        except CommandNotFoundError as e:
+            log.info(str(e))
+            return
+
+        if os.geteuid():
+            log.info("Refreshing LVM system is only possible as root.")
+            return
+
+        lvm_system.refresh()
+
+        for pv in lvm_system.pvs.values():
+            if pv.vgname:
+                self.assertIn(pv.vgname, lvm_system.vgs)
+                self.assertIn(pv, lvm_system.vgs[pv.vgname].pvs)
+
+        for lv in lvm_system.lvs.values():
+            self.assertIn(lv.vgname, lvm_system.vgs)
+            self.assertTrue(lv.devices)
+
+        if self.verbose > 2:
+            log.debug("LvmSystem object:\n%s", pp(lvm_system.as_dict(True)))
+
+    # -------------------------------------------------------------------------
+    def test_system_reports(self):
+
+        log.info("Test evaluating the reports of 'vgs' and 'pvs --segments' ...")
+
+        from pb_blockdev.lvm.system import LvmSystem, LvmSystemError
+        from pb_blockdev.lvm.system import PVSEG_REPORT_FIELDS
+        from pb_blockdev.lvm.vg import VG_REPORT_FIELDS
+
+        # Any existing file will do, 'lvm' is never executed here
+        lvm_system = LvmSystem(
+            lvm_command=sys.executable,
+            appname=self.appname,
+            verbose=self.verbose,
+        )
+
+        params = lvm_system._report_params('pvs', PVSEG_REPORT_FIELDS, ['--segments'])
+        self.assertEqual(params[0], 'pvs')
+        self.assertIn('--segments', params)
+        self.assertEqual(params[-2:], ['-o', ','.join(PVSEG_REPORT_FIELDS)])
+
+        with self.assertRaises(LvmSystemError):
+            lvm_system._parse_report('vgs', VG_REPORT_FIELDS, 5, '', 'error')
+
+        vg_rows = lvm_system._parse_report('vgs', VG_REPORT_FIELDS, 0, VGS_OUTPUT, '')
+        pv_rows = lvm_system._parse_report(
+            'pvs', PVSEG_REPORT_FIELDS, 0, PVS_SEGMENTS_OUTPUT, '')
+        self.assertEqual(len(vg_rows), 2)
+        self.assertEqual(len(pv_rows), 6)
+        self.assertEqual(vg_rows[0]['vg_name'], 'vg0')
+        self.assertEqual(pv_rows[3]['lv_name'], '')
+
+        lvm_system._init_from_reports(vg_rows, pv_rows)
+
+        self.assertEqual(sorted(lvm_system.vgs.keys()), ['vg0', 'vg1'])
+        self.assertEqual(
+            sorted(lvm_system.pvs.keys()),
+            ['/dev/sdb', '/dev/sdc', '/dev/sdd', '/dev/sde'])
+        self.assertEqual(
+            sorted(lvm_system.lvs.keys()), ['vg0/lv_data', 'vg0/lv_root'])
+
+        vg0 = lvm_system.vgs['vg0']
+        vg1 = lvm_system.vgs['vg1']
+        pvs = lvm_system.pvs
+        lvs = lvm_system.lvs
+
+        # VG -> PV and VG -> LV
+        self.assertEqual(vg0.pvs, [pvs['/dev/sdb'], pvs['/dev/sdc']])
+        self.assertEqual(vg1.pvs, [pvs['/dev/sdd']])
+        self.assertEqual(
+            sorted(vg0.lvs, key=lambda x: x.name),
+            [lvs['vg0/lv_data'], lvs['vg0/lv_root']])
+        self.assertEqual(vg1.lvs, [])
+
+        # PV -> VG, the orphaned PV has no VG
+        self.assertEqual(pvs['/dev/sdb'].vgname, 'vg0')
+        self.assertEqual(pvs['/dev/sdd'].vgname, 'vg1')
+        self.assertIsNone(pvs['/dev/sde'].vgname)
+
+        # Segment mapping, free segments are not recorded
+        self.assertEqual(
+            pvs['/dev/sdb'].segments, [('lv_root', 0, 400), ('lv_data', 400, 100)])
+        self.assertEqual(pvs['/dev/sdc'].segments, [('lv_data', 0, 100)])
+        self.assertEqual(pvs['/dev/sdd'].segments, [])
+
+        # LV -> PVs
+        self.assertEqual(lvs['vg0/lv_root'].devices, [('/dev/sdb', 0)])
+        self.assertEqual(
+            lvs['vg0/lv_data'].devices, [('/dev/sdb', 400), ('/dev/sdc', 0)])
+        self.assertEqual(lvs['vg0/lv_data'].vgname, 'vg0')
+
+    # -------------------------------------------------------------------------
+    def test_system_pv_lookup(self):
+
+        log.info("Test searching the PV of a block device in a LvmSystem ...")
+
+        from pb_blockdev.lvm.system import LvmSystem
+
+        # Any existing file will do, 'lvm' is never executed here
+        lvm_system = LvmSystem(
+            lvm_command=sys.executable,
+            appname=self.appname,
+            verbose=self.verbose,
+        )
+
+        pv = object()
+        lvm_system.pv_by_blockdev = {'sdz': pv}
+
+        self.assertIs(lvm_system.get_pv_for_blockdevice('sdz'), pv)
+        self.assertIs(lvm_system.get_pv_for_blockdevice('/dev/sdz'), pv)
+        self.assertIsNone(lvm_system.get_pv_for_blockdevice('sdy'))
+
+        class FakeBlockDevice(object):
+            name = 'sdz'
+
+        self.assertIs(lvm_system.get_pv_for_blockdevice(FakeBlockDevice()), pv)
+
+    # -------------------------------------------------------------------------
+    def test_lvm_shell_report(self):
+
+        log.info("Test parameter splitting and rendering of lvm shell reports ...")
+
+        from collections import OrderedDict
+        from pb_blockdev.lvm.shell import LvmShell
+
+        lvm_shell = LvmShell(lvm_command=sys.executable)
+
+        (params, opts) = lvm_shell._split_params([
+            'vgs', '--noheadings', '--separator', ';', '--unbuffered',
+            '-o', 'vg_name,vg_size'])
+        self.assertEqual(params, ['vgs', '-o', 'vg_name,vg_size'])
+        self.assertEqual(
+            opts, {'separator': ';', 'headings': False, 'fields': ['vg_name', 'vg_size']})
+
+        (params, opts) = lvm_shell._split_params(['lvs', '--aligned'])
+        self.assertEqual(params, ['lvs'])
+        self.assertEqual(opts, {'separator': ' ', 'headings': True, 'fields': None})
+
+        (params, opts) = lvm_shell._split_params(['lvs', '-o', '+devices'])
+        self.assertEqual(params, ['lvs', '-o', '+devices'])
+        self.assertIsNone(opts['fields'])
+
+        report = {'report': [{'vg': [
+            OrderedDict([('vg_name', 'vg0'), ('vg_size', '1g')]),
+            OrderedDict([('vg_name', 'vg1'), ('vg_size', '2g')]),
+        ]}]}
+        self.assertEqual(
+            LvmShell.render_report(report, ';', False),
+            '  vg0;1g\n  vg1;2g\n')
+        self.assertEqual(
+            LvmShell.render_report(report),
+            '  vg_name vg_size\n  vg0 1g\n  vg1 2g\n')
+
+        # The order of the requested fields wins over the order of the JSON keys
+        report = {'report': [{'vg': [{'vg_size': '1g', 'vg_name': 'vg0', 'vg_attr': 'wz--n-'}]}]}
+        self.assertEqual(
+            LvmShell.render_report(report, ';', True, ['vg_name', 'vg_size', 'vg_attr']),
+            '  vg_name;vg_size;vg_attr\n  vg0;1g;wz--n-\n')
+        self.assertEqual(
+            LvmShell.render_report(report, ';', False, ['vg_attr', 'vg_name', 'vg_size']),
+            '  wz--n-;vg0;1g\n')
+        self.assertEqual(LvmShell.render_report(None), '')
+        self.assertEqual(LvmShell.render_report({'report': [{'vg': []}]}), '')
+
+        self.assertEqual(LvmShell.report_ret_code(None), (0, ''))
+        self.assertEqual(LvmShell.report_ret_code({'log': [
+            {'log_type': 'status', 'log_ret_code': '1'}]}), (0, ''))
+        self.assertEqual(LvmShell.report_ret_code({'log': [
+            {'log_type': 'error', 'log_message': 'Volume group "xy" not found'},
+            {'log_type': 'status', 'log_ret_code': '5'}]}),
+            (5, 'Volume group "xy" not found\n'))
+
+    # -------------------------------------------------------------------------
+    def test_lvm_shell_restart(self):
+
+        log.info("Test restarting and disabling of the lvm shell ...")
+
+        from pb_blockdev.lvm import LvmTimeoutError
+        from pb_blockdev.lvm.shell import LvmShell, LvmShellError
+
+        tmp_dir = tempfile.mkdtemp(prefix='test-lvm-shell-')
+        fake_lvm = os.path.join(tmp_dir, 'lvm')
+        with open(fake_lvm, 'w') as fh:
+            fh.write(FAKE_LVM_SHELL)
+        os.chmod(fake_lvm, stat.S_IRWXU)
+
+        lvm_shell = LvmShell(lvm_command=fake_lvm, timeout=1, max_restarts=2)
+        try:
+            (ret_code, std_out, std_err) = lvm_shell.execute(
+                ['vgs', '--noheadings', '--separator', ';', '-o', 'vg_name,vg_size'])
+            self.assertEqual((ret_code, std_out, std_err), (0, '  vg0;1g\n', ''))
+            self.assertTrue(lvm_shell.running)
+            self.assertEqual(lvm_shell.starts, 1)
+
+            with self.assertRaises(LvmTimeoutError):
+                lvm_shell.execute(['hang'])
+            self.assertFalse(lvm_shell.running)
+            self.assertEqual(lvm_shell.failures, 1)
+            self.assertFalse(lvm_shell.disabled)
+
+            # A successful command in a restarted shell resets the failures
+            lvm_shell.execute(['vgs'])
+            self.assertEqual(lvm_shell.starts, 2)
+            self.assertEqual(lvm_shell.failures, 0)
+            self.assertEqual(lvm_shell.commands, 2)
+
+            with self.assertRaises(LvmShellError):
+                lvm_shell.execute(['die'])
+            self.assertEqual(lvm_shell.failures, 1)
+            with self.assertRaises(LvmShellError):
+                lvm_shell.execute(['die'])
+            self.assertEqual(lvm_shell.failures, 2)
+            self.assertTrue(lvm_shell.disabled)
+
+        finally:
+            lvm_shell.close()
+            shutil.rmtree(tmp_dir)
+
 # =============================================================================
 
 
@@ -120,7 +516,14 @@ if __name__ == '__main__':
     suite = unittest.TestSuite()
 
     suite.addTest(LvmTestcase('test_import', verbose))
+    suite.addTest(LvmTestcase('test_rw_lock', verbose))
+    suite.addTest(LvmTestcase('test_handler_lock', verbose))
     suite.addTest(LvmTestcase('test_handler_object', verbose))
+    suite.addTest(LvmTestcase('test_system_object', verbose))
+    suite.addTest(LvmTestcase('test_system_reports', verbose))
+    suite.addTest(LvmTestcase('test_system_pv_lookup', verbose))
+    suite.addTest(LvmTestcase('test_lvm_shell_report', verbose))
+    suite.addTest(LvmTestcase('test_lvm_shell_restart', verbose))
 
     runner = unittest.TextTestRunner(verbosity=verbose)
 
@@ -11,6 +11,10 @@
 
 import os
 import sys
+import time
+import stat
+import shutil
+import tempfile
 import logging
 
 try:
@@ -53,6 +57,431 @@ class MegaraidTestcase(BlockdevTestcase):
         log.debug("Importing MegaraidHandler from  pb_blockdev.megaraid.handler ...")
         from pb_blockdev.megaraid.handler import MegaraidHandler    # noqa
 
+        log.debug("Importing MegaraidCollector from  pb_blockdev.megaraid.collector ...")
+        from pb_blockdev.megaraid.collector import MegaraidCollector    # noqa
+
+        log.debug("Importing StorcliJsonBackend from  pb_blockdev.megaraid.storcli ...")
+        from pb_blockdev.megaraid.storcli import StorcliJsonBackend     # noqa
+
+    # -------------------------------------------------------------------------
+    def test_tokenize(self):
+
+        log.info("Test tokenizing and dispatching of MegaCli output ...")
+
+        from pb_blockdev.megaraid.parser import tokenize, iter_blocks
+        from pb_blockdev.megaraid.pd import MegaraidPd
+
+        output = (
+            "Adapter #0\n"
+            "\n"
+            "Enclosure Device ID: 9\n"
+            "Slot Number: 8\n"
+            "Drive's position: DiskGroup: 4, Span: 0, Arm: 0\n"
+            "Device Id: 14\n"
+            "WWN: 5000C50056337998\n"
+            "Media Error Count: 3\n"
+            "Raw Size: 2.728 TB [0x15d50a3b0 Sectors]\n"
+            "Coerced Size: 2.728 TB [0x15d400000 Sectors]\n"
+            "Firmware state: Online, Spun Up\n"
+            "SAS Address(0): 0x5000c50056337999\n"
+            "Inquiry Data: SEAGATE ST33000650SS    0004Z296Q3B9\n"
+            "\n"
+            "Enclosure Device ID: 9\n"
+            "Slot Number: 9\n"
+            "Hotspare Information:\n"
+            "Firmware state: Hotspare, Spun down\n")
+
+        tokens = list(tokenize(output))
+        self.assertEqual(tokens[0], ('adapter #0', None))
+        self.assertIn(("drive's position", 'DiskGroup: 4, Span: 0, Arm: 0'), tokens)
+        self.assertIn(('sas address', '0x5000c50056337999'), tokens)
+
+        def is_start(token):
+            return token[0] == 'enclosure device id'
+
+        blocks = list(iter_blocks(tokens, is_start))
+        self.assertEqual(len(blocks), 2)
+
+        pd = MegaraidPd(0, 9, 8)
+        pd.init_from_tokens(blocks[0][1])
+        self.assertEqual(pd.device_id, 14)
+        self.assertEqual(pd.disk_group, (4, 0, 0))
+        self.assertEqual(pd.wwn_hex, '5000c50056337998')
+        self.assertEqual(pd.media_errors, 3)
+        self.assertEqual(pd.coerced_sectors, 0x15d400000)
+        self.assertEqual(pd.firmware_state, 'Online, Spun Up')
+        self.assertEqual(pd.sas_addresses, [0x5000c50056337999])
+        self.assertEqual(pd.vendor, 'Seagate')
+        self.assertEqual(pd.serial, '0004Z296Q3B9')
+        self.assertFalse(pd.is_hotspare)
+
+        pd = MegaraidPd(0, 9, 9)
+        pd.init_from_tokens(blocks[1][1])
+        self.assertTrue(pd.is_hotspare)
+
+    # -------------------------------------------------------------------------
+    def test_event_cache(self):
+
+        log.info("Test the MegaCli event cache ...")
+
+        from pb_blockdev.megaraid.event_cache import MegaraidEventCache
+
+        tmp_dir = tempfile.mkdtemp(prefix='test-megaraid-')
+        cache_file = os.path.join(tmp_dir, 'events.json')
+
+        try:
+            cache = MegaraidEventCache(cache_file)
+            self.assertIsNone(cache.get('-PDList -a0', 100))
+            objects = ['pd1', 'pd2']
+            cache.store('-PDList -a0', 100, 'Output', objects)
+            entry = cache.get('-PDList -a0', 100)
+            self.assertIs(entry['objects'], objects)
+            # The event sequence has advanced
+            self.assertIsNone(cache.get('-PDList -a0', 101))
+            self.assertTrue(os.path.exists(cache_file))
+
+            # A new cache object loads only the raw output
+            cache = MegaraidEventCache(cache_file)
+            entry = cache.get('-PDList -a0', 100)
+            self.assertEqual(entry['out'], 'Output')
+            self.assertNotIn('objects', entry)
+
+            cache.clear()
+            cache = MegaraidEventCache(cache_file)
+            self.assertIsNone(cache.get('-PDList -a0', 100))
+
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def test_storcli_json(self):
+
+        log.info("Test evaluating recorded JSON output of StorCLI ...")
+
+        from pb_blockdev.megaraid.storcli import StorcliJsonBackend
+
+        fixture_dir = os.path.join(os.path.dirname(__file__), 'storcli')
+
+        def fixture(name):
+            with open(os.path.join(fixture_dir, name)) as fh:
+                return fh.read()
+
+        backend = StorcliJsonBackend(None, '/opt/MegaRAID/storcli/storcli64')
+
+        pds = backend.parse_pds(0, fixture('pds.json'))
+        self.assertEqual([(x.enclosure, x.slot) for x in pds], [(252, 0), (252, 1)])
+        pd = pds[0]
+        self.assertEqual(pd.device_id, 8)
+        self.assertEqual(pd.disk_group, (0, 0, 1))
+        self.assertEqual(pd.wwn_hex, '5000c5005e1e4f24')
+        self.assertEqual(pd.type, 'SAS')
+        self.assertEqual(pd.coerced_sectors, 0x22dc0000)
+        self.assertEqual(pd.firmware_state, 'Online, Spun Up')
+        self.assertEqual(pd.sas_addresses, [0x5000c5005e1e4f25, 0])
+        self.assertEqual(pd.vendor, 'SEAGATE')
+        self.assertEqual(pd.model, 'ST300MM0006')
+        self.assertEqual(pd.serial, 'S0K4A1B2')
+        self.assertFalse(pd.is_hotspare)
+        pd = pds[1]
+        self.assertTrue(pd.is_hotspare)
+        self.assertIsNone(pd.disk_group)
+        self.assertEqual(pd.media_errors, 2)
+        self.assertEqual(pd.predictive_failures, 1)
+        self.assertEqual(pd.firmware_state, 'Hotspare, Spun Up')
+
+        lds = backend.parse_lds(0, fixture('lds.json'))
+        self.assertEqual(len(lds), 2)
+        self.assertEqual(lds[0].name, 'system')
+        self.assertEqual(lds[0].raid_level, 'RAID-1')
+        self.assertEqual(lds[0].state, 'Optimal')
+        self.assertEqual(lds[0].target_id, 0)
+        self.assertEqual([(x.enclosure, x.slot) for x in lds[0].pds], [(252, 0), (252, 2)])
+        self.assertEqual(lds[1].raid_level, 'RAID-10')
+        self.assertEqual(lds[1].state, 'Degraded')
+        self.assertEqual(lds[1].pds[1].firmware_state, 'Rebuild')
+        self.assertEqual(backend.parse_lds(0, fixture('no-vds.json')), [])
+
+        enclosures = backend.parse_enclosures(0, fixture('enclosures.json'))
+        self.assertEqual([(x.number, x.id) for x in enclosures], [(0, 8), (1, 252)])
+        enc = enclosures[0]
+        self.assertEqual(enc.nr_slots, 12)
+        self.assertEqual(enc.nr_fans, 2)
+        self.assertEqual(enc.enc_type, 'SES')
+        self.assertEqual(enc.product_name, 'SAS2X28')
+        self.assertEqual(enc.nr_voltage_sensors, 2)
+        self.assertAlmostEqual(enc.voltage_sensors[1].voltage, 11.81)
+        self.assertEqual(enc.fans[1].speed, 'Medium Speed')
+        self.assertEqual(enc.temperature_sensors[0].temperature, 28)
+        enc = enclosures[1]
+        self.assertEqual(enc.status, 'OK')
+        self.assertIsNone(enc.product_revision)
+        self.assertEqual(enc.temperature_sensors, [])
+
+    # -------------------------------------------------------------------------
+    def test_telemetry(self):
+
+        log.info("Test the enclosure sensor telemetry store ...")
+
+        from pb_blockdev.megaraid.storcli import StorcliJsonBackend
+        from pb_blockdev.megaraid.telemetry import EnclosureTelemetry
+        from pb_blockdev.megaraid.telemetry import SensorThreshold
+
+        fixture = os.path.join(os.path.dirname(__file__), 'storcli', 'enclosures.json')
+        with open(fixture) as fh:
+            output = fh.read()
+
+        backend = StorcliJsonBackend(None, '/opt/MegaRAID/storcli/storcli64')
+        thresholds = [
+            SensorThreshold('temperature', max_value=40, max_rate=5),
+            SensorThreshold('fan', min_value=1),
+        ]
+
+        telemetry = EnclosureTelemetry(capacity=3)
+        key = (0, 8, 'temperature', 0)
+        for (i, temp) in enumerate((28, 29, 30, 40, 45)):
+            enclosures = backend.parse_enclosures(0, output)
+            enclosures[0].temperature_sensors[0].temperature = temp
+            telemetry.record(enclosures, 1000.0 + i * 60)
+
+        self.assertEqual(telemetry.count, 3)
+        self.assertIn((0, 8, 'voltage', 1), telemetry.keys())
+        self.assertEqual(
+            [x[1] for x in telemetry.series(key)], [30.0, 40.0, 45.0])
+        self.assertEqual(telemetry.latest(key), (45.0, 'OK'))
+
+        alarms = telemetry.evaluate(thresholds)
+        self.assertEqual(
+            [(x.key, x.reason) for x in alarms], [(key, 'max')])
+
+        enclosures = backend.parse_enclosures(0, output)
+        enclosures[0].temperature_sensors[0].temperature = 30
+        enclosures[0].fans[1].status = 'Failed'
+        telemetry.record(enclosures, 1000.0 + 5 * 60)
+        alarms = telemetry.evaluate(thresholds)
+        self.assertEqual(
+            [(x.key, x.reason) for x in alarms],
+            [((0, 8, 'fan', 1), 'min'), (key, 'rate')])
+        self.assertEqual(alarms[1].value, -15.0)
+
+    # -------------------------------------------------------------------------
+    def test_record_writer(self):
+
+        log.info("Test the machine readable output formats ...")
+
+        import json
+        try:
+            from StringIO import StringIO
+        except ImportError:
+            from io import StringIO
+
+        from pb_blockdev.megaraid.storcli import StorcliJsonBackend
+        from pb_blockdev.megaraid.output import get_record_writer
+        from pb_blockdev.megaraid.output import record_fields
+        from pb_blockdev.megaraid.output import PD_FIELDS, ADAPTER_FIELDS
+        from pb_blockdev.megaraid.output import SUMMARY_FIELDS
+        from pb_blockdev.megaraid.output import pd_record, adapter_record
+        from pb_blockdev.megaraid.output import summary_record
+
+        fixture = os.path.join(os.path.dirname(__file__), 'storcli', 'pds.json')
+        with open(fixture) as fh:
+            output = fh.read()
+        backend = StorcliJsonBackend(None, '/opt/MegaRAID/storcli/storcli64')
+        pds = backend.parse_pds(0, output)
+        fields = record_fields(PD_FIELDS, ADAPTER_FIELDS, SUMMARY_FIELDS)
+
+        def write(output_format):
+            fh = StringIO()
+            with get_record_writer(output_format, fh, fields) as writer:
+                for pd in pds:
+                    writer.write(pd_record(pd))
+                writer.write(adapter_record(0, len(pds), 1024, 0.12345))
+                writer.write(summary_record(1, len(pds), 1024, 0.2))
+            return fh.getvalue()
+
+        records = json.loads(write('json'))
+        self.assertEqual(
+            [x['record'] for x in records], ['pd', 'pd', 'adapter', 'summary'])
+        self.assertEqual(records[0]['serial'], 'S0K4A1B2')
+        self.assertEqual(records[2]['seconds'], 0.123)
+
+        lines = write('jsonl').splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(json.loads(lines[1])['slot'], 1)
+
+        lines = write('csv').splitlines()
+        self.assertEqual(lines[0].split(',')[:4], ['record', 'adapter', 'enclosure', 'slot'])
+        self.assertTrue(lines[1].startswith('pd,0,252,0,'))
+        self.assertTrue(lines[4].startswith('summary,'))
+
+        self.assertRaises(ValueError, get_record_writer, 'xml')
+
+    # -------------------------------------------------------------------------
+    def test_pd_history(self):
+
+        log.info("Test the history of the error counters of physical drives ...")
+
+        from pb_blockdev.megaraid.storcli import StorcliJsonBackend
+        from pb_blockdev.megaraid.pd_history import MegaraidPdHistory
+
+        fixture = os.path.join(os.path.dirname(__file__), 'storcli', 'pds.json')
+        with open(fixture) as fh:
+            output = fh.read()
+        backend = StorcliJsonBackend(None, '/opt/MegaRAID/storcli/storcli64')
+
+        tmp_dir = tempfile.mkdtemp(prefix='test-megaraid-')
+        db_file = os.path.join(tmp_dir, 'history.sqlite')
+        day = 24 * 60 * 60
+        start = 1000000.0
+
+        try:
+            history = MegaraidPdHistory(db_file)
+            pds = backend.parse_pds(0, output)
+            self.assertEqual(history.record(pds, start), {})
+            self.assertEqual(history.ranking(now=start), [])
+
+            # One day later: PD 252:1 got 4 new media errors
+            pds = backend.parse_pds(0, output)
+            pds[1]._media_errors = 6
+            changed = history.record(pds, start + day)
+            key = ('5000c50056337998', 'Z296Q3B9')
+            self.assertEqual(list(changed.keys()), [key])
+            self.assertEqual(changed[key]['media_errors'], 4)
+
+            # Two days later: PD 252:0 got 2 predictive failures,
+            # the counters of PD 252:1 were reset
+            pds = backend.parse_pds(0, output)
+            pds[0]._predictive_failures = 2
+            pds[1]._media_errors = 1
+            history.record(pds, start + 2 * day)
+            history.close()
+
+            history = MegaraidPdHistory(db_file)
+            self.assertEqual(len(history.history(*key)), 2)
+
+            ranking = history.ranking(now=start + 2 * day)
+            self.assertEqual(
+                [x['serial'] for x in ranking], ['S0K4A1B2', 'Z296Q3B9'])
+            self.assertEqual(ranking[1]['grown_media_errors'], 5)
+            self.assertEqual(ranking[1]['media_errors_per_day'], 2.5)
+
+            # Only the last half day
+            ranking = history.ranking(window=day / 2, now=start + 2 * day)
+            self.assertEqual(ranking[1]['grown_media_errors'], 1)
+            self.assertEqual(len(history.ranking(limit=1, now=start + 2 * day)), 1)
+            history.close()
+
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def test_ld_map(self):
+
+        log.info("Test mapping of logical drives to block devices via sysfs ...")
+
+        from pb_blockdev.megaraid.ld_map import MegaraidLdMap
+        from pb_blockdev.megaraid.ld import MegaraidLogicalDrive
+
+        tmp_dir = tempfile.mkdtemp(prefix='test-megaraid-')
+        host_dir = os.path.join(tmp_dir, 'scsi_host')
+        dev_dir = os.path.join(tmp_dir, 'devices')
+
+        def add_host(host_id, proc_name):
+            hdir = os.path.join(host_dir, 'host%d' % (host_id))
+            os.makedirs(hdir)
+            with open(os.path.join(hdir, 'proc_name'), 'w') as fh:
+                fh.write(proc_name + "\n")
+
+        def add_device(hbtl, bdev=None):
+            ddir = os.path.join(dev_dir, hbtl)
+            os.makedirs(ddir)
+            if bdev:
+                os.makedirs(os.path.join(ddir, 'block', bdev))
+
+        try:
+            add_host(0, 'ahci')
+            add_host(2, 'megaraid_sas')
+            add_host(5, 'megaraid_sas')
+            add_device('0:0:0:0', 'sda')
+            add_device('2:0:8:0', 'sdb')
+            add_device('2:2:0:0', 'sdc')
+            add_device('2:2:1:0', 'sdd')
+            add_device('5:3:2:0', 'sde')
+            add_device('5:2:3:0')
+            os.makedirs(os.path.join(dev_dir, 'target2:2:0'))
+
+            ld_map = MegaraidLdMap(scsi_host_dir=host_dir, scsi_devices_dir=dev_dir)
+            self.assertEqual(ld_map.build(), 4)
+            self.assertEqual(ld_map.hosts, {2: 0, 5: 1})
+
+            entry = ld_map.by_ld(0, 1)
+            self.assertEqual(str(entry.hbtl), '2:2:1:0')
+            self.assertEqual(entry.device_path, '/dev/sdd')
+            self.assertEqual(ld_map.by_ld(1, 130).device, 'sde')
+            self.assertIsNone(ld_map.by_ld(1, 3).device)
+            self.assertIsNone(ld_map.by_ld(0, 8))
+
+            entry = ld_map.by_device('/dev/sdc')
+            self.assertEqual((entry.adapter, entry.target_id), (0, 0))
+            self.assertIsNone(ld_map.by_device('sda'))
+            self.assertIsNone(ld_map.by_device('sdb'))
+
+            ld = MegaraidLogicalDrive(1, 0, target_id=130)
+            self.assertEqual(ld_map.resolve(ld).device, 'sde')
+
+            ld_map = MegaraidLdMap(
+                host_map={0: 5}, scsi_host_dir=host_dir, scsi_devices_dir=dev_dir)
+            self.assertEqual(ld_map.build(), 2)
+            self.assertEqual(ld_map.by_ld(0, 130).device, 'sde')
+
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def test_run_parallel(self):
+
+        log.info("Test run_parallel() ...")
+
+        from pb_blockdev.megaraid.collector import run_parallel
+
+        def slow_square(x):
+            time.sleep(0.2)
+            return x * x
+
+        start = time.time()
+        results = run_parallel(slow_square, range(4), max_workers=2)
+        duration = time.time() - start
+        self.assertEqual(results, {0: 0, 1: 1, 2: 4, 3: 9})
+        # Four items, but only two in parallel
+        self.assertGreaterEqual(duration, 0.4)
+        self.assertLess(duration, 0.8)
+
+        def fail(x):
+            if x == 2:
+                raise ValueError("Item %d failed." % (x))
+            return x
+
+        with self.assertRaises(ValueError):
+            run_parallel(fail, range(4), max_workers=4)
+
+        log.info("Test iter_parallel() ...")
+
+        from pb_blockdev.megaraid.collector import iter_parallel
+
+        def sleep_items(x):
+            time.sleep(x)
+            return x
+
+        items = [0.3, 0.1, 0.2]
+        results = list(iter_parallel(sleep_items, items, max_workers=3))
+        # In the order of completion
+        self.assertEqual([x[0] for x in results], [0.1, 0.2, 0.3])
+        for (item, result, seconds) in results:
+            self.assertEqual(result, item)
+            self.assertGreaterEqual(seconds, item)
+
+        with self.assertRaises(ValueError):
+            list(iter_parallel(fail, range(4), max_workers=4))
+
     # -------------------------------------------------------------------------
     def test_handler_object(self):
 
@@ -107,6 +536,101 @@ class MegaraidTestcase(BlockdevTestcase):
             s = ''
         log.debug("The test found %d MegaRaid controller%s.", count, s)
 
+    # -------------------------------------------------------------------------
+    def test_get_all_pds(self):
+
+        log.info("Test execute of get_all_pds() ...")
+
+        from pb_blockdev.megaraid.handler import MegaraidHandler
+
+        try:
+            hdlr = MegaraidHandler(verbose=self.verbose)
+        except CommandNotFoundError, e:
+            log.info(str(e))
+            return
+
+        count = hdlr.adapter_count()
+        adapter_id = 0
+        while adapter_id < count:
+            pds = hdlr.get_all_pds(adapter_id)
+            log.debug(
+                "Found %d physical drives on MegaRaid controller %d.",
+                len(pds), adapter_id)
+            for pd in pds:
+                self.assertEqual(pd.adapter, adapter_id)
+                if self.verbose > 2:
+                    log.debug("Got physical drive:\n%s", pp(pd.as_dict(True)))
+            adapter_id += 1
+
+    # -------------------------------------------------------------------------
+    def test_collector(self):
+
+        log.info("Test collecting all PDs and LDs by a MegaraidCollector ...")
+
+        from pb_blockdev.megaraid.collector import MegaraidCollector
+
+        try:
+            collector = MegaraidCollector(verbose=self.verbose)
+        except CommandNotFoundError, e:
+            log.info(str(e))
+            return
+
+        adapter_ids = collector.adapter_ids()
+        all_pds = collector.get_all_pds()
+        all_lds = collector.get_all_lds()
+        self.assertEqual(sorted(all_pds.keys()), adapter_ids)
+        self.assertEqual(sorted(all_lds.keys()), adapter_ids)
+
+        # The second run must be served by the cache of the handler
+        start = time.time()
+        collector.get_all_pds()
+        self.assertLess(time.time() - start, 0.1)
+
+        if self.verbose > 2:
+            log.debug("MegaraidCollector object:\n%s", pp(collector.as_dict(True)))
+
+    # -------------------------------------------------------------------------
+    def test_megacli_serialized(self):
+
+        log.info("Test serialized execution of MegaCli by a MegaraidCollector ...")
+
+        from pb_blockdev.tools import TOOLS
+        from pb_blockdev.megaraid.handler import MegaraidHandler
+        from pb_blockdev.megaraid.collector import MegaraidCollector
+
+        tmp_dir = tempfile.mkdtemp(prefix='test-megacli-')
+        running_dir = os.path.join(tmp_dir, 'running')
+        fake_megacli = os.path.join(tmp_dir, 'MegaCli64')
+        with open(fake_megacli, 'w') as fh:
+            fh.write('#!/bin/sh\n')
+            fh.write('mkdir %s 2>/dev/null || echo OVERLAP\n' % (running_dir))
+            fh.write('sleep 0.1\n')
+            fh.write('rmdir %s 2>/dev/null\n' % (running_dir))
+            fh.write('echo "$@"\necho "Exit Code: 0x00"\n')
+        os.chmod(fake_megacli, stat.S_IRWXU)
+
+        TOOLS.register('megacli', fake_megacli)
+        TOOLS.register('storcli', None)
+        try:
+            handler = MegaraidHandler(appname=self.appname, verbose=self.verbose)
+            collector = MegaraidCollector(handler=handler, max_workers=4)
+
+            def query(adapter_id):
+                return handler.exec_megacli(['-AdpAllInfo', '-a%d' % (adapter_id)])
+
+            results = collector.collect(query, adapter_ids=[0, 1, 2, 3])
+            self.assertEqual(sorted(results.keys()), [0, 1, 2, 3])
+            for adapter_id in results:
+                out = results[adapter_id]['out']
+                self.assertNotIn('OVERLAP', out)
+                self.assertEqual(
+                    out.splitlines()[0], '-AdpAllInfo -a%d -NoLog' % (adapter_id))
+
+        finally:
+            TOOLS.clear('megacli')
+            TOOLS.clear('storcli')
+            shutil.rmtree(tmp_dir)
+
 # =============================================================================
 
 
@@ -123,9 +647,20 @@ if __name__ == '__main__':
     suite = unittest.TestSuite()
 
     suite.addTest(MegaraidTestcase('test_import', verbose))
+    suite.addTest(MegaraidTestcase('test_tokenize', verbose))
+    suite.addTest(MegaraidTestcase('test_event_cache', verbose))
+    suite.addTest(MegaraidTestcase('test_storcli_json', verbose))
+    suite.addTest(MegaraidTestcase('test_telemetry', verbose))
+    suite.addTest(MegaraidTestcase('test_record_writer', verbose))
+    suite.addTest(MegaraidTestcase('test_pd_history', verbose))
+    suite.addTest(MegaraidTestcase('test_ld_map', verbose))
+    suite.addTest(MegaraidTestcase('test_run_parallel', verbose))
     suite.addTest(MegaraidTestcase('test_handler_object', verbose))
     suite.addTest(MegaraidTestcase('test_exec_megacli', verbose))
     suite.addTest(MegaraidTestcase('test_adapter_count', verbose))
+    suite.addTest(MegaraidTestcase('test_get_all_pds', verbose))
+    suite.addTest(MegaraidTestcase('test_collector', verbose))
+    suite.addTest(MegaraidTestcase('test_megacli_serialized', verbose))
 
     runner = unittest.TextTestRunner(verbosity=verbose)
 
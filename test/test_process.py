@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank.brehm@profitbricks.com
+@organization: Profitbricks GmbH
+@copyright: © 2010 - 2015 by Profitbricks GmbH
+@license: GPL3
+@summary: test script (and module) for unit tests on the process
+          execution modules
+'''
+
+import os
+import sys
+import time
+import errno
+import stat
+import signal
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+sys.path.insert(0, libdir)
+
+from general import BlockdevTestcase, get_arg_verbose, init_root_logger
+
+if sys.version_info[:2] >= (3, 5):
+    # async/await is a syntax error before Python 3.5
+    from aio_helpers import run_many
+
+log = logging.getLogger('test_process')
+
+NO_ASYNCIO_MSG = "asyncio with async/await is not available."
+
+
+# =============================================================================
+def process_alive(pid):
+    """Checks, whether the given process exists and is not a zombie."""
+
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        if e.errno == errno.ESRCH:
+            return False
+        raise
+    try:
+        with open('/proc/%d/stat' % (pid)) as fh:
+            return fh.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except IOError:
+        return False
+
+
+# =============================================================================
+def run_coroutine(coro):
+    """
+    Runs the given coroutine in a new event loop, like asyncio.run(),
+    which exists only since Python 3.7.
+    """
+
+    import asyncio
+
+    if hasattr(asyncio, 'run'):
+        return asyncio.run(coro)
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+# =============================================================================
+class FakeHandler(object):
+    """A minimal handler object for handler_call_with_timeout()."""
+
+    def __init__(self, simulate=False):
+        self.simulate = simulate
+        self.verbose = 0
+        self.calls = []
+
+    def call(self, cmd, quiet=True, sudo=False, simulate=None):
+        self.calls.append(cmd)
+        return (0, '', '')
+
+    def get_command(self, cmd):
+        return None
+
+
+# =============================================================================
+class ProcessTestcase(BlockdevTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        log.info("Test importing all appropriate modules ...")
+
+        log.debug("Importing pb_blockdev.process ...")
+        import pb_blockdev.process                      # noqa
+
+        if sys.version_info[:2] >= (3, 5):
+            log.debug("Importing pb_blockdev.aio ...")
+            import pb_blockdev.aio                      # noqa
+
+    # -------------------------------------------------------------------------
+    def test_call_with_timeout(self):
+
+        log.info("Test call_with_timeout() ...")
+
+        from pb_blockdev.process import call_with_timeout
+        from pb_blockdev.process import ExecTimeoutError
+
+        (ret_code, std_out, std_err) = call_with_timeout(
+            ['sh', '-c', 'echo out; echo err >&2; exit 3'], timeout=5)
+        self.assertEqual(ret_code, 3)
+        self.assertEqual(std_out, 'out\n')
+        self.assertEqual(std_err, 'err\n')
+
+        start = time.time()
+        with self.assertRaises(ExecTimeoutError):
+            call_with_timeout(['sh', '-c', 'sleep 10; sleep 10'], timeout=0.5)
+        self.assertLess(time.time() - start, 5)
+
+    # -------------------------------------------------------------------------
+    def test_kill_process_group(self):
+
+        log.info("Test killing of the whole process group on timeout ...")
+
+        from pb_blockdev.process import call_with_timeout
+        from pb_blockdev.process import kill_process_group
+        from pb_blockdev.process import ExecTimeoutError
+
+        # The child process forks a grandchild in the same process group
+        # and gives out its PID
+        cmd = ['sh', '-c', 'sleep 30 & echo $!; wait']
+        with self.assertRaises(ExecTimeoutError) as cm:
+            call_with_timeout(cmd, timeout=0.5)
+        grandchild = int(cm.exception.std_out.strip())
+        time.sleep(0.2)
+        self.assertFalse(process_alive(grandchild))
+
+        # A process ignoring SIGTERM is killed by SIGKILL after the grace period
+        proc = subprocess.Popen(
+            ['sh', '-c', 'trap "" TERM; echo ready; while true; do sleep 0.1; done'],
+            stdout=subprocess.PIPE, preexec_fn=os.setsid)
+        proc.stdout.readline()
+        start = time.time()
+        kill_process_group(proc, grace_period=0.3)
+        proc.stdout.close()
+        self.assertGreaterEqual(time.time() - start, 0.3)
+        self.assertEqual(proc.returncode, -signal.SIGKILL)
+
+    # -------------------------------------------------------------------------
+    def test_handler_call_with_timeout(self):
+
+        log.info("Test handler_call_with_timeout() ...")
+
+        from pb_blockdev.process import handler_call_with_timeout
+        from pb_blockdev.process import ExecTimeoutError
+
+        handler = FakeHandler()
+        (ret_code, std_out, std_err) = handler_call_with_timeout(
+            handler, ['sh', '-c', 'echo ok'], timeout=5)
+        self.assertEqual((ret_code, std_out, std_err), (0, 'ok\n', ''))
+        self.assertEqual(handler.calls, [])
+
+        with self.assertRaises(ExecTimeoutError):
+            handler_call_with_timeout(
+                handler, ['sh', '-c', 'sleep 10; sleep 10'], timeout=0.5)
+
+        # Simulated commands are given to the handler
+        handler_call_with_timeout(handler, ['false'], simulate=True)
+        self.assertEqual(handler.calls, [['false']])
+        handler = FakeHandler(simulate=True)
+        handler_call_with_timeout(handler, ['false'])
+        self.assertEqual(handler.calls, [['false']])
+
+    # -------------------------------------------------------------------------
+    @unittest.skipUnless(sys.version_info[:2] >= (3, 5), NO_ASYNCIO_MSG)
+    def test_async_runner(self):
+
+        log.info("Test AsyncToolRunner ...")
+
+        from pb_blockdev.aio import AsyncToolRunner
+        from pb_blockdev.process import ExecTimeoutError
+
+        runner = AsyncToolRunner(limits={'sleep': 2})
+        cmd = ['sh', '-c', 'sleep 0.3; echo ok']
+
+        start = time.time()
+        results = run_coroutine(run_many(runner, 'sleep', cmd, 4))
+        duration = time.time() - start
+        for result in results:
+            self.assertEqual(result, (0, 'ok\n', ''))
+        # Four commands, but only two in parallel
+        self.assertGreaterEqual(duration, 0.6)
+
+        with self.assertRaises(ExecTimeoutError):
+            run_coroutine(runner.run(
+                'other', ['sh', '-c', 'sleep 10; sleep 10'], timeout=0.5))
+
+    # -------------------------------------------------------------------------
+    @unittest.skipUnless(sys.version_info[:2] >= (3, 5), NO_ASYNCIO_MSG)
+    def test_async_runner_loops(self):
+
+        log.info("Test AsyncToolRunner in consecutive event loops ...")
+
+        from pb_blockdev.aio import AsyncToolRunner
+
+        runner = AsyncToolRunner(limits={'sleep': 1})
+        cmd = ['sh', '-c', 'sleep 0.1; echo ok']
+
+        def run_all():
+            # More jobs than the limit, so they have to wait
+            # for the semaphore
+            return run_many(runner, 'sleep', cmd, 3)
+
+        # A semaphore of a finished loop would block forever, so the loops
+        # are running in a thread with a timeout, if possible (before
+        # Python 3.8 subprocesses are only supported in the main thread)
+        for i in range(2):
+            results = []
+            if sys.version_info[:2] < (3, 8):
+                results.append(run_coroutine(run_all()))
+            else:
+                thread = threading.Thread(
+                    target=lambda: results.append(run_coroutine(run_all())))
+                thread.daemon = True
+                thread.start()
+                thread.join(10)
+                self.assertFalse(
+                    thread.is_alive(), "Event loop %d hangs." % (i + 1))
+            self.assertEqual(results, [[(0, 'ok\n', '')] * 3])
+
+    # -------------------------------------------------------------------------
+    @unittest.skipUnless(sys.version_info[:2] >= (3, 5), NO_ASYNCIO_MSG)
+    def test_async_megacli(self):
+
+        log.info("Test executing MegaCli by pb_blockdev.aio ...")
+
+        from pb_blockdev.tools import TOOLS
+        from pb_blockdev.megaraid.handler import MegaraidHandler
+        from pb_blockdev import aio
+
+        tmp_dir = tempfile.mkdtemp(prefix='test-megacli-')
+        fake_megacli = os.path.join(tmp_dir, 'MegaCli64')
+        with open(fake_megacli, 'w') as fh:
+            fh.write('#!/bin/sh\necho "$@"\necho "Exit Code: 0x00"\n')
+        os.chmod(fake_megacli, stat.S_IRWXU)
+
+        TOOLS.register('megacli', fake_megacli)
+        TOOLS.register('storcli', None)
+        try:
+            handler = MegaraidHandler(appname=self.appname, verbose=self.verbose)
+
+            result = run_coroutine(aio.exec_megacli(handler, '-AdpCount'))
+            self.assertEqual(result['retval'], 0)
+            self.assertEqual(result['exitcode'], 0)
+            self.assertEqual(result['out'].splitlines()[0], '-AdpCount -NoLog')
+
+            result = run_coroutine(aio.exec_megacli(
+                handler, ['-PDList', '-a0'], nolog=False))
+            self.assertEqual(result['out'].splitlines()[0], '-PDList -a0')
+
+        finally:
+            TOOLS.clear('megacli')
+            TOOLS.clear('storcli')
+            shutil.rmtree(tmp_dir)
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    log.info("Starting tests ...")
+
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+
+    suite.addTest(ProcessTestcase('test_import', verbose))
+    suite.addTest(ProcessTestcase('test_call_with_timeout', verbose))
+    suite.addTest(ProcessTestcase('test_kill_process_group', verbose))
+    suite.addTest(ProcessTestcase('test_handler_call_with_timeout', verbose))
+    suite.addTest(ProcessTestcase('test_async_runner', verbose))
+    suite.addTest(ProcessTestcase('test_async_runner_loops', verbose))
+    suite.addTest(ProcessTestcase('test_async_megacli', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -118,6 +118,45 @@ class TestScsiDevice(BlockdevTestcase):
             self.assertIsInstance(scsi_dev, ScsiDevice)
             self.assertEqual(scsi_dev.exists, True)
 
+    # -------------------------------------------------------------------------
+    def test_hbtl(self):
+
+        log.info("Testing HBTL objects ...")
+
+        import pickle
+        from pb_blockdev.hbtl import HBTL
+
+        a = HBTL(2, 0, 10, 1)
+        b = HBTL.from_string('2:0:9:3')
+        c = HBTL(2, 0, 10, 1)
+
+        self.assertEqual(a, c)
+        self.assertNotEqual(a, b)
+        self.assertTrue(b < a)
+        self.assertTrue(a >= c)
+        self.assertEqual(sorted([a, b]), [b, a])
+        self.assertEqual(len(set([a, b, c])), 2)
+        self.assertEqual({a: 1}[c], 1)
+        self.assertNotEqual(a, '2:0:10:1')
+
+        with self.assertRaises(AttributeError):
+            a.foo = 1
+
+        self.assertEqual(a.key, (2 << 48) | (10 << 16) | 1)
+        self.assertEqual(HBTL.from_key(a.key), a)
+        self.assertTrue(b.key < a.key)
+        with self.assertRaises(ValueError):
+            HBTL(0, 0, 0, 65536).key
+
+        self.assertEqual(pickle.loads(pickle.dumps(a)), a)
+
+        hbtls = HBTL.parse_many(['1:0:0:0', 'host1', '0:0:1:2', 'target1:0:0'], skip_invalid=True)
+        self.assertEqual([str(x) for x in hbtls], ['1:0:0:0', '0:0:1:2'])
+        with self.assertRaises(ValueError):
+            HBTL.parse_many(['1:0:0:0', '1:0:0'])
+        with self.assertRaises(ValueError):
+            HBTL.parse_many(['1:-1:0:0'])
+
 # =============================================================================
 
 if __name__ == '__main__':
@@ -135,6 +174,7 @@ if __name__ == '__main__':
     suite.addTest(TestScsiDevice('test_empty_object', verbose))
     suite.addTest(TestScsiDevice('test_all_existing', verbose))
     suite.addTest(TestScsiDevice('test_existing', verbose))
+    suite.addTest(TestScsiDevice('test_hbtl', verbose))
 
     runner = unittest.TextTestRunner(verbosity=verbose)
 
@@ -11,7 +11,10 @@
 
 import os
 import sys
+import time
+import shutil
 import logging
+import tempfile
 
 try:
     import unittest2 as unittest
@@ -22,6 +25,7 @@ libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..'))
 sys.path.insert(0, libdir)
 
 from general import BlockdevTestcase, get_arg_verbose, init_root_logger
+from general import timing_tests_enabled
 
 from pb_base.common import pp
 
@@ -80,6 +84,8 @@ class ScsiHostTestcase(BlockdevTestcase):
 
         for host in scsi_hosts:
             self.assertIsInstance(host, ScsiHost, ("Object %r should be a ScsiHost." % (host)))
+            # no shared topology without an explicit one
+            self.assertIsNone(host.topology)
 
     # -------------------------------------------------------------------------
     def test_search_blockdevices(self):
@@ -115,6 +121,152 @@ class ScsiHostTestcase(BlockdevTestcase):
                         log.debug("Blockdevice:\n%s", pp(blockdev.as_dict(True)))
                 first = False
 
+    # -------------------------------------------------------------------------
+    def test_scsi_topology(self):
+
+        log.info("Test reading the SCSI topology from a fake sysfs ...")
+
+        from pb_blockdev.hbtl import HBTL
+        from pb_blockdev.scsi_topology import ScsiTopology
+
+        nr_hosts = 16
+        nr_luns = 250
+
+        tmpdir = tempfile.mkdtemp(prefix='pb_blockdev_test_')
+        try:
+            host_dir = os.path.join(tmpdir, 'scsi_host')
+            devices_dir = os.path.join(tmpdir, 'devices')
+            os.mkdir(host_dir)
+            os.mkdir(devices_dir)
+
+            nr = 0
+            for host_id in range(nr_hosts):
+                os.mkdir(os.path.join(host_dir, 'host%d' % (host_id)))
+                os.mkdir(os.path.join(devices_dir, 'host%d' % (host_id)))
+                os.mkdir(os.path.join(devices_dir, 'target%d:0:0' % (host_id)))
+                for lun_id in range(nr_luns):
+                    lun_dir = os.path.join(devices_dir, '%d:0:0:%d' % (host_id, lun_id))
+                    os.mkdir(lun_dir)
+                    # every tenth LUN without a block device, e.g. an enclosure
+                    if lun_id % 10:
+                        os.makedirs(os.path.join(lun_dir, 'block', 'sd%d' % (nr)))
+                    nr += 1
+
+            start = time.time()
+            topology = ScsiTopology(host_dir, devices_dir)
+            duration = time.time() - start
+            log.debug(
+                "Reading topology of %d LUNs took %0.4f seconds.",
+                len(topology), duration)
+            if timing_tests_enabled():
+                self.assertLess(duration, 1.0)
+
+            self.assertEqual(topology.hosts, list(range(nr_hosts)))
+            self.assertEqual(len(topology), nr_hosts * nr_luns)
+            self.assertEqual(topology.targets(3), [(0, 0)])
+            self.assertEqual(topology.targets(nr_hosts), [])
+
+            luns = topology.luns(3)
+            self.assertEqual(len(luns), nr_luns)
+            self.assertEqual(luns, sorted(luns))
+            self.assertEqual(luns[0], HBTL(3, 0, 0, 0))
+            self.assertEqual(len(topology.luns(3, 0, 0)), nr_luns)
+            self.assertEqual(topology.luns(3, 1), [])
+
+            hbtl = HBTL(3, 0, 0, 12)
+            self.assertIn(hbtl, topology)
+            self.assertNotIn(HBTL(3, 0, 0, nr_luns), topology)
+            bdname = topology.blockdevice_name(hbtl)
+            self.assertEqual(bdname, 'sd%d' % (3 * nr_luns + 12))
+            self.assertEqual(topology.hbtl_of(bdname), hbtl)
+            self.assertIsNone(topology.blockdevice_name(HBTL(3, 0, 0, 10)))
+            self.assertIsNone(topology.hbtl_of('dm-0'))
+            self.assertEqual(
+                len(topology.blockdevices()), nr_hosts * nr_luns * 9 // 10)
+
+            # LUN Ids of flat or extended LUN addressing exceed 16 bits
+            big_lun = HBTL(0, 0, 0, 1073872896)
+            os.makedirs(os.path.join(devices_dir, str(big_lun), 'block', 'sdbig'))
+            topology.refresh()
+            self.assertEqual(topology.luns(0)[-1], big_lun)
+            self.assertEqual(topology.hbtl_of('sdbig'), big_lun)
+            self.assertEqual(len(topology), nr_hosts * nr_luns + 1)
+
+            shutil.rmtree(os.path.join(devices_dir, '3:0:0:12'))
+            topology.refresh()
+            self.assertNotIn(hbtl, topology)
+            self.assertIsNone(topology.hbtl_of(bdname))
+
+            if self.verbose > 3:
+                log.debug("SCSI topology:\n%s", pp(topology.as_dict(True)))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    # -------------------------------------------------------------------------
+    def test_scsi_host_topology(self):
+
+        log.info("Test a ScsiHost with a SCSI topology of a fake sysfs ...")
+
+        from pb_blockdev.hbtl import HBTL
+        from pb_blockdev.scsi_topology import ScsiTopology
+        from pb_blockdev.scsi_host import ScsiHost, get_scsi_hosts
+
+        # a host Id not existing in the real sysfs
+        host_id = 4711
+
+        tmpdir = tempfile.mkdtemp(prefix='pb_blockdev_test_')
+        try:
+            host_dir = os.path.join(tmpdir, 'scsi_host')
+            devices_dir = os.path.join(tmpdir, 'devices')
+            scan_file = os.path.join(tmpdir, 'scan')
+            os.makedirs(os.path.join(host_dir, 'host%d' % (host_id)))
+            os.mkdir(devices_dir)
+            open(scan_file, 'w').close()
+
+            def add_lun(lun_id, bdname):
+                os.makedirs(os.path.join(
+                    devices_dir, '%d:0:0:%d' % (host_id, lun_id), 'block', bdname))
+
+            add_lun(0, 'sda')
+            add_lun(1, 'sdb')
+
+            class FakeScsiHost(ScsiHost):
+
+                @property
+                def scan_file(self):
+                    return scan_file
+
+            topology = ScsiTopology(host_dir, devices_dir)
+            host = FakeScsiHost(
+                host_id, appname=self.appname, verbose=self.verbose, topology=topology)
+            self.assertEqual(host.luns, [HBTL(host_id, 0, 0, 0), HBTL(host_id, 0, 0, 1)])
+
+            # A new LUN is found after a scan of the host
+            add_lun(2, 'sdc')
+            host.init_lun_list()
+            self.assertEqual(len(host.luns), 2)
+            host.scan()
+            host.init_lun_list()
+            self.assertEqual(host.luns[-1], HBTL(host_id, 0, 0, 2))
+            self.assertEqual(host.lun_blockdevicename(0, 0, 2), 'sdc')
+
+            # No outdated block device name from the topology
+            lun_block_dir = os.path.join(devices_dir, '%d:0:0:1' % (host_id), 'block')
+            os.rename(os.path.join(lun_block_dir, 'sdb'), os.path.join(lun_block_dir, 'sdx'))
+            self.assertNotEqual(host.lun_blockdevicename(0, 0, 1), 'sdb')
+            topology.refresh()
+            self.assertEqual(host.lun_blockdevicename(0, 0, 1), 'sdx')
+
+            # An explicitly given topology is shared by all hosts
+            scsi_hosts = get_scsi_hosts(
+                appname=self.appname, verbose=self.verbose, topology=topology)
+            self.assertEqual([x.host_id for x in scsi_hosts], [host_id])
+            self.assertIs(scsi_hosts[0].topology, topology)
+            self.assertEqual(len(scsi_hosts[0].luns), 3)
+
+        finally:
+            shutil.rmtree(tmpdir)
+
 # =============================================================================
 
 
@@ -134,6 +286,8 @@ if __name__ == '__main__':
     suite.addTest(ScsiHostTestcase('test_scsi_host_object', verbose))
     suite.addTest(ScsiHostTestcase('test_get_all_scsi_hosts', verbose))
     suite.addTest(ScsiHostTestcase('test_search_blockdevices', verbose))
+    suite.addTest(ScsiHostTestcase('test_scsi_topology', verbose))
+    suite.addTest(ScsiHostTestcase('test_scsi_host_topology', verbose))
 
     runner = unittest.TextTestRunner(verbosity=verbose)
 